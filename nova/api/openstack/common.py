@@ -417,13 +417,17 @@ class ViewBuilder(object):
                               request,
                               items,
                               collection_name,
-                              id_key="uuid"):
+                              id_key="uuid",
+                              marker=None):
         """Retrieve 'next' link, if applicable. This is included if:
         1) 'limit' param is specified and equals the number of items.
         2) 'limit' param is specified but it exceeds CONF.api.max_limit,
         in this case the number of items is CONF.api.max_limit.
         3) 'limit' param is NOT specified but the number of items is
         CONF.api.max_limit.
+
+        The marker of the link is the identifier of the last item, unless
+        a marker is given.
         """
         links = []
         max_items = min(
@@ -431,7 +435,9 @@ class ViewBuilder(object):
             CONF.api.max_limit)
         if max_items and max_items == len(items):
             last_item = items[-1]
-            if id_key in last_item:
+            if marker is not None:
+                last_item_id = marker
+            elif id_key in last_item:
                 last_item_id = last_item[id_key]
             elif 'id' in last_item:
                 last_item_id = last_item["id"]
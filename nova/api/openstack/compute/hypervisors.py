@@ -183,10 +183,12 @@ class HypervisorsController(wsgi.Controller):
             compute_nodes = self._get_compute_nodes_by_name_pattern(
                 context, hypervisor_match)
         else:
-            # Get all compute nodes.
+            # Get all compute nodes. Of their large fields, only the CPU info
+            # is shown, and only in details.
             try:
                 compute_nodes = self.host_api.compute_node_get_all(
-                    context, limit=limit, marker=marker)
+                    context, limit=limit, marker=marker,
+                    expected_attrs=['cpu_info'] if detail else [])
             except exception.MarkerNotFound:
                 msg = _('marker [%s] not found') % marker
                 raise webob.exc.HTTPBadRequest(explanation=msg)
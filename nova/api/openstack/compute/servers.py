@@ -34,6 +34,7 @@ from nova.api import validation
 from nova import block_device
 from nova.compute import api as compute
 from nova.compute import flavors
+from nova.compute import instance_list as instance_list_api
 from nova.compute import utils as compute_utils
 import nova.conf
 from nova import context as nova_context
@@ -181,6 +182,9 @@ class ServersController(wsgi.Controller):
         search_opts.update(req.GET)
 
         context = req.environ['nova.context']
+        # NOTE: Listing servers tolerates instances up to
+        # [database]/replica_max_lag seconds old.
+        context.allow_replica_reads = True
         remove_invalid_options(context, search_opts,
                 self._get_server_search_options(req))
 
@@ -340,14 +344,21 @@ class ServersController(wsgi.Controller):
                       search_opts['flavor'])
             instance_list = objects.InstanceList()
 
+        next_marker = None
+        if CONF.api.instance_list_keyset_markers and instance_list:
+            next_marker = instance_list_api.get_keyset_marker(
+                instance_list[-1], sort_keys, sort_dirs)
+
         if is_detail:
             instance_list._context = context
             instance_list.fill_faults()
             response = self._view_builder.detail(
-                req, instance_list, cell_down_support=cell_down_support)
+                req, instance_list, cell_down_support=cell_down_support,
+                marker=next_marker)
         else:
             response = self._view_builder.index(
-                req, instance_list, cell_down_support=cell_down_support)
+                req, instance_list, cell_down_support=cell_down_support,
+                marker=next_marker)
         return response
 
     def _get_server(self, context, req, instance_uuid, is_detail=False,
@@ -451,6 +462,9 @@ class ServersController(wsgi.Controller):
     def show(self, req, id):
         """Returns server details by server id."""
         context = req.environ['nova.context']
+        # NOTE: Showing a server tolerates an instance up to
+        # [database]/replica_max_lag seconds old.
+        context.allow_replica_reads = True
         cell_down_support = api_version_request.is_supported(
             req, min_version=PARTIAL_CONSTRUCT_FOR_CELL_DOWN_MIN_VERSION)
         show_server_groups = api_version_request.is_supported(
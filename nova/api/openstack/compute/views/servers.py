@@ -410,13 +410,16 @@ class ViewBuilder(common.ViewBuilder):
                                                                    instance)
         return server
 
-    def index(self, request, instances, cell_down_support=False):
+    def index(self, request, instances, cell_down_support=False,
+              marker=None):
         """Show a list of servers without many details."""
         coll_name = self._collection_name
         return self._list_view(self.basic, request, instances, coll_name,
-                               False, cell_down_support=cell_down_support)
+                               False, cell_down_support=cell_down_support,
+                               marker=marker)
 
-    def detail(self, request, instances, cell_down_support=False):
+    def detail(self, request, instances, cell_down_support=False,
+               marker=None):
         """Detailed view of a list of instance."""
         coll_name = self._collection_name + '/detail'
         context = request.environ['nova.context']
@@ -446,7 +449,8 @@ class ViewBuilder(common.ViewBuilder):
                                        show_host_status=False,
                                        show_sec_grp=False,
                                        bdms=bdms,
-                                       cell_down_support=cell_down_support)
+                                       cell_down_support=cell_down_support,
+                                       marker=marker)
 
         if api_version_request.is_supported(request, min_version='2.16'):
             unknown_only = self._get_host_status_unknown_only(context)
@@ -462,7 +466,8 @@ class ViewBuilder(common.ViewBuilder):
 
     def _list_view(self, func, request, servers, coll_name, show_extra_specs,
                    show_extended_attr=None, show_host_status=None,
-                   show_sec_grp=False, bdms=None, cell_down_support=False):
+                   show_sec_grp=False, bdms=None, cell_down_support=False,
+                   marker=None):
         """Provide a view for a list of servers.
 
         :param func: Function used to format the server data
@@ -481,6 +486,8 @@ class ViewBuilder(common.ViewBuilder):
                                   returning a minimal instance
                                   construct if the relevant cell is
                                   down.
+        :param marker: The marker to use in the next link instead of the uuid
+                       of the last server.
         :returns: Server data in dictionary format
         """
         server_list = [func(request, server,
@@ -495,7 +502,8 @@ class ViewBuilder(common.ViewBuilder):
                        if server.uuid != virtual_interface.FAKE_UUID]
         servers_links = self._get_collection_links(request,
                                                    servers,
-                                                   coll_name)
+                                                   coll_name,
+                                                   marker=marker)
         servers_dict = dict(servers=server_list)
 
         if servers_links:
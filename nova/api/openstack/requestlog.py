@@ -15,12 +15,14 @@
 import time
 
 from oslo_log import log as logging
+from oslo_middleware import request_id
 from oslo_utils import excutils
 import webob.dec
 import webob.exc
 
 from nova.api.openstack import wsgi
 from nova.api import wsgi as base_wsgi
+from nova.db import api as db
 
 # TODO(sdague) maybe we can use a better name here for the logger
 LOG = logging.getLogger(__name__)
@@ -79,6 +81,14 @@ class RequestLog(base_wsgi.Middleware):
             data["microversion"] = req.api_version_request.get_string()
         LOG.info(self._log_format, data)
 
+    @staticmethod
+    def _report_query_stats(req):
+        # NOTE: This is done under eventlet too, the SQL queries of the
+        # request are only counted when [database]/query_stats is enabled.
+        req_id = req.environ.get(request_id.ENV_REQUEST_ID)
+        if req_id:
+            db.report_query_stats(req_id)
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
         res = {}
@@ -86,7 +96,9 @@ class RequestLog(base_wsgi.Middleware):
         try:
             res = req.get_response(self.application)
             self._log_req(req, res, start)
+            self._report_query_stats(req)
             return res
         except Exception:
             with excutils.save_and_reraise_exception():
                 self._log_req(req, res, start)
+                self._report_query_stats(req)
@@ -25,10 +25,12 @@ import collections
 import functools
 import re
 import sys
+import time
 import traceback
 from urllib import parse as urlparse
 
 from dateutil import parser as dateutil_parser
+import eventlet
 from keystoneauth1 import exceptions as ks_exc
 from neutronclient.common import exceptions as neutron_client_exc
 import os_resource_classes as orc
@@ -38,6 +40,7 @@ from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_serialization import jsonutils
 from oslo_utils import encodeutils
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 import prettytable
 from sqlalchemy.engine import url as sqla_url
@@ -97,6 +100,32 @@ def mask_passwd_in_url(url):
     return urlparse.urlunparse(new_parsed)
 
 
+def _run_in_batches(run_batch, max_batch, batch_time):
+    """Run batches until run_batch returns False, adapting their size.
+
+    This is shared by the --parallel modes of archive_deleted_rows and
+    online_data_migrations.
+
+    :param run_batch: Function called with the size of each batch, returning
+        whether to run another batch
+    :param max_batch: Size of the first batch and maximum size of the others
+    :param batch_time: Target duration of each batch in seconds, or None to
+        always run batches of max_batch
+    """
+    batch = max_batch
+    while True:
+        timer = timeutils.StopWatch()
+        timer.start()
+        if not run_batch(batch):
+            return
+        if batch_time:
+            # Scale the batch to the target duration, but at most double it
+            # at once so one quick batch can't blow it up.
+            batch = int(batch * min(2, batch_time / max(timer.elapsed(),
+                                                        0.001)))
+            batch = max(1, min(max_batch, batch))
+
+
 class DbCommands(object):
     """Class for managing the main database."""
 
@@ -138,6 +167,14 @@ class DbCommands(object):
         instance_mapping_obj.populate_user_id,
         # Added in Victoria
         pci_device_obj.PciDevice.populate_dev_uuids,
+        # Added in Wallaby
+        sa_db.instance_name_trigrams_populate,
+    )
+    # NOTE: These online migrations iterate over the cells themselves, so
+    # they are run once rather than once per cell with --all-cells.
+    cells_wide_online_migrations = (
+        instance_mapping_obj.populate_queued_for_delete,
+        instance_mapping_obj.populate_user_id,
     )
 
     def __init__(self):
@@ -226,16 +263,26 @@ Error: %s""") % str(e))
           help='Purge all data from shadow tables after archive completes')
     @args('--all-cells', action='store_true', dest='all_cells',
           default=False, help='Run command across all cells.')
+    @args('--parallel', type=int, metavar='<number>', dest='parallel',
+          help=('Archive until complete, archiving up to this many tables at '
+                'once across all cells, each in batches of at most max_rows '
+                'rows. Cells are archived in parallel. Implies '
+                '--until-complete.'))
+    @args('--batch-time', type=float, metavar='<seconds>', dest='batch_time',
+          help=('With --parallel, make batches smaller than max_rows as '
+                'needed for archiving each of them to take about this many '
+                'seconds at most.'))
     def archive_deleted_rows(self, max_rows=1000, verbose=False,
                              until_complete=False, purge=False,
-                             before=None, all_cells=False):
+                             before=None, all_cells=False, parallel=None,
+                             batch_time=None):
         """Move deleted rows from production tables to shadow tables.
 
         Returns 0 if nothing was archived, 1 if some number of rows were
         archived, 2 if max_rows is invalid, 3 if no connection could be
-        established to the API DB, 4 if before date is invalid. If automating,
-        this should be run continuously while the result
-        is 1, stopping at 0.
+        established to the API DB, 4 if before date is invalid, 5 if parallel
+        or batch_time is invalid. If automating, this should be run
+        continuously while the result is 1, stopping at 0.
         """
         max_rows = int(max_rows)
         if max_rows < 0:
@@ -245,6 +292,16 @@ Error: %s""") % str(e))
             print(_('max rows must be <= %(max_value)d') %
                   {'max_value': db.MAX_INT})
             return 2
+        if parallel is not None and parallel < 1:
+            print(_('Must supply a positive value for --parallel'))
+            return 5
+        if batch_time is not None and (parallel is None or batch_time <= 0):
+            print(_('--batch-time must be a positive value and requires '
+                    '--parallel'))
+            return 5
+        if parallel:
+            # NOTE: Parallel archiving always runs until complete.
+            until_complete = True
 
         ctxt = context.get_admin_context()
         try:
@@ -295,6 +352,16 @@ Error: %s""") % str(e))
             cell_mappings = [None]
             print_sort_func = None
         total_rows_archived = 0
+        if parallel:
+            # NOTE: The cells are archived here, so this skips the sequential
+            # loop below.
+            try:
+                self._do_archive_parallel(
+                    table_to_rows_archived, ctxt, cell_mappings, parallel,
+                    max_rows, batch_time, verbose, before_date)
+            except KeyboardInterrupt:
+                interrupt = True
+            cell_mappings = []
         for cell_mapping in cell_mappings:
             # NOTE(Kevin_Zheng): No need to calculate limit for each
             # cell if until_complete=True.
@@ -381,25 +448,8 @@ Error: %s""") % str(e))
                 table_to_rows_archived.setdefault(table_name, 0)
                 table_to_rows_archived[table_name] += rows_archived
             if deleted_instance_uuids:
-                table_to_rows_archived.setdefault(
-                    'API_DB.instance_mappings', 0)
-                table_to_rows_archived.setdefault(
-                    'API_DB.request_specs', 0)
-                table_to_rows_archived.setdefault(
-                    'API_DB.instance_group_member', 0)
-                deleted_mappings = objects.InstanceMappingList.destroy_bulk(
-                            ctxt, deleted_instance_uuids)
-                table_to_rows_archived[
-                    'API_DB.instance_mappings'] += deleted_mappings
-                deleted_specs = objects.RequestSpec.destroy_bulk(
-                    ctxt, deleted_instance_uuids)
-                table_to_rows_archived[
-                    'API_DB.request_specs'] += deleted_specs
-                deleted_group_members = (
-                    objects.InstanceGroup.destroy_members_bulk(
-                        ctxt, deleted_instance_uuids))
-                table_to_rows_archived[
-                    'API_DB.instance_group_member'] += deleted_group_members
+                self._destroy_api_db_records(
+                    table_to_rows_archived, ctxt, deleted_instance_uuids)
             # If we're not archiving until there is nothing more to archive, we
             # have reached max_rows in this cell DB or there was nothing to
             # archive.
@@ -409,6 +459,101 @@ Error: %s""") % str(e))
                 sys.stdout.write('.')
         return total_rows_archived
 
+    @staticmethod
+    def _destroy_api_db_records(table_to_rows_archived, ctxt,
+                                deleted_instance_uuids):
+        """Remove the API database records of archived instances."""
+        table_to_rows_archived.setdefault(
+            'API_DB.instance_mappings', 0)
+        table_to_rows_archived.setdefault(
+            'API_DB.request_specs', 0)
+        table_to_rows_archived.setdefault(
+            'API_DB.instance_group_member', 0)
+        deleted_mappings = objects.InstanceMappingList.destroy_bulk(
+                    ctxt, deleted_instance_uuids)
+        table_to_rows_archived[
+            'API_DB.instance_mappings'] += deleted_mappings
+        deleted_specs = objects.RequestSpec.destroy_bulk(
+            ctxt, deleted_instance_uuids)
+        table_to_rows_archived[
+            'API_DB.request_specs'] += deleted_specs
+        deleted_group_members = (
+            objects.InstanceGroup.destroy_members_bulk(
+                ctxt, deleted_instance_uuids))
+        table_to_rows_archived[
+            'API_DB.instance_group_member'] += deleted_group_members
+
+    def _do_archive_parallel(self, table_to_rows_archived, ctxt,
+                             cell_mappings, parallel, max_rows, batch_time,
+                             verbose, before_date):
+        """Archive all deleted rows of cells in parallel.
+
+        Each cell is archived in its own green thread. The tables of a cell
+        are archived in the groups returned by
+        db.archive_deleted_rows_table_groups(), the tables of a group being
+        archived concurrently, up to parallel tables at once across all
+        cells.
+
+        :param table_to_rows_archived: Dict tracking the number of rows
+            archived by <cell_name>.<table name>, see _do_archive()
+        :param ctxt: nova.context.RequestContext for the API database
+        :param cell_mappings: The cells to archive, or [None] to archive the
+            database of the configuration file
+        :param parallel: Maximum number of tables to archive at once
+        :param max_rows: Maximum number of rows to archive in each batch
+        :param batch_time: Target duration of each batch in seconds, or None
+            to always archive max_rows rows at once
+        :param verbose: Whether to print the throughput of each table
+        :param before_date: Archive rows that were deleted before this date
+        """
+        table_pool = eventlet.GreenPool(size=parallel)
+
+        def archive_table(cctxt, cell_name, table_name):
+            if cell_name:
+                name = cell_name + '.' + table_name
+            else:
+                name = table_name
+            archived = 0
+            timer = timeutils.StopWatch()
+            timer.start()
+
+            def archive_batch(batch):
+                nonlocal archived
+                rows_archived, deleted_instance_uuids = (
+                    db.archive_deleted_rows_for_table(
+                        cctxt, table_name, batch, before=before_date))
+                if not rows_archived:
+                    return False
+                archived += rows_archived
+                table_to_rows_archived[name] = archived
+                if deleted_instance_uuids:
+                    self._destroy_api_db_records(
+                        table_to_rows_archived, ctxt, deleted_instance_uuids)
+                return True
+
+            _run_in_batches(archive_batch, max_rows, batch_time)
+            if verbose and archived:
+                elapsed = timer.elapsed()
+                print(_('%(table)s: archived %(rows)d rows in %(time).1fs '
+                        '(%(rate).1f rows/s)') %
+                      {'table': name, 'rows': archived, 'time': elapsed,
+                       'rate': archived / max(elapsed, 0.001)})
+
+        def archive_cell(cell_mapping):
+            with context.target_cell(ctxt, cell_mapping) as cctxt:
+                cell_name = cell_mapping.name if cell_mapping else None
+                for table_names in db.archive_deleted_rows_table_groups(
+                        cctxt):
+                    threads = [table_pool.spawn(archive_table, cctxt,
+                                                cell_name, table_name)
+                               for table_name in table_names]
+                    for thread in threads:
+                        thread.wait()
+
+        cell_pool = eventlet.GreenPool(size=len(cell_mappings))
+        for result in cell_pool.imap(archive_cell, cell_mappings):
+            pass
+
     @args('--before', metavar='<before>', dest='before',
           help='If specified, purge rows from shadow tables that are older '
                'than this. Accepts date strings in the default format output '
@@ -420,8 +565,20 @@ Error: %s""") % str(e))
           help='Print information about purged records')
     @args('--all-cells', dest='all_cells', action='store_true', default=False,
           help='Run against all cell databases')
+    @args('--max_rows', type=int, metavar='<number>', dest='max_rows',
+          help='Delete at most this many rows per transaction, in primary '
+               'key order. By default, each table is purged at once.')
+    @args('--max-rate', type=float, metavar='<rows per second>',
+          dest='max_rate',
+          help='With --max_rows, sleep between transactions so as to delete '
+               'at most this many rows per second.')
+    @args('--max-replication-lag', type=float, metavar='<seconds>',
+          dest='max_replication_lag',
+          help='With --max_rows, wait between transactions while the slave '
+               'database lags more than this many seconds behind.')
     def purge(self, before=None, purge_all=False, verbose=False,
-              all_cells=False):
+              all_cells=False, max_rows=None, max_rate=None,
+              max_replication_lag=None):
         if before is None and purge_all is False:
             print(_('Either --before or --all is required'))
             return 1
@@ -433,6 +590,16 @@ Error: %s""") % str(e))
                 return 2
         else:
             before_date = None
+        if ((max_rows is not None and max_rows < 1) or
+                (max_rate is not None and max_rate <= 0) or
+                (max_replication_lag is not None and max_replication_lag < 0)):
+            print(_('--max_rows, --max-rate and --max-replication-lag must '
+                    'be positive values'))
+            return 5
+        if not max_rows and (max_rate or max_replication_lag is not None):
+            print(_('--max-rate and --max-replication-lag require '
+                    '--max_rows'))
+            return 5
 
         def status(msg):
             if verbose:
@@ -441,6 +608,30 @@ Error: %s""") % str(e))
         deleted = 0
         admin_ctxt = context.get_admin_context()
 
+        def purge_shadow_tables(ctxt):
+            timer = timeutils.StopWatch()
+            timer.start()
+
+            def throttle(rows):
+                if max_rate:
+                    time.sleep(max(0, rows / max_rate - timer.elapsed()))
+                if max_replication_lag is not None:
+                    lag = sa_db.replication_lag(ctxt)
+                    while lag is not None and lag > max_replication_lag:
+                        if lag == float('inf'):
+                            status(_('Waiting for the replication to '
+                                     'resume'))
+                        else:
+                            status(_('Waiting for the replication lag of '
+                                     '%.1fs to go down') % lag)
+                        time.sleep(1)
+                        lag = sa_db.replication_lag(ctxt)
+                timer.restart()
+
+            return sa_db.purge_shadow_tables(
+                ctxt, before_date, status_fn=status, max_rows=max_rows,
+                throttle_fn=throttle)
+
         if all_cells:
             try:
                 cells = objects.CellMappingList.get_all(admin_ctxt)
@@ -451,13 +642,10 @@ Error: %s""") % str(e))
             for cell in cells:
                 identity = _('Cell %s') % cell.identity
                 with context.target_cell(admin_ctxt, cell) as cctxt:
-                    deleted += sa_db.purge_shadow_tables(cctxt,
-                                                         before_date,
-                                                         status_fn=status)
+                    deleted += purge_shadow_tables(cctxt)
         else:
             identity = _('DB')
-            deleted = sa_db.purge_shadow_tables(admin_ctxt,
-                                                before_date, status_fn=status)
+            deleted = purge_shadow_tables(admin_ctxt)
         if deleted:
             return 0
         else:
@@ -525,10 +713,117 @@ Error: %s""") % str(e))
                     break
         return migrations, exceptions
 
+    def _run_migrations_parallel(self, ctxt, cell_mappings, parallel,
+                                 max_count, batch_time):
+        """Run the online data migrations of cells in parallel until complete.
+
+        Each migration is run in its own green thread in each cell, up to
+        parallel migrations at once across all cells, calling it in batches
+        until it finds no more records or migrates none of those it found.
+        The cells_wide_online_migrations are run once. Migrations which fail
+        are run again one at a time once the others are complete, as they may
+        depend on them.
+
+        :param ctxt: nova.context.RequestContext for the API database
+        :param cell_mappings: The cells to migrate, or [None] to migrate the
+            database of the configuration file
+        :param parallel: Maximum number of migrations to run at once
+        :param max_count: Maximum number of objects to migrate in each batch
+        :param batch_time: Target duration of each batch in seconds, or None
+            to always migrate max_count objects at once
+        :returns: A (migration_info, exceptions) tuple, migration_info being
+            a dict of the (found, done) totals of each migration across cells
+            and exceptions whether some migrations still failed
+        """
+        migration_info = collections.defaultdict(lambda: (0, 0))
+        failed = []
+        runs = []
+        for migration_meth in self.online_migrations:
+            if migration_meth in self.cells_wide_online_migrations:
+                runs.append((None, migration_meth))
+            else:
+                runs.extend((cell_mapping, migration_meth)
+                            for cell_mapping in cell_mappings)
+        completed = []
+
+        def run_migration(cell_mapping, migration_meth):
+            name = migration_meth.__name__
+            if cell_mapping is not None:
+                label = '%s.%s' % (cell_mapping.name, name)
+            else:
+                label = name
+            total_found = total_done = 0
+            error = False
+            timer = timeutils.StopWatch()
+            timer.start()
+            with context.target_cell(ctxt, cell_mapping) as cctxt:
+
+                def migrate_batch(batch):
+                    nonlocal total_found, total_done, error
+                    try:
+                        found, done = migration_meth(cctxt, batch)
+                    except Exception:
+                        msg = (_("Error attempting to run %(method)s") % dict(
+                               method=label))
+                        print(msg)
+                        LOG.exception(msg)
+                        error = True
+                        return False
+                    total_found += found
+                    total_done += done
+                    return bool(found and done)
+
+                _run_in_batches(migrate_batch, max_count, batch_time)
+            found, done = migration_info[name]
+            migration_info[name] = (found + total_found, done + total_done)
+            if error:
+                failed.append((cell_mapping, migration_meth))
+                return
+            completed.append(label)
+            if total_found:
+                print(_('%(meth)s: %(total)i rows matched, %(done)i migrated '
+                        'in %(time).1fs (%(completed)i/%(runs)i complete)') %
+                      {'meth': label, 'total': total_found,
+                       'done': total_done, 'time': timer.elapsed(),
+                       'completed': len(completed), 'runs': len(runs)})
+
+        pool = eventlet.GreenPool(size=parallel)
+        for cell_mapping, migration_meth in runs:
+            pool.spawn_n(run_migration, cell_mapping, migration_meth)
+        pool.waitall()
+
+        retries, failed[:] = list(failed), []
+        for cell_mapping, migration_meth in retries:
+            run_migration(cell_mapping, migration_meth)
+        return dict(migration_info), bool(failed)
+
     @args('--max-count', metavar='<number>', dest='max_count',
           help='Maximum number of objects to consider')
-    def online_data_migrations(self, max_count=None):
+    @args('--all-cells', action='store_true', dest='all_cells',
+          default=False,
+          help=('Run the migrations against all cells, implies --parallel 1 '
+                'if --parallel is not given.'))
+    @args('--parallel', type=int, metavar='<number>', dest='parallel',
+          help=('Run until complete, running up to this many migrations at '
+                'once across all cells, each in batches of at most '
+                '--max-count objects. Migrations which find nothing to '
+                'migrate are not run again.'))
+    @args('--batch-time', type=float, metavar='<seconds>', dest='batch_time',
+          help=('With --parallel, make batches smaller than --max-count as '
+                'needed for migrating each of them to take about this many '
+                'seconds at most.'))
+    def online_data_migrations(self, max_count=None, all_cells=False,
+                               parallel=None, batch_time=None):
         ctxt = context.get_admin_context()
+        if all_cells and parallel is None:
+            parallel = 1
+        if parallel is not None and parallel < 1:
+            print(_('Must supply a positive value for --parallel'))
+            return 127
+        if batch_time is not None and (parallel is None or batch_time <= 0):
+            print(_('--batch-time must be a positive value and requires '
+                    '--parallel'))
+            return 127
         if max_count is not None:
             try:
                 max_count = int(max_count)
@@ -546,6 +841,17 @@ Error: %s""") % str(e))
         ran = None
         migration_info = {}
         exceptions = False
+        if parallel:
+            if all_cells:
+                cell_mappings = objects.CellMappingList.get_all(ctxt)
+            else:
+                cell_mappings = [None]
+            # NOTE: Parallel migrations always run until complete, so this
+            # skips the sequential loop below.
+            unlimited = True
+            migration_info, exceptions = self._run_migrations_parallel(
+                ctxt, cell_mappings, parallel, max_count, batch_time)
+            ran = 0
         while ran is None or ran != 0:
             migrations, exceptions = self._run_migration(ctxt, max_count)
             ran = 0
@@ -970,7 +1276,8 @@ class CellV2Commands(object):
         ctxt = context.RequestContext()
         cell_mapping_uuid = cell_mapping = None
         # First, try to detect if a CellMapping has already been created
-        compute_nodes = objects.ComputeNodeList.get_all(ctxt)
+        compute_nodes = objects.ComputeNodeList.get_all(ctxt,
+                                                        expected_attrs=[])
         if not compute_nodes:
             print(_('No hosts found to map to cell, exiting.'))
             return None
@@ -1267,7 +1574,8 @@ class CellV2Commands(object):
             # We query for the compute nodes in the cell,
             # so that they can be unmapped.
             with context.target_cell(ctxt, cell_mapping) as cctxt:
-                nodes = objects.ComputeNodeList.get_all(cctxt)
+                nodes = objects.ComputeNodeList.get_all(cctxt,
+                                                        expected_attrs=[])
 
         # Check to see if there are any InstanceMappings for this cell.
         instance_mappings = objects.InstanceMappingList.get_by_cell_id(
@@ -2911,8 +2911,10 @@ class API(base.Base):
                 limit = None
 
         # Skip get BuildRequest if filtering by IP address, as building
-        # instances will not have IP addresses.
-        if skip_build_request:
+        # instances will not have IP addresses. Also skip it for a keyset
+        # marker, which is only handed out for instances from the cells,
+        # that are listed after all build requests.
+        if skip_build_request or instance_list.is_keyset_marker(marker):
             build_requests = objects.BuildRequestList()
         else:
             # The ordering of instances will be
@@ -5895,7 +5897,8 @@ class HostAPI(base.Base):
 
         raise exception.ComputeHostNotFound(host=compute_id)
 
-    def compute_node_get_all(self, context, limit=None, marker=None):
+    def compute_node_get_all(self, context, limit=None, marker=None,
+                             expected_attrs=None):
         load_cells()
 
         computes = []
@@ -5920,7 +5923,8 @@ class HostAPI(base.Base):
 
                 try:
                     cell_computes = objects.ComputeNodeList.get_by_pagination(
-                        cctxt, limit=limit, marker=marker)
+                        cctxt, limit=limit, marker=marker,
+                        expected_attrs=expected_attrs)
                 except exception.MarkerNotFound:
                     # NOTE(danms): Keep looking through cells
                     continue
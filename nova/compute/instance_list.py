@@ -10,7 +10,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import copy
+import datetime
+
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 
 from nova.compute import multi_cell_list
 import nova.conf
@@ -18,11 +23,16 @@ from nova import context
 from nova.db import api as db
 from nova import exception
 from nova import objects
+from nova.objects import fields
 from nova.objects import instance as instance_obj
 
 
 CONF = nova.conf.CONF
 
+# Keyset markers are versioned so that their encoding can change later.
+KEYSET_MARKER_PREFIX = 'ks1.'
+_KEYSET_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
 
 class InstanceSortContext(multi_cell_list.RecordSortContext):
     def __init__(self, sort_keys, sort_dirs):
@@ -73,6 +83,12 @@ class InstanceLister(multi_cell_list.CrossCellLister):
                 raise exception.MarkerNotFound(marker=marker)
         return im.cell_mapping.uuid, db_inst
 
+    def get_marker_values(self, ctx, marker):
+        if not is_keyset_marker(marker):
+            return None
+        return _decode_keyset_marker(marker, self.sort_ctx.sort_keys,
+                                     self.sort_ctx.sort_dirs)
+
     def get_marker_by_values(self, ctx, values):
         return db.instance_get_by_sort_filters(ctx,
                                                self.sort_ctx.sort_keys,
@@ -87,6 +103,84 @@ class InstanceLister(multi_cell_list.CrossCellLister):
             **kwargs)
 
 
+def is_keyset_marker(marker):
+    """Return True if the marker is a keyset marker and not an instance uuid.
+    """
+    return (isinstance(marker, str) and
+            marker.startswith(KEYSET_MARKER_PREFIX))
+
+
+def get_keyset_marker(instance, sort_keys, sort_dirs):
+    """Build a keyset marker to list the instances after an instance.
+
+    The marker is an opaque string encoding the sort keys and directions
+    and the values of the instance for them, so that the next page can be
+    listed from every cell by seeking past those values, without looking
+    up the marker instance first.
+
+    :param instance: The Instance listed last
+    :param sort_keys: The sort keys passed to get_instance_objects_sorted()
+    :param sort_dirs: The sort directions passed to
+                      get_instance_objects_sorted()
+    :returns: The keyset marker, or None if the instance is not from a cell
+              database, like the instance of a build request or from a
+              down cell, in which case its uuid has to be used as the marker
+    """
+    sort_ctx = InstanceSortContext(sort_keys, sort_dirs)
+    if not instance.obj_attr_is_set('id'):
+        return None
+
+    values = []
+    for key in sort_ctx.sort_keys:
+        if key not in instance.fields or not instance.obj_attr_is_set(key):
+            return None
+        value = instance[key]
+        if isinstance(value, datetime.datetime):
+            value = timeutils.normalize_time(value).strftime(
+                _KEYSET_TIME_FORMAT)
+        elif value is not None and not isinstance(value, (int, str)):
+            value = str(value)
+        values.append(value)
+
+    data = jsonutils.dump_as_bytes(
+        [sort_ctx.sort_keys, sort_ctx.sort_dirs, values])
+    return KEYSET_MARKER_PREFIX + base64.urlsafe_b64encode(data).decode()
+
+
+def _decode_keyset_marker(marker, sort_keys, sort_dirs):
+    try:
+        keys, dirs, values = jsonutils.loads(
+            base64.urlsafe_b64decode(marker[len(KEYSET_MARKER_PREFIX):]))
+        if (keys != sort_keys or dirs != sort_dirs or
+                not isinstance(values, list) or len(values) != len(keys)):
+            # The marker is from a list with a different sort order
+            raise ValueError()
+        for i, key in enumerate(keys):
+            field = objects.Instance.fields.get(key)
+            if field is None:
+                raise ValueError()
+            if values[i] is None:
+                continue
+            # NOTE: The values are compared with the columns in the database
+            # query, so they have to be of the type get_keyset_marker()
+            # encodes the field with
+            if isinstance(field, fields.BooleanField):
+                expected = bool
+            elif isinstance(field, fields.IntegerField):
+                expected = int
+            else:
+                expected = str
+            if (not isinstance(values[i], expected) or
+                    (expected is int and isinstance(values[i], bool))):
+                raise ValueError()
+            if isinstance(field, fields.DateTimeField):
+                values[i] = datetime.datetime.strptime(values[i],
+                                                       _KEYSET_TIME_FORMAT)
+    except (TypeError, ValueError):
+        raise exception.MarkerNotFound(marker=marker)
+    return values
+
+
 # NOTE(danms): These methods are here for legacy glue reasons. We should not
 # replicate these for every data type we implement.
 def get_instances_sorted(ctx, filters, limit, marker, columns_to_join,
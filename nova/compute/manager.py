@@ -528,7 +528,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
 class ComputeManager(manager.Manager):
     """Manages the running instances from creation to destruction."""
 
-    target = messaging.Target(version='5.13')
+    target = messaging.Target(version='5.14')
 
     def __init__(self, compute_driver=None, *args, **kwargs):
         """Load configuration options and connect to the hypervisor."""
@@ -556,6 +556,21 @@ class ComputeManager(manager.Manager):
                 CONF.max_concurrent_builds)
         else:
             self._build_semaphore = compute_utils.UnlimitedSemaphore()
+        if CONF.max_concurrent_block_device_setups != 0:
+            self._block_device_setup_semaphore = eventlet.semaphore.Semaphore(
+                CONF.max_concurrent_block_device_setups)
+        else:
+            self._block_device_setup_semaphore = (
+                compute_utils.UnlimitedSemaphore())
+        if CONF.max_concurrent_spawns != 0:
+            self._spawn_semaphore = eventlet.semaphore.Semaphore(
+                CONF.max_concurrent_spawns)
+        else:
+            self._spawn_semaphore = compute_utils.UnlimitedSemaphore()
+        self._image_fetch_semaphore = None
+        if CONF.max_concurrent_image_fetches > 0:
+            self._image_fetch_semaphore = eventlet.semaphore.Semaphore(
+                CONF.max_concurrent_image_fetches)
         if CONF.max_concurrent_snapshots > 0:
             self._snapshot_semaphore = eventlet.semaphore.Semaphore(
                 CONF.max_concurrent_snapshots)
@@ -953,8 +968,45 @@ class ComputeManager(manager.Manager):
             instance.task_state = None
             instance.save(expected_task_state=[task_states.MIGRATING])
 
-    def _init_instance(self, context, instance):
-        """Initialize this instance during service init."""
+    def _init_instances(self, context, instances):
+        """Initialize the instances on this host during service init.
+
+        The instances are initialized by a pool of
+        [compute]/init_instances_pool_size greenthreads, each instance being
+        handled by a single greenthread. The power state of all the instances
+        is retrieved from the virt driver at once beforehand when the driver
+        supports it.
+        """
+        if not instances:
+            return
+
+        try:
+            vm_power_states = self.driver.get_instance_power_states(instances)
+        except NotImplementedError:
+            vm_power_states = {}
+        except Exception as e:
+            LOG.warning('Unable to retrieve the power state of all the '
+                        'instances of the host at once, falling back to '
+                        'querying them individually: %s', e)
+            vm_power_states = {}
+
+        def init_instance(instance):
+            self._init_instance(
+                context, instance,
+                vm_power_state=vm_power_states.get(instance.uuid))
+
+        pool = eventlet.GreenPool(CONF.compute.init_instances_pool_size)
+        # NOTE: Consume the iterator so that an error initializing any of the
+        # instances is raised here, as it would be when initializing them
+        # sequentially.
+        list(pool.imap(init_instance, instances))
+
+    def _init_instance(self, context, instance, vm_power_state=None):
+        """Initialize this instance during service init.
+
+        :param vm_power_state: Optional power state of the instance already
+            retrieved from the virt driver, to use instead of querying it.
+        """
 
         # NOTE(danms): If the instance appears to not be owned by this
         # host, it may have been evacuated away, but skipped by the
@@ -1052,7 +1104,10 @@ class ComputeManager(manager.Manager):
                 self._set_instance_obj_error_state(instance)
             return
 
-        current_power_state = self._get_power_state(instance)
+        if vm_power_state is None:
+            current_power_state = self._get_power_state(instance)
+        else:
+            current_power_state = vm_power_state
         try_reboot, reboot_type = self._retry_reboot(
             instance, current_power_state)
 
@@ -1132,6 +1187,12 @@ class ComputeManager(manager.Manager):
                 LOG.exception('Failed to start instance', instance=instance)
             return
 
+        # NOTE: Reverting a crashed resize or resetting a live migration
+        # below may change the power state of the instance, so the driver
+        # must be queried again afterwards in that case.
+        migrating = instance.task_state in (task_states.RESIZE_MIGRATING,
+                                            task_states.MIGRATING)
+
         net_info = instance.get_network_info()
         try:
             self.driver.plug_vifs(instance, net_info)
@@ -1182,7 +1243,10 @@ class ComputeManager(manager.Manager):
             self._reset_live_migration(context, instance)
 
         db_state = instance.power_state
-        drv_state = self._get_power_state(instance)
+        if vm_power_state is None or migrating:
+            drv_state = self._get_power_state(instance)
+        else:
+            drv_state = current_power_state
         expect_running = (db_state == power_state.RUNNING and
                           drv_state != db_state)
 
@@ -1403,7 +1467,17 @@ class ComputeManager(manager.Manager):
                 eventlet.semaphore.BoundedSemaphore(
                     CONF.compute.max_concurrent_disk_ops)
 
-        self.driver.init_host(host=self.host)
+        # Record instance action events in the background if the user has
+        # asked for it.
+        if CONF.compute.instance_action_event_buffer_size > 0:
+            compute_utils.action_event_buffer = (
+                compute_utils.InstanceActionEventBuffer(
+                    CONF.compute.instance_action_event_buffer_size))
+
+        with timeutils.StopWatch() as timer:
+            self.driver.init_host(host=self.host)
+        LOG.info('Took %0.2f seconds to initialize the virt driver.',
+                 timer.elapsed())
         context = nova.context.get_admin_context()
         instances = objects.InstanceList.get_by_host(
             context, self.host,
@@ -1427,13 +1501,19 @@ class ComputeManager(manager.Manager):
 
         try:
             # checking that instance was not already evacuated to other host
-            evacuated_instances = self._destroy_evacuated_instances(
-                context, nodes_by_uuid)
+            with timeutils.StopWatch() as timer:
+                evacuated_instances = self._destroy_evacuated_instances(
+                    context, nodes_by_uuid)
+            LOG.info('Took %0.2f seconds to clean up evacuated instances.',
+                     timer.elapsed())
 
             # Initialise instances on the host that are not evacuating
-            for instance in instances:
-                if instance.uuid not in evacuated_instances:
-                    self._init_instance(context, instance)
+            instances_to_init = [instance for instance in instances
+                                 if instance.uuid not in evacuated_instances]
+            with timeutils.StopWatch() as timer:
+                self._init_instances(context, instances_to_init)
+            LOG.info('Took %0.2f seconds to initialize %d instances.',
+                     timer.elapsed(), len(instances_to_init))
 
             # NOTE(gibi): collect all the instance uuids that is in some way
             # was already handled above. Either by init_instance or by
@@ -1443,8 +1523,11 @@ class ComputeManager(manager.Manager):
             # handled by the above calls.
             already_handled = {instance.uuid for instance in instances}.union(
                 evacuated_instances)
-            self._error_out_instances_whose_build_was_interrupted(
-                context, already_handled, nodes_by_uuid.keys())
+            with timeutils.StopWatch() as timer:
+                self._error_out_instances_whose_build_was_interrupted(
+                    context, already_handled, nodes_by_uuid.keys())
+            LOG.info('Took %0.2f seconds to look for instances whose build '
+                     'was interrupted.', timer.elapsed())
 
         finally:
             if instances:
@@ -1521,6 +1604,15 @@ class ComputeManager(manager.Manager):
         self.instance_events.cancel_all_events()
         self.driver.cleanup_host(host=self.host)
         self._cleanup_live_migrations_in_pool()
+        self._flush_instance_action_events()
+
+    def _flush_instance_action_events(self):
+        # Stop buffering first so any further events are recorded
+        # synchronously, then record everything that is still buffered.
+        action_event_buffer = compute_utils.action_event_buffer
+        if action_event_buffer is not None:
+            compute_utils.action_event_buffer = None
+            action_event_buffer.stop()
 
     def _cleanup_live_migrations_in_pool(self):
         # Shutdown the pool so we don't get new requests.
@@ -1731,6 +1823,8 @@ class ComputeManager(manager.Manager):
         retries = CONF.network_allocate_retries
         attempts = retries + 1
         retry_time = 1
+        timer = timeutils.StopWatch()
+        timer.start()
         bind_host_id = self.driver.network_binding_host_id(context, instance)
         for attempt in range(1, attempts + 1):
             try:
@@ -1742,6 +1836,8 @@ class ComputeManager(manager.Manager):
                         resource_provider_mapping=resource_provider_mapping)
                 LOG.debug('Instance network_info: |%s|', nwinfo,
                           instance=instance)
+                LOG.debug('Took %0.2f seconds to allocate network(s) for the '
+                          'instance.', timer.elapsed(), instance=instance)
                 instance.system_metadata['network_allocated'] = 'True'
                 # NOTE(JoshNang) do not save the instance here, as it can cause
                 # races. The caller shares a reference to instance and waits
@@ -2378,9 +2474,16 @@ class ComputeManager(manager.Manager):
                     block_device_info = resources['block_device_info']
                     network_info = resources['network_info']
                     accel_info = resources['accel_info']
+                    if self._should_fetch_image_for_build(instance):
+                        with self._build_stage('image fetch',
+                                               self._image_fetch_semaphore,
+                                               instance):
+                            self._fetch_image_for_build(context, instance)
                     LOG.debug('Start spawning the instance on the hypervisor.',
                               instance=instance)
-                    with timeutils.StopWatch() as timer:
+                    with self._build_stage('spawn', self._spawn_semaphore,
+                                           instance), \
+                            timeutils.StopWatch() as timer:
                         self.driver.spawn(context, instance, image_meta,
                                           injected_files, admin_password,
                                           allocs, network_info=network_info,
@@ -2521,6 +2624,67 @@ class ComputeManager(manager.Manager):
                 self.host, phase=fields.NotificationPhase.END,
                 bdms=block_device_mapping)
 
+    @contextlib.contextmanager
+    def _build_stage(self, stage, semaphore, instance):
+        """Run a stage of an instance build under its concurrency limit.
+
+        Each stage has its own semaphore so that the stages of concurrent
+        builds can overlap, e.g. one build preparing its block devices while
+        another one is spawning. The time spent waiting for a slot and the
+        time spent in the stage are both logged.
+
+        :param stage: name of the build stage, used for logging
+        :param semaphore: semaphore limiting the concurrency of the stage
+        :param instance: nova.objects.instance.Instance object being built
+        """
+        queue_timer = timeutils.StopWatch()
+        queue_timer.start()
+        with semaphore:
+            queue_timer.stop()
+            timer = timeutils.StopWatch()
+            timer.start()
+            try:
+                yield
+            finally:
+                timer.stop()
+                LOG.debug('Waited %(wait)0.2f seconds to start the %(stage)s '
+                          'build stage which then took %(took)0.2f seconds.',
+                          {'wait': queue_timer.elapsed(), 'stage': stage,
+                           'took': timer.elapsed()}, instance=instance)
+
+    def _should_fetch_image_for_build(self, instance):
+        """Return whether to fetch the image of an instance before spawning.
+
+        This is only enabled by [DEFAULT]/max_concurrent_image_fetches, and
+        only done for images spawn would download into the local image cache
+        of the driver. Images with trusted certificates are left to spawn,
+        which verifies their signature while downloading them.
+        """
+        if self._image_fetch_semaphore is None or not instance.image_ref:
+            return False
+        if 'trusted_certs' in instance and instance.trusted_certs:
+            return False
+        return self.driver.spawn_uses_image_cache()
+
+    def _fetch_image_for_build(self, context, instance):
+        """Download the image of an instance being built into the cache.
+
+        This is done before spawning so that the Glance download does not
+        hold a slot of the spawn build stage. It is best-effort: the driver
+        downloads the image itself while spawning if it could not be cached.
+
+        :param context: The RequestContext
+        :param instance: nova.objects.instance.Instance object being built
+        """
+        try:
+            self.driver.cache_image(context, instance.image_ref)
+        except NotImplementedError:
+            pass
+        except Exception as e:
+            LOG.warning('Failed to cache image %(image_id)s before spawning: '
+                        '%(err)s', {'image_id': instance.image_ref, 'err': e},
+                        instance=instance)
+
     def _build_resources_cleanup(self, instance, network_info):
         # Make sure the async call finishes
         if network_info is not None:
@@ -2577,8 +2741,11 @@ class ComputeManager(manager.Manager):
             instance.task_state = task_states.BLOCK_DEVICE_MAPPING
             instance.save()
 
-            block_device_info = self._prep_block_device(context, instance,
-                    block_device_mapping)
+            with self._build_stage('block device setup',
+                                   self._block_device_setup_semaphore,
+                                   instance):
+                block_device_info = self._prep_block_device(context, instance,
+                        block_device_mapping)
             resources['block_device_info'] = block_device_info
         except (exception.InstanceNotFound,
                 exception.UnexpectedDeletingTaskStateError):
@@ -9082,10 +9249,13 @@ class ComputeManager(manager.Manager):
             action=fields.NotificationAction.LIVE_MIGRATION_ROLLBACK_DEST,
             phase=fields.NotificationPhase.END)
 
-    def _require_nw_info_update(self, context, instance):
+    def _require_nw_info_update(self, context, instance, ports=None):
         """Detect whether there is a mismatch in binding:host_id, or
         binding_failed or unbound binding:vif_type for any of the instances
         ports.
+
+        :param ports: Optional list of the ports of the instance, to use
+            instead of listing them from neutron.
         """
         # Only update port bindings if compute manager does manage port
         # bindings instead of the compute driver. For example IronicDriver
@@ -9094,10 +9264,12 @@ class ComputeManager(manager.Manager):
         if self.driver.manages_network_binding_host_id():
             return False
 
-        search_opts = {'device_id': instance.uuid,
-                       'fields': ['binding:host_id', 'binding:vif_type']}
-        ports = self.network_api.list_ports(context, **search_opts)
-        for p in ports['ports']:
+        if ports is None:
+            search_opts = {'device_id': instance.uuid,
+                           'fields': ['binding:host_id', 'binding:vif_type']}
+            ports = self.network_api.list_ports(
+                context, **search_opts)['ports']
+        for p in ports:
             if p.get('binding:host_id') != self.host:
                 return True
             vif_type = p.get('binding:vif_type')
@@ -9118,13 +9290,19 @@ class ComputeManager(manager.Manager):
         list, pull the DB record, and try the call to the network API.
         If anything errors don't fail, as it's possible the instance
         has been deleted, etc.
+
+        If [DEFAULT]/heal_instance_info_cache_batch_size is greater than 1,
+        up to that many instances are popped off the list on each call and
+        their neutron resources are retrieved in bulk before refreshing the
+        info_cache of each of them.
         """
         heal_interval = CONF.heal_instance_info_cache_interval
         if not heal_interval:
             return
 
+        batch_size = CONF.heal_instance_info_cache_batch_size
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
-        instance = None
+        instances = []
 
         LOG.debug('Starting heal instance info cache')
 
@@ -9147,17 +9325,17 @@ class ComputeManager(manager.Manager):
                               'because it is being deleted.', instance=inst)
                     continue
 
-                if not instance:
-                    # Save the first one we find so we don't
-                    # have to get it again
-                    instance = inst
+                if len(instances) < batch_size:
+                    # Save the first ones we find so we don't
+                    # have to get them again
+                    instances.append(inst)
                 else:
                     instance_uuids.append(inst['uuid'])
 
             self._instance_uuids_to_heal = instance_uuids
         else:
-            # Find the next valid instance on the list
-            while instance_uuids:
+            # Find the next valid instances on the list
+            while instance_uuids and len(instances) < batch_size:
                 try:
                     inst = objects.Instance.get_by_uuid(
                             context, instance_uuids.pop(0),
@@ -9178,42 +9356,72 @@ class ComputeManager(manager.Manager):
                     LOG.debug('Skipping network cache update for instance '
                               'because it is being deleted.', instance=inst)
                 else:
-                    instance = inst
-                    break
+                    instances.append(inst)
 
-        if instance:
-            # We have an instance now to refresh
-            try:
-                # Fix potential mismatch in port binding if evacuation failed
-                # after reassigning the port binding to the dest host but
-                # before the instance host is changed.
-                # Do this only when instance has no pending task.
-                if instance.task_state is None and \
-                        self._require_nw_info_update(context, instance):
-                    LOG.info("Updating ports in neutron", instance=instance)
-                    self.network_api.setup_instance_network_on_host(
-                        context, instance, self.host)
-                # Call to network API to get instance info.. this will
-                # force an update to the instance's info_cache
-                self.network_api.get_instance_nw_info(
-                    context, instance, force_refresh=True)
-                LOG.debug('Updated the network info_cache for instance',
-                          instance=instance)
-            except exception.InstanceNotFound:
-                # Instance is gone.
-                LOG.debug('Instance no longer exists. Unable to refresh',
-                          instance=instance)
-                return
-            except exception.InstanceInfoCacheNotFound:
-                # InstanceInfoCache is gone.
-                LOG.debug('InstanceInfoCache no longer exists. '
-                          'Unable to refresh', instance=instance)
-            except Exception:
-                LOG.error('An error occurred while refreshing the network '
-                          'cache.', instance=instance, exc_info=True)
-        else:
+        if not instances:
             LOG.debug("Didn't find any instances for network info cache "
                       "update.")
+            return
+
+        prefetched = None
+        if len(instances) > 1:
+            # Retrieve the ports, networks, subnets and floating IPs of all
+            # of the instances with a handful of requests rather than a
+            # series of requests per instance. Only the ports are listed again
+            # per instance, to check that the prefetched resources still
+            # apply.
+            try:
+                prefetched = self.network_api.prefetch_instances_nw_info(
+                    context, instances)
+            except Exception:
+                LOG.warning('Unable to retrieve the network resources of '
+                            '%d instances in bulk, refreshing their network '
+                            'info_cache individually.', len(instances),
+                            exc_info=True)
+
+        for instance in instances:
+            self._heal_instance_info_cache_for_instance(
+                context, instance, prefetched)
+
+    def _heal_instance_info_cache_for_instance(self, context, instance,
+                                               prefetched=None):
+        """Refresh the network info_cache of a single instance.
+
+        :param prefetched: Optional nova.network.neutron.PrefetchedNetworkInfo
+            holding the neutron resources of the instance.
+        """
+        try:
+            # Fix potential mismatch in port binding if evacuation failed
+            # after reassigning the port binding to the dest host but
+            # before the instance host is changed.
+            # Do this only when instance has no pending task.
+            ports = prefetched.get_ports(instance) if prefetched else None
+            if instance.task_state is None and \
+                    self._require_nw_info_update(context, instance,
+                                                 ports=ports):
+                LOG.info("Updating ports in neutron", instance=instance)
+                self.network_api.setup_instance_network_on_host(
+                    context, instance, self.host)
+                # The port bindings were just updated so the prefetched
+                # ports are stale.
+                prefetched = None
+            # Call to network API to get instance info.. this will
+            # force an update to the instance's info_cache
+            self.network_api.get_instance_nw_info(
+                context, instance, force_refresh=True, prefetched=prefetched)
+            LOG.debug('Updated the network info_cache for instance',
+                      instance=instance)
+        except exception.InstanceNotFound:
+            # Instance is gone.
+            LOG.debug('Instance no longer exists. Unable to refresh',
+                      instance=instance)
+        except exception.InstanceInfoCacheNotFound:
+            # InstanceInfoCache is gone.
+            LOG.debug('InstanceInfoCache no longer exists. '
+                      'Unable to refresh', instance=instance)
+        except Exception:
+            LOG.error('An error occurred while refreshing the network '
+                      'cache.', instance=instance, exc_info=True)
 
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
@@ -9504,13 +9712,28 @@ class ComputeManager(manager.Manager):
                         {'num_db_instances': num_db_instances,
                          'num_vm_instances': num_vm_instances})
 
+        # Fetch the power state of all the instances from the driver at once
+        # if it can do so, rather than calling get_info() for each of them.
+        try:
+            vm_power_states = self.driver.get_instance_power_states(
+                db_instances)
+        except NotImplementedError:
+            vm_power_states = {}
+        except Exception as e:
+            LOG.warning('Unable to retrieve the power state of all the '
+                        'instances of the host at once, falling back to '
+                        'querying them individually: %s', e)
+            vm_power_states = {}
+
         def _sync(db_instance):
             # NOTE(melwitt): This must be synchronized as we query state from
             #                two separate sources, the driver and the database.
             #                They are set (in stop_instance) and read, in sync.
             @utils.synchronized(db_instance.uuid)
             def query_driver_power_state_and_sync():
-                self._query_driver_power_state_and_sync(context, db_instance)
+                self._query_driver_power_state_and_sync(
+                    context, db_instance,
+                    vm_power_states.get(db_instance.uuid))
 
             try:
                 query_driver_power_state_and_sync()
@@ -9532,12 +9755,47 @@ class ComputeManager(manager.Manager):
                 self._syncs_in_progress[uuid] = True
                 self._sync_power_pool.spawn_n(_sync, db_instance)
 
-    def _query_driver_power_state_and_sync(self, context, db_instance):
+    @staticmethod
+    def _power_state_needs_sync(db_instance, vm_power_state):
+        """Returns False if the hypervisor power state matches the database
+        and _sync_instance_power_state would have nothing to correct.
+        """
+        if vm_power_state != db_instance.power_state:
+            return True
+        vm_state = db_instance.vm_state
+        if vm_state == vm_states.ACTIVE:
+            return vm_power_state != power_state.RUNNING
+        if vm_state == vm_states.STOPPED:
+            return vm_power_state not in (power_state.NOSTATE,
+                                          power_state.SHUTDOWN,
+                                          power_state.CRASHED)
+        if vm_state == vm_states.PAUSED:
+            return vm_power_state in (power_state.SHUTDOWN,
+                                      power_state.CRASHED)
+        if vm_state in (vm_states.SOFT_DELETED, vm_states.DELETED):
+            return vm_power_state not in (power_state.NOSTATE,
+                                          power_state.SHUTDOWN)
+        return False
+
+    def _query_driver_power_state_and_sync(self, context, db_instance,
+                                           vm_power_state=None):
+        """Sync the power state of an instance with the hypervisor.
+
+        :param vm_power_state: The power state of the instance prefetched
+            from the driver along with all the other instances of the host,
+            or None to query the driver for this instance only.
+        """
         if db_instance.task_state is not None:
             LOG.info("During sync_power_state the instance has a "
                      "pending task (%(task)s). Skip.",
                      {'task': db_instance.task_state}, instance=db_instance)
             return
+        # NOTE: A prefetched power state was read before the instance lock
+        # was taken, so it is only trusted to tell there is nothing to do.
+        # Otherwise the driver is queried again to act on fresh data.
+        if (vm_power_state is not None and
+                not self._power_state_needs_sync(db_instance, vm_power_state)):
+            return
         # No pending tasks. Now try to figure out the real vm_power_state.
         try:
             vm_instance = self.driver.get_info(db_instance)
@@ -9846,9 +10104,14 @@ class ComputeManager(manager.Manager):
                         "Failed to delete compute node resource provider "
                         "for compute node %s: %s", cn.uuid, str(e))
 
-        for nodename in nodenames:
-            self._update_available_resource_for_node(context, nodename,
-                                                     startup=startup)
+        # NOTE: Consuming the results of GreenPool.imap re-raises any
+        # exception from _update_available_resource_for_node here, which is
+        # how a ReshapeFailed on startup kills the service.
+        pool = eventlet.GreenPool(size=CONF.compute.update_resources_pool_size)
+        update_node = functools.partial(
+            self._update_available_resource_for_node, context,
+            startup=startup)
+        list(pool.imap(update_node, nodenames))
 
     def _get_compute_nodes_in_db(self, context, nodenames, use_slave=False,
                                  startup=False):
@@ -10370,6 +10633,32 @@ class ComputeManager(manager.Manager):
 
         return results
 
+    def prefetch_image(self, context, image_id):
+        """Ask the virt driver to cache an image ahead of a build.
+
+        Conductor casts this to the hosts picked by the scheduler so that the
+        image download overlaps with the rest of the build request handling.
+        This is best-effort: failures are only logged and the build downloads
+        the image itself if it is not cached by the time it is needed.
+
+        :param context: The RequestContext
+        :param image_id: The ID of the image to be cached
+        """
+        try:
+            with timeutils.StopWatch() as timer:
+                cached = self.driver.cache_image(context, image_id)
+        except NotImplementedError:
+            LOG.debug('Virt driver does not support image pre-caching; '
+                      'not prefetching image %s', image_id)
+        except Exception as e:
+            LOG.warning('Failed to prefetch image %(image_id)s: %(err)s',
+                        {'image_id': image_id, 'err': e})
+        else:
+            if cached:
+                LOG.info('Took %(time)0.2f seconds to prefetch image '
+                         '%(image_id)s.',
+                         {'time': timer.elapsed(), 'image_id': image_id})
+
     @periodic_task.periodic_task(spacing=CONF.instance_delete_interval)
     def _run_pending_deletes(self, context):
         """Retry any pending instance file deletes."""
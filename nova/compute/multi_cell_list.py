@@ -197,6 +197,23 @@ class CrossCellLister(metaclass=abc.ABCMeta):
         """
         pass
 
+    def get_marker_values(self, ctx, marker):
+        """Get the sort key values encoded in a keyset marker.
+
+        Implementations that support keyset markers, which carry the values
+        of the sort keys of the last record seen instead of its identifier,
+        return those values here. The records are then listed from each cell
+        by passing them as the marker_values keyword argument to
+        get_by_filters(), with no need to look up a marker record.
+
+        :param ctx: A RequestContext
+        :param marker: The marker provided by the caller
+        :returns: A list of values for the sort keys, or None if the marker
+                  is a record identifier
+        :raises: MarkerNotFound if the marker is an invalid keyset marker
+        """
+        return None
+
     @abc.abstractmethod
     def get_by_filters(self, ctx, filters, limit, marker, **kwargs):
         """List records by filters, sorted and paginated.
@@ -245,7 +262,13 @@ class CrossCellLister(metaclass=abc.ABCMeta):
 
         cell_down_support = kwargs.pop('cell_down_support', False)
 
+        # A keyset marker gives us the values of the sort keys to start
+        # after directly, which every cell can seek to on its own.
+        marker_values = None
         if marker:
+            marker_values = self.get_marker_values(ctx, marker)
+
+        if marker and marker_values is None:
             # A marker identifier was provided from the API. Call this
             # the 'global' marker as it determines where we start the
             # process across all cells. Look up the record in
@@ -282,7 +305,11 @@ class CrossCellLister(metaclass=abc.ABCMeta):
 
             marker_id = self.marker_identifier
 
-            if marker:
+            # With a keyset marker, the sort key values of the last record
+            # returned are used to get the next batch, instead of its id.
+            local_marker_values = marker_values
+
+            if marker and marker_values is None:
                 if cctx.cell_uuid == global_marker_cell:
                     local_marker = marker
                 else:
@@ -349,17 +376,27 @@ class CrossCellLister(metaclass=abc.ABCMeta):
                     query_size = batch_size
 
                 # Get one batch
-                query_result = self.get_by_filters(
-                    cctx, filters,
-                    limit=query_size or None, marker=local_marker,
-                    **kwargs)
+                if local_marker_values is not None:
+                    query_result = self.get_by_filters(
+                        cctx, filters,
+                        limit=query_size or None, marker=None,
+                        marker_values=local_marker_values, **kwargs)
+                else:
+                    query_result = self.get_by_filters(
+                        cctx, filters,
+                        limit=query_size or None, marker=local_marker,
+                        **kwargs)
 
                 # Yield wrapped results from the batch, counting as we go
                 # (to avoid traversing the list to count). Also, update our
                 # local_marker each time so that local_marker is the end of
                 # this batch in order to find the next batch.
                 for item in query_result:
-                    local_marker = item[self.marker_identifier]
+                    if local_marker_values is not None:
+                        local_marker_values = [
+                            item[key] for key in self.sort_ctx.sort_keys]
+                    else:
+                        local_marker = item[self.marker_identifier]
                     yield RecordWrapper(cctx, self.sort_ctx, item)
                     batch_count += 1
 
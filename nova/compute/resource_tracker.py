@@ -19,10 +19,14 @@ scheduler with useful information about availability through the ComputeNode
 model.
 """
 import collections
+import contextlib
 import copy
+import functools
+import inspect
 
 from keystoneauth1 import exceptions as ks_exc
 import os_traits
+from oslo_concurrency import lockutils
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
@@ -56,6 +60,32 @@ LOG = logging.getLogger(__name__)
 COMPUTE_RESOURCE_SEMAPHORE = "compute_resources"
 
 
+def _synchronized_node(get_nodename):
+    """Decorator serializing a ResourceTracker method on a compute node lock.
+
+    :param get_nodename: callable receiving the dict of arguments the
+        decorated method was called with and returning the nodename the
+        method operates on.
+    """
+    def decorator(f):
+        signature = inspect.signature(f)
+
+        @functools.wraps(f)
+        def inner(self, *args, **kwargs):
+            nodename = None
+            if self.lock_per_node:
+                arguments = signature.bind(self, *args, **kwargs).arguments
+                nodename = get_nodename(arguments)
+            with self._node_lock(nodename):
+                return f(self, *args, **kwargs)
+        return inner
+    return decorator
+
+
+def _nodename_arg(arguments):
+    return arguments['nodename']
+
+
 def _instance_in_resize_state(instance):
     """Returns True if the instance is in one of the resizing states.
 
@@ -96,9 +126,11 @@ class ResourceTracker(object):
         self.compute_nodes = {}
         # Dict of Stats objects, keyed by nodename
         self.stats = collections.defaultdict(compute_stats.Stats)
-        # Set of UUIDs of instances tracked on this host.
-        self.tracked_instances = set()
-        self.tracked_migrations = {}
+        # Sets of UUIDs of instances tracked on this host, keyed by nodename
+        self.tracked_instances = collections.defaultdict(set)
+        # Dicts of tracked Migration objects keyed by instance UUID, keyed by
+        # nodename
+        self.tracked_migrations = collections.defaultdict(dict)
         self.is_bfv = {}  # dict, keyed by instance uuid, to is_bfv boolean
         monitor_handler = monitors.MonitorHandler(self)
         self.monitors = monitor_handler.monitors
@@ -122,8 +154,31 @@ class ResourceTracker(object):
         # are not found on the provider tree. These are tracked to facilitate
         # smarter logging.
         self.absent_providers = set()
+        # Whether node scoped operations are serialized per node rather than
+        # on the host-wide COMPUTE_RESOURCE_SEMAPHORE.
+        self.lock_per_node = CONF.compute.resource_tracker_lock_per_node
+
+    def _node_lock(self, nodename):
+        """Returns the lock serializing operations on the given node."""
+        name = COMPUTE_RESOURCE_SEMAPHORE
+        if self.lock_per_node:
+            name = '%s-%s' % (COMPUTE_RESOURCE_SEMAPHORE, nodename)
+        return lockutils.lock(name, fair=True)
+
+    @contextlib.contextmanager
+    def _host_lock(self):
+        """Serialize updates to state shared by all nodes of this host.
+
+        This must be used while holding a node lock. If node locks are not
+        enabled the host-wide lock is already held by the caller.
+        """
+        if not self.lock_per_node:
+            yield
+            return
+        with lockutils.lock(COMPUTE_RESOURCE_SEMAPHORE, fair=True):
+            yield
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(_nodename_arg)
     def instance_claim(self, context, instance, nodename, allocations,
                        limits=None):
         """Indicate that some resources are needed for an upcoming compute
@@ -168,8 +223,9 @@ class ResourceTracker(object):
 
         cn = self.compute_nodes[nodename]
         pci_requests = instance.pci_requests
-        claim = claims.Claim(context, instance, nodename, self, cn,
-                             pci_requests, limits=limits)
+        with self._host_lock():
+            claim = claims.Claim(context, instance, nodename, self, cn,
+                                 pci_requests, limits=limits)
 
         # self._set_instance_host_and_node() will save instance to the DB
         # so set instance.numa_topology first.  We need to make sure
@@ -179,11 +235,12 @@ class ResourceTracker(object):
         instance.numa_topology = instance_numa_topology
         self._set_instance_host_and_node(instance, nodename)
 
-        if self.pci_tracker:
-            # NOTE(jaypipes): ComputeNode.pci_device_pools is set below
-            # in _update_usage_from_instance().
-            self.pci_tracker.claim_instance(context, pci_requests,
-                                            instance_numa_topology)
+        with self._host_lock():
+            if self.pci_tracker:
+                # NOTE(jaypipes): ComputeNode.pci_device_pools is set below
+                # in _update_usage_from_instance().
+                self.pci_tracker.claim_instance(context, pci_requests,
+                                                instance_numa_topology)
 
         claimed_resources = self._claim_resources(allocations)
         instance.resources = claimed_resources
@@ -197,7 +254,7 @@ class ResourceTracker(object):
 
         return claim
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(_nodename_arg)
     def rebuild_claim(self, context, instance, nodename, allocations,
                       limits=None, image_meta=None, migration=None):
         """Create a claim for a rebuild operation."""
@@ -207,7 +264,7 @@ class ResourceTracker(object):
             move_type=fields.MigrationType.EVACUATION,
             image_meta=image_meta, limits=limits)
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(_nodename_arg)
     def resize_claim(self, context, instance, instance_type, nodename,
                      migration, allocations, image_meta=None, limits=None):
         """Create a claim for a resize or cold-migration move.
@@ -219,7 +276,7 @@ class ResourceTracker(object):
                                 migration, allocations, image_meta=image_meta,
                                 limits=limits)
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(_nodename_arg)
     def live_migration_claim(self, context, instance, nodename, migration,
                              limits, allocs):
         """Builds a MoveClaim for a live migration.
@@ -295,23 +352,25 @@ class ResourceTracker(object):
             for request in instance.pci_requests.requests:
                 if request.source == objects.InstancePCIRequest.NEUTRON_PORT:
                     new_pci_requests.requests.append(request)
-        claim = claims.MoveClaim(context, instance, nodename,
-                                 new_instance_type, image_meta, self, cn,
-                                 new_pci_requests, migration, limits=limits)
-
         claimed_pci_devices_objs = []
-        # TODO(artom) The second part of this condition should not be
-        # necessary, but since SRIOV live migration is currently handled
-        # elsewhere - see for example _claim_pci_for_instance_vifs() in the
-        # compute manager - we don't do any PCI claims if this is a live
-        # migration to avoid stepping on that code's toes. Ideally,
-        # MoveClaim/this method would be used for all live migration resource
-        # claims.
-        if self.pci_tracker and not migration.is_live_migration:
-            # NOTE(jaypipes): ComputeNode.pci_device_pools is set below
-            # in _update_usage_from_instance().
-            claimed_pci_devices_objs = self.pci_tracker.claim_instance(
-                    context, new_pci_requests, claim.claimed_numa_topology)
+        with self._host_lock():
+            claim = claims.MoveClaim(context, instance, nodename,
+                                     new_instance_type, image_meta, self, cn,
+                                     new_pci_requests, migration,
+                                     limits=limits)
+
+            # TODO(artom) The second part of this condition should not be
+            # necessary, but since SRIOV live migration is currently handled
+            # elsewhere - see for example _claim_pci_for_instance_vifs() in
+            # the compute manager - we don't do any PCI claims if this is a
+            # live migration to avoid stepping on that code's toes. Ideally,
+            # MoveClaim/this method would be used for all live migration
+            # resource claims.
+            if self.pci_tracker and not migration.is_live_migration:
+                # NOTE(jaypipes): ComputeNode.pci_device_pools is set below
+                # in _update_usage_from_instance().
+                claimed_pci_devices_objs = self.pci_tracker.claim_instance(
+                        context, new_pci_requests, claim.claimed_numa_topology)
         claimed_pci_devices = objects.PciDeviceList(
                 objects=claimed_pci_devices_objs)
 
@@ -429,7 +488,8 @@ class ResourceTracker(object):
             self._add_assigned_resources(claimed_resources)
             return objects.ResourceList(objects=claimed_resources)
 
-    def _populate_assigned_resources(self, context, instance_by_uuid):
+    def _populate_assigned_resources(self, context, instance_by_uuid,
+                                     nodename):
         """Populate self.assigned_resources organized by resource class and
         reource provider uuid, which is as following format:
         {
@@ -441,7 +501,7 @@ class ResourceTracker(object):
         resources = []
 
         # Get resources assigned to migrations
-        for mig in self.tracked_migrations.values():
+        for mig in self.tracked_migrations[nodename].values():
             mig_ctx = mig.instance.migration_context
             # We might have a migration whose instance hasn't arrived here yet.
             # Ignore it.
@@ -453,7 +513,7 @@ class ResourceTracker(object):
                 resources.extend(mig_ctx.new_resources or [])
 
         # Get resources assigned to instances
-        for uuid in self.tracked_instances:
+        for uuid in self.tracked_instances[nodename]:
             resources.extend(instance_by_uuid[uuid].resources or [])
 
         self.assigned_resources.clear()
@@ -528,7 +588,7 @@ class ResourceTracker(object):
         instance.node = None
         instance.save()
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(_nodename_arg)
     def abort_instance_claim(self, context, instance, nodename):
         """Remove usage from the given instance."""
         self._update_usage_from_instance(context, instance, nodename,
@@ -545,13 +605,15 @@ class ResourceTracker(object):
             pci_devices = self._get_migration_context_resource(
                 'pci_devices', instance, prefix=prefix)
             if pci_devices:
-                for pci_device in pci_devices:
-                    self.pci_tracker.free_device(pci_device, instance)
+                with self._host_lock():
+                    for pci_device in pci_devices:
+                        self.pci_tracker.free_device(pci_device, instance)
 
-                dev_pools_obj = self.pci_tracker.stats.to_device_pools_obj()
+                    dev_pools_obj = (
+                        self.pci_tracker.stats.to_device_pools_obj())
                 self.compute_nodes[nodename].pci_device_pools = dev_pools_obj
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(lambda args: args['migration'].source_node)
     def drop_move_claim_at_source(self, context, instance, migration):
         """Drop a move claim after confirming a resize or cold migration."""
         migration.status = 'confirmed'
@@ -567,7 +629,7 @@ class ResourceTracker(object):
         # though.
         instance.drop_migration_context()
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(lambda args: args['migration'].dest_node)
     def drop_move_claim_at_dest(self, context, instance, migration):
         """Drop a move claim after reverting a resize or cold migration."""
 
@@ -585,7 +647,7 @@ class ResourceTracker(object):
         instance.revert_migration_context()
         instance.save(expected_task_state=[task_states.RESIZE_REVERTING])
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(_nodename_arg)
     def drop_move_claim(self, context, instance, nodename,
                         instance_type=None, prefix='new_'):
         self._drop_move_claim(
@@ -614,8 +676,10 @@ class ResourceTracker(object):
         """
         # Remove usage for an instance that is tracked in migrations, such as
         # on the dest node during revert resize.
-        if instance['uuid'] in self.tracked_migrations:
-            migration = self.tracked_migrations.pop(instance['uuid'])
+        tracked_migrations = self.tracked_migrations[nodename]
+        tracked_instances = self.tracked_instances[nodename]
+        if instance['uuid'] in tracked_migrations:
+            migration = tracked_migrations.pop(instance['uuid'])
             if not instance_type:
                 instance_type = self._get_instance_type(instance, prefix,
                                                         migration)
@@ -623,8 +687,8 @@ class ResourceTracker(object):
         # as on the source node after a migration).
         # NOTE(lbeliveau): On resize on the same node, the instance is
         # included in both tracked_migrations and tracked_instances.
-        elif instance['uuid'] in self.tracked_instances:
-            self.tracked_instances.remove(instance['uuid'])
+        elif instance['uuid'] in tracked_instances:
+            tracked_instances.remove(instance['uuid'])
 
         if instance_type is not None:
             numa_topology = self._get_migration_context_resource(
@@ -640,7 +704,7 @@ class ResourceTracker(object):
             ctxt = context.elevated()
             self._update(ctxt, self.compute_nodes[nodename])
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(_nodename_arg)
     def update_usage(self, context, instance, nodename):
         """Update the resource usage and stats after a change in an
         instance
@@ -652,7 +716,7 @@ class ResourceTracker(object):
 
         # don't update usage for this instance unless it submitted a resource
         # claim first:
-        if uuid in self.tracked_instances:
+        if uuid in self.tracked_instances[nodename]:
             self._update_usage_from_instance(context, instance, nodename)
             self._update(context.elevated(), self.compute_nodes[nodename])
 
@@ -762,16 +826,18 @@ class ResourceTracker(object):
         return True
 
     def _setup_pci_tracker(self, context, compute_node, resources):
-        if not self.pci_tracker:
-            n_id = compute_node.id
-            self.pci_tracker = pci_manager.PciDevTracker(context, node_id=n_id)
-            if 'pci_passthrough_devices' in resources:
-                dev_json = resources.pop('pci_passthrough_devices')
-                self.pci_tracker.update_devices_from_hypervisor_resources(
-                        dev_json)
+        with self._host_lock():
+            if not self.pci_tracker:
+                n_id = compute_node.id
+                self.pci_tracker = pci_manager.PciDevTracker(
+                    context, node_id=n_id)
+                if 'pci_passthrough_devices' in resources:
+                    dev_json = resources.pop('pci_passthrough_devices')
+                    self.pci_tracker.update_devices_from_hypervisor_resources(
+                            dev_json)
 
-            dev_pools_obj = self.pci_tracker.stats.to_device_pools_obj()
-            compute_node.pci_device_pools = dev_pools_obj
+                dev_pools_obj = self.pci_tracker.stats.to_device_pools_obj()
+                compute_node.pci_device_pools = dev_pools_obj
 
     def _copy_resources(self, compute_node, resources, initial=False):
         """Copy resource values to supplied compute_node."""
@@ -911,7 +977,8 @@ class ResourceTracker(object):
                               'another host\'s instance!',
                           {'uuid': migration.instance_uuid})
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(
+        lambda args: args['resources']['hypervisor_hostname'])
     def _update_available_resource(self, context, resources, startup=False):
 
         # initialize the compute node object, creating it
@@ -958,8 +1025,9 @@ class ResourceTracker(object):
         # this periodic task, and also because the resource tracker is not
         # notified when instances are deleted, we need remove all usages
         # from deleted instances.
-        self.pci_tracker.clean_usage(instances, migrations)
-        dev_pools_obj = self.pci_tracker.stats.to_device_pools_obj()
+        with self._host_lock():
+            self.pci_tracker.clean_usage(instances, migrations)
+            dev_pools_obj = self.pci_tracker.stats.to_device_pools_obj()
         cn.pci_device_pools = dev_pools_obj
 
         self._report_final_resource_view(nodename)
@@ -970,7 +1038,9 @@ class ResourceTracker(object):
         cn.metrics = jsonutils.dumps(metrics)
 
         # Update assigned resources to self.assigned_resources
-        self._populate_assigned_resources(context, instance_by_uuid)
+        with self._host_lock():
+            self._populate_assigned_resources(
+                context, instance_by_uuid, nodename)
 
         # update the compute_node
         self._update(context, cn, startup=startup)
@@ -980,7 +1050,8 @@ class ResourceTracker(object):
         # Check if there is any resource assigned but not found
         # in provider tree
         if startup:
-            self._check_resources(context)
+            with self._host_lock():
+                self._check_resources(context)
 
     def _get_compute_node(self, context, nodename):
         """Returns compute node for the host and nodename."""
@@ -1065,11 +1136,22 @@ class ResourceTracker(object):
                    'pci_stats': pci_stats})
 
     def _resource_change(self, compute_node):
-        """Check to see if any resources have changed."""
+        """Check to see if any resources have changed.
+
+        Fields which are flagged as changed on the compute node but still hold
+        the values it was last saved with are reset, so that
+        ComputeNode.save() only serializes and writes the columns which really
+        changed, e.g. not the numa_topology and pci_device_pools JSON blobs
+        when only vcpus_used moved.
+        """
         nodename = compute_node.hypervisor_hostname
         old_compute = self.old_resources[nodename]
-        if not obj_base.obj_equal_prims(
-                compute_node, old_compute, ['updated_at']):
+        changed = obj_base.obj_diff_fields(
+            compute_node, old_compute, ['updated_at'])
+        unchanged = compute_node.obj_what_changed() - changed
+        if unchanged:
+            compute_node.obj_reset_changes(unchanged, recursive=True)
+        if changed:
             self.old_resources[nodename] = copy.deepcopy(compute_node)
             return True
         return False
@@ -1225,10 +1307,14 @@ class ResourceTracker(object):
                 with excutils.save_and_reraise_exception(logger=LOG):
                     self.old_resources[nodename] = old_compute
 
-        self._update_to_placement(context, compute_node, startup)
+        # NOTE: The provider tree is shared by all the nodes of this host and
+        # is flushed to placement as a whole, so concurrent updates for
+        # different nodes must not interleave.
+        with self._host_lock():
+            self._update_to_placement(context, compute_node, startup)
 
-        if self.pci_tracker:
-            self.pci_tracker.save(context)
+            if self.pci_tracker:
+                self.pci_tracker.save(context)
 
     def _update_usage(self, usage, nodename, sign=1):
         # TODO(stephenfin): We don't use the CPU, RAM and disk fields for much
@@ -1292,7 +1378,7 @@ class ResourceTracker(object):
                     migration.source_node == nodename)
         same_node = (incoming and outbound)
 
-        tracked = uuid in self.tracked_instances
+        tracked = uuid in self.tracked_instances[nodename]
         itype = None
         numa_topology = None
         sign = 0
@@ -1349,22 +1435,22 @@ class ResourceTracker(object):
             cn = self.compute_nodes[nodename]
             usage = self._get_usage_dict(
                         itype, instance, numa_topology=numa_topology)
-            if self.pci_tracker and sign:
-                self.pci_tracker.update_pci_for_instance(
-                    context, instance, sign=sign)
+            with self._host_lock():
+                if self.pci_tracker and sign:
+                    self.pci_tracker.update_pci_for_instance(
+                        context, instance, sign=sign)
+                if self.pci_tracker:
+                    obj = self.pci_tracker.stats.to_device_pools_obj()
+                else:
+                    obj = objects.PciDevicePoolList()
             self._update_usage(usage, nodename)
-            if self.pci_tracker:
-                obj = self.pci_tracker.stats.to_device_pools_obj()
-                cn.pci_device_pools = obj
-            else:
-                obj = objects.PciDevicePoolList()
-                cn.pci_device_pools = obj
-            self.tracked_migrations[uuid] = migration
+            cn.pci_device_pools = obj
+            self.tracked_migrations[nodename][uuid] = migration
 
     def _update_usage_from_migrations(self, context, migrations, nodename):
         filtered = {}
         instances = {}
-        self.tracked_migrations.clear()
+        self.tracked_migrations[nodename].clear()
 
         # do some defensive filtering against bad migrations records in the
         # database:
@@ -1435,18 +1521,19 @@ class ResourceTracker(object):
         """Update usage for a single instance."""
 
         uuid = instance['uuid']
-        is_new_instance = uuid not in self.tracked_instances
+        tracked_instances = self.tracked_instances[nodename]
+        is_new_instance = uuid not in tracked_instances
         # NOTE(sfinucan): Both brand new instances as well as instances that
         # are being unshelved will have is_new_instance == True
         is_removed_instance = not is_new_instance and (is_removed or
             instance['vm_state'] in vm_states.ALLOW_RESOURCE_REMOVAL)
 
         if is_new_instance:
-            self.tracked_instances.add(uuid)
+            tracked_instances.add(uuid)
             sign = 1
 
         if is_removed_instance:
-            self.tracked_instances.remove(uuid)
+            tracked_instances.remove(uuid)
             self._release_assigned_resources(instance.resources)
             sign = -1
 
@@ -1458,9 +1545,10 @@ class ResourceTracker(object):
         # if it's a new or deleted instance:
         if is_new_instance or is_removed_instance:
             if self.pci_tracker:
-                self.pci_tracker.update_pci_for_instance(context,
-                                                         instance,
-                                                         sign=sign)
+                with self._host_lock():
+                    self.pci_tracker.update_pci_for_instance(context,
+                                                             instance,
+                                                             sign=sign)
             # new instance, update compute node resource usage:
             self._update_usage(self._get_usage_dict(instance, instance),
                                nodename, sign=sign)
@@ -1473,7 +1561,8 @@ class ResourceTracker(object):
 
         cn.current_workload = stats.calculate_workload()
         if self.pci_tracker:
-            obj = self.pci_tracker.stats.to_device_pools_obj()
+            with self._host_lock():
+                obj = self.pci_tracker.stats.to_device_pools_obj()
             cn.pci_device_pools = obj
         else:
             cn.pci_device_pools = objects.PciDevicePoolList()
@@ -1484,7 +1573,7 @@ class ResourceTracker(object):
         instances assigned to the local compute host, even if they are not
         currently powered on.
         """
-        self.tracked_instances.clear()
+        self.tracked_instances[nodename].clear()
 
         cn = self.compute_nodes[nodename]
         # set some initial values, reserve room for host/hypervisor:
@@ -1527,8 +1616,9 @@ class ResourceTracker(object):
             # the (potentially expensive) context.elevated construction below.
             return
         read_deleted_context = context.elevated(read_deleted='yes')
+        tracked_instances = self.tracked_instances[cn.hypervisor_hostname]
         for consumer_uuid, alloc in allocations.items():
-            if consumer_uuid in self.tracked_instances:
+            if consumer_uuid in tracked_instances:
                 LOG.debug("Instance %s actively managed on this compute host "
                           "and has allocations in placement: %s.",
                           consumer_uuid, alloc)
@@ -1932,7 +2022,7 @@ class ResourceTracker(object):
         self.pci_tracker.free_instance_claims(context, instance)
         self.pci_tracker.save(context)
 
-    @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+    @_synchronized_node(lambda args: args['node'])
     def finish_evacuation(self, instance, node, migration):
         instance.apply_migration_context()
         # NOTE (ndipanov): This save will now update the host and node
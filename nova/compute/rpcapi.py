@@ -383,6 +383,7 @@ class ComputeAPI(object):
         * 5.13 - Add accel_uuids (accelerator requests) parameter to
                  shelve_instance(), shelve_offload_instance() and
                  unshelve_instance()
+        * 5.14 - Add prefetch_image()
     '''
 
     VERSION_ALIASES = {
@@ -1511,3 +1512,20 @@ class ComputeAPI(object):
                                call_monitor_timeout=CONF.rpc_response_timeout,
                                timeout=CONF.long_rpc_timeout)
         return cctxt.call(ctxt, 'cache_images', image_ids=image_ids)
+
+    def prefetch_image(self, ctxt, host, image_id):
+        """Ask a compute host to start caching an image in the background.
+
+        This is best-effort, so nothing is sent if the compute service is too
+        old to handle the request.
+        """
+        version = '5.14'
+        client = self.router.client(ctxt)
+        if not client.can_send_version(version):
+            LOG.debug('Compute RPC version pin does not allow '
+                      'prefetch_image() to be called; not prefetching image '
+                      '%(image_id)s on host %(host)s.',
+                      {'image_id': image_id, 'host': host})
+            return
+        cctxt = client.prepare(server=host, version=version)
+        cctxt.cast(ctxt, 'prefetch_image', image_id=image_id)
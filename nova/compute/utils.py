@@ -21,6 +21,7 @@ import itertools
 import math
 import traceback
 
+import eventlet.queue
 import netifaces
 from oslo_log import log
 from oslo_serialization import jsonutils
@@ -32,6 +33,7 @@ from nova.compute import power_state
 from nova.compute import task_states
 from nova.compute import vm_states
 import nova.conf
+from nova import context as nova_context
 from nova import exception
 from nova import notifications
 from nova.notifications.objects import aggregate as aggregate_notification
@@ -407,6 +409,12 @@ def notify_about_instance_usage(notifier, context, instance, event_suffix,
     :param extra_usage_info: Dictionary containing extra values to add or
         override in the notification.
     """
+    event_type = 'compute.instance.%s' % event_suffix
+    # Building the payload is expensive so skip it if the notification will
+    # not be sent anyway.
+    if not notifier.is_enabled() or not rpc.is_event_type_enabled(event_type):
+        return
+
     if not extra_usage_info:
         extra_usage_info = {}
 
@@ -424,7 +432,7 @@ def notify_about_instance_usage(notifier, context, instance, event_suffix,
     else:
         method = notifier.info
 
-    method(context, 'compute.instance.%s' % event_suffix, usage_info)
+    method(context, event_type, usage_info)
 
 
 def _get_fault_and_priority_from_exception(exception: Exception):
@@ -454,6 +462,11 @@ def notify_about_instance_action(context, instance, host, action, phase=None,
     :param bdms: BlockDeviceMappingList object for the instance. If it is not
         provided then we will load it from the db if so configured
     """
+    event_type = notification_base.EventType(
+        object='instance', action=action, phase=phase)
+    if not rpc.is_event_type_enabled(
+            event_type.to_notification_event_type_field()):
+        return
     fault, priority = _get_fault_and_priority_from_exception(exception)
     payload = instance_notification.InstanceActionPayload(
             context=context,
@@ -465,10 +478,7 @@ def notify_about_instance_action(context, instance, host, action, phase=None,
             priority=priority,
             publisher=notification_base.NotificationPublisher(
                 host=host, source=source),
-            event_type=notification_base.EventType(
-                    object='instance',
-                    action=action,
-                    phase=phase),
+            event_type=event_type,
             payload=payload)
     notification.emit(context)
 
@@ -486,6 +496,13 @@ def notify_about_instance_create(context, instance, host, phase=None,
     :param bdms: BlockDeviceMappingList object for the instance. If it is not
                 provided then we will load it from the db if so configured
     """
+    event_type = notification_base.EventType(
+        object='instance',
+        action=fields.NotificationAction.CREATE,
+        phase=phase)
+    if not rpc.is_event_type_enabled(
+            event_type.to_notification_event_type_field()):
+        return
     fault, priority = _get_fault_and_priority_from_exception(exception)
     payload = instance_notification.InstanceCreatePayload(
         context=context,
@@ -497,10 +514,7 @@ def notify_about_instance_create(context, instance, host, phase=None,
         priority=priority,
         publisher=notification_base.NotificationPublisher(
             host=host, source=fields.NotificationSource.COMPUTE),
-        event_type=notification_base.EventType(
-            object='instance',
-            action=fields.NotificationAction.CREATE,
-            phase=phase),
+        event_type=event_type,
         payload=payload)
     notification.emit(context)
 
@@ -1356,11 +1370,102 @@ def get_stashed_volume_connector(bdm, instance):
                 return connector
 
 
+class InstanceActionEventBuffer(object):
+    """Records instance action events in batches from a background thread.
+
+    Events are queued instead of being written through conductor one at a
+    time. A single greenthread drains the queue and records everything that
+    accumulated while it was busy with one call, so events are written in the
+    order they were queued. The queue is bounded and callers block once it is
+    full until the writer catches up.
+    """
+
+    _STOP = object()
+
+    def __init__(self, size):
+        self._size = size
+        self._queue = eventlet.queue.LightQueue(maxsize=size)
+        self._writer = utils.spawn(self._run)
+
+    def event_start(self, context, instance_uuid, event_name, host=None):
+        values = objects.InstanceActionEvent.pack_action_event_start(
+            context, instance_uuid, event_name, host=host)
+        self._put(context, 'start', values)
+
+    def event_finish_with_failure(self, context, instance_uuid, event_name,
+                                  exc_val=None, exc_tb=None):
+        # NOTE: Format the exception the same way serialize_args does for
+        # InstanceActionEvent.event_finish_with_failure since the values are
+        # sent over RPC as they are.
+        if isinstance(exc_val, Exception):
+            try:
+                exc_val = exc_val.format_message()
+            except Exception:
+                exc_val = exc_val.__class__.__name__
+        if exc_tb and not isinstance(exc_tb, str):
+            exc_tb = ''.join(traceback.format_tb(exc_tb))
+        values = objects.InstanceActionEvent.pack_action_event_finish(
+            context, instance_uuid, event_name, exc_val=exc_val,
+            exc_tb=exc_tb)
+        self._put(context, 'finish', values)
+
+    def _put(self, context, event_type, values):
+        self._queue.put({'event_type': event_type,
+                         'values': values,
+                         'use_last_action': not context.project_id})
+
+    def _get_batch(self, block=True):
+        events = []
+        while len(events) < self._size:
+            try:
+                events.append(self._queue.get(block=block and not events))
+            except eventlet.queue.Empty:
+                break
+        return events
+
+    def _write(self, events):
+        try:
+            objects.InstanceActionEvent.record_events(
+                nova_context.get_admin_context(), events)
+        except Exception:
+            LOG.exception('Failed to record %d instance action events.',
+                          len(events))
+
+    def _run(self):
+        while True:
+            events = self._get_batch()
+            stop = self._STOP in events
+            events = [event for event in events if event is not self._STOP]
+            if events:
+                self._write(events)
+            if stop:
+                return
+
+    def stop(self):
+        """Record all of the queued events and stop the writer."""
+        self._queue.put(self._STOP)
+        self._writer.wait()
+        # Record anything queued by callers which raced with the stop.
+        events = self._get_batch(block=False)
+        while events:
+            self._write(events)
+            events = self._get_batch(block=False)
+
+
+# This buffer is used to record instance action events in the background
+# when [compute]instance_action_event_buffer_size is set.
+# It is initialized at ComputeManager.init_host()
+action_event_buffer = None
+
+
 class EventReporter(object):
     """Context manager to report instance action events.
 
     If constructed with ``graceful_exit=True`` the __exit__ function will
     handle and not re-raise on InstanceActionNotFound.
+
+    If the events are buffered by ``action_event_buffer`` they are recorded
+    in the background and errors recording them are only logged.
     """
 
     def __init__(self, context, event_name, host, *instance_uuids,
@@ -1372,7 +1477,12 @@ class EventReporter(object):
         self.graceful_exit = graceful_exit
 
     def __enter__(self):
+        buffer = action_event_buffer
         for uuid in self.instance_uuids:
+            if buffer is not None:
+                buffer.event_start(
+                    self.context, uuid, self.event_name, host=self.host)
+                continue
             objects.InstanceActionEvent.event_start(
                 self.context, uuid, self.event_name, want_result=False,
                 host=self.host)
@@ -1380,7 +1490,13 @@ class EventReporter(object):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        buffer = action_event_buffer
         for uuid in self.instance_uuids:
+            if buffer is not None:
+                buffer.event_finish_with_failure(
+                    self.context, uuid, self.event_name, exc_val=exc_val,
+                    exc_tb=exc_tb)
+                continue
             try:
                 objects.InstanceActionEvent.event_finish_with_failure(
                     self.context, uuid, self.event_name, exc_val=exc_val,
@@ -112,11 +112,12 @@ class ConductorManager(manager.Manager):
     namespace.  See the ComputeTaskManager class for details.
     """
 
-    target = messaging.Target(version='3.0')
+    target = messaging.Target(version='3.1')
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
                                                *args, **kwargs)
+        self.serializer = nova_object.NovaObjectSerializer()
         self.compute_task_mgr = ComputeTaskManager()
         self.additional_endpoints.append(self.compute_task_mgr)
 
@@ -164,24 +165,35 @@ class ConductorManager(manager.Manager):
                     version_manifest=object_versions)
         return result
 
-    def object_action(self, context, objinst, objmethod, args, kwargs):
+    def object_action(self, context, objinst, objmethod, args, kwargs,
+                      compress_threshold=None, delta=False):
         """Perform an action on an object."""
         oldobj = objinst.obj_clone()
         result = self._object_dispatch(objinst, objmethod, args, kwargs)
         updates = dict()
+        changes = objinst.obj_what_changed()
         # NOTE(danms): Diff the object with the one passed to us and
         # generate a list of changes to forward back
         for name, field in objinst.fields.items():
             if not objinst.obj_attr_is_set(name):
                 # Avoid demand-loading anything
                 continue
-            if (not oldobj.obj_attr_is_set(name) or
-                    getattr(oldobj, name) != getattr(objinst, name)):
-                updates[name] = field.to_primitive(objinst, name,
-                                                   getattr(objinst, name))
+            if not oldobj.obj_attr_is_set(name):
+                # NOTE: The caller keeps its own copy of the fields left out
+                # of a delta, so those are only sent back if the action
+                # changed them rather than just loaded them.
+                if delta and name not in changes:
+                    continue
+            elif getattr(oldobj, name) == getattr(objinst, name):
+                continue
+            updates[name] = field.to_primitive(objinst, name,
+                                               getattr(objinst, name))
         # This is safe since a field named this would conflict with the
         # method anyway
-        updates['obj_what_changed'] = objinst.obj_what_changed()
+        updates['obj_what_changed'] = changes
+        if compress_threshold:
+            return self.serializer.compress_entity(
+                context, (updates, result), compress_threshold)
         return updates, result
 
     def object_backport_versions(self, context, objinst, object_versions):
@@ -1509,6 +1521,61 @@ class ComputeTaskManager(base.Base):
                 with obj_target_cell(inst, cell0):
                     inst.destroy()
 
+    def _prefetch_image(self, context, build_request, request_spec,
+                        host_lists, host_mapping_cache):
+        """Ask the scheduled hosts to start caching the image being booted.
+
+        This is best effort: the image is requested with a cast to each of
+        the first ``[conductor]/image_prefetch_hosts`` hosts of every host
+        list so the download overlaps with the rest of the build, and any
+        failure is logged and otherwise ignored.
+
+        :param context: The RequestContext
+        :param build_request: The BuildRequest of the first instance; all
+            instances of a multi-create request share the same image
+        :param request_spec: The RequestSpec of the first instance
+        :param host_lists: List of lists of Selection objects returned by the
+            scheduler
+        :param host_mapping_cache: dict, keyed by host name, of HostMapping
+            objects which is updated with the mappings looked up here
+        """
+        max_hosts = CONF.conductor.image_prefetch_hosts
+        if not max_hosts:
+            return
+        # Volume-backed servers do not use the image cache.
+        if 'is_bfv' in request_spec and request_spec.is_bfv:
+            return
+        if ('image' not in request_spec or not request_spec.image or
+                'id' not in request_spec.image):
+            return
+        image_id = request_spec.image.id
+        # The image cache is populated without certificate validation, which
+        # happens when the image is downloaded for the instance.
+        instance = build_request.instance
+        if 'trusted_certs' in instance and instance.trusted_certs:
+            return
+
+        hosts = []
+        for host_list in host_lists:
+            for selection in host_list[:max_hosts]:
+                if selection.service_host not in hosts:
+                    hosts.append(selection.service_host)
+
+        for host in hosts:
+            try:
+                if host not in host_mapping_cache:
+                    host_mapping_cache[host] = (
+                        objects.HostMapping.get_by_host(context, host))
+                cell = host_mapping_cache[host].cell_mapping
+                with nova_context.target_cell(context, cell) as cctxt:
+                    self.compute_rpcapi.prefetch_image(
+                        cctxt, host, image_id)
+            except Exception as exc:
+                # The build itself deals with a missing host mapping.
+                LOG.debug('Unable to request prefetch of image %(image_id)s '
+                          'on host %(host)s: %(exc)s',
+                          {'image_id': image_id, 'host': host, 'exc': exc})
+
     def schedule_and_build_instances(self, context, build_requests,
                                      request_specs, image,
                                      admin_password, injected_files,
@@ -1532,6 +1599,9 @@ class ComputeTaskManager(base.Base):
         instances = []
         host_az = {}  # host=az cache to optimize multi-create
 
+        self._prefetch_image(context, build_requests[0], request_specs[0],
+                             host_lists, host_mapping_cache)
+
         for (build_request, request_spec, host_list) in zip(
                 build_requests, request_specs, host_lists):
             instance = build_request.get_new_instance(context)
@@ -1614,6 +1684,55 @@ class ComputeTaskManager(base.Base):
                                                   block_device_mapping, tags,
                                                   cell_mapping_cache)
 
+        def _build_and_run_instance(cell, request_spec, host, host_list,
+                                    instance, filter_props, instance_bdms):
+            try:
+                accel_uuids = self._create_and_bind_arq_for_instance(
+                        context, instance, host.nodename, request_spec)
+            except Exception as exc:
+                with excutils.save_and_reraise_exception():
+                    self._cleanup_build_artifacts(
+                        context, exc, instances, build_requests, request_specs,
+                        block_device_mapping, tags, cell_mapping_cache)
+
+            # NOTE(danms): Compute RPC expects security group names or ids
+            # not objects, so convert this to a list of names until we can
+            # pass the objects.
+            legacy_secgroups = [s.identifier
+                                for s in request_spec.security_groups]
+            with obj_target_cell(instance, cell) as cctxt:
+                self.compute_rpcapi.build_and_run_instance(
+                    cctxt, instance=instance, image=image,
+                    request_spec=request_spec,
+                    filter_properties=filter_props,
+                    admin_password=admin_password,
+                    injected_files=injected_files,
+                    requested_networks=requested_networks,
+                    security_groups=legacy_secgroups,
+                    block_device_mapping=instance_bdms,
+                    host=host.service_host, node=host.nodename,
+                    limits=host.limits, host_list=host_list,
+                    accel_uuids=accel_uuids)
+
+        def _build_and_run_batch(cell, batch):
+            instance_bdms = self._create_instance_records_bulk(
+                context, cell, [instance for (_, _, _, instance, _) in batch],
+                block_device_mapping, tags)
+            for (request_spec, host, host_list, instance,
+                    filter_props) in batch:
+                # Skip instances whose build request was deleted before
+                # their records were written.
+                if instance.uuid in instance_bdms:
+                    _build_and_run_instance(
+                        cell, request_spec, host, host_list, instance,
+                        filter_props, instance_bdms[instance.uuid])
+
+        batch_size = CONF.conductor.build_batch_size
+        # Instances waiting for their records to be written when batching,
+        # keyed by the uuid of the cell they are built in.
+        batches = collections.defaultdict(list)
+        batch_cells = {}
+
         zipped = zip(build_requests, request_specs, host_lists, instances)
         for (build_request, request_spec, host_list, instance) in zipped:
             if instance is None:
@@ -1644,6 +1763,15 @@ class ComputeTaskManager(base.Base):
                         context, exc, instances, build_requests, request_specs,
                         block_device_mapping, tags, cell_mapping_cache)
 
+            if batch_size:
+                batch_cells[cell.uuid] = cell
+                batch = batches[cell.uuid]
+                batch.append(
+                    (request_spec, host, host_list, instance, filter_props))
+                if len(batch) >= batch_size:
+                    _build_and_run_batch(cell, batches.pop(cell.uuid))
+                continue
+
             # TODO(melwitt): Maybe we should set_target_cell on the contexts
             # once we map to a cell, and remove these separate with statements.
             with obj_target_cell(instance, cell) as cctxt:
@@ -1676,33 +1804,93 @@ class ComputeTaskManager(base.Base):
                 # this one.
                 continue
 
-            try:
-                accel_uuids = self._create_and_bind_arq_for_instance(
-                        context, instance, host.nodename, request_spec)
-            except Exception as exc:
-                with excutils.save_and_reraise_exception():
-                    self._cleanup_build_artifacts(
-                        context, exc, instances, build_requests, request_specs,
-                        block_device_mapping, tags, cell_mapping_cache)
+            _build_and_run_instance(cell, request_spec, host, host_list,
+                                    instance, filter_props, instance_bdms)
 
-            # NOTE(danms): Compute RPC expects security group names or ids
-            # not objects, so convert this to a list of names until we can
-            # pass the objects.
-            legacy_secgroups = [s.identifier
-                                for s in request_spec.security_groups]
+        for cell_uuid, batch in batches.items():
+            _build_and_run_batch(batch_cells[cell_uuid], batch)
+
+    def _create_instance_records_bulk(self, context, cell, instances,
+                                      block_device_mapping, tags):
+        """Write the records of several instances created in the same cell.
+
+        This does the same as the per-instance path of
+        schedule_and_build_instances, that is it records the create instance
+        action, block device mappings and tags of each instance in the cell,
+        maps the instances to the cell and deletes their build requests, but
+        each of these steps is done for all of the instances at once.
+
+        :param context: nova auth RequestContext
+        :param cell: CellMapping of the cell the instances were created in
+        :param instances: list of Instance objects created in the cell
+        :param block_device_mapping: BlockDeviceMappingList requested for
+            each instance
+        :param tags: TagList requested for each instance, may be None
+        :returns: dict, keyed by instance uuid, of the BlockDeviceMappingList
+            of each instance which should be built; instances whose build
+            request was deleted in the meantime are destroyed and left out.
+        """
+        instance_uuids = [instance.uuid for instance in instances]
+        for instance in instances:
             with obj_target_cell(instance, cell) as cctxt:
-                self.compute_rpcapi.build_and_run_instance(
-                    cctxt, instance=instance, image=image,
-                    request_spec=request_spec,
-                    filter_properties=filter_props,
-                    admin_password=admin_password,
-                    injected_files=injected_files,
-                    requested_networks=requested_networks,
-                    security_groups=legacy_secgroups,
-                    block_device_mapping=instance_bdms,
-                    host=host.service_host, node=host.nodename,
-                    limits=host.limits, host_list=host_list,
-                    accel_uuids=accel_uuids)
+                # send a state update notification for the initial create to
+                # show it going from non-existent to BUILDING
+                # This can lazy-load attributes on instance.
+                notifications.send_update_with_states(cctxt, instance, None,
+                        vm_states.BUILDING, None, None, service="conductor")
+
+        bdms = []
+        for instance in instances:
+            LOG.debug("block_device_mapping %s", list(block_device_mapping),
+                      instance=instance)
+            instance_block_device_mapping = copy.deepcopy(
+                block_device_mapping)
+            for bdm in instance_block_device_mapping:
+                bdm.volume_size = self._volume_size(instance.flavor, bdm)
+                bdm.instance_uuid = instance.uuid
+                bdms.append(bdm)
+
+        with nova_context.target_cell(context, cell) as cctxt:
+            objects.InstanceAction.action_start_bulk(
+                cctxt, instance_uuids, instance_actions.CREATE)
+            bdms_by_instance = collections.defaultdict(
+                lambda: objects.BlockDeviceMappingList(objects=[]))
+            if bdms:
+                created = objects.BlockDeviceMappingList.update_or_create_bulk(
+                    cctxt, bdms)
+                for bdm in created:
+                    bdms_by_instance[bdm.instance_uuid].objects.append(bdm)
+            tags_by_instance = collections.defaultdict(
+                lambda: objects.TagList(objects=[]))
+            if tags:
+                instance_tags = objects.TagList.create_bulk(
+                    cctxt, instance_uuids, [tag.tag for tag in tags])
+                for tag in instance_tags:
+                    tags_by_instance[tag.resource_id].objects.append(tag)
+
+        # NOTE(mdbooth): As in the per-instance case, the instance mappings
+        # are only updated once the instance records are complete in the
+        # cell, and before the build requests are destroyed.
+        self._map_instances_to_cell(context, instances, cell)
+        destroyed = set(objects.BuildRequestList.destroy_bulk(
+            context, instance_uuids))
+
+        instance_bdms = {}
+        for instance in instances:
+            bdms = bdms_by_instance[instance.uuid]
+            # TODO(Kevin Zheng): clean this up once instance.create() handles
+            # tags; we do this so the instance.create notification in
+            # build_and_run_instance in nova-compute doesn't lazy-load tags
+            instance.tags = tags_by_instance[instance.uuid]
+            if instance.uuid in destroyed:
+                instance_bdms[instance.uuid] = bdms
+            else:
+                # The build request was deleted before/during scheduling so
+                # the instance is gone and we don't have anything to build for
+                # this one.
+                self._destroy_unbuilt_instance(context, instance, cell, bdms,
+                                               instance.tags)
+        return instance_bdms
 
     def _create_and_bind_arqs(self, context, instance_uuid, extra_specs,
                               hostname, resource_provider_mapping):
@@ -1763,6 +1951,33 @@ class ComputeTaskManager(base.Base):
         inst_mapping.save()
         return inst_mapping
 
+    @staticmethod
+    def _map_instances_to_cell(context, instances, cell):
+        """Update the instance mappings of several instances to a cell.
+
+        This is the bulk equivalent of _map_instance_to_cell().
+
+        :param context: nova auth RequestContext
+        :param instances: list of Instance objects being built
+        :param cell: CellMapping representing the cell in which the instances
+            were created and are being built.
+        """
+        instances_by_uuid = {instance.uuid: instance for instance in instances}
+        inst_mappings = objects.InstanceMappingList.get_by_instance_uuids(
+            context, list(instances_by_uuid))
+        for inst_mapping in inst_mappings:
+            if inst_mapping.cell_mapping is not None:
+                LOG.error('During scheduling instance is already mapped to '
+                          'another cell: %s. This should not happen and is an '
+                          'indication of bigger problems. If you see this you '
+                          'should report it to the nova team. Overwriting '
+                          'the mapping to point at cell %s.',
+                          inst_mapping.cell_mapping.identity, cell.identity,
+                          instance=instances_by_uuid[
+                              inst_mapping.instance_uuid])
+        objects.InstanceMappingList.set_cell_mapping_bulk(
+            context, list(instances_by_uuid), cell)
+
     def _cleanup_build_artifacts(self, context, exc, instances, build_requests,
                                  request_specs, block_device_mappings, tags,
                                  cell_mapping_cache):
@@ -1842,38 +2057,47 @@ class ComputeTaskManager(base.Base):
             build_request.destroy()
         except exception.BuildRequestNotFound:
             # This indicates an instance deletion request has been
-            # processed, and the build should halt here. Clean up the
-            # bdm, tags and instance record.
-            with obj_target_cell(instance, cell) as cctxt:
-                with compute_utils.notify_about_instance_delete(
-                        self.notifier, cctxt, instance,
-                        source=fields.NotificationSource.CONDUCTOR):
+            # processed, and the build should halt here.
+            self._destroy_unbuilt_instance(context, instance, cell,
+                                           instance_bdms, instance_tags)
+            return False
+        return True
+
+    def _destroy_unbuilt_instance(self, context, instance, cell, instance_bdms,
+                                  instance_tags):
+        """Clean up an instance whose build request was deleted by the user.
+
+        This destroys the instance record, bdms and tags created in the cell
+        before it was found that the build request is gone.
+        """
+        with obj_target_cell(instance, cell) as cctxt:
+            with compute_utils.notify_about_instance_delete(
+                    self.notifier, cctxt, instance,
+                    source=fields.NotificationSource.CONDUCTOR):
+                try:
+                    instance.destroy()
+                except exception.InstanceNotFound:
+                    pass
+                except exception.ObjectActionError:
+                    # NOTE(melwitt): Instance became scheduled during
+                    # the destroy, "host changed". Refresh and re-destroy.
                     try:
+                        instance.refresh()
                         instance.destroy()
                     except exception.InstanceNotFound:
                         pass
-                    except exception.ObjectActionError:
-                        # NOTE(melwitt): Instance became scheduled during
-                        # the destroy, "host changed". Refresh and re-destroy.
-                        try:
-                            instance.refresh()
-                            instance.destroy()
-                        except exception.InstanceNotFound:
-                            pass
-            for bdm in instance_bdms:
-                with obj_target_cell(bdm, cell):
-                    try:
-                        bdm.destroy()
-                    except exception.ObjectActionError:
-                        pass
-            if instance_tags:
-                with try_target_cell(context, cell) as target_ctxt:
-                    try:
-                        objects.TagList.destroy(target_ctxt, instance.uuid)
-                    except exception.InstanceNotFound:
-                        pass
-            return False
-        return True
+        for bdm in instance_bdms:
+            with obj_target_cell(bdm, cell):
+                try:
+                    bdm.destroy()
+                except exception.ObjectActionError:
+                    pass
+        if instance_tags:
+            with try_target_cell(context, cell) as target_ctxt:
+                try:
+                    objects.TagList.destroy(target_ctxt, instance.uuid)
+                except exception.InstanceNotFound:
+                    pass
 
     def cache_images(self, context, aggregate, image_ids):
         """Cache a set of images on the set of hosts in an aggregate.
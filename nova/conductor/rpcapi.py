@@ -198,6 +198,9 @@ class ConductorAPI(object):
     that they can handle the version_cap being set to 3.0.
 
     * Remove provider_fw_rule_get_all()
+
+    * 3.1 - Added compress_threshold and delta to object_action() which
+            also accepts compressed and delta objects
     """
 
     VERSION_ALIASES = {
@@ -217,10 +220,10 @@ class ConductorAPI(object):
         target = messaging.Target(topic=RPC_TOPIC, version='3.0')
         version_cap = self.VERSION_ALIASES.get(CONF.upgrade_levels.conductor,
                                                CONF.upgrade_levels.conductor)
-        serializer = objects_base.NovaObjectSerializer()
+        self.serializer = objects_base.NovaObjectSerializer()
         self.client = rpc.get_client(target,
                                      version_cap=version_cap,
-                                     serializer=serializer)
+                                     serializer=self.serializer)
 
     # TODO(hanlind): This method can be removed once oslo.versionedobjects
     # has been converted to use version_manifests in remotable_classmethod
@@ -243,9 +246,25 @@ class ConductorAPI(object):
                           args=args, kwargs=kwargs)
 
     def object_action(self, context, objinst, objmethod, args, kwargs):
-        cctxt = self.client.prepare()
-        return cctxt.call(context, 'object_action', objinst=objinst,
-                          objmethod=objmethod, args=args, kwargs=kwargs)
+        version = '3.1'
+        msg_args = {'objinst': objinst, 'objmethod': objmethod,
+                    'args': args, 'kwargs': kwargs}
+        threshold = CONF.rpc_compress_threshold
+        if ((CONF.rpc_object_delta or threshold) and
+                self.client.can_send_version(version)):
+            if CONF.rpc_object_delta:
+                delta = objinst.obj_to_delta_primitive(objmethod)
+                if delta is not None:
+                    msg_args['objinst'] = delta
+                    msg_args['delta'] = True
+            if threshold:
+                msg_args['objinst'] = self.serializer.compress_entity(
+                    context, msg_args['objinst'], threshold)
+                msg_args['compress_threshold'] = threshold
+        else:
+            version = '3.0'
+        cctxt = self.client.prepare(version=version)
+        return cctxt.call(context, 'object_action', **msg_args)
 
     def object_backport_versions(self, context, objinst, object_versions):
         cctxt = self.client.prepare()
@@ -346,6 +346,25 @@ minimum value for this is 100 records per batch.
 Related options:
 
 * instance_list_cells_batch_strategy
+* max_limit
+"""),
+    cfg.BoolOpt("instance_list_keyset_markers",
+        default=False,
+        help="""
+When enabled, the ``next`` links of server lists use an opaque keyset marker
+encoding the values of the sort keys of the last server in the page instead
+of the uuid of that server. The next page is then listed from each cell
+database by seeking past those values, without looking up the marker server
+in the API and cell databases first, and with a predicate that the cell
+databases can satisfy from an index for the default and common sort keys.
+This makes deep pages of large server lists considerably cheaper.
+
+Keyset markers are always accepted in the ``marker`` query parameter,
+whatever the value of this option. It is disabled by default since clients
+which use the marker from the ``next`` links as a server uuid would break.
+
+Related options:
+
 * max_limit
 """),
     cfg.BoolOpt("list_records_by_skipping_down_cells",
@@ -362,6 +381,28 @@ partial for certain requests containing those records. In those cases this
 option will be ignored. See "Handling Down Cells" section of the Compute API
 guide (https://docs.openstack.org/api-guide/compute/down_cells.html) for
 more information.
+"""),
+    cfg.IntOpt("flavor_cache_time",
+        min=0,
+        default=0,
+        help="""
+Number of seconds flavors are cached for in each process before checking
+whether they changed in the API database.
+
+When set, all the flavors, their extra specs and the projects which can access
+them are loaded from the API database into a process-local cache, which serves
+flavor lookups by id, flavor id and name, such as those made when creating,
+resizing and showing servers. Once this many seconds passed, a single query
+checks whether flavors were created, updated or deleted since, and they are
+only reloaded if so. Flavor changes made by the same process are seen at once,
+those made by other processes usually take up to this many seconds to be seen.
+As this check can miss updates made within the same second, flavors are also
+reloaded every ten times this many seconds.
+
+Possible values:
+
+* 0 (the default), to always look up flavors in the API database.
+* A number of seconds.
 """),
 ]
 
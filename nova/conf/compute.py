@@ -660,6 +660,81 @@ Possible Values:
 
 * 0 : treated as unlimited.
 * Any positive integer representing maximum concurrent builds.
+"""),
+    cfg.IntOpt('max_concurrent_block_device_setups',
+        default=0,
+        min=0,
+        help="""
+Limits the maximum number of instance builds that prepare their block devices
+concurrently on this compute node.
+
+Instance builds are split into stages: network allocation, which runs in the
+background, block device setup, fetching the image into the image cache of the
+virt driver and spawning the instance on the hypervisor. Each of the block
+device setup, image fetch and spawn stages can be limited on its own so that
+``max_concurrent_builds`` can be raised and builds can overlap, with one build
+attaching its volumes while others are spawning, without overloading the block
+storage service.
+
+Possible Values:
+
+* 0 : treated as unlimited.
+* Any positive integer representing the maximum number of builds preparing
+  block devices at the same time.
+
+Related options:
+
+* ``max_concurrent_builds``
+* ``max_concurrent_spawns``
+* ``max_concurrent_image_fetches``
+"""),
+    cfg.IntOpt('max_concurrent_spawns',
+        default=0,
+        min=0,
+        help="""
+Limits the maximum number of instance builds that spawn the instance on the
+hypervisor concurrently on this compute node.
+
+Unless ``max_concurrent_image_fetches`` is set, the image of the instance is
+downloaded from Glance while the build holds a spawn slot.
+
+Possible Values:
+
+* 0 : treated as unlimited.
+* Any positive integer representing the maximum number of builds spawning
+  instances at the same time.
+
+Related options:
+
+* ``max_concurrent_builds``
+* ``max_concurrent_block_device_setups``
+* ``max_concurrent_image_fetches``
+"""),
+    cfg.IntOpt('max_concurrent_image_fetches',
+        default=0,
+        min=0,
+        help="""
+Limits the maximum number of instance builds that fetch their image into the
+image cache of the virt driver concurrently on this compute node.
+
+When set, the image of an instance being built is downloaded from Glance
+before the build takes a spawn slot, so that ``max_concurrent_spawns`` only
+limits the work done on the hypervisor. This is only done when the virt driver
+spawns instances from its local image cache, such as the libvirt driver with
+an image backend which does not clone images, and not for instances with
+trusted image certificates, whose image is verified while spawning. Image
+downloads are still limited by ``max_concurrent_disk_ops`` too.
+
+Possible Values:
+
+* 0 : images are not fetched before spawning, the default.
+* Any positive integer representing the maximum number of builds fetching
+  images at the same time.
+
+Related options:
+
+* ``max_concurrent_spawns``
+* ``max_concurrent_disk_ops``
 """),
     cfg.IntOpt('max_concurrent_snapshots',
         default=5,
@@ -1000,6 +1075,91 @@ Related options:
 * ``[scheduler]query_placement_for_image_type_support`` - enables
   filtering computes based on supported image types, which is required
   to be enabled for this to take effect.
+"""),
+    cfg.BoolOpt('resource_tracker_lock_per_node',
+        default=False,
+        help="""
+Serialize resource tracker operations per compute node instead of per host.
+
+By default every resource claim, usage update and periodic resource audit on
+a nova-compute service is serialized behind a single host-wide lock. When a
+single service manages many compute nodes (for example the ironic driver)
+this means a claim for one node waits for the audit of every other node.
+
+When enabled, operations which only affect a single compute node take a lock
+specific to that node and the host-wide lock is only held while state shared
+by all nodes of the service (the placement provider tree and the PCI device
+tracker) is being updated.
+
+Related options:
+
+* ``[compute]update_resources_pool_size``
+"""),
+    cfg.IntOpt('update_resources_pool_size',
+        default=1,
+        min=1,
+        help="""
+Number of compute nodes audited concurrently by the update_available_resource
+periodic task.
+
+The default of 1 audits the compute nodes managed by this service one after
+the other. Services managing many compute nodes, for example with the ironic
+driver, can raise this to shorten the periodic task, which is only useful if
+``[compute]resource_tracker_lock_per_node`` is also enabled.
+
+Possible values:
+
+* Any positive integer representing greenthreads count.
+
+Related options:
+
+* ``[compute]resource_tracker_lock_per_node``
+* ``update_resources_interval``
+"""),
+    cfg.IntOpt('init_instances_pool_size',
+        default=1,
+        min=1,
+        help="""
+Number of instances initialized concurrently when the compute service starts.
+
+On startup the compute service checks the state of each of the instances on
+its host, for example to resume guests, retry interrupted reboots or clean up
+interrupted operations. The default of 1 handles the instances one after the
+other. On hosts with many instances raising this shortens the time it takes
+for the service to become ready after a restart. Each instance is still only
+ever handled by a single greenthread.
+
+Possible values:
+
+* Any positive integer representing greenthreads count.
+
+Related options:
+
+* ``resume_guests_state_on_host_boot``
+"""),
+    cfg.IntOpt('instance_action_event_buffer_size',
+        default=0,
+        min=0,
+        help="""
+Maximum number of instance action events buffered by the compute service.
+
+Instance action events, which are listed by the ``os-instance-actions`` API,
+are normally recorded through the conductor at the start and the end of every
+operation on an instance. When this is set to a positive value the events are
+queued instead and recorded in batches by a background greenthread, taking
+the database writes and conductor round trips off the path of the operations.
+Events are still recorded in the order they happened. Once this many events
+are waiting to be recorded, operations wait for room in the buffer. Buffered
+events are recorded when the compute service is stopped.
+
+Note that when the events are buffered, failures to record them, e.g. because
+the instance action they belong to cannot be found, are only logged and no
+longer fail the operation.
+
+Possible values:
+
+* 0: Record events synchronously. This is the default.
+* Any positive integer representing the maximum number of buffered events.
 """),
 ]
 
@@ -1046,6 +1206,37 @@ Possible values:
 
 * Any positive integer in seconds.
 * Any value <=0 will disable the sync. This is not recommended.
+
+Related options:
+
+* ``heal_instance_info_cache_batch_size``
+"""),
+    cfg.IntOpt('heal_instance_info_cache_batch_size',
+        default=1,
+        min=1,
+        help="""
+Number of instances whose network information cache is updated on each run
+of the cache heal task.
+
+By default the network information cache of a single instance is refreshed
+every ``heal_instance_info_cache_interval`` seconds, which on a host with many
+instances means that each cache is only refreshed every few hours. When this
+option is greater than 1, the ports, networks, subnets and floating IPs of up
+to this many instances are retrieved from Neutron with a handful of bulk
+requests and the cache of each of those instances is rebuilt from them, so
+that the caches are refreshed more often without increasing the number of
+requests made to Neutron.
+
+Possible values:
+
+* 1 (default): Refresh the cache of one instance per run, querying Neutron
+  for each of its resources individually.
+* Any integer greater than 1: Refresh the caches of up to this many instances
+  per run using bulk Neutron requests.
+
+Related options:
+
+* ``heal_instance_info_cache_interval``
 """),
     cfg.IntOpt('reclaim_instance_interval',
         default=0,
@@ -1449,6 +1640,55 @@ Possible values:
   default)
 * A string with a list of named database columns, for example ``%(id)d``
   or ``%(uuid)s`` or ``%(hostname)s``.
+"""),
+    cfg.BoolOpt('compress_network_info_cache',
+        default=False,
+        help="""
+Store the network information cache of instances compressed.
+
+The network information cache of an instance with many ports is a large JSON
+document which is read from the database with most instance queries. When
+enabled, caches written by this service are stored zlib compressed, which
+makes them several times smaller. Caches are always sent over RPC
+uncompressed, and both forms are always read.
+
+Only enable this once all services which access the main or cell databases
+have been upgraded to a release that can read compressed caches, since older
+services fail to read them.
+
+Possible values:
+
+* ``False`` (default): Store network information caches as plain JSON.
+* ``True``: Store network information caches compressed.
+"""),
+    cfg.StrOpt('instance_name_trigrams',
+        default='disabled',
+        choices=[
+            ('disabled', 'Do not maintain or use the instance name trigram '
+             'index'),
+            ('maintain', 'Maintain the instance name trigram index when '
+             'instances are created or renamed'),
+            ('search', 'Maintain the instance name trigram index and use it '
+             'to narrow down searches for server names'),
+        ],
+        help="""
+Maintain and use an index of the trigrams of instance names.
+
+Listing servers filtered by a name which is neither anchored at the start nor
+at the end, like ``?name=web``, requires matching the name of every instance
+of the cell databases against the regular expression. With this index, the
+instances whose name contains all the (case-folded) trigrams of the name
+searched for are found from the index first, and only those are matched
+against the regular expression, so the results are the same.
+
+To enable the index, set this to ``maintain`` on all the services which
+access the cell databases, run ``nova-manage db online_data_migrations`` to
+index the existing instances, and then set this to ``search`` on the API
+services. Searching with an incomplete index would miss instances.
+
+Names anchored at the start or at both ends, like ``?name=^web`` or
+``?name=^web-1$``, are always narrowed down with an indexed prefix or
+equality match, whatever the value of this option.
 """),
 ]
 
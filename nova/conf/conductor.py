@@ -31,6 +31,53 @@ ALL_OPTS = [
         help="""
 Number of workers for OpenStack Conductor service. The default will be the
 number of CPUs available.
+"""),
+    cfg.IntOpt(
+        'image_prefetch_hosts',
+        default=0,
+        min=0,
+        help="""
+Number of scheduled hosts per instance to ask to prefetch the image.
+
+Once the scheduler has picked a host and its alternates for a new instance,
+the conductor can ask those compute hosts to start downloading the image into
+their image cache, so the download overlaps with the database work done before
+the build request reaches the compute host. The request is a fire-and-forget
+cast; failures do not affect the build.
+
+Possible values:
+
+* 0: Disabled (default)
+* 1: Prefetch on the selected host only
+* Any integer greater than 1: Prefetch on the selected host and up to this
+  many hosts in total, taking alternate hosts in the order the scheduler
+  returned them
+
+Related options:
+
+* ``[image_cache] subdirectory_name``: the compute service caches the
+  prefetched image the same way it does for spawning instances.
+"""),
+    cfg.IntOpt(
+        'build_batch_size',
+        default=0,
+        min=0,
+        help="""
+Number of instances of a multi-create request whose records are written
+together.
+
+After scheduling, the conductor records the instance action, block device
+mappings and tags of each new instance in its cell database, maps it to the
+cell and deletes its build request in the API database before sending it to
+the compute host. When this is set, those writes are grouped per cell into
+batches of up to this many instances, which reduces the number of database
+transactions for large multi-create requests. Each instance of a batch is
+sent to its compute host once the writes for the batch have completed.
+
+Possible values:
+
+* 0: Write the records of each instance separately (default)
+* Any positive integer: Maximum number of instances per batch
 """),
 ]
 
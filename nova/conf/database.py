@@ -86,9 +86,107 @@ api_db_opts = [
     # TODO(markus_z): We should probably default this to 30 to not rely on the
     # SQLAlchemy default. Otherwise we wouldn't provide a stable default.
     cfg.IntOpt('pool_timeout',
-        help='')
+        help=''),
+    cfg.FloatOpt('replica_max_lag',
+        min=0,
+        help="""
+Maximum number of seconds the slave API database may lag behind for
+replica-safe reads to be routed to it.
+
+Reads of the API database which are marked as replica-safe, such as looking up
+the cells of a project when listing servers, are sent to
+``[api_database]/slave_connection`` automatically as long as it reports lagging
+less than this behind. Reads made for a request which has written to the
+database in the meantime are never routed to it, so that requests read their
+own writes. Slave databases whose replication has stopped are never routed to,
+while those which do not report any replication status, such as databases
+other than MySQL and PostgreSQL, are assumed to be up to date.
+
+As replica-safe reads may return data up to this many seconds old, only set
+this for the services which can afford it, such as ``nova-api``.
+
+Possible values:
+
+* Unset (the default), to never route reads to the slave database
+  automatically.
+* A number of seconds.
+
+Related options:
+
+* ``[api_database]/slave_connection``
+* ``[database]/replica_max_lag``
+"""),
 ]  # noqa
 
+db_opts = [
+    cfg.FloatOpt('replica_max_lag',
+        min=0,
+        help="""
+Maximum number of seconds the slave database may lag behind for replica-safe
+reads to be routed to it.
+
+Reads of the database which are marked as replica-safe, such as listing and
+showing servers, listing hypervisors and instance actions, server usage audits
+and loading host states in the scheduler, are sent to
+``[database]/slave_connection`` automatically as long as it reports lagging
+less than this behind. Reads made for a request which has written to the
+database in the meantime are never routed to it, so that requests read their
+own writes. Slave databases whose replication has stopped are never routed to,
+while those which do not report any replication status, such as databases
+other than MySQL and PostgreSQL, are assumed to be up to date.
+
+As replica-safe reads may return data up to this many seconds old, only set
+this for the services which can afford it, such as ``nova-api`` and
+``nova-scheduler``.
+
+Possible values:
+
+* Unset (the default), to never route reads to the slave database
+  automatically.
+* A number of seconds.
+
+Related options:
+
+* ``[database]/slave_connection``
+* ``[api_database]/replica_max_lag``
+"""),
+    cfg.BoolOpt('query_stats',
+        default=False,
+        help="""
+Log the SQL queries run against the databases for each request.
+
+When enabled, the number of queries run for each request against the main,
+API and cell databases, the number of rows they returned or changed and the
+time they took are counted, and a summary is logged at INFO level at the end
+of each API request, RPC message and run of periodic tasks, or otherwise when
+the greenthread which handled the request exits.
+Statements run more than ``[database]/query_stats_repeat_threshold`` times for
+the same request are logged at WARNING level as possible N+1 query patterns.
+
+This adds some overhead to each query and is meant for troubleshooting.
+
+Related options:
+
+* ``[database]/query_stats_repeat_threshold``
+* ``[profiler]/trace_sqlalchemy``
+"""),
+    cfg.IntOpt('query_stats_repeat_threshold',
+        default=10,
+        min=1,
+        help="""
+Number of times a statement may run for a request before it is logged as a
+possible N+1 query pattern.
+
+Possible values:
+
+* A positive integer.
+
+Related options:
+
+* ``[database]/query_stats``
+"""),
+]
+
 
 def enrich_help_text(alt_db_opts):
 
@@ -108,6 +206,7 @@ def enrich_help_text(alt_db_opts):
 
 def register_opts(conf):
     conf.register_opts(api_db_opts, group=api_db_group)
+    conf.register_opts(db_opts, group='database')
 
 
 def list_opts():
@@ -124,4 +223,5 @@ def list_opts():
         _ENRICHED = True
     return {
         api_db_group: api_db_opts,
+        'database': db_opts,
     }
@@ -105,6 +105,64 @@ If enabled, include block device information in the versioned notification
 payload. Sending block device information is disabled by default as providing
 that information can incur some overhead on the system since the information
 may need to be loaded from the database.
+"""),
+    cfg.ListOpt(
+        'excluded_event_types',
+        default=[],
+        help="""
+Event types of notifications which shall not be emitted.
+
+Each entry is a shell-style pattern matched against the event type, for
+example ``instance.update`` or ``compute.instance.exists``. Both versioned and
+legacy unversioned event types can be listed, and ``instance.*.start`` style
+wildcards are supported. The payload of an excluded notification is not
+built, so excluding notifications nobody consumes saves the work of building
+them as well as sending them.
+
+The list of versioned notifications is visible in
+https://docs.openstack.org/nova/latest/reference/notifications.html
+"""),
+    cfg.IntOpt(
+        'send_queue_size',
+        default=0,
+        min=0,
+        help="""
+Maximum number of notifications waiting to be sent in the background.
+
+By default notifications are sent to the message bus by the code emitting
+them, which adds the time it takes to send them to the operation. When this
+is set to a positive value, notifications are queued instead and sent from a
+background greenthread. What happens when the queue is full is controlled by
+``send_queue_overflow_policy``. Queued notifications are sent when the
+service is stopped.
+
+This is meant for the services running under eventlet, like
+``nova-compute`` and ``nova-conductor``.
+
+Possible values:
+
+* 0: Send notifications synchronously. This is the default.
+* Any positive integer representing the maximum number of queued
+  notifications.
+
+Related options:
+
+* ``send_queue_overflow_policy``
+"""),
+    cfg.StrOpt(
+        'send_queue_overflow_policy',
+        default='block',
+        choices=[
+            ('block', 'Wait until there is room in the queue for the '
+             'notification'),
+            ('drop', 'Drop the notification and log a warning'),
+        ],
+        help="""
+What to do with a notification when the send queue is full.
+
+Related options:
+
+* ``send_queue_size``
 """)
 ]
 
@@ -37,6 +37,45 @@ Operations with RPC calls that utilize this value:
 Related options:
 
 * rpc_response_timeout
+"""),
+    cfg.BoolOpt("rpc_object_delta",
+        default=False,
+        help="""
+Send only the changed fields of an object for remote object actions.
+
+When a service without database access calls a remotable object method
+through nova-conductor, the whole object is normally sent. If this is
+enabled, objects which support it, such as instances being saved, only send
+the fields which have changed along with those the method and its
+notifications read. Only those fields and any the method changes are then
+returned. This is only done once nova-conductor is new enough to support it,
+according to the ``[upgrade_levels] conductor`` setting.
+
+Related options:
+
+* rpc_compress_threshold
+"""),
+    cfg.IntOpt("rpc_compress_threshold",
+        default=0,
+        min=0,
+        help="""
+Size in bytes above which remote object actions are compressed.
+
+When a service without database access calls a remotable object method
+through nova-conductor, the object sent and the updates returned are
+compressed with zlib if their serialized size is larger than this. This
+trades conductor and compute CPU time for smaller RPC messages. This is only
+done once nova-conductor is new enough to support it, according to the
+``[upgrade_levels] conductor`` setting.
+
+Possible values:
+
+* 0: Disables compression, the default.
+* Any positive integer in bytes.
+
+Related options:
+
+* rpc_object_delta
 """),
 ]
 
@@ -133,6 +133,11 @@ class RequestContext(context.RequestContext):
         self.mq_connection = None
         self.cell_uuid = None
 
+        # NOTE: Set by API handlers whose reads can be served by the slave
+        # database, see nova.db.api.replica_safe_on_request. It is not
+        # sent over RPC.
+        self.allow_replica_reads = False
+
         self.user_auth_plugin = user_auth_plugin
         if self.is_admin is None:
             self.is_admin = policy.check_is_admin(self)
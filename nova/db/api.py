@@ -91,6 +91,29 @@ def select_db_reader_mode(f):
     return IMPL.select_db_reader_mode(f)
 
 
+def replica_safe(f):
+    """Decorator marking a select_db_reader_mode reader as replica-safe.
+
+    Replica-safe readers are routed to the slave database when
+    [database]/replica_max_lag allows, even without 'use_slave'.
+    """
+    return IMPL.replica_safe(f)
+
+
+def replica_safe_on_request(f):
+    """Decorator marking a reader as replica-safe for requests allowing it.
+
+    These readers are only routed to the slave database for requests whose
+    RequestContext.allow_replica_reads is set.
+    """
+    return IMPL.replica_safe_on_request(f)
+
+
+def report_query_stats(request_id):
+    """Log the SQL queries run for a request, see [database]/query_stats."""
+    return IMPL.report_query_stats(request_id)
+
+
 ###################
 
 
@@ -258,14 +281,28 @@ def compute_node_get_by_nodename(context, hypervisor_hostname):
     return IMPL.compute_node_get_by_nodename(context, hypervisor_hostname)
 
 
-def compute_node_get_all(context):
+def compute_node_get_all(context, columns=None):
     """Get all computeNodes.
 
     :param context: The security context
+    :param columns: The names of the columns to return, all of them if None
 
     :returns: List of dictionaries each containing compute node properties
     """
-    return IMPL.compute_node_get_all(context)
+    return IMPL.compute_node_get_all(context, columns=columns)
+
+
+def compute_node_get_all_by_ids(context, compute_ids, columns=None):
+    """Get compute nodes by their ids.
+
+    :param context: The security context
+    :param compute_ids: The ids of the compute nodes
+    :param columns: The names of the columns to return, all of them if None
+
+    :returns: List of dictionaries each containing compute node properties
+    """
+    return IMPL.compute_node_get_all_by_ids(context, compute_ids,
+                                            columns=columns)
 
 
 def compute_node_get_all_mapped_less_than(context, mapped_less_than):
@@ -281,17 +318,20 @@ def compute_node_get_all_mapped_less_than(context, mapped_less_than):
                                                       mapped_less_than)
 
 
-def compute_node_get_all_by_pagination(context, limit=None, marker=None):
+def compute_node_get_all_by_pagination(context, limit=None, marker=None,
+                                       columns=None):
     """Get compute nodes by pagination.
     :param context: The security context
     :param limit: Maximum number of items to return
     :param marker: The last item of the previous page, the next results after
                    this value will be returned
+    :param columns: The names of the columns to return, all of them if None
 
     :returns: List of dictionaries each containing compute node properties
     """
     return IMPL.compute_node_get_all_by_pagination(context,
-                                                   limit=limit, marker=marker)
+                                                   limit=limit, marker=marker,
+                                                   columns=columns)
 
 
 def compute_node_get_all_by_host(context, host):
@@ -596,15 +636,19 @@ def instance_get_all_by_filters(context, filters, sort_key='created_at',
 
 def instance_get_all_by_filters_sort(context, filters, limit=None,
                                      marker=None, columns_to_join=None,
-                                     sort_keys=None, sort_dirs=None):
+                                     sort_keys=None, sort_dirs=None,
+                                     marker_values=None):
     """Get all instances that match all filters sorted by multiple keys.
 
-    sort_keys and sort_dirs must be a list of strings.
+    sort_keys and sort_dirs must be a list of strings. If marker_values is
+    given it is a list of values for the leading sort keys and only the
+    instances sorted after those values are returned, without looking up a
+    marker instance.
     """
     return IMPL.instance_get_all_by_filters_sort(
         context, filters, limit=limit, marker=marker,
         columns_to_join=columns_to_join, sort_keys=sort_keys,
-        sort_dirs=sort_dirs)
+        sort_dirs=sort_dirs, marker_values=marker_values)
 
 
 def instance_get_by_sort_filters(context, sort_keys, sort_dirs, values):
@@ -883,6 +927,13 @@ def block_device_mapping_update_or_create(context, values, legacy=True):
     return IMPL.block_device_mapping_update_or_create(context, values, legacy)
 
 
+def block_device_mapping_update_or_create_bulk(context, values_list,
+                                               legacy=True):
+    """Update or create several block device mappings in one transaction."""
+    return IMPL.block_device_mapping_update_or_create_bulk(
+        context, values_list, legacy)
+
+
 def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids):
     """Get all block device mapping belonging to a list of instances."""
     return IMPL.block_device_mapping_get_all_by_instance_uuids(context,
@@ -1184,6 +1235,11 @@ def action_start(context, values):
     return IMPL.action_start(context, values)
 
 
+def action_start_bulk(context, values_list):
+    """Start an action for each of several instances."""
+    return IMPL.action_start_bulk(context, values_list)
+
+
 def action_finish(context, values):
     """Finish an action for an instance."""
     return IMPL.action_finish(context, values)
@@ -1210,6 +1266,11 @@ def action_event_finish(context, values):
     return IMPL.action_event_finish(context, values)
 
 
+def action_events_record(context, events):
+    """Start and finish a batch of instance action events."""
+    return IMPL.action_events_record(context, events)
+
+
 def action_events_get(context, action_id):
     """Get the events by action id."""
     return IMPL.action_events_get(context, action_id)
@@ -1313,6 +1374,36 @@ def archive_deleted_rows(context=None, max_rows=None, before=None):
                                      before=before)
 
 
+def archive_deleted_rows_table_groups(context=None):
+    """Return the tables archive_deleted_rows() archives, in groups.
+
+    The tables of a group can be archived concurrently, once the tables of
+    all of the previous groups have been archived.
+
+    :param context: nova.context.RequestContext for database access
+    :returns: A list of lists of table names, in the order to archive them
+    """
+    return IMPL.archive_deleted_rows_table_groups(context=context)
+
+
+def archive_deleted_rows_for_table(context, tablename, max_rows, before=None):
+    """Move up to max_rows rows from a production table to its shadow table.
+
+    :param context: nova.context.RequestContext for database access
+    :param tablename: The name of the table to archive rows of
+    :param max_rows: Maximum number of rows to archive
+    :param before: optional datetime which when specified filters the records
+        to only archive those records deleted before the given date
+    :returns: 2-item tuple:
+
+        - number of rows that were archived
+        - list of UUIDs of instances that were archived, if tablename is
+          instances
+    """
+    return IMPL.archive_deleted_rows_for_table(context, tablename, max_rows,
+                                               before=before)
+
+
 def pcidevice_online_data_migration(context, max_count):
     return IMPL.pcidevice_online_data_migration(context, max_count)
 
@@ -1330,6 +1421,11 @@ def instance_tag_set(context, instance_uuid, tags):
     return IMPL.instance_tag_set(context, instance_uuid, tags)
 
 
+def instance_tag_set_bulk(context, instance_uuids, tags):
+    """Replace the tags of several instances with the same list of tags."""
+    return IMPL.instance_tag_set_bulk(context, instance_uuids, tags)
+
+
 def instance_tag_get_by_instance_uuid(context, instance_uuid):
     """Get all tags for a given instance."""
     return IMPL.instance_tag_get_by_instance_uuid(context, instance_uuid)
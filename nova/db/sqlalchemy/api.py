@@ -23,7 +23,10 @@ import datetime
 import functools
 import inspect
 import sys
+import time
 
+from eventlet import greenthread
+from oslo_context import context as common_context
 from oslo_db import api as oslo_db_api
 from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import enginefacade
@@ -78,6 +81,25 @@ LOG = logging.getLogger(__name__)
 main_context_manager = enginefacade.transaction_context()
 api_context_manager = enginefacade.transaction_context()
 
+# NOTE: The time.monotonic() time of the last write made for each request ID,
+# oldest first, for replica-safe readers to read the writes of their request.
+_REQUEST_WRITES = {}
+# NOTE: The (time.monotonic() time, lag) last measured for each slave engine.
+_REPLICA_LAGS = {}
+# The number of seconds replication lags are measured for.
+_REPLICA_LAG_CACHE_TIME = 1
+# The replica_safe attribute of readers marked with replica_safe_on_request.
+_REPLICA_SAFE_ON_REQUEST = 'on_request'
+# NOTE: The _QueryStats of each request ID, oldest first, see
+# _instrument_queries().
+_QUERY_STATS = {}
+# The maximum number of requests queries are counted for at a time.
+_QUERY_STATS_MAX_REQUESTS = 1000
+# The maximum number of instances _instances_fill_metadata() queries the
+# manually-joined tables for at a time, to keep the IN lists of the queries to
+# a size databases handle well.
+_FILL_METADATA_BATCH_SIZE = 1000
+
 
 def _get_db_conf(conf_group, connection=None):
     kw = dict(conf_group.items())
@@ -106,6 +128,10 @@ def _joinedload_all(column):
 def configure(conf):
     main_context_manager.configure(**_get_db_conf(conf.database))
     api_context_manager.configure(**_get_db_conf(conf.api_database))
+    main_context_manager.append_on_engine_create(_track_request_writes)
+    api_context_manager.append_on_engine_create(_track_request_writes)
+    main_context_manager.append_on_engine_create(_instrument_queries)
+    api_context_manager.append_on_engine_create(_instrument_queries)
 
     if profiler_sqlalchemy and CONF.profiler.enabled \
             and CONF.profiler.trace_sqlalchemy:
@@ -123,6 +149,8 @@ def create_context_manager(connection=None):
     """
     ctxt_mgr = enginefacade.transaction_context()
     ctxt_mgr.configure(**_get_db_conf(CONF.database, connection=connection))
+    ctxt_mgr.append_on_engine_create(_track_request_writes)
+    ctxt_mgr.append_on_engine_create(_instrument_queries)
     return ctxt_mgr
 
 
@@ -185,6 +213,8 @@ def select_db_reader_mode(f):
     The kwarg argument 'use_slave' defines reader mode. Asynchronous reader
     will be used if 'use_slave' is True and synchronous reader otherwise.
     If 'use_slave' is not specified default value 'False' will be used.
+    Asynchronous reader is also used by replica-safe readers when
+    [database]/replica_max_lag allows, see replica_safe.
 
     Wrapped function must have a context in the arguments.
     """
@@ -197,7 +227,9 @@ def select_db_reader_mode(f):
         context = keyed_args['context']
         use_slave = keyed_args.get('use_slave', False)
 
-        if use_slave:
+        if use_slave or _is_replica_safe(f, context) and _use_replica(
+                context, get_context_manager(context),
+                CONF.database.replica_max_lag):
             reader_mode = get_context_manager(context).async_
         else:
             reader_mode = get_context_manager(context).reader
@@ -207,6 +239,244 @@ def select_db_reader_mode(f):
     return wrapper
 
 
+def _replica_max_lag():
+    lags = [lag for lag in (CONF.database.replica_max_lag,
+                            CONF.api_database.replica_max_lag)
+            if lag is not None]
+    return max(lags) if lags else None
+
+
+def _track_request_writes(engine):
+    """Record when requests write to the database through an engine.
+
+    Replica-safe readers only read from slave databases which have caught up
+    with the writes of their request, see _use_replica(). The request is the
+    one of the current RequestContext, whichever database it writes to.
+    """
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        if not (context.isinsert or context.isupdate or context.isdelete):
+            return
+        max_lag = _replica_max_lag()
+        request_context = common_context.get_current()
+        if (max_lag is None or request_context is None or
+                not request_context.request_id):
+            return
+        now = time.monotonic()
+        _REQUEST_WRITES.pop(request_context.request_id, None)
+        _REQUEST_WRITES[request_context.request_id] = now
+        # Forget about the writes which slave databases lagging at most
+        # max_lag seconds behind have by now.
+        for request_id, written_at in list(_REQUEST_WRITES.items()):
+            if now - written_at <= max_lag:
+                break
+            del _REQUEST_WRITES[request_id]
+
+    sa.event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+class _QueryStats(object):
+    """The SQL queries run for a request, see _instrument_queries()."""
+
+    def __init__(self, thread_request_ids):
+        self.queries = 0
+        self.rows = 0
+        self.time = 0.0
+        self.statements = collections.Counter()
+        # The IDs of the requests counted for the greenthread which ran the
+        # first query of this request.
+        self.thread_request_ids = thread_request_ids
+
+
+def _report_thread_query_stats(thread_request_ids):
+    for request_id in list(thread_request_ids):
+        report_query_stats(request_id)
+
+
+def _instrument_queries(engine):
+    """Count the SQL queries run through an engine per request.
+
+    When [database]/query_stats is enabled, the queries, rows and time are
+    counted for the request of the current RequestContext until
+    report_query_stats() is called for it. This is done at the end of each API
+    request, RPC message and run of periodic tasks, and otherwise when the
+    greenthread which ran the first query of the request exits. At most
+    _QUERY_STATS_MAX_REQUESTS requests are followed at a time, the oldest being
+    reported early if needed.
+    """
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        if CONF.database.query_stats:
+            context._nova_query_started_at = time.monotonic()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        started_at = getattr(context, '_nova_query_started_at', None)
+        request_context = common_context.get_current()
+        if (started_at is None or request_context is None or
+                not request_context.request_id):
+            return
+        request_id = request_context.request_id
+        stats = _QUERY_STATS.get(request_id)
+        if stats is None:
+            current = greenthread.getcurrent()
+            thread_request_ids = getattr(
+                current, '_nova_query_stats_request_ids', None)
+            if thread_request_ids is None:
+                # NOTE: Long-lived greenthreads, such as the ones dispatching
+                # RPC messages, run many requests, so the callback reporting
+                # their remaining requests is only linked once per thread.
+                thread_request_ids = set()
+                if hasattr(current, 'link'):
+                    current.link(lambda gt: _report_thread_query_stats(
+                        thread_request_ids))
+                current._nova_query_stats_request_ids = thread_request_ids
+            thread_request_ids.add(request_id)
+            stats = _QUERY_STATS[request_id] = _QueryStats(thread_request_ids)
+            while len(_QUERY_STATS) > _QUERY_STATS_MAX_REQUESTS:
+                report_query_stats(next(iter(_QUERY_STATS)))
+        stats.queries += 1
+        # NOTE: Some drivers do not report the number of rows selected.
+        stats.rows += max(cursor.rowcount, 0)
+        stats.time += time.monotonic() - started_at
+        stats.statements[statement] += 1
+
+    sa.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    sa.event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def report_query_stats(request_id):
+    """Log the SQL queries counted for a request and stop counting them.
+
+    See [database]/query_stats.
+
+    :param request_id: The ID of the request
+    :returns: The _QueryStats of the request, or None if no queries were
+        counted for it
+    """
+    stats = _QUERY_STATS.pop(request_id, None)
+    if stats is None:
+        return None
+    stats.thread_request_ids.discard(request_id)
+    LOG.info('Request %(request_id)s ran %(queries)d SQL queries affecting '
+             '%(rows)d rows in %(time).3fs',
+             {'request_id': request_id, 'queries': stats.queries,
+              'rows': stats.rows, 'time': stats.time})
+    threshold = CONF.database.query_stats_repeat_threshold
+    for statement, count in stats.statements.most_common():
+        if count <= threshold:
+            break
+        LOG.warning('Request %(request_id)s ran the same SQL statement '
+                    '%(count)d times, this may be an N+1 query pattern: '
+                    '%(statement)s',
+                    {'request_id': request_id, 'count': count,
+                     'statement': statement})
+    return stats
+
+
+def _replica_lag(ctxt_mgr):
+    """Return how many seconds the slave database lags behind at most.
+
+    The lag is measured at most once per _REPLICA_LAG_CACHE_TIME seconds, the
+    time since it was measured being added to it.
+
+    :param ctxt_mgr: The database context manager of the database
+    :returns: The replication lag in seconds, infinite if replication has
+        stopped, 0 if the slave database does not report it, or None if no
+        slave connection is configured
+    """
+    engine = ctxt_mgr.writer.get_engine()
+    slave_engine = ctxt_mgr.reader.get_engine()
+    if slave_engine is engine:
+        return None
+    now = time.monotonic()
+    measured_at, lag = _REPLICA_LAGS.get(slave_engine, (None, None))
+    if measured_at is None or now - measured_at > _REPLICA_LAG_CACHE_TIME:
+        try:
+            lag = _replication_lag(engine, slave_engine) or 0
+        except db_exc.DBError:
+            LOG.warning('Unable to get the replication lag of the slave '
+                        'database, not routing reads to it.', exc_info=True)
+            lag = float('inf')
+        measured_at = now
+        _REPLICA_LAGS[slave_engine] = (measured_at, lag)
+    return lag + now - measured_at
+
+
+def _use_replica(context, ctxt_mgr, max_lag):
+    """Return whether a replica-safe read can use the slave database.
+
+    That is if the slave database lags at most max_lag seconds behind and has
+    caught up with the writes made for the request of the context.
+
+    :param context: The RequestContext of the read
+    :param ctxt_mgr: The database context manager of the database
+    :param max_lag: The maximum lag of the slave database in seconds, or None
+        if replica-safe reads should not use it
+    """
+    if max_lag is None:
+        return False
+    lag = _replica_lag(ctxt_mgr)
+    if lag is None or lag > max_lag:
+        return False
+    written_at = _REQUEST_WRITES.get(getattr(context, 'request_id', None))
+    return written_at is None or time.monotonic() - written_at > lag
+
+
+def replica_safe(f):
+    """Decorator marking a reader as replica-safe.
+
+    Replica-safe readers tolerate reading data up to
+    [database]/replica_max_lag (or [api_database]/replica_max_lag) seconds
+    old, and so are routed to the slave database when _use_replica() allows.
+    It must be applied below select_db_reader_mode,
+    pick_context_manager_reader_allow_async or pick_api_context_manager_reader
+    for them to route the reader, and the reader can only call other readers
+    which allow asynchronous reads.
+    """
+    f.replica_safe = True
+    return f
+
+
+def replica_safe_on_request(f):
+    """Decorator marking a reader as replica-safe for some requests only.
+
+    Such readers are shared by callers which must see the latest data, so
+    they are only routed like replica_safe readers for requests whose
+    RequestContext.allow_replica_reads is set, such as server list and show.
+    """
+    f.replica_safe = _REPLICA_SAFE_ON_REQUEST
+    return f
+
+
+def _is_replica_safe(f, context):
+    replica_safe = getattr(f, 'replica_safe', False)
+    if replica_safe == _REPLICA_SAFE_ON_REQUEST:
+        return getattr(context, 'allow_replica_reads', False)
+    return replica_safe
+
+
+def pick_api_context_manager_reader(f):
+    """Decorator to use a reader API db context manager.
+
+    Replica-safe readers are routed to the slave API database when
+    [api_database]/replica_max_lag allows.
+
+    Wrapped function must have a RequestContext in the arguments.
+    """
+    @functools.wraps(f)
+    def wrapped(context, *args, **kwargs):
+        if _is_replica_safe(f, context) and _use_replica(
+                context, api_context_manager,
+                CONF.api_database.replica_max_lag):
+            reader_mode = api_context_manager.async_
+        else:
+            reader_mode = api_context_manager.reader
+        with reader_mode.using(context):
+            return f(context, *args, **kwargs)
+    return wrapped
+
+
 def pick_context_manager_writer(f):
     """Decorator to use a writer db context manager.
 
@@ -240,14 +510,21 @@ def pick_context_manager_reader(f):
 def pick_context_manager_reader_allow_async(f):
     """Decorator to use a reader.allow_async db context manager.
 
-    The db context manager will be picked from the RequestContext.
+    The db context manager will be picked from the RequestContext. Replica-safe
+    readers are routed to the slave database when [database]/replica_max_lag
+    allows, see replica_safe.
 
     Wrapped function must have a RequestContext in the arguments.
     """
     @functools.wraps(f)
     def wrapped(context, *args, **kwargs):
         ctxt_mgr = get_context_manager(context)
-        with ctxt_mgr.reader.allow_async.using(context):
+        if _is_replica_safe(f, context) and _use_replica(
+                context, ctxt_mgr, CONF.database.replica_max_lag):
+            reader_mode = ctxt_mgr.async_
+        else:
+            reader_mode = ctxt_mgr.reader.allow_async
+        with reader_mode.using(context):
             return f(context, *args, **kwargs)
     return wrapped
 
@@ -562,17 +839,23 @@ def service_update(context, service_id, values):
 ###################
 
 
-def _compute_node_select(context, filters=None, limit=None, marker=None):
+def _compute_node_select(context, filters=None, limit=None, marker=None,
+                         columns=None):
     if filters is None:
         filters = {}
 
     cn_tbl = sa.alias(models.ComputeNode.__table__, name='cn')
-    select = sa.select([cn_tbl])
+    if columns is None:
+        select = sa.select([cn_tbl])
+    else:
+        select = sa.select([cn_tbl.c[column] for column in columns])
 
     if context.read_deleted == "no":
         select = select.where(cn_tbl.c.deleted == 0)
     if "compute_id" in filters:
         select = select.where(cn_tbl.c.id == filters["compute_id"])
+    if "compute_ids" in filters:
+        select = select.where(cn_tbl.c.id.in_(filters["compute_ids"]))
     if "service_id" in filters:
         select = select.where(cn_tbl.c.service_id == filters["service_id"])
     if "host" in filters:
@@ -596,9 +879,13 @@ def _compute_node_select(context, filters=None, limit=None, marker=None):
     return select
 
 
-def _compute_node_fetchall(context, filters=None, limit=None, marker=None):
-    select = _compute_node_select(context, filters, limit=limit, marker=marker)
-    engine = get_engine(context=context)
+def _compute_node_fetchall(context, filters=None, limit=None, marker=None,
+                           columns=None):
+    select = _compute_node_select(context, filters, limit=limit, marker=marker,
+                                  columns=columns)
+    # NOTE: Use the engine of the transaction in progress, which is the one of
+    # the slave database for asynchronous readers.
+    engine = context.session.get_bind()
     conn = engine.connect()
 
     results = conn.execute(select).fetchall()
@@ -663,9 +950,16 @@ def compute_node_get_all_by_host(context, host):
     return results
 
 
+@pick_context_manager_reader_allow_async
+@replica_safe
+def compute_node_get_all(context, columns=None):
+    return _compute_node_fetchall(context, columns=columns)
+
+
 @pick_context_manager_reader
-def compute_node_get_all(context):
-    return _compute_node_fetchall(context)
+def compute_node_get_all_by_ids(context, compute_ids, columns=None):
+    return _compute_node_fetchall(context, {"compute_ids": compute_ids},
+                                  columns=columns)
 
 
 @pick_context_manager_reader
@@ -674,9 +968,12 @@ def compute_node_get_all_mapped_less_than(context, mapped_less_than):
                                   {'mapped': mapped_less_than})
 
 
-@pick_context_manager_reader
-def compute_node_get_all_by_pagination(context, limit=None, marker=None):
-    return _compute_node_fetchall(context, limit=limit, marker=marker)
+@pick_context_manager_reader_allow_async
+@replica_safe
+def compute_node_get_all_by_pagination(context, limit=None, marker=None,
+                                       columns=None):
+    return _compute_node_fetchall(context, limit=limit, marker=marker,
+                                  columns=columns)
 
 
 @pick_context_manager_reader
@@ -1133,6 +1430,10 @@ def instance_create(context, values):
     instance_ref.security_groups = sg_models
     context.session.add(instance_ref)
 
+    if CONF.instance_name_trigrams != 'disabled':
+        _instance_name_trigrams_set(context, instance_ref['uuid'],
+                                    values.get('display_name'), replace=False)
+
     # create the instance uuid to ec2_id mapping entry for instance
     ec2_instance_create(context, instance_ref['uuid'])
 
@@ -1209,6 +1510,10 @@ def instance_destroy(context, instance_uuid, constraint=None,
                 action_id=action.id).delete()
         context.session.query(models.InstanceAction).filter_by(
             instance_uuid=instance_uuid).delete()
+        # NOTE: Instance name trigrams are otherwise removed when the
+        # instance is archived, which a hard deleted instance never is.
+        context.session.query(models.InstanceNameTrigram).filter_by(
+            instance_uuid=instance_uuid).delete()
         # NOTE(ttsiouts): The instance is the last thing to be deleted in
         # order to respect all constraints
         context.session.query(models.Instance).filter_by(
@@ -1219,6 +1524,7 @@ def instance_destroy(context, instance_uuid, constraint=None,
 
 @require_context
 @pick_context_manager_reader_allow_async
+@replica_safe_on_request
 def instance_get_by_uuid(context, uuid, columns_to_join=None):
     return _instance_get_by_uuid(context, uuid,
                                  columns_to_join=columns_to_join)
@@ -1290,7 +1596,11 @@ def _build_instance_get(context, columns_to_join=None):
 
 def _instances_fill_metadata(context, instances, manual_joins=None):
     """Selectively fill instances with manually-joined metadata. Note that
-    instance will be converted to a dict.
+    instance will be converted to a dict, its metadata and system_metadata
+    being dicts of values by key.
+
+    The manually-joined tables are queried for at most
+    _FILL_METADATA_BATCH_SIZE instances at a time.
 
     :param context: security context
     :param instances: list of instances to fill
@@ -1303,26 +1613,22 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
     if manual_joins is None:
         manual_joins = ['metadata', 'system_metadata']
 
-    meta = collections.defaultdict(list)
-    if 'metadata' in manual_joins:
-        for row in _instance_metadata_get_multi(context, uuids):
-            meta[row['instance_uuid']].append(row)
-
-    sys_meta = collections.defaultdict(list)
-    if 'system_metadata' in manual_joins:
-        for row in _instance_system_metadata_get_multi(context, uuids):
-            sys_meta[row['instance_uuid']].append(row)
-
+    meta = collections.defaultdict(dict)
+    sys_meta = collections.defaultdict(dict)
     pcidevs = collections.defaultdict(list)
-    if 'pci_devices' in manual_joins:
-        for row in _instance_pcidevs_get_multi(context, uuids):
-            pcidevs[row['instance_uuid']].append(row)
+    faults = {}
+    for start in range(0, len(uuids), _FILL_METADATA_BATCH_SIZE):
+        batch = uuids[start:start + _FILL_METADATA_BATCH_SIZE]
+        _instance_metadata_get_multi(context, batch, manual_joins, meta,
+                                     sys_meta)
 
-    if 'fault' in manual_joins:
-        faults = instance_fault_get_by_instance_uuids(context, uuids,
-                                                      latest=True)
-    else:
-        faults = {}
+        if 'pci_devices' in manual_joins:
+            for row in _instance_pcidevs_get_multi(context, batch):
+                pcidevs[row['instance_uuid']].append(row)
+
+        if 'fault' in manual_joins:
+            faults.update(instance_fault_get_by_instance_uuids(
+                context, batch, latest=True))
 
     filled_instances = []
     for inst in instances:
@@ -1338,6 +1644,44 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
     return filled_instances
 
 
+def _instance_metadata_get_multi(context, instance_uuids, manual_joins, meta,
+                                 sys_meta):
+    """Get the metadata and system metadata of instances in a single query.
+
+    Rows are read with a UNION ALL of both tables, without loading them as
+    models.
+
+    :param context: security context
+    :param instance_uuids: list of UUIDs of the instances
+    :param manual_joins: list of manually joined tables, only 'metadata' and
+                         'system_metadata' are read
+    :param meta: dict of dicts of metadata by instance UUID to fill
+    :param sys_meta: dict of dicts of system metadata by instance UUID to fill
+    """
+    selects = []
+    for column, model in (('metadata', models.InstanceMetadata),
+                          ('system_metadata', models.InstanceSystemMetadata)):
+        if column not in manual_joins:
+            continue
+        table = model.__table__
+        select = sql.select([
+            sql.literal(column, sa.String), table.c.instance_uuid,
+            table.c.key, table.c.value,
+        ]).where(table.c.instance_uuid.in_(instance_uuids))
+        # NOTE: The system metadata of deleted instances is deleted with
+        # them, so it is read whether it is deleted or not.
+        if column == 'metadata':
+            select = select.where(table.c.deleted == 0)
+        selects.append(select)
+    if not instance_uuids or not selects:
+        return
+
+    query = selects[0] if len(selects) == 1 else sql.union_all(*selects)
+    metadata = {'metadata': meta, 'system_metadata': sys_meta}
+    for column, instance_uuid, key, value in context.session.execute(query):
+        metadata[column][instance_uuid][key] = value
+
+
 def _manual_join_columns(columns_to_join):
     """Separate manually joined columns from columns_to_join
 
@@ -1385,6 +1729,7 @@ def instance_get_all(context, columns_to_join=None):
 
 @require_context
 @pick_context_manager_reader_allow_async
+@replica_safe_on_request
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                 limit=None, marker=None, columns_to_join=None):
     """Return instances matching all filters sorted by the primary key.
@@ -1428,9 +1773,10 @@ def _get_query_nova_resource_by_changes_time(query, filters, model_object):
 
 @require_context
 @pick_context_manager_reader_allow_async
+@replica_safe_on_request
 def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
                                      columns_to_join=None, sort_keys=None,
-                                     sort_dirs=None):
+                                     sort_dirs=None, marker_values=None):
     """Return instances that match all filters sorted by the given keys.
     Deleted instances will be returned by default, unless there's a filter that
     says otherwise.
@@ -1492,6 +1838,12 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     |        'not-tags-any: [some-not-any-tag, some-another-not-any-tag]
     |    }
 
+    Instead of a marker uuid, the values of the leading sort keys of the
+    last instance seen can be passed as marker_values to seek directly to
+    the next instance in the sort order without looking up the marker
+    instance first. The values must cover a unique key (like uuid) so that
+    no instance compares equal to them.
+
     """
     # NOTE(mriedem): If the limit is 0 there is no point in even going
     # to the database since nothing is going to be returned anyway.
@@ -1631,7 +1983,20 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     query_prefix = _regex_instance_filter(query_prefix, filters)
 
     # paginate query
-    if marker is not None:
+    if marker_values is not None:
+        seek = _keyset_filter(models.Instance, sort_keys, sort_dirs,
+                              marker_values)
+        if seek is not None:
+            query_prefix = query_prefix.filter(seek)
+        else:
+            # NOTE: Fall back to the generic criteria built by
+            # paginate_query() for values it treats specially, using a
+            # transient marker that only carries the values.
+            columns = models.Instance.__table__.columns
+            marker = models.Instance(**{
+                skey: val for skey, val in zip(sort_keys, marker_values)
+                if skey in columns})
+    elif marker is not None:
         try:
             marker = _instance_get_by_uuid(
                     context.elevated(read_deleted='yes'), marker)
@@ -1649,8 +2014,53 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
 
 
+def _keyset_filter(model, sort_keys, sort_dirs, values):
+    """Build a seek predicate selecting the rows sorted after some values.
+
+    Consecutive sort keys with the same direction are compared together as
+    a row value, so with the default (created_at, id) ordering this is just
+    (created_at, id) < (:created_at, :id), which the database can satisfy
+    with a range scan over a matching composite index. A change of
+    direction adds a disjunct comparing the next run of keys for rows equal
+    on all previous runs.
+
+    Returns None if any of the values is NULL or for a boolean or unknown
+    column, since those need the special handling done by paginate_query().
+    """
+    runs = []
+    for skey, sdir, val in zip(sort_keys, sort_dirs, values):
+        if skey not in model.__table__.columns or val is None:
+            return None
+        model_attr = getattr(model, skey)
+        if isinstance(model_attr.type, Boolean):
+            return None
+        if runs and runs[-1][0] == sdir:
+            runs[-1][1].append(model_attr)
+            runs[-1][2].append(val)
+        else:
+            runs.append((sdir, [model_attr], [val]))
+
+    def _row(attrs):
+        return attrs[0] if len(attrs) == 1 else sa.tuple_(*attrs)
+
+    def _vals(vals):
+        return vals[0] if len(vals) == 1 else tuple(vals)
+
+    criteria = []
+    equal = []
+    for sdir, attrs, vals in runs:
+        if sdir == 'desc':
+            crit = _row(attrs) < _vals(vals)
+        else:
+            crit = _row(attrs) > _vals(vals)
+        criteria.append(and_(*(equal + [crit])))
+        equal.append(_row(attrs) == _vals(vals))
+    return or_(*criteria)
+
+
 @require_context
 @pick_context_manager_reader_allow_async
+@replica_safe_on_request
 def instance_get_by_sort_filters(context, sort_keys, sort_dirs, values):
     """Attempt to get a single instance based on a combination of sort
     keys, directions and filter values. This is used to try to find a
@@ -1815,12 +2225,95 @@ def _regex_instance_filter(query, filters):
             query = query.filter(column_attr.op(db_regexp_op)(
                                  u'%' + filter_val + u'%'))
         else:
+            query = _literal_regex_instance_filter(query, filter_name,
+                                                   filter_val)
             filter_val = safe_regex_filter(filter_val)
             query = query.filter(column_attr.op(db_regexp_op)(
                                  filter_val))
     return query
 
 
+_REGEX_SPECIAL_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+
+def _literal_regex_instance_filter(query, filter_name, regex):
+    """Narrow down a regular expression filter on a literal string.
+
+    Regular expression matches can't use an index, so they are evaluated
+    for every instance in the cell database. When the regular expression
+    is a literal string anchored at the start, or at both ends, this adds
+    an indexable prefix or equality match on the column. When it is a
+    literal string which is not anchored, and the instance name trigrams
+    are searched, this adds a match on the trigrams of the string for the
+    display_name. The regular expression match is still applied on top,
+    these matches only ever let through a superset of its matches.
+
+    Returns the updated query.
+    """
+    starts = regex.startswith('^')
+    ends = regex.endswith('$') and len(regex) > int(starts)
+    literal = regex[int(starts):len(regex) - int(ends)]
+    if not literal or _REGEX_SPECIAL_CHARS.intersection(literal):
+        return query
+
+    column_attr = getattr(models.Instance, filter_name)
+    if starts and ends:
+        return query.filter(column_attr == literal)
+    if starts:
+        return query.filter(column_attr.startswith(literal, autoescape=True))
+
+    trigrams = _instance_name_trigrams(literal)
+    if (filter_name != 'display_name' or not trigrams or
+            CONF.instance_name_trigrams != 'search'):
+        return query
+    model = models.InstanceNameTrigram
+    matching = query.session.query(model.instance_uuid).\
+        filter(model.trigram.in_(trigrams)).\
+        group_by(model.instance_uuid).\
+        having(func.count(sql.distinct(model.trigram)) == len(trigrams))
+    return query.filter(models.Instance.uuid.in_(matching))
+
+
+def _instance_name_trigrams(name):
+    """Return the set of trigrams of an instance name, case-folded."""
+    name = (name or '').lower()
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+def _instance_name_trigrams_set(context, instance_uuid, name, replace=True):
+    model = models.InstanceNameTrigram
+    if replace:
+        context.session.query(model).filter_by(
+            instance_uuid=instance_uuid).delete(synchronize_session=False)
+    # NOTE: Names without trigrams still get an empty one, which no search
+    # ever looks for, to record that the instance has been indexed.
+    trigrams = _instance_name_trigrams(name) or {''}
+    context.session.execute(model.__table__.insert(), [
+        {'instance_uuid': instance_uuid, 'trigram': trigram}
+        for trigram in trigrams])
+
+
+@pick_context_manager_writer
+def instance_name_trigrams_populate(context, count):
+    """Index the name trigrams of up to count instances not indexed yet.
+
+    This does nothing unless the instance_name_trigrams option is enabled.
+    """
+    if CONF.instance_name_trigrams == 'disabled':
+        return 0, 0
+
+    model = models.InstanceNameTrigram
+    indexed = sql.exists().where(
+        model.instance_uuid == models.Instance.uuid)
+    instances = context.session.query(
+        models.Instance.uuid, models.Instance.display_name).\
+        filter(~indexed).limit(count).all()
+    for instance_uuid, display_name in instances:
+        _instance_name_trigrams_set(context, instance_uuid, display_name,
+                                    replace=False)
+    return len(instances), len(instances)
+
+
 def _exact_instance_filter(query, filters, legal_keys):
     """Applies exact match filtering to an Instance query.
 
@@ -1947,6 +2440,7 @@ def process_sort_params(sort_keys, sort_dirs,
 
 @require_context
 @pick_context_manager_reader_allow_async
+@replica_safe
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None,
                                          columns_to_join=None, limit=None,
@@ -2273,6 +2767,11 @@ def _instance_update(context, instance_uuid, values, expected, original=None):
                                            models.InstanceSystemMetadata,
                                            system_metadata)
 
+    if ('display_name' in updates and
+            CONF.instance_name_trigrams != 'disabled'):
+        _instance_name_trigrams_set(context, instance_uuid,
+                                    updates['display_name'])
+
     return instance_ref
 
 
@@ -2778,6 +3277,13 @@ def block_device_mapping_update_or_create(context, values, legacy=True):
     return result
 
 
+@pick_context_manager_writer
+def block_device_mapping_update_or_create_bulk(context, values_list,
+                                               legacy=True):
+    return [block_device_mapping_update_or_create(context, values, legacy)
+            for values in values_list]
+
+
 @require_context
 @pick_context_manager_reader_allow_async
 def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids):
@@ -3306,13 +3812,6 @@ def migration_get_in_progress_and_error_by_host_and_node(context, host, node):
 ########################
 # User-provided metadata
 
-def _instance_metadata_get_multi(context, instance_uuids):
-    if not instance_uuids:
-        return []
-    return model_query(context, models.InstanceMetadata).filter(
-        models.InstanceMetadata.instance_uuid.in_(instance_uuids))
-
-
 def _instance_metadata_get_query(context, instance_uuid):
     return model_query(context, models.InstanceMetadata, read_deleted="no").\
                     filter_by(instance_uuid=instance_uuid)
@@ -3367,14 +3866,6 @@ def instance_metadata_update(context, instance_uuid, metadata, delete):
 # System-owned metadata
 
 
-def _instance_system_metadata_get_multi(context, instance_uuids):
-    if not instance_uuids:
-        return []
-    return model_query(context, models.InstanceSystemMetadata,
-                       read_deleted='yes').filter(
-        models.InstanceSystemMetadata.instance_uuid.in_(instance_uuids))
-
-
 def _instance_system_metadata_get_query(context, instance_uuid):
     return model_query(context, models.InstanceSystemMetadata).\
                     filter_by(instance_uuid=instance_uuid)
@@ -3739,6 +4230,14 @@ def action_start(context, values):
     return action_ref
 
 
+@pick_context_manager_writer
+def action_start_bulk(context, values_list):
+    for values in values_list:
+        convert_objects_related_datetimes(values, 'start_time', 'updated_at')
+    context.session.execute(models.InstanceAction.__table__.insert(None),
+                            values_list)
+
+
 @pick_context_manager_writer
 def action_finish(context, values):
     convert_objects_related_datetimes(values, 'start_time', 'finish_time',
@@ -3753,7 +4252,8 @@ def action_finish(context, values):
     return query.one()
 
 
-@pick_context_manager_reader
+@pick_context_manager_reader_allow_async
+@replica_safe
 def actions_get(context, instance_uuid, limit=None, marker=None,
                 filters=None):
     """Get all instance actions for the provided uuid and filters."""
@@ -3772,7 +4272,7 @@ def actions_get(context, instance_uuid, limit=None, marker=None,
                                                             model_object)
 
     if marker is not None:
-        marker = action_get_by_request_id(context, instance_uuid, marker)
+        marker = _action_get_by_request_id(context, instance_uuid, marker)
         if not marker:
             raise exception.MarkerNotFound(marker=marker)
     actions = sqlalchemyutils.paginate_query(query_prefix,
@@ -3810,6 +4310,10 @@ def _action_get_last_created_by_instance_uuid(context, instance_uuid):
 @pick_context_manager_writer
 def action_event_start(context, values):
     """Start an event on an instance action."""
+    return _action_event_start(context, values, not context.project_id)
+
+
+def _action_event_start(context, values, use_last_action):
     convert_objects_related_datetimes(values, 'start_time')
     action = _action_get_by_request_id(context, values['instance_uuid'],
                                        values['request_id'])
@@ -3820,7 +4324,7 @@ def action_event_start(context, values):
     # init_instance can continue to finish the recovery action, like:
     # powering_off, unpausing, and so on.
     update_action = True
-    if not action and not context.project_id:
+    if not action and use_last_action:
         action = _action_get_last_created_by_instance_uuid(
             context, values['instance_uuid'])
         # If we couldn't find an action by the request_id, we don't want to
@@ -3853,6 +4357,10 @@ def action_event_start(context, values):
 @pick_context_manager_writer
 def action_event_finish(context, values):
     """Finish an event on an instance action."""
+    return _action_event_finish(context, values, not context.project_id)
+
+
+def _action_event_finish(context, values, use_last_action):
     convert_objects_related_datetimes(values, 'start_time', 'finish_time')
     action = _action_get_by_request_id(context, values['instance_uuid'],
                                        values['request_id'])
@@ -3863,7 +4371,7 @@ def action_event_finish(context, values):
     # init_instance can continue to finish the recovery action, like:
     # powering_off, unpausing, and so on.
     update_action = True
-    if not action and not context.project_id:
+    if not action and use_last_action:
         action = _action_get_last_created_by_instance_uuid(
             context, values['instance_uuid'])
         # If we couldn't find an action by the request_id, we don't want to
@@ -3896,7 +4404,43 @@ def action_event_finish(context, values):
     return event_ref
 
 
-@pick_context_manager_reader
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@pick_context_manager_writer
+def action_events_record(context, events):
+    """Start and finish a batch of instance action events.
+
+    The events are applied in order in a single transaction. Events whose
+    action or started event cannot be found are skipped.
+
+    :param events: list of dicts with an ``event_type`` of either ``start``
+        or ``finish``, the packed event ``values`` and ``use_last_action``
+        which is True if the event should be recorded against the last
+        action of the instance when no action matches its request_id.
+    :returns: the number of events which were recorded.
+    """
+    recorded = 0
+    for event in events:
+        # Copy the values since they are converted in place and a deadlock
+        # retry would otherwise replay the converted values.
+        values = dict(event['values'])
+        try:
+            if event['event_type'] == 'start':
+                _action_event_start(context, values,
+                                    event['use_last_action'])
+            else:
+                _action_event_finish(context, values,
+                                     event['use_last_action'])
+        except (exception.InstanceActionNotFound,
+                exception.InstanceActionEventNotFound) as e:
+            LOG.warning('Unable to record instance action event: %s',
+                        e.format_message())
+            continue
+        recorded += 1
+    return recorded
+
+
+@pick_context_manager_reader_allow_async
+@replica_safe
 def action_events_get(context, action_id):
     events = model_query(context, models.InstanceActionEvent).\
                          filter_by(action_id=action_id).\
@@ -4159,6 +4703,12 @@ def _archive_deleted_rows_for_table(metadata, tablename, max_rows, before):
             with conn.begin():
                 conn.execute(insert)
                 result_delete = conn.execute(delete)
+                # NOTE: Instance name trigrams have no shadow table, they are
+                # only needed while the instance is in the instances table.
+                if deleted_instance_uuids:
+                    trigrams = models.InstanceNameTrigram.__table__
+                    conn.execute(trigrams.delete().where(
+                        trigrams.c.instance_uuid.in_(deleted_instance_uuids)))
             rows_archived = result_delete.rowcount
         except db_exc.DBReferenceError as ex:
             # A foreign key constraint keeps us from deleting some of
@@ -4237,13 +4787,154 @@ def archive_deleted_rows(context=None, max_rows=None, before=None):
     return table_to_rows_archived, deleted_instance_uuids, total_rows_archived
 
 
+def archive_deleted_rows_table_groups(context=None):
+    """Return the tables to archive, in groups which can be archived at once.
+
+    Rows of a table can only be archived once the rows referencing them in
+    other tables have been, so each group only holds tables which are not
+    referenced by the tables of the same or later groups. Tables with an
+    instance_uuid column also come before the instances table, so that their
+    rows for deleted instances are archived along with them.
+
+    :param context: nova.context.RequestContext for database access
+    :returns: A list of lists of table names, in the order to archive them
+    """
+    meta = MetaData(get_engine(use_slave=True, context=context))
+    meta.reflect()
+    tablenames = set(
+        table.name for table in meta.sorted_tables
+        if (table.name != 'migrate_version' and
+            not table.name.startswith(_SHADOW_TABLE_PREFIX) and
+            _SHADOW_TABLE_PREFIX + table.name in meta.tables))
+
+    referencing = collections.defaultdict(set)
+    for tablename in tablenames:
+        table = meta.tables[tablename]
+        for fk in table.foreign_keys:
+            parent = fk.column.table.name
+            if parent in tablenames and parent != tablename:
+                referencing[parent].add(tablename)
+        # NOTE: This mirrors the tables _archive_deleted_rows_for_table()
+        # archives the rows of deleted instances for.
+        if (tablename != 'instances' and 'instances' in tablenames and
+                (tablename != 'pci_devices' and
+                 'instance_uuid' in table.columns or
+                 tablename == 'instance_actions_events')):
+            referencing['instances'].add(tablename)
+
+    levels = {}
+
+    def level(tablename, seen=()):
+        if tablename not in levels:
+            children = referencing[tablename] - set(seen) - {tablename}
+            levels[tablename] = 1 + max(
+                [level(child, seen + (tablename,)) for child in children],
+                default=-1)
+        return levels[tablename]
+
+    groups = collections.defaultdict(list)
+    for tablename in sorted(tablenames):
+        groups[level(tablename)].append(tablename)
+    return [groups[key] for key in sorted(groups)]
+
+
+def archive_deleted_rows_for_table(context, tablename, max_rows, before=None):
+    """Move up to max_rows rows from a production table to its shadow table.
+
+    :param context: nova.context.RequestContext for database access
+    :param tablename: The name of the table to archive rows of
+    :param max_rows: Maximum number of rows to archive
+    :param before: optional datetime which when specified filters the records
+        to only archive those records deleted before the given date
+    :returns: 2-item tuple:
+
+        - number of rows that were archived
+        - list of UUIDs of instances that were archived
+    """
+    meta = MetaData(get_engine(use_slave=True, context=context))
+    return _archive_deleted_rows_for_table(meta, tablename, max_rows=max_rows,
+                                           before=before)
+
+
+def _purge_shadow_table_chunks(conn, table, col, before_date, max_rows,
+                               status_fn, throttle_fn):
+    """Delete the purgeable rows of a table max_rows at a time."""
+    pk = list(table.primary_key.columns)[0]
+    select = sql.select([pk]).order_by(pk).limit(max_rows)
+    if col is not None:
+        select = select.where(col < before_date)
+
+    deleted = 0
+    while True:
+        ids = [row[0] for row in conn.execute(select)]
+        if not ids:
+            break
+        deleted += conn.execute(table.delete().where(pk.in_(ids))).rowcount
+        status_fn(_('Deleted %(rows)i rows from %(table)s so far') % {
+                      'rows': deleted, 'table': table.name})
+        if len(ids) < max_rows:
+            break
+        if throttle_fn:
+            throttle_fn(len(ids))
+    return deleted
+
+
 def _purgeable_tables(metadata):
     return [t for t in metadata.sorted_tables
             if (t.name.startswith(_SHADOW_TABLE_PREFIX) and not
                 t.name.endswith('migrate_version'))]
 
 
-def purge_shadow_tables(context, before_date, status_fn=None):
+def replication_lag(context):
+    """Return how many seconds the slave database lags behind, if known.
+
+    :param context: nova.context.RequestContext for database access
+    :returns: The replication lag in seconds, infinite if replication has
+        stopped, or None if no slave connection is configured or the database
+        does not report it
+    """
+    return _replication_lag(get_engine(context=context),
+                            get_engine(use_slave=True, context=context))
+
+
+def _replication_lag(engine, slave_engine):
+    if slave_engine is engine:
+        return None
+    if slave_engine.dialect.name == 'mysql':
+        status = slave_engine.execute('SHOW SLAVE STATUS').first()
+        if status is None:
+            # Not a slave, or one which does not report its status.
+            return None
+        lag = status['Seconds_Behind_Master']
+        if lag is None:
+            # NOTE: MySQL reports no lag when the replication threads have
+            # stopped, in which case the slave may be arbitrarily stale.
+            return float('inf')
+    elif slave_engine.dialect.name == 'postgresql':
+        lag = slave_engine.execute(
+            'SELECT EXTRACT(EPOCH FROM now() - '
+            'pg_last_xact_replay_timestamp())').scalar()
+    else:
+        lag = None
+    return None if lag is None else float(lag)
+
+
+def purge_shadow_tables(context, before_date, status_fn=None, max_rows=None,
+                        throttle_fn=None):
+    """Delete rows from the shadow tables.
+
+    :param context: nova.context.RequestContext for database access
+    :param before_date: Only delete rows older than this datetime, or None to
+        delete all of them
+    :param status_fn: Optional function called with progress messages
+    :param max_rows: Optional maximum number of rows to delete per
+        transaction. Rows are then deleted in chunks in primary key order,
+        each committed on its own, so an interrupted purge can just be run
+        again to resume.
+    :param throttle_fn: Optional function called with the number of rows
+        deleted after each chunk, which can sleep to slow the purge down
+    :returns: The number of rows deleted
+    """
     engine = get_engine(context=context)
     conn = engine.connect()
     metadata = MetaData()
@@ -4279,19 +4970,24 @@ def purge_shadow_tables(context, before_date, status_fn=None):
                             'table': table.name})
             continue
 
-        if col is not None:
-            delete = table.delete().where(col < before_date)
+        if max_rows and len(table.primary_key.columns) == 1:
+            deleted = _purge_shadow_table_chunks(
+                conn, table, col, before_date, max_rows, status_fn,
+                throttle_fn)
         else:
-            delete = table.delete()
+            if col is not None:
+                delete = table.delete().where(col < before_date)
+            else:
+                delete = table.delete()
+            deleted = conn.execute(delete).rowcount
 
-        deleted = conn.execute(delete)
-        if deleted.rowcount > 0:
+        if deleted > 0:
             status_fn(_('Deleted %(rows)i rows from %(table)s based on '
                         'timestamp column %(col)s') % {
-                            'rows': deleted.rowcount,
+                            'rows': deleted,
                             'table': table.name,
                             'col': col is None and '(n/a)' or col.name})
-        total_deleted += deleted.rowcount
+        total_deleted += deleted
 
     return total_deleted
 
@@ -4422,6 +5118,31 @@ def instance_tag_set(context, instance_uuid, tags):
         resource_id=instance_uuid).all()
 
 
+@pick_context_manager_writer
+def instance_tag_set_bulk(context, instance_uuids, tags):
+    instance_uuids = set(instance_uuids)
+    found = model_query(context, models.Instance, read_deleted="no",
+                        project_only=True,
+                        args=(models.Instance.uuid,)).filter(
+                        models.Instance.uuid.in_(instance_uuids)).all()
+    missing = instance_uuids - set(row.uuid for row in found)
+    if missing:
+        raise exception.InstanceNotFound(instance_id=missing.pop())
+
+    context.session.query(models.Tag).filter(
+        models.Tag.resource_id.in_(instance_uuids)).delete(
+        synchronize_session=False)
+
+    tags = set(tags)
+    if tags:
+        data = [{'resource_id': instance_uuid, 'tag': tag}
+                for instance_uuid in instance_uuids for tag in tags]
+        context.session.execute(models.Tag.__table__.insert(None), data)
+
+    return context.session.query(models.Tag).filter(
+        models.Tag.resource_id.in_(instance_uuids)).all()
+
+
 @pick_context_manager_reader
 def instance_tag_get_by_instance_uuid(context, instance_uuid):
     _check_instance_exists_in_project(context, instance_uuid)
@@ -0,0 +1,39 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_log import log as logging
+from sqlalchemy import MetaData, Table, Index
+
+LOG = logging.getLogger(__name__)
+
+# Composite indexes matching the keyset pagination predicates for the
+# default and the most common instance list sort orders.
+INDEXES = [
+    ('instances_created_at_id_idx', ['created_at', 'id']),
+    ('instances_display_name_uuid_idx', ['display_name', 'uuid']),
+    ('instances_updated_at_uuid_idx', ['updated_at', 'uuid']),
+]
+
+
+def upgrade(migrate_engine):
+    meta = MetaData(bind=migrate_engine)
+    instances = Table('instances', meta, autoload=True)
+    existing = [idx.columns.keys() for idx in instances.indexes]
+
+    for index_name, columns in INDEXES:
+        if columns in existing:
+            LOG.info('Skipped adding %s because an equivalent index'
+                     ' already exists.', index_name)
+            continue
+        index = Index(index_name,
+                      *[getattr(instances.c, col) for col in columns])
+        index.create(migrate_engine)
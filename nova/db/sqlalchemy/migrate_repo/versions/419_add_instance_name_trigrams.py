@@ -0,0 +1,38 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import String
+from sqlalchemy import Table
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+    trigrams = Table('instance_name_trigrams', meta,
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime),
+        Column('id', Integer, primary_key=True, nullable=False),
+        Column('instance_uuid', String(36), nullable=False),
+        Column('trigram', String(3), nullable=False),
+        Index('instance_name_trigrams_trigram_instance_uuid_idx',
+              'trigram', 'instance_uuid'),
+        Index('instance_name_trigrams_instance_uuid_idx', 'instance_uuid'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8'
+    )
+
+    trigrams.create(checkfirst=True)
@@ -221,6 +221,12 @@ class Instance(BASE, NovaBase, models.SoftDeleteMixin):
               'deleted', 'created_at'),
         Index('instances_updated_at_project_id_idx',
               'updated_at', 'project_id'),
+        Index('instances_created_at_id_idx',
+              'created_at', 'id'),
+        Index('instances_display_name_uuid_idx',
+              'display_name', 'uuid'),
+        Index('instances_updated_at_uuid_idx',
+              'updated_at', 'uuid'),
         schema.UniqueConstraint('uuid', name='uniq_instances0uuid'),
     )
     injected_files = []
@@ -1617,6 +1623,24 @@ class ResourceProviderAggregate(BASE, models.ModelBase):
     aggregate_id = Column(Integer, primary_key=True, nullable=False)
 
 
+class InstanceNameTrigram(BASE, NovaBase):
+    """Represents a trigram of the display name of an instance.
+
+    These are used to narrow down searches for instances by name, see the
+    instance_name_trigrams option.
+    """
+
+    __tablename__ = 'instance_name_trigrams'
+    __table_args__ = (
+        Index('instance_name_trigrams_trigram_instance_uuid_idx',
+              'trigram', 'instance_uuid'),
+        Index('instance_name_trigrams_instance_uuid_idx', 'instance_uuid'),
+    )
+    id = Column(Integer, primary_key=True, nullable=False)
+    instance_uuid = Column(String(36), nullable=False)
+    trigram = Column(String(3), nullable=False)
+
+
 class ConsoleAuthToken(BASE, NovaBase):
     """Represents a console auth token"""
 
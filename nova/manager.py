@@ -54,6 +54,7 @@ This module provides Manager, a base class for managers.
 from oslo_service import periodic_task
 
 import nova.conf
+from nova.db import api as db
 from nova.db import base
 from nova import profiler
 from nova import rpc
@@ -101,7 +102,13 @@ class Manager(base.Base, PeriodicTasks, metaclass=ManagerMeta):
 
     def periodic_tasks(self, context, raise_on_error=False):
         """Tasks to be run at a periodic interval."""
-        return self.run_periodic_tasks(context, raise_on_error=raise_on_error)
+        try:
+            return self.run_periodic_tasks(
+                context, raise_on_error=raise_on_error)
+        finally:
+            # NOTE: The SQL queries run for the periodic tasks are only
+            # counted when [database]/query_stats is enabled.
+            db.report_query_stats(context.request_id)
 
     def init_host(self):
         """Hook to do additional manager initialization when one requests
@@ -14,8 +14,10 @@
 #    under the License.
 
 import functools
+import zlib
 
 import netaddr
+from oslo_serialization import base64
 from oslo_serialization import jsonutils
 
 from nova import exception
@@ -164,12 +166,56 @@ LEGACY_EXPOSED_VIF_TYPES = (
 # the VIF class
 NIC_NAME_LEN = 14
 
+# Prefix of the compressed form of serialized network info, which is followed
+# by the base64 encoded zlib compressed JSON. The number is the version of the
+# format.
+COMPRESSED_PREFIX = 'nova-zlib-1:'
+
+
+def compress_json(data):
+    """Return the compressed form of serialized network info."""
+    return COMPRESSED_PREFIX + base64.encode_as_text(
+        zlib.compress(data.encode('utf-8')))
+
+
+def decompress_json(data):
+    """Return the JSON of serialized network info, compressed or not."""
+    if data.startswith(COMPRESSED_PREFIX):
+        return zlib.decompress(base64.decode_as_bytes(
+            data[len(COMPRESSED_PREFIX):])).decode('utf-8')
+    return data
+
 
 class Model(dict):
     """Defines some necessary structures for most of the network models."""
+
+    __slots__ = ()
+
+    # The keys which __init__() sets
+    _keys = frozenset()
+
     def __repr__(self):
         return jsonutils.dumps(self)
 
+    @classmethod
+    def _from_dict(cls, data):
+        """Build a model from a dict, like cls(**data).
+
+        A dict which has exactly the keys that __init__() sets, as json()
+        writes them, is copied and then given the same defaults __init__()
+        would give it, which is much quicker than going through __init__()
+        for the many models in large network info.
+        """
+        if data.keys() != cls._keys:
+            return cls(**data)
+        model = cls.__new__(cls)
+        dict.update(model, data)
+        model._set_defaults()
+        return model
+
+    def _set_defaults(self):
+        pass
+
     def _set_meta(self, kwargs):
         # pull meta out of kwargs if it's there
         self['meta'] = kwargs.pop('meta', {})
@@ -183,6 +229,11 @@ class Model(dict):
 
 class IP(Model):
     """Represents an IP address in Nova."""
+
+    __slots__ = ()
+
+    _keys = frozenset(['address', 'type', 'version', 'meta'])
+
     def __init__(self, address=None, type=None, **kwargs):
         super(IP, self).__init__()
 
@@ -191,7 +242,12 @@ class IP(Model):
         self['version'] = kwargs.pop('version', None)
 
         self._set_meta(kwargs)
+        self._set_version()
+
+    def _set_defaults(self):
+        self._set_version()
 
+    def _set_version(self):
         # determine version from address if not passed in
         if self['address'] and not self['version']:
             try:
@@ -217,15 +273,28 @@ class IP(Model):
     @classmethod
     def hydrate(cls, ip):
         if ip:
-            return cls(**ip)
+            return cls._from_dict(ip)
         return None
 
 
 class FixedIP(IP):
     """Represents a Fixed IP address in Nova."""
+
+    __slots__ = ()
+
+    _keys = IP._keys | frozenset(['floating_ips'])
+
     def __init__(self, floating_ips=None, **kwargs):
         super(FixedIP, self).__init__(**kwargs)
-        self['floating_ips'] = floating_ips or []
+        self['floating_ips'] = floating_ips
+        self._set_fixed_defaults()
+
+    def _set_defaults(self):
+        super(FixedIP, self)._set_defaults()
+        self._set_fixed_defaults()
+
+    def _set_fixed_defaults(self):
+        self['floating_ips'] = self['floating_ips'] or []
 
         if not self['type']:
             self['type'] = 'fixed'
@@ -239,7 +308,7 @@ class FixedIP(IP):
 
     @staticmethod
     def hydrate(fixed_ip):
-        fixed_ip = FixedIP(**fixed_ip)
+        fixed_ip = FixedIP._from_dict(fixed_ip)
         fixed_ip['floating_ips'] = [IP.hydrate(floating_ip)
                                    for floating_ip in fixed_ip['floating_ips']]
         return fixed_ip
@@ -254,6 +323,11 @@ class FixedIP(IP):
 
 class Route(Model):
     """Represents an IP Route in Nova."""
+
+    __slots__ = ()
+
+    _keys = frozenset(['cidr', 'gateway', 'interface', 'meta'])
+
     def __init__(self, cidr=None, gateway=None, interface=None, **kwargs):
         super(Route, self).__init__()
 
@@ -266,25 +340,37 @@ class Route(Model):
 
     @classmethod
     def hydrate(cls, route):
-        route = cls(**route)
+        route = cls._from_dict(route)
         route['gateway'] = IP.hydrate(route['gateway'])
         return route
 
 
 class Subnet(Model):
     """Represents a Subnet in Nova."""
+
+    __slots__ = ()
+
+    _keys = frozenset(['cidr', 'dns', 'gateway', 'ips', 'routes', 'version',
+                       'meta'])
+
     def __init__(self, cidr=None, dns=None, gateway=None, ips=None,
                  routes=None, **kwargs):
         super(Subnet, self).__init__()
 
         self['cidr'] = cidr
-        self['dns'] = dns or []
+        self['dns'] = dns
         self['gateway'] = gateway
-        self['ips'] = ips or []
-        self['routes'] = routes or []
+        self['ips'] = ips
+        self['routes'] = routes
         self['version'] = kwargs.pop('version', None)
 
         self._set_meta(kwargs)
+        self._set_defaults()
+
+    def _set_defaults(self):
+        self['dns'] = self['dns'] or []
+        self['ips'] = self['ips'] or []
+        self['routes'] = self['routes'] or []
 
         if self['cidr'] and not self['version']:
             self['version'] = netaddr.IPNetwork(self['cidr']).version
@@ -314,7 +400,7 @@ class Subnet(Model):
 
     @classmethod
     def hydrate(cls, subnet):
-        subnet = cls(**subnet)
+        subnet = cls._from_dict(subnet)
         subnet['dns'] = [IP.hydrate(dns) for dns in subnet['dns']]
         subnet['ips'] = [FixedIP.hydrate(ip) for ip in subnet['ips']]
         subnet['routes'] = [Route.hydrate(route) for route in subnet['routes']]
@@ -324,6 +410,11 @@ class Subnet(Model):
 
 class Network(Model):
     """Represents a Network in Nova."""
+
+    __slots__ = ()
+
+    _keys = frozenset(['id', 'bridge', 'label', 'subnets', 'meta'])
+
     def __init__(self, id=None, bridge=None, label=None,
                  subnets=None, **kwargs):
         super(Network, self).__init__()
@@ -335,6 +426,9 @@ class Network(Model):
 
         self._set_meta(kwargs)
 
+    def _set_defaults(self):
+        self['subnets'] = self['subnets'] or []
+
     def add_subnet(self, subnet):
         if subnet not in self['subnets']:
             self['subnets'].append(subnet)
@@ -342,7 +436,7 @@ class Network(Model):
     @classmethod
     def hydrate(cls, network):
         if network:
-            network = cls(**network)
+            network = cls._from_dict(network)
             network['subnets'] = [Subnet.hydrate(subnet)
                                   for subnet in network['subnets']]
         return network
@@ -358,6 +452,8 @@ class Network(Model):
 class VIF8021QbgParams(Model):
     """Represents the parameters for a 802.1qbg VIF."""
 
+    __slots__ = ()
+
     def __init__(self, managerid, typeid, typeidversion, instanceid):
         super(VIF8021QbgParams, self).__init__()
 
@@ -370,6 +466,8 @@ class VIF8021QbgParams(Model):
 class VIF8021QbhParams(Model):
     """Represents the parameters for a 802.1qbh VIF."""
 
+    __slots__ = ()
+
     def __init__(self, profileid):
         super(VIF8021QbhParams, self).__init__()
 
@@ -378,6 +476,14 @@ class VIF8021QbhParams(Model):
 
 class VIF(Model):
     """Represents a Virtual Interface in Nova."""
+
+    __slots__ = ()
+
+    _keys = frozenset(['id', 'address', 'network', 'type', 'details',
+                       'devname', 'ovs_interfaceid', 'qbh_params',
+                       'qbg_params', 'active', 'vnic_type', 'profile',
+                       'preserve_on_delete', 'meta'])
+
     def __init__(self, id=None, address=None, network=None, type=None,
                  details=None, devname=None, ovs_interfaceid=None,
                  qbh_params=None, qbg_params=None, active=False,
@@ -402,6 +508,10 @@ class VIF(Model):
 
         self._set_meta(kwargs)
 
+    def _set_defaults(self):
+        self['network'] = self['network'] or None
+        self['details'] = self['details'] or {}
+
     def __eq__(self, other):
         keys = ['id', 'address', 'network', 'vnic_type',
                 'type', 'profile', 'details', 'devname',
@@ -490,7 +600,7 @@ class VIF(Model):
 
     @classmethod
     def hydrate(cls, vif):
-        vif = cls(**vif)
+        vif = cls._from_dict(vif)
         vif['network'] = Network.hydrate(vif['network'])
         return vif
 
@@ -521,7 +631,7 @@ class NetworkInfo(list):
     @classmethod
     def hydrate(cls, network_info):
         if isinstance(network_info, str):
-            network_info = jsonutils.loads(network_info)
+            network_info = jsonutils.loads(decompress_json(network_info))
         return cls([VIF.hydrate(vif) for vif in network_info])
 
     def wait(self, do_raise=True):
@@ -18,6 +18,7 @@
 API and utilities for nova-network interactions.
 """
 
+import collections
 import copy
 import functools
 import time
@@ -296,6 +297,70 @@ def _ensure_no_port_binding_failure(port):
         raise exception.PortBindingFailed(port_id=port['id'])
 
 
+class PrefetchedNetworkInfo(object):
+    """Neutron resources retrieved in bulk for a set of instances.
+
+    Holds the ports, networks, subnets, DHCP ports and floating IPs of
+    several instances so that the network info of each of them can be built
+    without querying neutron for those resources one instance at a time.
+    Instances of this class are returned by
+    API.prefetch_instances_nw_info().
+    """
+
+    def __init__(self, ports, networks, subnets, dhcp_ports, floating_ips):
+        self.ports = collections.defaultdict(list)
+        for port in ports:
+            self.ports[port['device_id']].append(port)
+        self.networks = {network['id']: network for network in networks}
+        self.subnets = {subnet['id']: subnet for subnet in subnets}
+        self.dhcp_ports = collections.defaultdict(list)
+        for port in dhcp_ports:
+            self.dhcp_ports[port['network_id']].append(port)
+        self.floating_ips = collections.defaultdict(list)
+        for fip in floating_ips:
+            key = (fip['port_id'], fip['fixed_ip_address'])
+            self.floating_ips[key].append(fip)
+
+    def get_ports(self, instance):
+        """Return the ports of the given instance."""
+        return [port for port in self.ports.get(instance.uuid, [])
+                if port['tenant_id'] == instance.project_id]
+
+    def matches_ports(self, instance, ports):
+        """Return whether the given ports of an instance were prefetched.
+
+        The ports match when they have the same IDs, networks and fixed IPs
+        as the prefetched ports of the instance, in which case the prefetched
+        networks, subnets and floating IPs still apply to them.
+        """
+        def _port_set(ports):
+            return {(port['id'], port['network_id'],
+                     frozenset((ip['subnet_id'], ip.get('ip_address'))
+                               for ip in port.get('fixed_ips', [])))
+                    for port in ports}
+
+        return _port_set(self.get_ports(instance)) == _port_set(ports)
+
+    def get_networks(self, net_ids):
+        """Return the networks with the given IDs, in the same order."""
+        networks = []
+        for net_id in net_ids:
+            network = self.networks.get(net_id)
+            if network is not None and network not in networks:
+                networks.append(network)
+        return networks
+
+    def get_subnets(self, port):
+        """Return the subnets the fixed IPs of the given port belong to."""
+        subnet_ids = set(ip['subnet_id'] for ip in port['fixed_ips'])
+        return [self.subnets[subnet_id] for subnet_id in subnet_ids
+                if subnet_id in self.subnets]
+
+    def get_floating_ips(self, fixed_ip, port_id):
+        """Return the floating IPs associated with a port's fixed IP."""
+        return self.floating_ips.get((port_id, fixed_ip), [])
+
+
 class API(base.Base):
     """API for interacting with the neutron 2.x API."""
 
@@ -1812,11 +1877,62 @@ class API(base.Base):
                                                nw_info=result)
         return result
 
+    def prefetch_instances_nw_info(self, context, instances):
+        """Retrieve the neutron resources of several instances at once.
+
+        The ports of all the given instances are listed with a single request
+        and their networks, subnets, DHCP ports and floating IPs are then
+        retrieved with one request per resource type. The result can be
+        passed to get_instance_nw_info() along with ``force_refresh=True`` to
+        rebuild the network info of any of these instances without further
+        requests to neutron for those resources, other than listing the
+        ports of the instance again to check that they have not changed.
+
+        :param context: The request context.
+        :param instances: List of nova.objects.Instance objects.
+        :returns: A PrefetchedNetworkInfo object.
+        """
+        client = get_client(context, admin=True)
+        ports = client.list_ports(
+            device_id=[instance.uuid for instance in instances]).get(
+                'ports', [])
+
+        # NOTE: Listing resources with an empty list of IDs would return all
+        # of the resources visible to the admin user, so each request is
+        # skipped when there is nothing to filter on.
+        networks = []
+        net_ids = set(port['network_id'] for port in ports)
+        if net_ids:
+            networks = client.list_networks(id=list(net_ids)).get(
+                'networks', [])
+
+        subnets = []
+        subnet_ids = set(ip['subnet_id']
+                         for port in ports for ip in port['fixed_ips'])
+        if subnet_ids:
+            subnets = client.list_subnets(id=list(subnet_ids)).get(
+                'subnets', [])
+
+        dhcp_ports = []
+        dhcp_net_ids = set(subnet['network_id'] for subnet in subnets)
+        if dhcp_net_ids:
+            dhcp_ports = client.list_ports(
+                network_id=list(dhcp_net_ids),
+                device_owner='network:dhcp').get('ports', [])
+
+        floating_ips = []
+        if ports:
+            floating_ips = self._safe_get_floating_ips(
+                client, port_id=[port['id'] for port in ports])
+
+        return PrefetchedNetworkInfo(ports, networks, subnets, dhcp_ports,
+                                     floating_ips)
+
     def _get_instance_nw_info(self, context, instance, networks=None,
                               port_ids=None, admin_client=None,
                               preexisting_port_ids=None,
                               refresh_vif_id=None, force_refresh=False,
-                              **kwargs):
+                              prefetched=None, **kwargs):
         # NOTE(danms): This is an inner method intended to be called
         # by other code that updates instance nwinfo. It *must* be
         # called with the refresh_cache-%(instance_uuid) lock held!
@@ -1837,7 +1953,8 @@ class API(base.Base):
                                                  port_ids, admin_client,
                                                  preexisting_port_ids,
                                                  refresh_vif_id,
-                                                 force_refresh=force_refresh)
+                                                 force_refresh=force_refresh,
+                                                 prefetched=prefetched)
         return network_model.NetworkInfo.hydrate(nw_info)
 
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
@@ -1960,12 +2077,15 @@ class API(base.Base):
         raise exception.FixedIpNotFoundForInstance(
                 instance_uuid=instance.uuid, ip=address)
 
-    def _get_physnet_tunneled_info(self, context, neutron, net_id):
+    def _get_physnet_tunneled_info(self, context, neutron, net_id,
+                                   network=None):
         """Retrieve detailed network info.
 
         :param context: The request context.
         :param neutron: The neutron client object.
         :param net_id: The ID of the network to retrieve information for.
+        :param network: Optional details of the network, as returned by
+            list_networks, to use instead of retrieving them from neutron.
 
         :return: A tuple containing the physnet name, if defined, and the
             tunneled status of the network. If the network uses multiple
@@ -1973,9 +2093,9 @@ class API(base.Base):
             used for the physnet name.
         """
         if self._has_multi_provider_extension(context, neutron=neutron):
-            network = neutron.show_network(net_id,
-                                           fields='segments').get('network')
-            segments = network.get('segments', {})
+            net = network or neutron.show_network(
+                net_id, fields='segments').get('network')
+            segments = net.get('segments', {})
             for net in segments:
                 # NOTE(vladikr): In general, "multi-segments" network is a
                 # combination of L2 segments. The current implementation
@@ -1997,7 +2117,7 @@ class API(base.Base):
                          "physical_network") % net_id)
                 raise exception.NovaException(message=msg)
 
-        net = neutron.show_network(
+        net = network or neutron.show_network(
             net_id, fields=['provider:physical_network',
                             'provider:network_type']).get('network')
         return (net.get('provider:physical_network'),
@@ -2885,12 +3005,16 @@ class API(base.Base):
             context, instance, migration.dest_compute, migration=migration,
             provider_mappings=provider_mappings)
 
-    def _nw_info_get_ips(self, client, port):
+    def _nw_info_get_ips(self, client, port, prefetched=None):
         network_IPs = []
         for fixed_ip in port['fixed_ips']:
             fixed = network_model.FixedIP(address=fixed_ip['ip_address'])
-            floats = self._get_floating_ips_by_fixed_and_port(
-                client, fixed_ip['ip_address'], port['id'])
+            if prefetched is None:
+                floats = self._get_floating_ips_by_fixed_and_port(
+                    client, fixed_ip['ip_address'], port['id'])
+            else:
+                floats = prefetched.get_floating_ips(
+                    fixed_ip['ip_address'], port['id'])
             for ip in floats:
                 fip = network_model.IP(address=ip['floating_ip_address'],
                                        type='floating')
@@ -2898,14 +3022,23 @@ class API(base.Base):
             network_IPs.append(fixed)
         return network_IPs
 
-    def _nw_info_get_subnets(self, context, port, network_IPs, client=None):
-        subnets = self._get_subnets_from_port(context, port, client)
+    def _nw_info_get_subnets(self, context, port, network_IPs, client=None,
+                             prefetched=None):
+        if prefetched is None:
+            subnets = self._get_subnets_from_port(context, port, client)
+        else:
+            subnets = [
+                self._build_subnet_model(
+                    subnet,
+                    prefetched.dhcp_ports.get(subnet['network_id'], []))
+                for subnet in prefetched.get_subnets(port)]
         for subnet in subnets:
             subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                              if fixed_ip.is_in_subnet(subnet)]
         return subnets
 
-    def _nw_info_build_network(self, context, port, networks, subnets):
+    def _nw_info_build_network(self, context, port, networks, subnets,
+                               prefetched=None):
         # TODO(stephenfin): Pass in an existing admin client if available.
         neutron = get_client(context, admin=True)
         network_name = None
@@ -2959,8 +3092,13 @@ class API(base.Base):
         if bridge is not None and vif_type != network_model.VIF_TYPE_DVS:
             bridge = bridge[:network_model.NIC_NAME_LEN]
 
-        physnet, tunneled = self._get_physnet_tunneled_info(
-            context, neutron, port['network_id'])
+        if prefetched is None:
+            physnet, tunneled = self._get_physnet_tunneled_info(
+                context, neutron, port['network_id'])
+        else:
+            physnet, tunneled = self._get_physnet_tunneled_info(
+                context, neutron, port['network_id'],
+                network=prefetched.networks.get(port['network_id']))
         network = network_model.Network(
             id=port['network_id'],
             bridge=bridge,
@@ -2990,7 +3128,7 @@ class API(base.Base):
                 if vif.get('preserve_on_delete')]
 
     def _build_vif_model(self, context, client, current_neutron_port,
-                         networks, preexisting_port_ids):
+                         networks, preexisting_port_ids, prefetched=None):
         """Builds a ``nova.network.model.VIF`` object based on the parameters
         and current state of the port in Neutron.
 
@@ -3004,6 +3142,9 @@ class API(base.Base):
         :param preexisting_port_ids: List of IDs of ports attached to a
             given server instance which Nova did not create and therefore
             should not delete when the port is detached from the server.
+        :param prefetched: Optional PrefetchedNetworkInfo object from which
+            the subnets, floating IPs and network details of the port are
+            taken rather than retrieved from Neutron.
         :return: nova.network.model.VIF object which represents a port in the
             instance network info cache.
         """
@@ -3013,17 +3154,20 @@ class API(base.Base):
             vif_active = True
 
         network_IPs = self._nw_info_get_ips(client,
-                                            current_neutron_port)
+                                            current_neutron_port,
+                                            prefetched=prefetched)
         subnets = self._nw_info_get_subnets(context,
                                             current_neutron_port,
-                                            network_IPs, client)
+                                            network_IPs, client,
+                                            prefetched=prefetched)
 
         devname = "tap" + current_neutron_port['id']
         devname = devname[:network_model.NIC_NAME_LEN]
 
         network, ovs_interfaceid = (
             self._nw_info_build_network(context, current_neutron_port,
-                                        networks, subnets))
+                                        networks, subnets,
+                                        prefetched=prefetched))
         preserve_on_delete = (current_neutron_port['id'] in
                               preexisting_port_ids)
 
@@ -3044,7 +3188,8 @@ class API(base.Base):
     def _build_network_info_model(self, context, instance, networks=None,
                                   port_ids=None, admin_client=None,
                                   preexisting_port_ids=None,
-                                  refresh_vif_id=None, force_refresh=False):
+                                  refresh_vif_id=None, force_refresh=False,
+                                  prefetched=None):
         """Return list of ordered VIFs attached to instance.
 
         :param context: Request context.
@@ -3070,6 +3215,12 @@ class API(base.Base):
                         by default the instance.info_cache will be used to
                         populate the network info. Pass ``True`` to force
                         collection of ports and networks from neutron directly.
+        :param prefetched: Optional PrefetchedNetworkInfo object, as returned
+                        by prefetch_instances_nw_info(), from which the
+                        networks, subnets and floating IPs of the instance are
+                        taken rather than retrieved from neutron. Only used
+                        along with ``force_refresh`` and when the ports of the
+                        instance still match the prefetched ones.
         """
 
         search_opts = {'tenant_id': instance.project_id,
@@ -3080,8 +3231,18 @@ class API(base.Base):
             client = admin_client
 
         data = client.list_ports(**search_opts)
-
         current_neutron_ports = data.get('ports', [])
+        if prefetched is not None and force_refresh:
+            # NOTE: The prefetched resources were retrieved before the
+            # refresh_cache lock was taken so they are only used if the ports
+            # of the instance have not changed since.
+            if not prefetched.matches_ports(instance, current_neutron_ports):
+                LOG.debug('The ports of the instance changed since they were '
+                          'prefetched, retrieving their network resources.',
+                          instance=instance)
+                prefetched = None
+        else:
+            prefetched = None
 
         if preexisting_port_ids is None:
             preexisting_port_ids = []
@@ -3153,9 +3314,12 @@ class API(base.Base):
             net_ids = [current_neutron_port_map.get(port_id).get('network_id')
                        for port_id in port_ids]
 
-            # This is copied from _gather_port_ids_and_networks.
-            networks = self._get_available_networks(
-                context, instance.project_id, net_ids, client)
+            if prefetched is not None:
+                networks = prefetched.get_networks(net_ids)
+            else:
+                # This is copied from _gather_port_ids_and_networks.
+                networks = self._get_available_networks(
+                    context, instance.project_id, net_ids, client)
         else:
             # We are refreshing the full cache using the existing cache rather
             # than what is currently in neutron.
@@ -3168,7 +3332,7 @@ class API(base.Base):
             if current_neutron_port:
                 vif = self._build_vif_model(
                     context, client, current_neutron_port, networks,
-                    preexisting_port_ids)
+                    preexisting_port_ids, prefetched=prefetched)
                 nw_info.append(vif)
             elif nw_info_refresh:
                 LOG.info('Port %s from network info_cache is no '
@@ -3234,57 +3398,67 @@ class API(base.Base):
         subnets = []
 
         for subnet in ipam_subnets:
-            subnet_dict = {'cidr': subnet['cidr'],
-                           'gateway': network_model.IP(
-                                address=subnet['gateway_ip'],
-                                type='gateway'),
-            }
-            if subnet.get('ipv6_address_mode'):
-                subnet_dict['ipv6_address_mode'] = subnet['ipv6_address_mode']
-
             # attempt to populate DHCP server field
             search_opts = {'network_id': subnet['network_id'],
                            'device_owner': 'network:dhcp'}
             data = client.list_ports(**search_opts)
             dhcp_ports = data.get('ports', [])
-            for p in dhcp_ports:
-                for ip_pair in p['fixed_ips']:
-                    if ip_pair['subnet_id'] == subnet['id']:
-                        subnet_dict['dhcp_server'] = ip_pair['ip_address']
-                        break
-
-            # NOTE(arnaudmorin): If enable_dhcp is set on subnet, but, for
-            # some reason neutron did not have any DHCP port yet, we still
-            # want the network_info to be populated with a valid dhcp_server
-            # value. This is mostly useful for the metadata API (which is
-            # relying on this value to give network_data to the instance).
-            #
-            # This will also help some providers which are using external
-            # DHCP servers not handled by neutron.
-            # In this case, neutron will never create any DHCP port in the
-            # subnet.
-            #
-            # Also note that we cannot set the value to None because then the
-            # value would be discarded by the metadata API.
-            # So the subnet gateway will be used as fallback.
-            if subnet.get('enable_dhcp') and 'dhcp_server' not in subnet_dict:
-                subnet_dict['dhcp_server'] = subnet['gateway_ip']
-
-            subnet_object = network_model.Subnet(**subnet_dict)
-            for dns in subnet.get('dns_nameservers', []):
-                subnet_object.add_dns(
-                    network_model.IP(address=dns, type='dns'))
-
-            for route in subnet.get('host_routes', []):
-                subnet_object.add_route(
-                    network_model.Route(cidr=route['destination'],
-                                        gateway=network_model.IP(
-                                            address=route['nexthop'],
-                                            type='gateway')))
-
-            subnets.append(subnet_object)
+            subnets.append(self._build_subnet_model(subnet, dhcp_ports))
         return subnets
 
+    @staticmethod
+    def _build_subnet_model(subnet, dhcp_ports):
+        """Build a ``nova.network.model.Subnet`` object from a neutron subnet.
+
+        :param subnet: The subnet as returned by neutron.
+        :param dhcp_ports: The DHCP ports of the network the subnet is on,
+            used to populate the DHCP server of the subnet.
+        """
+        subnet_dict = {'cidr': subnet['cidr'],
+                       'gateway': network_model.IP(
+                            address=subnet['gateway_ip'],
+                            type='gateway'),
+        }
+        if subnet.get('ipv6_address_mode'):
+            subnet_dict['ipv6_address_mode'] = subnet['ipv6_address_mode']
+
+        for p in dhcp_ports:
+            for ip_pair in p['fixed_ips']:
+                if ip_pair['subnet_id'] == subnet['id']:
+                    subnet_dict['dhcp_server'] = ip_pair['ip_address']
+                    break
+
+        # NOTE(arnaudmorin): If enable_dhcp is set on subnet, but, for
+        # some reason neutron did not have any DHCP port yet, we still
+        # want the network_info to be populated with a valid dhcp_server
+        # value. This is mostly useful for the metadata API (which is
+        # relying on this value to give network_data to the instance).
+        #
+        # This will also help some providers which are using external
+        # DHCP servers not handled by neutron.
+        # In this case, neutron will never create any DHCP port in the
+        # subnet.
+        #
+        # Also note that we cannot set the value to None because then the
+        # value would be discarded by the metadata API.
+        # So the subnet gateway will be used as fallback.
+        if subnet.get('enable_dhcp') and 'dhcp_server' not in subnet_dict:
+            subnet_dict['dhcp_server'] = subnet['gateway_ip']
+
+        subnet_object = network_model.Subnet(**subnet_dict)
+        for dns in subnet.get('dns_nameservers', []):
+            subnet_object.add_dns(
+                network_model.IP(address=dns, type='dns'))
+
+        for route in subnet.get('host_routes', []):
+            subnet_object.add_route(
+                network_model.Route(cidr=route['destination'],
+                                    gateway=network_model.IP(
+                                        address=route['nexthop'],
+                                        type='gateway')))
+
+        return subnet_object
+
     def setup_instance_network_on_host(
             self, context, instance, host, migration=None,
             provider_mappings=None):
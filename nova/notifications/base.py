@@ -169,6 +169,10 @@ def send_instance_update_notification(context, instance, old_vm_state=None,
     """Send 'compute.instance.update' notification to inform observers
     about instance state changes.
     """
+    if not (rpc.is_event_type_enabled('compute.instance.update') or
+            rpc.is_event_type_enabled('instance.update')):
+        return
+
     # NOTE(gibi): The image_ref_url is only used in unversioned notifications.
     # Calling the generate_image_url() could be costly as it calls
     # the Keystone API. So only do the call if the actual value will be
@@ -217,14 +217,17 @@ class NotificationBase(NotificationObject):
         """Send the notification."""
         assert self.payload.populated
 
+        event_type = self.event_type.to_notification_event_type_field()
+        if not rpc.is_event_type_enabled(event_type):
+            return
+
         # Note(gibi): notification payload will be a newly populated object
         # therefore every field of it will look changed so this does not carry
         # any extra information so we drop this from the payload.
         self.payload.obj_reset_changes(recursive=True)
 
         self._emit(context,
-                   event_type=
-                   self.event_type.to_notification_event_type_field(),
+                   event_type=event_type,
                    publisher_id='%s:%s' %
                                 (self.publisher.source,
                                  self.publisher.host),
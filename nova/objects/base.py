@@ -17,13 +17,20 @@
 import contextlib
 import datetime
 import functools
+import json
+import sys
 import traceback
+import weakref
+import zlib
 
 import netaddr
 import oslo_messaging as messaging
+from oslo_serialization import base64
+from oslo_serialization import jsonutils
 from oslo_utils import versionutils
 from oslo_versionedobjects import base as ovoo_base
 from oslo_versionedobjects import exception as ovoo_exc
+from oslo_versionedobjects import fields as ovoo_fields
 
 from nova import objects
 from nova.objects import fields as obj_fields
@@ -54,6 +61,263 @@ def get_attrname(name):
     return '_obj_' + name
 
 
+# Field types whose primitive form is the value itself and whose coerce()
+# returns a value it has already coerced unchanged.
+_PRIMITIVE_FIELD_TYPES = (ovoo_fields.String, ovoo_fields.Integer,
+                          ovoo_fields.NonNegativeInteger, ovoo_fields.UUID,
+                          ovoo_fields.Boolean, ovoo_fields.Float,
+                          ovoo_fields.NonNegativeFloat)
+# Those of the above which database columns already return coerced.
+_DB_FIELD_TYPES = (ovoo_fields.String, ovoo_fields.Integer, ovoo_fields.UUID)
+# Marks a sub-object field which has no rule to backport it by.
+_NO_COMPAT_RULE = object()
+# Version manifests by top-level object name, see obj_tree_get_versions().
+_VERSION_MANIFESTS = {}
+
+
+@functools.lru_cache(maxsize=128)
+def _version_tuple(version):
+    return versionutils.convert_version_to_tuple(version)
+
+
+def _subobject_compat_version(target_version, relationships):
+    """Work out the version to backport a sub-object to.
+
+    This follows ovo's _get_subobject_version() but returns the result so
+    that it can be kept rather than calling back into the backport.
+
+    :returns: The sub-object version, None if the sub-object did not exist
+              yet in target_version or False if it needs no backport
+    """
+    tgt = _version_tuple(target_version)
+    for index, (parent, child) in enumerate(relationships):
+        parent = _version_tuple(parent)
+        if tgt < parent:
+            if index == 0:
+                return None
+            return relationships[index - 1][1]
+        elif tgt == parent:
+            return child
+    return False
+
+
+def _backport_subobject(value, primitive, version, manifest):
+    if isinstance(value, ovoo_base.VersionedObject):
+        value.obj_make_compatible_from_manifest(
+            value._obj_primitive_field(primitive, 'data'), version,
+            version_manifest=manifest)
+        primitive[value._obj_primitive_key('version')] = version
+    elif isinstance(value, list):
+        for element, element_primitive in zip(value, primitive):
+            _backport_subobject(element, element_primitive, version,
+                                manifest)
+
+
+class _ObjectCodec(object):
+    """Conversion plan for the fields of a registered object class.
+
+    The generic obj_to_primitive() and obj_from_primitive() dispatch every
+    field of every object through its field type. This works out once, at
+    registration time, which fields can be copied as they are and which
+    actually need converting, and converts objects using that.
+    """
+
+    def __init__(self, cls):
+        self.name_key = cls._obj_primitive_key('name')
+        self.namespace_key = cls._obj_primitive_key('namespace')
+        self.version_key = cls._obj_primitive_key('version')
+        self.data_key = cls._obj_primitive_key('data')
+        self.changes_key = cls._obj_primitive_key('changes')
+        self.field_names = frozenset(cls.fields)
+        # (name, attrname, field or None if the value is its own primitive)
+        self.encoders = []
+        # (name, attrname, field, whether a primitive can be used as is)
+        self.decoders = []
+        # Fields which may hold objects with changes of their own
+        self.object_fields = []
+        # Fields which can be set from a database row as they are
+        self.db_fields = set()
+        # (name, attrname, objname) for fields holding objects or lists of
+        # objects, which need backporting along with this object
+        self.subobject_fields = []
+        self.is_list = issubclass(cls, ovoo_base.ObjectListBase)
+        # Backport plans by target version and sub-object versions
+        self.compat_plans = {}
+        for name, field in cls.fields.items():
+            attrname = get_attrname(name)
+            field_type = type(field._type)
+            plain = (type(field).to_primitive is
+                     ovoo_fields.Field.to_primitive and
+                     field_type.to_primitive is
+                     ovoo_fields.FieldType.to_primitive)
+            self.encoders.append((name, attrname, None if plain else field))
+            trusted = (plain and field_type in _PRIMITIVE_FIELD_TYPES and
+                       type(field).coerce is ovoo_fields.Field.coerce and
+                       type(field).from_primitive is
+                       ovoo_fields.Field.from_primitive and
+                       not field.read_only)
+            self.decoders.append((name, attrname, field, trusted))
+            if trusted and field_type in _DB_FIELD_TYPES:
+                self.db_fields.add(name)
+            if not trusted and field_type is not ovoo_fields.DateTime:
+                self.object_fields.append((name, attrname))
+            if isinstance(field, (ovoo_fields.ObjectField,
+                                  ovoo_fields.ListOfObjectsField)):
+                self.subobject_fields.append((name, attrname, field.objname))
+
+    def what_changed(self, obj):
+        changes = set([name for name in obj._changed_fields
+                       if name in self.field_names])
+        values = obj.__dict__
+        for name, attrname in self.object_fields:
+            value = values.get(attrname)
+            if (isinstance(value, ovoo_base.VersionedObject) and
+                    value.obj_what_changed()):
+                changes.add(name)
+        return changes
+
+    def to_primitive(self, obj, target_version=None, manifest=None):
+        if target_version is None:
+            target_version = obj.VERSION
+        elif (target_version != obj.VERSION and
+                _version_tuple(target_version) > _version_tuple(obj.VERSION)):
+            raise ovoo_exc.InvalidTargetVersion(version=target_version)
+        values = obj.__dict__
+        data = {}
+        for name, attrname, field in self.encoders:
+            if attrname in values:
+                value = values[attrname]
+                if field is not None:
+                    value = field.to_primitive(obj, name, value)
+                data[name] = value
+        if target_version != obj.VERSION or manifest:
+            obj.obj_make_compatible_from_manifest(data, target_version,
+                                                  manifest)
+        primitive = {self.name_key: obj.obj_name(),
+                     self.namespace_key: obj.OBJ_PROJECT_NAMESPACE,
+                     self.version_key: target_version,
+                     self.data_key: data}
+        what_changed = obj.obj_what_changed()
+        if what_changed:
+            # NOTE: Keep to the order of the fields rather than that of the
+            # set, so that equal objects always give equal primitives.
+            changes = [name for name in data if name in what_changed]
+            if changes:
+                primitive[self.changes_key] = changes
+        return primitive
+
+    def compat_plan(self, obj, target_version, manifest):
+        """Return how to backport the sub-objects of obj.
+
+        This only depends on the class, the target version and the versions
+        the manifest has for the sub-objects, so it is only worked out once
+        for each of those rather than for every object converted.
+
+        :returns: A list of (name, attrname, version) for the sub-object
+                  fields to backport, where version is None for a field
+                  which did not exist yet in target_version
+        """
+        if manifest is None:
+            key = (target_version, None)
+        else:
+            key = (target_version, tuple(
+                manifest.get(objname)
+                for name, attrname, objname in self.subobject_fields))
+        plan = self.compat_plans.get(key)
+        if plan is None:
+            plan = self._make_compat_plan(obj, target_version, manifest)
+            self.compat_plans[key] = plan
+        return plan
+
+    def _make_compat_plan(self, obj, target_version, manifest):
+        # NOTE: This mirrors ovo's obj_make_compatible() and
+        # _obj_relationship_for(), for both objects and lists of them.
+        plan = []
+        for name, attrname, objname in self.subobject_fields:
+            if self.is_list and obj.child_versions:
+                relationships = list(obj.child_versions.items())
+            elif manifest is not None:
+                relationships = None
+                if objname in manifest:
+                    relationships = [(target_version, manifest[objname])]
+            elif name in obj.obj_relationships:
+                relationships = obj.obj_relationships[name]
+            elif self.is_list:
+                relationships = None
+            else:
+                plan.append((name, attrname, _NO_COMPAT_RULE))
+                continue
+            if relationships:
+                version = _subobject_compat_version(target_version,
+                                                    relationships)
+            elif self.is_list:
+                # NOTE: Lists without version information backport their
+                # objects to 1.0, like ovo does.
+                version = '1.0'
+            else:
+                version = False
+            if version is not False:
+                plan.append((name, attrname, version))
+        return plan
+
+    def make_compatible(self, obj, primitive, target_version):
+        """Backport the sub-objects of obj in primitive.
+
+        :returns: False if obj has version rules of its own, which can not
+                  use the plans of its class, True otherwise
+        """
+        if ('obj_relationships' in obj.__dict__ or
+                'child_versions' in obj.__dict__):
+            return False
+        manifest = getattr(obj, '_obj_version_manifest', None)
+        values = obj.__dict__
+        for name, attrname, version in self.compat_plan(obj, target_version,
+                                                        manifest):
+            if attrname not in values:
+                continue
+            if version is _NO_COMPAT_RULE:
+                raise ovoo_exc.ObjectActionError(
+                    action='obj_make_compatible',
+                    reason='No rule for %s' % name)
+            if version is None:
+                del primitive[name]
+            else:
+                _backport_subobject(values[attrname], primitive[name],
+                                    version, manifest)
+        return True
+
+    def from_primitive(self, cls, context, objver, primitive):
+        obj = cls()
+        obj._context = context
+        obj.VERSION = objver
+        data = primitive[self.data_key]
+        changes = primitive.get(self.changes_key, [])
+        values = obj.__dict__
+        for name, attrname, field, trusted in self.decoders:
+            if name not in data:
+                continue
+            value = data[name]
+            if trusted and (value is not None or field.nullable):
+                values[attrname] = value
+            else:
+                setattr(obj, name, field.from_primitive(obj, name, value))
+        obj._changed_fields = set([name for name in changes
+                                   if name in self.field_names])
+        return obj
+
+    def set_db_fields(self, obj, db_obj, names):
+        values = obj.__dict__
+        changed = obj._changed_fields
+        for name in names:
+            value = db_obj[name]
+            if name in self.db_fields and (
+                    value is not None or obj.fields[name].nullable):
+                values[get_attrname(name)] = value
+                changed.add(name)
+            else:
+                setattr(obj, name, value)
+
+
 class NovaObjectRegistry(ovoo_base.VersionedObjectRegistry):
     notification_classes = []
 
@@ -69,6 +333,10 @@ class NovaObjectRegistry(ovoo_base.VersionedObjectRegistry):
                 getattr(objects, cls.obj_name()).VERSION)
             if version >= cur_version:
                 setattr(objects, cls.obj_name(), cls)
+        # NOTE: Stored on the class itself so that unregistered subclasses,
+        # which may add fields, fall back to the generic conversion.
+        cls._obj_codec = _ObjectCodec(cls)
+        _VERSION_MANIFESTS.clear()
 
     @classmethod
     def register_notification(cls, notification_cls):
@@ -130,6 +398,108 @@ class NovaObject(ovoo_base.VersionedObject):
         finally:
             self._context = original_context
 
+    @classmethod
+    def _obj_get_codec(cls):
+        return cls.__dict__.get('_obj_codec')
+
+    def obj_to_primitive(self, target_version=None, version_manifest=None):
+        codec = self._obj_get_codec()
+        if codec is None:
+            return super(NovaObject, self).obj_to_primitive(
+                target_version=target_version,
+                version_manifest=version_manifest)
+        return codec.to_primitive(self, target_version, version_manifest)
+
+    def obj_make_compatible(self, primitive, target_version):
+        codec = self._obj_get_codec()
+        if (codec is None or
+                not codec.make_compatible(self, primitive, target_version)):
+            super(NovaObject, self).obj_make_compatible(primitive,
+                                                        target_version)
+
+    @classmethod
+    def _obj_from_primitive(cls, context, objver, primitive):
+        codec = cls._obj_get_codec()
+        # NOTE: Only a primitive of our own version was built from values
+        # already coerced by this class, so only those can skip coercion.
+        if codec is None or objver != cls.VERSION:
+            return super(NovaObject, cls)._obj_from_primitive(
+                context, objver, primitive)
+        return codec.from_primitive(cls, context, objver, primitive)
+
+    def obj_what_changed(self):
+        codec = self._obj_get_codec()
+        if codec is None:
+            return super(NovaObject, self).obj_what_changed()
+        return codec.what_changed(self)
+
+    def _obj_bulk_load_attr(self, attrname):
+        """Lazy-load attrname together with the list this object came from.
+
+        :param attrname: The name of the attribute to load
+        :returns: True if attrname was loaded in bulk, False otherwise
+        """
+        ref = getattr(self, '_obj_list_ref', None)
+        objlist = ref() if ref is not None else None
+        if objlist is None:
+            return False
+        return objlist.obj_bulk_load_attr(self, attrname)
+
+    def _obj_set_db_fields(self, db_obj, names):
+        """Set fields from a database row.
+
+        Values of fields whose type would not change what the database
+        returns are stored without going through coercion.
+
+        :param db_obj: The database row to take values from
+        :param names: The names of the fields to set
+        """
+        codec = self._obj_get_codec()
+        if codec is None:
+            for name in names:
+                setattr(self, name, db_obj[name])
+        else:
+            codec.set_db_fields(self, db_obj, names)
+
+    def obj_delta_fields(self, objmethod):
+        """Return the fields objmethod needs when called over RPC.
+
+        Objects can override this for remotable methods which only act on
+        what has changed, such as save(), so that only those fields are sent
+        to conductor instead of the whole object.
+
+        :param objmethod: The name of the remotable method being called
+        :returns: A set of field names, or None if the whole object is needed
+        """
+        return None
+
+    def obj_to_delta_primitive(self, objmethod):
+        """Simple base-case delta serialization mechanism.
+
+        This builds a primitive like obj_to_primitive() does, except that
+        only the fields returned by obj_delta_fields() are included.
+
+        :param objmethod: The name of the remotable method being called
+        :returns: A primitive, or None if the whole object is needed
+        """
+        delta_fields = self.obj_delta_fields(objmethod)
+        if delta_fields is None:
+            return None
+        primitive = {}
+        for name in delta_fields:
+            if self.obj_attr_is_set(name):
+                primitive[name] = self.fields[name].to_primitive(
+                    self, name, getattr(self, name))
+        obj = {self._obj_primitive_key('name'): self.obj_name(),
+               self._obj_primitive_key('namespace'): (
+                   self.OBJ_PROJECT_NAMESPACE),
+               self._obj_primitive_key('version'): self.VERSION,
+               self._obj_primitive_key('data'): primitive}
+        changes = self.obj_what_changed()
+        if changes:
+            obj[self._obj_primitive_key('changes')] = list(changes)
+        return obj
+
 
 class NovaPersistentObject(object):
     """Mixin class for Persistent objects.
@@ -203,6 +573,67 @@ class ObjectListBase(ovoo_base.ObjectListBase):
         else:
             return primitive.get(key, default)
 
+    # Maps attributes of the objects in the list to the name of a method
+    # of the list which can lazy-load them for many objects at once. The
+    # method is called with the attribute name and the objects to load it
+    # for.
+    obj_bulk_loaders = {}
+
+    def obj_make_compatible(self, primitive, target_version):
+        codec = self._obj_get_codec()
+        if (codec is None or
+                not codec.make_compatible(self, primitive, target_version)):
+            super(ObjectListBase, self).obj_make_compatible(primitive,
+                                                            target_version)
+
+    @classmethod
+    def _obj_from_primitive(cls, context, objver, primitive):
+        self = super(ObjectListBase, cls)._obj_from_primitive(
+            context, objver, primitive)
+        self.obj_link_objects()
+        return self
+
+    def obj_link_objects(self):
+        """Let the objects in this list lazy-load attributes together.
+
+        Once linked, the first lazy-load of an attribute which has a bulk
+        loader on any of the objects loads it for all of the objects in
+        the list which do not have it yet.
+        """
+        if (not self.obj_bulk_loaders or
+                not self.obj_attr_is_set('objects')):
+            return
+        # NOTE: Only keep a weak reference, objects should not keep the
+        # list they came from alive.
+        ref = weakref.ref(self)
+        for obj in self.objects:
+            obj._obj_list_ref = ref
+
+    def obj_bulk_load_attr(self, obj, attrname):
+        """Lazy-load an attribute of obj and of its siblings in this list.
+
+        :param obj: The object in this list that needs attrname
+        :param attrname: The name of the attribute to load
+        :returns: True if attrname was loaded in bulk, False if obj should
+                  load it itself
+        """
+        loader = self.obj_bulk_loaders.get(attrname)
+        if loader is None:
+            return False
+        # NOTE: Objects can come from several cells, each with its own
+        # context, so only load those which share the context of obj.
+        objs = [other for other in self.objects
+                if other._context is obj._context and
+                not other.obj_attr_is_set(attrname)]
+        if len(objs) < 2 or not any(other is obj for other in objs):
+            return False
+        getattr(self, loader)(attrname, objs)
+        return True
+
+
+def _intern_keys(pairs):
+    return {sys.intern(key): value for key, value in pairs}
+
 
 class NovaObjectSerializer(messaging.NoOpSerializer):
     """A NovaObject-aware Serializer.
@@ -213,6 +644,8 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
     should pass this to its RPCClient and RPCServer objects.
     """
 
+    COMPRESSED_KEY = 'nova_object.zlib'
+
     @property
     def conductor(self):
         if not hasattr(self, '_conductor'):
@@ -232,7 +665,7 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
                     '.'.join(objver.split('.')[:2])
                 return self._process_object(context, objprim)
             objname = objprim['nova_object.name']
-            version_manifest = ovoo_base.obj_tree_get_versions(objname)
+            version_manifest = obj_tree_get_versions(objname)
             if objname in version_manifest:
                 objinst = self.conductor.object_backport_versions(
                     context, objprim, version_manifest)
@@ -271,7 +704,54 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
             entity = entity.obj_to_primitive()
         return entity
 
+    def compress_entity(self, context, entity, threshold):
+        """Serialize an entity and compress it if it is large.
+
+        The compressed form can only be understood by services which handle
+        it in deserialize_entity(), so callers must only use this when the
+        RPC version negotiated with the receiver allows it.
+
+        :param context: Request context
+        :param entity: The entity to serialize
+        :param threshold: Size in bytes of the serialized entity above
+                          which it is compressed
+        :returns: The serialized entity, or a dict holding its compressed
+                  form if it was larger than threshold
+        """
+        entity = self.serialize_entity(context, entity)
+        # NOTE: The entity is encoded piece by piece so that finding out
+        # whether it is larger than threshold only encodes up to threshold
+        # bytes of it, and the pieces encoded so far are then compressed
+        # along with the rest rather than thrown away.
+        chunks = json.JSONEncoder(
+            default=jsonutils.to_primitive).iterencode(entity)
+        head = []
+        size = 0
+        for chunk in chunks:
+            chunk = chunk.encode('utf-8')
+            head.append(chunk)
+            size += len(chunk)
+            if size > threshold:
+                break
+        else:
+            return entity
+        compressor = zlib.compressobj()
+        data = [compressor.compress(chunk) for chunk in head]
+        data.extend(compressor.compress(chunk.encode('utf-8'))
+                    for chunk in chunks)
+        data.append(compressor.flush())
+        return {self.COMPRESSED_KEY: base64.encode_as_text(b''.join(data))}
+
+    def _decompress_entity(self, entity):
+        data = zlib.decompress(
+            base64.decode_as_bytes(entity[self.COMPRESSED_KEY]))
+        # NOTE: Field names and other dict keys repeat a lot in object
+        # primitives, so intern them rather than keeping a copy per dict.
+        return jsonutils.loads(data, object_pairs_hook=_intern_keys)
+
     def deserialize_entity(self, context, entity):
+        if isinstance(entity, dict) and self.COMPRESSED_KEY in entity:
+            entity = self._decompress_entity(entity)
         if isinstance(entity, dict) and 'nova_object.name' in entity:
             entity = self._process_object(context, entity)
         elif isinstance(entity, (tuple, list, set, dict)):
@@ -280,6 +760,19 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
         return entity
 
 
+def obj_tree_get_versions(objname):
+    """Return the versions of objname and of all the objects it can hold.
+
+    This is ovo's obj_tree_get_versions(), which walks the whole registry,
+    remembered for each object until another object class is registered.
+    """
+    manifest = _VERSION_MANIFESTS.get(objname)
+    if manifest is None:
+        manifest = ovoo_base.obj_tree_get_versions(objname)
+        _VERSION_MANIFESTS[objname] = manifest
+    return dict(manifest)
+
+
 def obj_to_primitive(obj):
     """Recursively turn an object into a python primitive.
 
@@ -361,6 +854,18 @@ def serialize_args(fn):
             else classmethod(wrapper))
 
 
+def _strip_prim(prim, keys):
+    if isinstance(prim, dict):
+        for k in keys:
+            prim.pop(k, None)
+        for v in prim.values():
+            _strip_prim(v, keys)
+    if isinstance(prim, list):
+        for v in prim:
+            _strip_prim(v, keys)
+    return prim
+
+
 def obj_equal_prims(obj_1, obj_2, ignore=None):
     """Compare two primitives for equivalence ignoring some keys.
 
@@ -375,22 +880,42 @@ def obj_equal_prims(obj_1, obj_2, ignore=None):
     :returns: True if the primitives are equal ignoring changes
     and specified fields, otherwise False.
     """
-
-    def _strip(prim, keys):
-        if isinstance(prim, dict):
-            for k in keys:
-                prim.pop(k, None)
-            for v in prim.values():
-                _strip(v, keys)
-        if isinstance(prim, list):
-            for v in prim:
-                _strip(v, keys)
-        return prim
-
     if ignore is not None:
         keys = ['nova_object.changes'] + ignore
     else:
         keys = ['nova_object.changes']
-    prim_1 = _strip(obj_1.obj_to_primitive(), keys)
-    prim_2 = _strip(obj_2.obj_to_primitive(), keys)
+    prim_1 = _strip_prim(obj_1.obj_to_primitive(), keys)
+    prim_2 = _strip_prim(obj_2.obj_to_primitive(), keys)
     return prim_1 == prim_2
+
+
+def obj_diff_fields(obj_1, obj_2, ignore=None):
+    """Return the names of the fields whose primitives differ.
+
+    This is the field level counterpart of obj_equal_prims(): a field set on
+    only one of the objects is considered different, and the list of changed
+    fields of nested objects is ignored.
+
+    :param:obj1: The first object in the comparison
+    :param:obj2: The second object in the comparison
+    :param:ignore: A list of fields to ignore
+    :returns: A set of field names
+    """
+    ignore = set(ignore or [])
+    keys = ['nova_object.changes']
+    diff = set()
+    for name, field in obj_1.fields.items():
+        if name in ignore:
+            continue
+        is_set_1 = obj_1.obj_attr_is_set(name)
+        is_set_2 = obj_2.obj_attr_is_set(name)
+        if not is_set_1 and not is_set_2:
+            continue
+        if is_set_1 != is_set_2:
+            diff.add(name)
+            continue
+        prim_1 = field.to_primitive(obj_1, name, getattr(obj_1, name))
+        prim_2 = field.to_primitive(obj_2, name, getattr(obj_2, name))
+        if _strip_prim(prim_1, keys) != _strip_prim(prim_2, keys):
+            diff.add(name)
+    return diff
@@ -351,7 +351,8 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
     # Version 1.15: BlockDeviceMapping <= version 1.14
     # Version 1.16: BlockDeviceMapping <= version 1.15
     # Version 1.17: Add get_by_instance_uuids()
-    VERSION = '1.17'
+    # Version 1.18: Add update_or_create_bulk()
+    VERSION = '1.18'
 
     fields = {
         'objects': fields.ListOfObjectsField('BlockDeviceMapping'),
@@ -398,6 +399,35 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(
                 context, cls(), objects.BlockDeviceMapping, db_bdms or [])
 
+    @base.remotable_classmethod
+    def update_or_create_bulk(cls, context, bdms):
+        """Update or create the given block device mappings.
+
+        This is the equivalent of calling update_or_create() on each of the
+        BlockDeviceMapping objects, but all of the records are written in a
+        single database transaction.
+
+        :param context: security context used for database calls
+        :param bdms: list of BlockDeviceMapping objects which have not been
+            created yet
+        :returns: BlockDeviceMappingList of the records written, in the same
+            order as bdms
+        """
+        values_list = []
+        for bdm in bdms:
+            if bdm.obj_attr_is_set('id'):
+                raise exception.ObjectActionError(action='create',
+                                                  reason='already created')
+            updates = bdm.obj_get_changes()
+            if 'instance' in updates:
+                raise exception.ObjectActionError(action='create',
+                                                  reason='instance assigned')
+            values_list.append(updates)
+        db_bdms = db.block_device_mapping_update_or_create_bulk(
+            context, values_list, legacy=False)
+        return base.obj_make_list(
+                context, cls(), objects.BlockDeviceMapping, db_bdms)
+
     def root_bdm(self):
         """It only makes sense to call this method when the
         BlockDeviceMappingList contains BlockDeviceMappings from
@@ -278,6 +278,30 @@ class BuildRequestList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.BuildRequest,
                                   db_build_reqs)
 
+    @staticmethod
+    @db.api_context_manager.writer
+    def _destroy_bulk_in_db(context, instance_uuids):
+        # Lock the rows so a concurrent delete from the API either finishes
+        # before we look at them or finds them gone once we are done.
+        query = context.session.query(
+            api_models.BuildRequest.instance_uuid).filter(
+            api_models.BuildRequest.instance_uuid.in_(instance_uuids))
+        found = [row.instance_uuid for row in query.with_for_update()]
+        if found:
+            context.session.query(api_models.BuildRequest).filter(
+                api_models.BuildRequest.instance_uuid.in_(found)).delete(
+                synchronize_session=False)
+        return found
+
+    @classmethod
+    def destroy_bulk(cls, context, instance_uuids):
+        """Destroy the build requests of the given instances.
+
+        :returns: The list of instance uuids whose build request was
+            destroyed; build requests which were already gone are skipped.
+        """
+        return cls._destroy_bulk_in_db(context, instance_uuids)
+
     @staticmethod
     def _pass_exact_filters(instance, filters):
         for filter_key, filter_val in filters.items():
@@ -274,7 +274,8 @@ class CellMappingList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(), CellMapping, db_mappings)
 
     @staticmethod
-    @db_api.api_context_manager.reader
+    @db_api.pick_api_context_manager_reader
+    @db_api.replica_safe
     def _get_by_project_id_from_db(context, project_id):
         # SELECT DISTINCT cell_id FROM instance_mappings \
         #   WHERE project_id = $project_id;
@@ -13,6 +13,7 @@
 #    under the License.
 
 
+from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import uuidutils
 from oslo_utils import versionutils
@@ -28,8 +29,38 @@ from nova import objects
 from nova.objects import base
 from nova.objects import fields
 from nova.objects import pci_device_pool
+from nova import utils
 
 CONF = nova.conf.CONF
+LOG = logging.getLogger(__name__)
+
+
+# These fields hold large serialized values which many users of compute
+# nodes do not need, so they can be left out when loading compute nodes
+# and lazy-loaded when accessed.
+COMPUTE_NODE_OPTIONAL_ATTRS = ['cpu_info', 'numa_topology', 'pci_device_pools',
+                               'stats', 'supported_hv_specs']
+
+# The database columns of the fields which are named differently
+_DB_COLUMNS = {
+    'pci_device_pools': 'pci_stats',
+    'supported_hv_specs': 'supported_instances',
+}
+
+
+def _expected_cols(expected_attrs):
+    """Return the compute_nodes columns needed to load expected_attrs.
+
+    :param expected_attrs: The optional attributes to load, or None for all
+    :returns: A list of column names, or None for all of them
+    """
+    if expected_attrs is None:
+        return None
+    skipped = set(_DB_COLUMNS.get(attrname, attrname)
+                  for attrname in COMPUTE_NODE_OPTIONAL_ATTRS
+                  if attrname not in expected_attrs)
+    return [column.name for column in models.ComputeNode.__table__.columns
+            if column.name not in skipped]
 
 
 @base.NovaObjectRegistry.register
@@ -98,6 +129,9 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject):
         'mapped': fields.IntegerField(),
         }
 
+    # The database values of the JSON fields which have not been decoded yet
+    _db_blobs = {}
+
     def obj_make_compatible(self, primitive, target_version):
         super(ComputeNode, self).obj_make_compatible(primitive, target_version)
         target_version = versionutils.convert_version_to_tuple(target_version)
@@ -172,7 +206,7 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject):
             compute.host = None
 
     @staticmethod
-    def _from_db_object(context, compute, db_compute):
+    def _from_db_object(context, compute, db_compute, expected_attrs=None):
         special_cases = set([
             'stats',
             'supported_hv_specs',
@@ -180,6 +214,8 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject):
             'pci_device_pools',
             ])
         fields = set(compute.fields) - special_cases
+        if expected_attrs is not None:
+            fields -= set(COMPUTE_NODE_OPTIONAL_ATTRS) - set(expected_attrs)
         online_updates = {}
         for key in fields:
             value = db_compute[key]
@@ -223,21 +259,11 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject):
         if online_updates:
             db.compute_node_update(context, compute.id, online_updates)
 
-        stats = db_compute['stats']
-        if stats:
-            compute.stats = jsonutils.loads(stats)
-
-        sup_insts = db_compute.get('supported_instances')
-        if sup_insts:
-            hv_specs = jsonutils.loads(sup_insts)
-            hv_specs = [objects.HVSpec.from_list(hv_spec)
-                        for hv_spec in hv_specs]
-            compute.supported_hv_specs = hv_specs
-
-        pci_stats = db_compute.get('pci_stats')
-        if pci_stats is not None:
-            pci_stats = pci_device_pool.from_pci_stats(pci_stats)
-        compute.pci_device_pools = pci_stats
+        for attrname in special_cases & set(COMPUTE_NODE_OPTIONAL_ATTRS):
+            if expected_attrs is None or attrname in expected_attrs:
+                compute._set_db_blob(
+                    attrname, db_compute.get(_DB_COLUMNS.get(attrname,
+                                                             attrname)))
         compute._context = context
 
         # Make sure that we correctly set the host field depending on either
@@ -248,6 +274,86 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject):
 
         return compute
 
+    def _set_db_blob(self, attrname, value):
+        """Set a JSON field from its database value, decoding it lazily."""
+        if attrname == 'pci_device_pools' and value is None:
+            self.pci_device_pools = None
+            return
+        if attrname != 'pci_device_pools' and not value:
+            return
+        if '_db_blobs' not in self.__dict__:
+            self._db_blobs = {}
+        if hasattr(self, base.get_attrname(attrname)):
+            delattr(self, base.get_attrname(attrname))
+        self._db_blobs[attrname] = value
+
+    def _decode_db_blob(self, attrname):
+        value = self._db_blobs.pop(attrname)
+        # NOTE: The field may have been set since it was loaded, in which
+        # case the database value is stale.
+        if hasattr(self, base.get_attrname(attrname)):
+            return
+        if attrname == 'stats':
+            value = jsonutils.loads(value)
+        elif attrname == 'supported_hv_specs':
+            value = [objects.HVSpec.from_list(hv_spec)
+                     for hv_spec in jsonutils.loads(value)]
+        else:
+            value = pci_device_pool.from_pci_stats(value)
+        setattr(self, attrname, value)
+        self.obj_reset_changes([attrname])
+
+    def _set_optional_attr(self, attrname, db_compute):
+        value = db_compute.get(_DB_COLUMNS.get(attrname, attrname))
+        if attrname in ('cpu_info', 'numa_topology'):
+            if (attrname == 'numa_topology' and value and
+                    'nova_object.name' not in value):
+                value = objects.NUMATopology.from_legacy_object(value)
+            setattr(self, attrname, value)
+            self.obj_reset_changes([attrname])
+        else:
+            self._set_db_blob(attrname, value)
+
+    @staticmethod
+    def _load_optional_attr(context, attrname, computes):
+        """Load an optional attribute of compute nodes from the database."""
+        column = _DB_COLUMNS.get(attrname, attrname)
+        with utils.temporary_mutation(context, read_deleted='yes'):
+            db_computes = db.compute_node_get_all_by_ids(
+                context, [compute.id for compute in computes],
+                columns=['id', column])
+        db_computes = {db_compute['id']: db_compute
+                       for db_compute in db_computes}
+        for compute in computes:
+            if compute.id in db_computes:
+                compute._set_optional_attr(attrname, db_computes[compute.id])
+
+    def obj_attr_is_set(self, attrname):
+        return (attrname in self._db_blobs or
+                super(ComputeNode, self).obj_attr_is_set(attrname))
+
+    def obj_load_attr(self, attrname):
+        if (attrname not in self._db_blobs and
+                attrname in COMPUTE_NODE_OPTIONAL_ATTRS and
+                self._context and 'id' in self):
+            LOG.debug("Lazy-loading '%(attr)s' on %(name)s id %(id)s",
+                      {'attr': attrname, 'name': self.obj_name(),
+                       'id': self.id})
+            # NOTE: If this compute node came from a list, load the attribute
+            # for all of the compute nodes in it which need it in one go.
+            if not self._obj_bulk_load_attr(attrname):
+                self._load_optional_attr(self._context, attrname, [self])
+        if attrname in self._db_blobs:
+            self._decode_db_blob(attrname)
+        if not hasattr(self, base.get_attrname(attrname)):
+            super(ComputeNode, self).obj_load_attr(attrname)
+
+    def obj_to_primitive(self, target_version=None, version_manifest=None):
+        for attrname in list(self._db_blobs):
+            self._decode_db_blob(attrname)
+        return super(ComputeNode, self).obj_to_primitive(
+            target_version=target_version, version_manifest=version_manifest)
+
     @base.remotable_classmethod
     def get_by_id(cls, context, compute_id):
         db_compute = db.compute_node_get(context, compute_id)
@@ -408,16 +514,43 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
     # Version 1.15 Added get_by_pagination()
     # Version 1.16: Added get_all_by_uuids()
     # Version 1.17: Added get_all_by_not_mapped()
-    VERSION = '1.17'
+    # Version 1.18: Added expected_attrs to get_all(), get_by_pagination()
+    #               and get_all_by_uuids()
+    VERSION = '1.18'
     fields = {
         'objects': fields.ListOfObjectsField('ComputeNode'),
         }
 
+    obj_bulk_loaders = dict.fromkeys(COMPUTE_NODE_OPTIONAL_ATTRS,
+                                     '_bulk_load_attr')
+
+    def _bulk_load_attr(self, attrname, computes):
+        LOG.debug('Lazy-loading %(attr)s on %(count)i compute nodes in bulk',
+                  {'attr': attrname, 'count': len(computes)})
+        ComputeNode._load_optional_attr(computes[0]._context, attrname,
+                                        computes)
+
+    @classmethod
+    def _make_list(cls, context, db_computes, expected_attrs):
+        computes = base.obj_make_list(context, cls(context),
+                                      objects.ComputeNode, db_computes,
+                                      expected_attrs=expected_attrs)
+        computes.obj_link_objects()
+        return computes
+
     @base.remotable_classmethod
-    def get_all(cls, context):
-        db_computes = db.compute_node_get_all(context)
-        return base.obj_make_list(context, cls(context), objects.ComputeNode,
-                                  db_computes)
+    def get_all(cls, context, expected_attrs=None):
+        """Return all compute nodes.
+
+        :param context: The security context
+        :param expected_attrs: The names of the optional attributes, from
+                               COMPUTE_NODE_OPTIONAL_ATTRS, to load. The
+                               others are lazy-loaded when accessed. All of
+                               them are loaded if None.
+        """
+        db_computes = db.compute_node_get_all(
+            context, columns=_expected_cols(expected_attrs))
+        return cls._make_list(context, db_computes, expected_attrs)
 
     @base.remotable_classmethod
     def get_all_by_not_mapped(cls, context, mapped_less_than):
@@ -428,11 +561,12 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
                                   db_computes)
 
     @base.remotable_classmethod
-    def get_by_pagination(cls, context, limit=None, marker=None):
+    def get_by_pagination(cls, context, limit=None, marker=None,
+                          expected_attrs=None):
         db_computes = db.compute_node_get_all_by_pagination(
-            context, limit=limit, marker=marker)
-        return base.obj_make_list(context, cls(context), objects.ComputeNode,
-                                  db_computes)
+            context, limit=limit, marker=marker,
+            columns=_expected_cols(expected_attrs))
+        return cls._make_list(context, db_computes, expected_attrs)
 
     @base.remotable_classmethod
     def get_by_hypervisor(cls, context, hypervisor_match):
@@ -469,17 +603,27 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
 
     @staticmethod
     @db.select_db_reader_mode
-    def _db_compute_node_get_all_by_uuids(context, compute_uuids):
-        db_computes = sa_api.model_query(context, models.ComputeNode).filter(
+    @db.replica_safe
+    def _db_compute_node_get_all_by_uuids(context, compute_uuids,
+                                          columns=None):
+        if columns is None:
+            db_computes = sa_api.model_query(context, models.ComputeNode)
+        else:
+            db_computes = sa_api.model_query(
+                context, models.ComputeNode,
+                args=[getattr(models.ComputeNode, column)
+                      for column in columns])
+        db_computes = db_computes.filter(
             models.ComputeNode.uuid.in_(compute_uuids)).all()
+        if columns is not None:
+            db_computes = [db_compute._asdict() for db_compute in db_computes]
         return db_computes
 
     @base.remotable_classmethod
-    def get_all_by_uuids(cls, context, compute_uuids):
-        db_computes = cls._db_compute_node_get_all_by_uuids(context,
-                                                            compute_uuids)
-        return base.obj_make_list(context, cls(context), objects.ComputeNode,
-                                  db_computes)
+    def get_all_by_uuids(cls, context, compute_uuids, expected_attrs=None):
+        db_computes = cls._db_compute_node_get_all_by_uuids(
+            context, compute_uuids, columns=_expected_cols(expected_attrs))
+        return cls._make_list(context, db_computes, expected_attrs)
 
     @staticmethod
     @db.select_db_reader_mode
@@ -12,9 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
+import time
+
 from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import utils as sqlalchemyutils
 from oslo_utils import versionutils
+import sqlalchemy as sa
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.expression import asc
@@ -48,6 +52,133 @@ def _dict_with_extra_specs(flavor_model):
     return dict(flavor_model, extra_specs=extra_specs)
 
 
+class _FlavorCache(object):
+    """Process-local cache of all flavors, see [api]/flavor_cache_time."""
+
+    def __init__(self):
+        # The version of the flavors in the API database when they were
+        # loaded, see _flavor_cache_version_from_db().
+        self.version = None
+        # The time.monotonic() times the flavors were loaded and the version
+        # was last checked.
+        self.loaded_at = None
+        self.checked_at = None
+        # Incremented each time the flavors are changed by this process, so
+        # that flavors loaded concurrently are not cached.
+        self.generation = 0
+        self.by_id = {}
+        self.by_flavorid = {}
+        self.by_name = {}
+        # The ids of the non-public flavors each project can access.
+        self.flavor_ids_by_project = {}
+
+    def invalidate(self):
+        self.version = self.loaded_at = self.checked_at = None
+        self.generation += 1
+
+    def load(self, version, db_flavors, loaded_at):
+        flavor_ids_by_project = {}
+        for db_flavor in db_flavors:
+            for project_id in db_flavor.pop('projects'):
+                flavor_ids_by_project.setdefault(project_id, set()).add(
+                    db_flavor['id'])
+        self.by_id = {f['id']: f for f in db_flavors}
+        self.by_flavorid = {f['flavorid']: f for f in db_flavors}
+        self.by_name = {f['name']: f for f in db_flavors}
+        self.flavor_ids_by_project = flavor_ids_by_project
+        self.version = version
+        self.loaded_at = loaded_at
+
+    def get(self, context, index, value):
+        """Return a copy of a cached flavor the context can access, or None.
+
+        Callers look up the flavors missing from the cache in the database,
+        whose comparisons may differ, for example be case-insensitive.
+        """
+        db_flavor = index.get(value)
+        if db_flavor is None or not (
+                context.is_admin or db_flavor['is_public'] or
+                db_flavor['id'] in self.flavor_ids_by_project.get(
+                    context.project_id, ())):
+            return None
+        return dict(db_flavor, extra_specs=dict(db_flavor['extra_specs']))
+
+
+_FLAVOR_CACHE = _FlavorCache()
+# The flavors are reloaded after this many [api]/flavor_cache_time periods
+# even if their version did not change.
+_FLAVOR_CACHE_RELOAD_PERIODS = 10
+
+
+@db_api.api_context_manager.reader
+def _flavor_cache_version_from_db(context):
+    """Return a value which changes whenever flavors are changed.
+
+    Rows are hard deleted from the flavor tables, so their count and maximum
+    id change when rows are created or deleted, and their maximum updated_at
+    when rows are updated. The latter can miss updates made within the same
+    second, as updated_at only has a resolution of one second on MySQL, or by
+    a node whose clock is behind, which is why _get_flavor_cache() also
+    reloads the flavors periodically.
+    """
+    columns = []
+    for model in (api_models.Flavors, api_models.FlavorExtraSpecs,
+                  api_models.FlavorProjects):
+        columns.extend(sa.select([func(column)]).as_scalar()
+                       for func, column in ((sa.func.count, model.id),
+                                            (sa.func.max, model.id),
+                                            (sa.func.max, model.updated_at)))
+    return tuple(context.session.query(*columns).one())
+
+
+@db_api.api_context_manager.reader
+def _flavor_get_all_for_cache_from_db(context):
+    query = context.session.query(api_models.Flavors).\
+            options(joinedload('extra_specs')).\
+            options(joinedload('projects')).\
+            order_by(asc(api_models.Flavors.id))
+    return [dict(_dict_with_extra_specs(db_flavor),
+                 projects=[x['project_id'] for x in db_flavor['projects']])
+            for db_flavor in query.all()]
+
+
+def _get_flavor_cache(context):
+    """Return the flavor cache, reloading it if flavors changed.
+
+    :returns: The _FlavorCache, or None if flavors are not cached
+    """
+    cache_time = CONF.api.flavor_cache_time
+    if not cache_time:
+        return None
+    cache = _FLAVOR_CACHE
+    now = time.monotonic()
+    if cache.checked_at is not None and now - cache.checked_at < cache_time:
+        return cache
+    generation = cache.generation
+    version = _flavor_cache_version_from_db(context)
+    if (version != cache.version or now - cache.loaded_at >=
+            cache_time * _FLAVOR_CACHE_RELOAD_PERIODS):
+        db_flavors = _flavor_get_all_for_cache_from_db(context)
+        if generation != cache.generation:
+            # NOTE: This process changed flavors in the meantime, which the
+            # flavors just loaded may not include.
+            return None
+        cache.load(version, db_flavors, now)
+    cache.checked_at = now
+    return cache
+
+
+def _invalidates_flavor_cache(f):
+    """Decorator invalidating the flavor cache once f changed flavors."""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _FLAVOR_CACHE.invalidate()
+    return wrapper
+
+
 # NOTE(danms): There are some issues with the oslo_db context manager
 # decorators with static methods. We pull these out for now and can
 # move them back into the actual staticmethods on the object when those
@@ -63,6 +194,7 @@ def _get_projects_from_db(context, flavorid):
     return [x['project_id'] for x in db_flavor['projects']]
 
 
+@_invalidates_flavor_cache
 @db_api.api_context_manager.writer
 def _flavor_add_project(context, flavor_id, project_id):
     project = api_models.FlavorProjects()
@@ -75,6 +207,7 @@ def _flavor_add_project(context, flavor_id, project_id):
                                            project_id=project_id)
 
 
+@_invalidates_flavor_cache
 @db_api.api_context_manager.writer
 def _flavor_del_project(context, flavor_id, project_id):
     result = context.session.query(api_models.FlavorProjects).\
@@ -86,6 +219,7 @@ def _flavor_del_project(context, flavor_id, project_id):
                                              project_id=project_id)
 
 
+@_invalidates_flavor_cache
 @db_api.api_context_manager.writer
 def _flavor_extra_specs_add(context, flavor_id, specs, max_retries=10):
     writer = db_api.api_context_manager.writer
@@ -123,6 +257,7 @@ def _flavor_extra_specs_add(context, flavor_id, specs, max_retries=10):
                     id=flavor_id, retries=max_retries)
 
 
+@_invalidates_flavor_cache
 @db_api.api_context_manager.writer
 def _flavor_extra_specs_del(context, flavor_id, key):
     result = context.session.query(api_models.FlavorExtraSpecs).\
@@ -134,6 +269,7 @@ def _flavor_extra_specs_del(context, flavor_id, key):
             extra_specs_key=key, flavor_id=flavor_id)
 
 
+@_invalidates_flavor_cache
 @db_api.api_context_manager.writer
 def _flavor_create(context, values):
     specs = values.get('extra_specs')
@@ -170,6 +306,7 @@ def _flavor_create(context, values):
     return _dict_with_extra_specs(db_flavor)
 
 
+@_invalidates_flavor_cache
 @db_api.api_context_manager.writer
 def _flavor_destroy(context, flavor_id=None, flavorid=None):
     query = context.session.query(api_models.Flavors)
@@ -285,6 +422,11 @@ class Flavor(base.NovaPersistentObject, base.NovaObject,
     @require_context
     def _flavor_get_from_db(context, id):
         """Returns a dict describing specific flavor."""
+        cache = _get_flavor_cache(context)
+        if cache is not None:
+            result = cache.get(context, cache.by_id, id)
+            if result:
+                return result
         result = Flavor._flavor_get_query_from_db(context).\
                         filter_by(id=id).\
                         first()
@@ -296,6 +438,11 @@ class Flavor(base.NovaPersistentObject, base.NovaObject,
     @require_context
     def _flavor_get_by_name_from_db(context, name):
         """Returns a dict describing specific flavor."""
+        cache = _get_flavor_cache(context)
+        if cache is not None:
+            result = cache.get(context, cache.by_name, name)
+            if result:
+                return result
         result = Flavor._flavor_get_query_from_db(context).\
                             filter_by(name=name).\
                             first()
@@ -307,6 +454,11 @@ class Flavor(base.NovaPersistentObject, base.NovaObject,
     @require_context
     def _flavor_get_by_flavor_id_from_db(context, flavor_id):
         """Returns a dict describing specific flavor_id."""
+        cache = _get_flavor_cache(context)
+        if cache is not None:
+            result = cache.get(context, cache.by_flavorid, flavor_id)
+            if result:
+                return result
         result = Flavor._flavor_get_query_from_db(context).\
                         filter_by(flavorid=flavor_id).\
                         order_by(asc(api_models.Flavors.id)).\
@@ -486,6 +638,7 @@ class Flavor(base.NovaPersistentObject, base.NovaObject,
 
     # NOTE(mriedem): This method is not remotable since we only expect the API
     # to be able to make updates to a flavor.
+    @_invalidates_flavor_cache
     @db_api.api_context_manager.writer
     def _save(self, context, values):
         db_flavor = context.session.query(api_models.Flavors).\
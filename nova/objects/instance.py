@@ -69,6 +69,24 @@ INSTANCE_OPTIONAL_ATTRS = (_INSTANCE_OPTIONAL_JOINED_FIELDS +
 # These are fields that most query calls load by default
 INSTANCE_DEFAULT_FIELDS = ['metadata', 'system_metadata',
                            'info_cache', 'security_groups']
+# These are fields that lazy-load for all instances of a list at once.
+# NOTE: services and keypairs are left out since they do not load the same
+# way in bulk, and ec2_ids are not loaded from the instance query at all.
+_INSTANCE_BULK_LOADABLE_ATTRS = ['metadata', 'system_metadata', 'info_cache',
+                                 'security_groups', 'pci_devices', 'tags',
+                                 'fault', 'flavor', 'old_flavor',
+                                 'new_flavor', 'numa_topology',
+                                 'pci_requests', 'vcpu_model',
+                                 'migration_context', 'device_metadata',
+                                 'trusted_certs', 'resources']
+# These are fields that are always sent to conductor when an instance is
+# saved with [DEFAULT]/rpc_object_delta, besides the changed ones. They are
+# read by save() and the notifications it sends, or may be changed by it.
+_SAVE_DELTA_FIELDS = {'uuid', 'vm_state', 'task_state', 'power_state',
+                      'host', 'node', 'display_name', 'locked', 'progress',
+                      'launched_at', 'terminated_at', 'updated_at',
+                      'flavor', 'info_cache', 'metadata', 'system_metadata',
+                      'tags'}
 
 # Maximum count of tags to one instance
 MAX_TAG_COUNT = 50
@@ -377,15 +395,12 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         if expected_attrs is None:
             expected_attrs = []
         # Most of the field names match right now, so be quick
-        for field in instance.fields:
-            if field in INSTANCE_OPTIONAL_ATTRS:
-                continue
-            elif field == 'deleted':
-                instance.deleted = db_inst['deleted'] == db_inst['id']
-            elif field == 'cleaned':
-                instance.cleaned = db_inst['cleaned'] == 1
-            else:
-                instance[field] = db_inst[field]
+        instance._obj_set_db_fields(
+            db_inst, [field for field in instance.fields
+                      if field not in INSTANCE_OPTIONAL_ATTRS and
+                      field not in ('deleted', 'cleaned')])
+        instance.deleted = db_inst['deleted'] == db_inst['id']
+        instance.cleaned = db_inst['cleaned'] == 1
 
         if 'metadata' in expected_attrs:
             instance['metadata'] = utils.instance_meta(db_inst)
@@ -510,6 +525,7 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
 
     @staticmethod
     @db.select_db_reader_mode
+    @db.replica_safe_on_request
     def _db_instance_get_by_uuid(context, uuid, columns_to_join,
                                  use_slave=False):
         return db.instance_get_by_uuid(context, uuid,
@@ -753,6 +769,21 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 value = jsonutils.dumps(obj.obj_to_primitive())
             self._extra_values_to_save[field] = value
 
+    def obj_delta_fields(self, objmethod):
+        if objmethod != 'save':
+            return None
+        # NOTE: save() only writes what has changed and looks the instance
+        # up by uuid. It then reloads the instance, joining the optional
+        # fields which are set, and sends notifications reading the states,
+        # flavor, network info, metadata and tags, so those are sent rather
+        # than lazy-loaded by conductor. The flavors are stored together so
+        # _save_flavor() needs all of them if any changed.
+        changes = self.obj_what_changed()
+        delta_fields = changes | _SAVE_DELTA_FIELDS
+        if changes & {'flavor', 'old_flavor', 'new_flavor'}:
+            delta_fields |= {'flavor', 'old_flavor', 'new_flavor'}
+        return delta_fields
+
     # TODO(stephenfin): Remove the 'admin_state_reset' field in version 3.0 of
     # the object
     @base.remotable
@@ -1102,6 +1133,11 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                    })
 
         with utils.temporary_mutation(self._context, read_deleted='yes'):
+            # NOTE: If this instance came from a list, load the attribute
+            # for all of the instances in it which need it in one go.
+            if (self._obj_bulk_load_attr(attrname) and
+                    self.obj_attr_is_set(attrname)):
+                return
             self._obj_load_attr(attrname)
 
     def _obj_load_attr(self, attrname):
@@ -1254,6 +1290,7 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
             inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
         inst_list.objects.append(inst_obj)
     inst_list.obj_reset_changes()
+    inst_list.obj_link_objects()
     return inst_list
 
 
@@ -1289,8 +1326,44 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         'objects': fields.ListOfObjectsField('Instance'),
     }
 
+    obj_bulk_loaders = dict.fromkeys(_INSTANCE_BULK_LOADABLE_ATTRS,
+                                     '_bulk_load_attr')
+
+    def _bulk_load_attr(self, attrname, instances):
+        if attrname == 'tags':
+            # NOTE: Deleted instances never have tags, see
+            # Instance._obj_load_attr().
+            instances = [inst for inst in instances if not inst.deleted]
+        if 'flavor' in attrname:
+            expected_attr = 'flavor'
+            attrs = ['flavor', 'old_flavor', 'new_flavor']
+        else:
+            expected_attr = attrname
+            attrs = [attrname]
+        if not instances:
+            return
+        LOG.debug('Lazy-loading %(attr)s on %(count)i instances in bulk',
+                  {'attr': expected_attr, 'count': len(instances)})
+        loaded = InstanceList.get_by_filters(
+            instances[0]._context,
+            {'uuid': [inst.uuid for inst in instances]},
+            expected_attrs=[expected_attr])
+        loaded = {inst.uuid: inst for inst in loaded}
+        for inst in instances:
+            loaded_inst = loaded.get(inst.uuid)
+            if loaded_inst is None:
+                continue
+            # NOTE: Orphan the instance to make sure we don't lazy-load
+            # anything below
+            loaded_inst._context = None
+            for attr in attrs:
+                if attr in loaded_inst and attr not in inst:
+                    setattr(inst, attr, getattr(loaded_inst, attr))
+            inst.obj_reset_changes(attrs)
+
     @classmethod
     @db.select_db_reader_mode
+    @db.replica_safe_on_request
     def _get_by_filters_impl(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
                        marker=None, expected_attrs=None, use_slave=False,
@@ -1390,6 +1463,7 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
 
     @staticmethod
     @db.select_db_reader_mode
+    @db.replica_safe
     def _db_instance_get_active_by_window_joined(
             context, begin, end, project_id, host, columns_to_join,
             use_slave=False, limit=None, marker=None):
@@ -30,7 +30,8 @@ class InstanceAction(base.NovaPersistentObject, base.NovaObject,
     # Version 1.0: Initial version
     # Version 1.1: String attributes updated to support unicode
     # Version 1.2: Add create() method.
-    VERSION = '1.2'
+    # Version 1.3: Add action_start_bulk() method.
+    VERSION = '1.3'
 
     fields = {
         'id': fields.IntegerField(),
@@ -87,6 +88,13 @@ class InstanceAction(base.NovaPersistentObject, base.NovaObject,
         if want_result:
             return cls._from_db_object(context, cls(), db_action)
 
+    @base.remotable_classmethod
+    def action_start_bulk(cls, context, instance_uuids, action_name):
+        values_list = [cls.pack_action_start(context, instance_uuid,
+                                             action_name)
+                       for instance_uuid in instance_uuids]
+        db.action_start_bulk(context, values_list)
+
     @base.remotable_classmethod
     def action_finish(cls, context, instance_uuid, want_result=True):
         values = cls.pack_action_finish(context, instance_uuid)
@@ -140,7 +148,8 @@ class InstanceActionEvent(base.NovaPersistentObject, base.NovaObject,
     # Version 1.2: Add 'host' field
     # Version 1.3: Add create() method.
     # Version 1.4: Added 'details' field.
-    VERSION = '1.4'
+    # Version 1.5: Add record_events() method.
+    VERSION = '1.5'
     fields = {
         'id': fields.IntegerField(),
         'event': fields.StringField(nullable=True),
@@ -236,6 +245,18 @@ class InstanceActionEvent(base.NovaPersistentObject, base.NovaObject,
                                              exc_tb=None,
                                              want_result=want_result)
 
+    @base.remotable_classmethod
+    def record_events(cls, context, events):
+        """Start and finish a batch of events in a single database call.
+
+        :param events: list of dicts with an ``event_type`` of ``start`` or
+            ``finish``, the ``values`` packed by pack_action_event_start() or
+            pack_action_event_finish() and ``use_last_action``, see
+            nova.db.api.action_events_record()
+        :returns: the number of events which were recorded
+        """
+        return db.action_events_record(context, events)
+
     @base.remotable
     def finish_with_failure(self, exc_val, exc_tb):
         values = self.pack_action_event_finish(self._context,
@@ -14,11 +14,14 @@
 
 from oslo_log import log as logging
 
+import nova.conf
 from nova.db import api as db
 from nova import exception
+from nova.network import model as network_model
 from nova.objects import base
 from nova.objects import fields
 
+CONF = nova.conf.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -41,11 +44,80 @@ class InstanceInfoCache(base.NovaPersistentObject, base.NovaObject):
     @staticmethod
     def _from_db_object(context, info_cache, db_obj):
         for field in info_cache.fields:
-            setattr(info_cache, field, db_obj[field])
+            if field == 'network_info':
+                info_cache._set_network_info_json(db_obj[field])
+            else:
+                setattr(info_cache, field, db_obj[field])
         info_cache.obj_reset_changes()
         info_cache._context = context
         return info_cache
 
+    def _set_network_info_json(self, nw_info_json):
+        """Set network_info from its serialized form.
+
+        Many users of an instance never look at its network info, so it is
+        only hydrated when first used, see obj_load_attr(), and is sent on
+        as it is if it was not.
+        """
+        if not isinstance(nw_info_json, str):
+            self.network_info = nw_info_json
+            return
+        self.__dict__.pop(base.get_attrname('network_info'), None)
+        self._network_info_json = nw_info_json
+
+    def _get_network_info_json(self):
+        """Return network_info as it was set if it is not hydrated yet."""
+        if base.get_attrname('network_info') in self.__dict__:
+            return None
+        return self.__dict__.get('_network_info_json')
+
+    def obj_attr_is_set(self, attrname):
+        if (attrname == 'network_info' and
+                self._get_network_info_json() is not None):
+            return True
+        return super(InstanceInfoCache, self).obj_attr_is_set(attrname)
+
+    def obj_load_attr(self, attrname):
+        nw_info_json = None
+        if attrname == 'network_info':
+            nw_info_json = self.__dict__.pop('_network_info_json', None)
+        if nw_info_json is None:
+            return super(InstanceInfoCache, self).obj_load_attr(attrname)
+        changed = attrname in self._changed_fields
+        self.network_info = network_model.NetworkInfo.hydrate(nw_info_json)
+        if not changed:
+            self._changed_fields.discard(attrname)
+
+    def obj_to_primitive(self, target_version=None, version_manifest=None):
+        primitive = super(InstanceInfoCache, self).obj_to_primitive(
+            target_version=target_version, version_manifest=version_manifest)
+        nw_info_json = self._get_network_info_json()
+        if nw_info_json is not None:
+            # NOTE: Only ever send plain JSON, as older services expect.
+            data = self._obj_primitive_field(primitive, 'data')
+            data['network_info'] = network_model.decompress_json(
+                nw_info_json)
+            if 'network_info' in self.obj_what_changed():
+                changes = primitive.setdefault(
+                    self._obj_primitive_key('changes'), [])
+                changes.append('network_info')
+        return primitive
+
+    @classmethod
+    def _obj_from_primitive(cls, context, objver, primitive):
+        data = primitive['nova_object.data']
+        nw_info_json = data.get('network_info')
+        if isinstance(nw_info_json, str):
+            data = dict(data)
+            del data['network_info']
+            primitive = dict(primitive)
+            primitive['nova_object.data'] = data
+        self = super(InstanceInfoCache, cls)._obj_from_primitive(
+            context, objver, primitive)
+        if isinstance(nw_info_json, str):
+            self._set_network_info_json(nw_info_json)
+        return self
+
     @classmethod
     def new(cls, context, instance_uuid):
         """Create an InfoCache object that can be used to create the DB
@@ -73,8 +145,14 @@ class InstanceInfoCache(base.NovaPersistentObject, base.NovaObject):
     @base.remotable
     def save(self, update_cells=True):
         if 'network_info' in self.obj_what_changed():
-            nw_info_json = self.fields['network_info'].to_primitive(
-                self, 'network_info', self.network_info)
+            nw_info_json = self._get_network_info_json()
+            if nw_info_json is None:
+                nw_info_json = self.fields['network_info'].to_primitive(
+                    self, 'network_info', self.network_info)
+            if nw_info_json is not None:
+                nw_info_json = network_model.decompress_json(nw_info_json)
+                if CONF.compress_network_info_cache:
+                    nw_info_json = network_model.compress_json(nw_info_json)
             rv = db.instance_info_cache_update(self._context,
                                                self.instance_uuid,
                                                {'network_info': nw_info_json})
@@ -363,6 +363,22 @@ class InstanceMappingList(base.ObjectListBase, base.NovaObject):
     def destroy_bulk(cls, context, instance_uuids):
         return cls._destroy_bulk_in_db(context, instance_uuids)
 
+    @staticmethod
+    @db_api.api_context_manager.writer
+    def _set_cell_mapping_bulk_in_db(context, instance_uuids, cell_id):
+        return context.session.query(api_models.InstanceMapping).filter(
+                api_models.InstanceMapping.instance_uuid.in_(instance_uuids)).\
+                update({'cell_id': cell_id}, synchronize_session=False)
+
+    @classmethod
+    def set_cell_mapping_bulk(cls, context, instance_uuids, cell_mapping):
+        """Map the given instances to a cell with a single update.
+
+        :returns: The number of instance mappings updated
+        """
+        return cls._set_cell_mapping_bulk_in_db(context, instance_uuids,
+                                                cell_mapping.id)
+
     @staticmethod
     @db_api.api_context_manager.reader
     def _get_not_deleted_by_cell_and_project_from_db(context, cell_uuid,
@@ -161,7 +161,11 @@ class PciDevice(base.NovaPersistentObject, base.NovaObject):
 
         for k, v in dev_dict.items():
             if k in self.fields.keys():
-                setattr(self, k, v)
+                # NOTE: Setting a field flags it as changed even if the value
+                # is the same, which would make the resource tracker write
+                # every device back to the database on each periodic update.
+                if not self.obj_attr_is_set(k) or getattr(self, k) != v:
+                    setattr(self, k, v)
             else:
                 # NOTE(yjiang5): extra_info.update does not update
                 # obj_what_changed, set it explicitly
@@ -170,8 +174,9 @@ class PciDevice(base.NovaPersistentObject, base.NovaObject):
                 #     - "capabilities": dict of (strings/list of strings)
                 extra_info = self.extra_info
                 data = v if isinstance(v, str) else jsonutils.dumps(v)
-                extra_info.update({k: data})
-                self.extra_info = extra_info
+                if extra_info.get(k) != data:
+                    extra_info.update({k: data})
+                    self.extra_info = extra_info
 
     def __init__(self, *args, **kwargs):
         super(PciDevice, self).__init__(*args, **kwargs)
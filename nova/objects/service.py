@@ -31,7 +31,7 @@ LOG = logging.getLogger(__name__)
 
 
 # NOTE(danms): This is the global service version counter
-SERVICE_VERSION = 54
+SERVICE_VERSION = 55
 
 
 # NOTE(danms): This is our SERVICE_VERSION history. The idea is that any
@@ -194,6 +194,9 @@ SERVICE_VERSION_HISTORY = (
     # Add accel_uuids (accelerator requests) param to shelve_instance and
     # shelve_offload_instance and unshelve_instance
     {'compute_rpc': '5.13'},
+    # Version 55: Compute RPC v5.14:
+    # Add prefetch_image()
+    {'compute_rpc': '5.14'},
 )
 
 # This is used to raise an error at service startup if older than N-1 computes
@@ -55,7 +55,8 @@ class Tag(base.NovaObject):
 class TagList(base.ObjectListBase, base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Tag <= version 1.1
-    VERSION = '1.1'
+    # Version 1.2: Added method create_bulk()
+    VERSION = '1.2'
 
     fields = {
         'objects': fields.ListOfObjectsField('Tag'),
@@ -71,6 +72,11 @@ class TagList(base.ObjectListBase, base.NovaObject):
         db_tags = db.instance_tag_set(context, resource_id, tags)
         return base.obj_make_list(context, cls(), objects.Tag, db_tags)
 
+    @base.remotable_classmethod
+    def create_bulk(cls, context, resource_ids, tags):
+        db_tags = db.instance_tag_set_bulk(context, resource_ids, tags)
+        return base.obj_make_list(context, cls(), objects.Tag, db_tags)
+
     @base.remotable_classmethod
     def destroy(cls, context, resource_id):
         db.instance_tag_delete_all(context, resource_id)
@@ -12,17 +12,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import fnmatch
 import functools
 
+import eventlet
+import eventlet.queue
 from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_messaging.rpc import dispatcher
+from oslo_messaging.rpc import server as rpc_server
 from oslo_serialization import jsonutils
 from oslo_service import periodic_task
 from oslo_utils import importutils
 
 import nova.conf
 import nova.context
+from nova.db import api as db
 import nova.exception
 from nova.i18n import _
 
@@ -51,6 +56,7 @@ TRANSPORT = None
 LEGACY_NOTIFIER = None
 NOTIFICATION_TRANSPORT = None
 NOTIFIER = None
+_NOTIFICATION_QUEUE = None
 
 # NOTE(danms): If rpc_response_timeout is over this value (per-call or
 # globally), we will enable heartbeating
@@ -64,6 +70,7 @@ EXTRA_EXMODS = []
 
 def init(conf):
     global TRANSPORT, NOTIFICATION_TRANSPORT, LEGACY_NOTIFIER, NOTIFIER
+    global _NOTIFICATION_QUEUE
     exmods = get_allowed_exmods()
     TRANSPORT = create_transport(get_transport_url())
     NOTIFICATION_TRANSPORT = messaging.get_notification_transport(
@@ -89,10 +96,17 @@ def init(conf):
             NOTIFICATION_TRANSPORT,
             serializer=serializer,
             topics=conf.notifications.versioned_notifications_topics)
+    if conf.notifications.send_queue_size:
+        _NOTIFICATION_QUEUE = NotificationQueue(
+            conf.notifications.send_queue_size,
+            conf.notifications.send_queue_overflow_policy)
 
 
 def cleanup():
     global TRANSPORT, NOTIFICATION_TRANSPORT, LEGACY_NOTIFIER, NOTIFIER
+    global _NOTIFICATION_QUEUE
+    flush_notifications()
+    _NOTIFICATION_QUEUE = None
     assert TRANSPORT is not None
     assert NOTIFICATION_TRANSPORT is not None
     assert LEGACY_NOTIFIER is not None
@@ -191,6 +205,20 @@ class ProfilerRequestContextSerializer(RequestContextSerializer):
                      self).deserialize_context(context)
 
 
+class RPCDispatcher(dispatcher.RPCDispatcher):
+    """Dispatcher reporting the SQL queries run for each RPC message."""
+
+    def dispatch(self, incoming):
+        try:
+            return super(RPCDispatcher, self).dispatch(incoming)
+        finally:
+            # NOTE: The SQL queries run for the request are only counted when
+            # [database]/query_stats is enabled.
+            request_id = incoming.ctxt.get('request_id')
+            if request_id:
+                db.report_query_stats(request_id)
+
+
 def get_transport_url(url_str=None):
     return messaging.TransportURL.parse(CONF, url_str)
 
@@ -219,25 +247,41 @@ def get_server(target, endpoints, serializer=None):
     else:
         serializer = RequestContextSerializer(serializer)
     access_policy = dispatcher.DefaultRPCAccessPolicy
-    return messaging.get_rpc_server(TRANSPORT,
-                                    target,
-                                    endpoints,
-                                    executor='eventlet',
-                                    serializer=serializer,
-                                    access_policy=access_policy)
+    rpc_dispatcher = RPCDispatcher(endpoints, serializer, access_policy)
+    return rpc_server.RPCServer(TRANSPORT, target, rpc_dispatcher,
+                                executor='eventlet')
 
 
 def get_notifier(service, host=None, publisher_id=None):
     assert LEGACY_NOTIFIER is not None
     if not publisher_id:
         publisher_id = "%s.%s" % (service, host or CONF.host)
-    return LegacyValidatingNotifier(
-            LEGACY_NOTIFIER.prepare(publisher_id=publisher_id))
+    notifier = LEGACY_NOTIFIER.prepare(publisher_id=publisher_id)
+    if _NOTIFICATION_QUEUE is not None:
+        notifier = QueuedNotifier(notifier, _NOTIFICATION_QUEUE)
+    return LegacyValidatingNotifier(notifier)
 
 
 def get_versioned_notifier(publisher_id):
     assert NOTIFIER is not None
-    return NOTIFIER.prepare(publisher_id=publisher_id)
+    notifier = NOTIFIER.prepare(publisher_id=publisher_id)
+    if _NOTIFICATION_QUEUE is not None:
+        notifier = QueuedNotifier(notifier, _NOTIFICATION_QUEUE)
+    return notifier
+
+
+def flush_notifications():
+    """Wait until all of the queued notifications have been sent."""
+    if _NOTIFICATION_QUEUE is not None:
+        _NOTIFICATION_QUEUE.flush()
+
+
+def is_event_type_enabled(event_type):
+    """Returns False if notifications of the event type are excluded by
+    [notifications]excluded_event_types.
+    """
+    return not any(fnmatch.fnmatchcase(event_type, pattern)
+                   for pattern in CONF.notifications.excluded_event_types)
 
 
 def if_notifications_enabled(f):
@@ -410,7 +454,12 @@ class LegacyValidatingNotifier(object):
         # notification itself detected by the special payload keys.
         return {'exception', 'args'} == set(payload.keys())
 
+    def is_enabled(self):
+        return self.notifier.is_enabled()
+
     def _notify(self, priority, ctxt, event_type, payload):
+        if not is_event_type_enabled(event_type):
+            return
         if (event_type not in self.allowed_legacy_notification_event_types and
                 not self._is_wrap_exception_notification(payload)):
             if self.fatal:
@@ -421,6 +470,74 @@ class LegacyValidatingNotifier(object):
         getattr(self.notifier, priority)(ctxt, event_type, payload)
 
 
+class NotificationQueue(object):
+    """Sends notifications from a background greenthread.
+
+    The queue is bounded. When it is full, notifications either wait for room
+    in the queue or are dropped, depending on the overflow policy.
+    """
+
+    def __init__(self, size, overflow_policy):
+        self._queue = eventlet.queue.Queue(maxsize=size)
+        self._overflow_policy = overflow_policy
+        self._sender = None
+
+    def put(self, notify):
+        """Queue a notification.
+
+        :param notify: callable sending the notification
+        """
+        if self._sender is None:
+            self._sender = eventlet.spawn(self._run)
+        if self._overflow_policy == 'block':
+            self._queue.put(notify)
+            return
+        try:
+            self._queue.put_nowait(notify)
+        except eventlet.queue.Full:
+            LOG.warning('Dropping notification since %d notifications are '
+                        'already waiting to be sent.', self._queue.maxsize)
+
+    def _run(self):
+        while True:
+            notify = self._queue.get()
+            try:
+                notify()
+            except Exception:
+                LOG.exception('Failed to send notification.')
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until all of the queued notifications have been sent."""
+        if self._sender is not None:
+            self._queue.join()
+
+
+class QueuedNotifier(object):
+    """Wraps a notifier to send its notifications through a
+    NotificationQueue.
+    """
+
+    def __init__(self, notifier, queue):
+        self.notifier = notifier
+        self.queue = queue
+        for priority in ['audit', 'debug', 'info', 'warn', 'warning',
+                         'error', 'critical', 'sample']:
+            setattr(self, priority,
+                    functools.partial(self._notify, priority))
+
+    def is_enabled(self):
+        return self.notifier.is_enabled()
+
+    def prepare(self, **kwargs):
+        return QueuedNotifier(self.notifier.prepare(**kwargs), self.queue)
+
+    def _notify(self, priority, *args, **kwargs):
+        self.queue.put(functools.partial(
+            getattr(self.notifier, priority), *args, **kwargs))
+
+
 class ClientRouter(periodic_task.PeriodicTasks):
     """Creates RPC clients that honor the context's RPC transport
     or provides a default.
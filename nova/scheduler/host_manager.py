@@ -36,7 +36,10 @@ from nova import exception
 from nova import objects
 from nova.pci import stats as pci_stats
 from nova.scheduler import filters
+from nova.scheduler.filters import numa_topology_filter
+from nova.scheduler.filters import pci_passthrough_filter
 from nova.scheduler import weights
+from nova.scheduler.weights import pci as pci_weigher
 from nova import utils
 from nova.virt import hardware
 
@@ -224,10 +227,14 @@ class HostState(object):
         self.vcpus_used = compute.vcpus_used
         self.updated = compute.updated_at
         # the ComputeNode.numa_topology field is a StringField so deserialize
+        # NOTE: The NUMA topology and PCI device pools are only loaded when
+        # the host manager needs them, see _choose_compute_node_attrs().
         self.numa_topology = objects.NUMATopology.obj_from_db_obj(
-            compute.numa_topology) if compute.numa_topology else None
+            compute.numa_topology) if (
+                'numa_topology' in compute and compute.numa_topology) else None
         self.pci_stats = pci_stats.PciDeviceStats(
-            stats=compute.pci_device_pools)
+            stats=compute.pci_device_pools
+            if 'pci_device_pools' in compute else None)
 
         # All virt drivers report host_ip
         self.host_ip = compute.host_ip
@@ -345,6 +352,7 @@ class HostManager(object):
         weigher_classes = self.weight_handler.get_matching_classes(
                 CONF.filter_scheduler.weight_classes)
         self.weighers = [cls() for cls in weigher_classes]
+        self.compute_node_attrs = self._choose_compute_node_attrs()
         # Dict of aggregates keyed by their ID
         self.aggs_by_id = {}
         # Dict of set of aggregate IDs keyed by the name of the host belonging
@@ -361,6 +369,27 @@ class HostManager(object):
     def _load_filters(self):
         return CONF.filter_scheduler.enabled_filters
 
+    def _choose_compute_node_attrs(self):
+        """Return the optional ComputeNode attributes to load.
+
+        The NUMA topology and PCI device pools of compute nodes are only
+        loaded when the enabled filters and weighers need them.
+        """
+        attrs = ['cpu_info', 'stats', 'supported_hv_specs']
+        numa_filter = any(
+            isinstance(host_filter, numa_topology_filter.NUMATopologyFilter)
+            for host_filter in self.enabled_filters)
+        if numa_filter:
+            attrs.append('numa_topology')
+        if numa_filter or any(
+                isinstance(host_filter,
+                           pci_passthrough_filter.PciPassthroughFilter)
+                for host_filter in self.enabled_filters) or any(
+                isinstance(weigher, pci_weigher.PCIWeigher)
+                for weigher in self.weighers):
+            attrs.append('pci_device_pools')
+        return attrs
+
     def _init_aggregates(self):
         elevated = context_module.get_admin_context()
         aggs = objects.AggregateList.get_all(elevated)
@@ -420,7 +449,7 @@ class HostManager(object):
                 for cell in self.cells.values():
                     with context_module.target_cell(context, cell) as cctxt:
                         cell_cns = objects.ComputeNodeList.get_all(
-                            cctxt).objects
+                            cctxt, expected_attrs=[]).objects
                         computes_by_cell[cell] = cell_cns
                         count += len(cell_cns)
 
@@ -629,10 +658,12 @@ class HostManager(object):
             services = objects.ServiceList.get_by_binary(
                 cctxt, 'nova-compute', include_disabled=True)
             if compute_uuids is None:
-                return services, objects.ComputeNodeList.get_all(cctxt)
+                return services, objects.ComputeNodeList.get_all(
+                    cctxt, expected_attrs=self.compute_node_attrs)
             else:
                 return services, objects.ComputeNodeList.get_all_by_uuids(
-                    cctxt, compute_uuids)
+                    cctxt, compute_uuids,
+                    expected_attrs=self.compute_node_attrs)
 
         timeout = context_module.CELL_TIMEOUT
         results = context_module.scatter_gather_cells(context, cells, timeout,
@@ -293,6 +293,10 @@ class Service(service.Service):
             LOG.exception('Service error occurred during cleanup_host')
             pass
 
+        # Send the notifications still queued by the operations which
+        # completed before the service stopped.
+        rpc.flush_notifications()
+
         super(Service, self).stop()
 
     def periodic_tasks(self, raise_on_error=False):
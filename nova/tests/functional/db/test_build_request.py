@@ -144,6 +144,22 @@ class BuildRequestListTestCase(test.NoDBTestCase):
             self.assertTrue(objects.base.obj_equal_prims(reqs[i].instance,
                                                          req_list[i].instance))
 
+    def test_destroy_bulk(self):
+        reqs = [self._create_req(), self._create_req(), self._create_req()]
+        uuids = [reqs[0].instance_uuid, reqs[1].instance_uuid]
+
+        destroyed = build_request.BuildRequestList.destroy_bulk(
+            self.context, uuids + [uuidutils.generate_uuid()])
+
+        self.assertEqual(sorted(uuids), sorted(destroyed))
+        req_list = build_request.BuildRequestList.get_all(self.context)
+        self.assertEqual([reqs[2].instance_uuid],
+                         [req.instance_uuid for req in req_list])
+
+    def test_destroy_bulk_none_found(self):
+        self.assertEqual([], build_request.BuildRequestList.destroy_bulk(
+            self.context, [uuidutils.generate_uuid()]))
+
     def test_get_all_filter_by_project_id(self):
         reqs = [self._create_req(), self._create_req(project_id='filter')]
 
@@ -458,6 +458,26 @@ class InstanceMappingListTestCase(test.NoDBTestCase):
         self.assertEqual(sorted(uuids),
                          sorted([m.instance_uuid for m in mappings]))
 
+    def test_set_cell_mapping_bulk(self):
+        cell = create_cell_mapping(id=4)
+        db_inst_mapping1 = create_mapping(cell_id=None)
+        db_inst_mapping2 = create_mapping()
+        # Create a third that we won't include
+        db_inst_mapping3 = create_mapping(cell_id=None)
+        uuids = [db_inst_mapping1.instance_uuid,
+                 db_inst_mapping2.instance_uuid]
+
+        updated = instance_mapping.InstanceMappingList.set_cell_mapping_bulk(
+            self.context, uuids, cell_mapping.CellMapping(id=cell.id))
+
+        self.assertEqual(2, updated)
+        mappings = instance_mapping.InstanceMappingList.get_by_instance_uuids(
+            self.context, uuids + [db_inst_mapping3.instance_uuid])
+        cells = {m.instance_uuid: m.cell_mapping for m in mappings}
+        for uuid in uuids:
+            self.assertEqual(cell.uuid, cells[uuid].uuid)
+        self.assertIsNone(cells[db_inst_mapping3.instance_uuid])
+
     def test_get_not_deleted_by_cell_and_project(self):
         cells = []
         # Create two cells
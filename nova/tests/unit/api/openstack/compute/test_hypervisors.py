@@ -112,7 +112,8 @@ TEST_SERVERS = [dict(name="inst1", uuid=uuids.instance_1, host="compute1"),
                 dict(name="inst4", uuid=uuids.instance_4, host="compute2")]
 
 
-def fake_compute_node_get_all(context, limit=None, marker=None):
+def fake_compute_node_get_all(context, limit=None, marker=None,
+                              expected_attrs=None):
     if marker in ['99999', uuids.invalid_marker]:
         raise exception.MarkerNotFound(marker)
     marker_found = True if marker is None else False
@@ -47,6 +47,7 @@ from nova import availability_zones
 from nova import block_device
 from nova.compute import api as compute_api
 from nova.compute import flavors
+from nova.compute import instance_list
 from nova.compute import task_states
 from nova.compute import vm_states
 import nova.conf
@@ -361,6 +362,12 @@ class ServersControllerTest(ControllerTest):
         res_dict = self.controller.show(self.request, FAKE_UUID)
         self.assertEqual(res_dict['server']['id'], FAKE_UUID)
 
+    def test_show_allows_replica_reads(self):
+        ctxt = self.request.environ['nova.context']
+        self.assertFalse(ctxt.allow_replica_reads)
+        self.controller.show(self.request, FAKE_UUID)
+        self.assertTrue(ctxt.allow_replica_reads)
+
     def test_get_server_joins(self):
         def fake_get(*args, **kwargs):
             expected_attrs = kwargs['expected_attrs']
@@ -776,6 +783,13 @@ class ServersControllerTest(ControllerTest):
 
             self.assertEqual(s['links'], expected_links)
 
+    def test_get_server_list_allows_replica_reads(self):
+        req = self.req(self.path)
+        ctxt = req.environ['nova.context']
+        self.assertFalse(ctxt.allow_replica_reads)
+        self.controller.index(req)
+        self.assertTrue(ctxt.allow_replica_reads)
+
     def test_get_servers_with_limit(self):
         req = self.req(self.path_with_query % 'limit=3')
         res_dict = self.controller.index(req)
@@ -794,6 +808,24 @@ class ServersControllerTest(ControllerTest):
                            'marker': [fakes.get_fake_uuid(2)]}
         self.assertThat(params, matchers.DictMatches(expected_params))
 
+    def test_get_servers_with_limit_keyset_marker(self):
+        self.flags(instance_list_keyset_markers=True, group='api')
+        req = self.req(self.path_with_query % 'limit=3')
+        res_dict = self.controller.index(req)
+
+        servers_links = res_dict['servers_links']
+        self.assertEqual(servers_links[0]['rel'], 'next')
+        href_parts = urlparse.urlparse(servers_links[0]['href'])
+        params = urlparse.parse_qs(href_parts.query)
+        self.assertEqual(['3'], params['limit'])
+        marker = params['marker'][0]
+        self.assertTrue(instance_list.is_keyset_marker(marker))
+        lister = instance_list.InstanceLister(['created_at'], ['desc'])
+        self.assertEqual(
+            [datetime.datetime(2010, 10, 10, 12, 0, 0),
+             fakes.get_fake_uuid(2)],
+            lister.get_marker_values(req.environ['nova.context'], marker))
+
     def test_get_servers_with_limit_bad_value(self):
         req = self.req(self.path_with_query % 'limit=aaa')
         self.assertRaises(exception.ValidationError,
@@ -524,6 +524,24 @@ class TestCollectionLinks(test.NoDBTestCase):
                                                mock.sentinel.coll_key)
         self.assertThat(results, matchers.HasLength(1))
 
+    @mock.patch('nova.api.openstack.common.ViewBuilder._get_next_link')
+    def test_items_equals_given_limit_with_marker(self, href_link_mock):
+        items = [
+            {"uuid": "123"}
+        ]
+        req = mock.MagicMock()
+        params = mock.PropertyMock(return_value=dict(limit=1))
+        type(req).params = params
+
+        builder = common.ViewBuilder()
+        results = builder._get_collection_links(req, items,
+                                                mock.sentinel.coll_key,
+                                                "uuid", marker="456")
+
+        href_link_mock.assert_called_once_with(req, "456",
+                                               mock.sentinel.coll_key)
+        self.assertThat(results, matchers.HasLength(1))
+
 
 class LinkPrefixTest(test.NoDBTestCase):
 
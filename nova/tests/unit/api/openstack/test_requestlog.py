@@ -144,3 +144,20 @@ class TestRequestLogMiddleware(testtools.TestCase):
         api.api_request('/', strip_version=True)
         self.assertNotIn("nova.api.openstack.requestlog",
                 self.stdlog.logger.output)
+
+    @mock.patch('nova.db.api.report_query_stats')
+    @mock.patch('nova.api.openstack.requestlog.RequestLog._should_emit')
+    def test_reports_query_stats_under_eventlet(self, emit, report):
+        """Ensure the SQL queries of requests are reported.
+
+        This is done under eventlet too, with the request ID set by the
+        compute_req_id middleware.
+        """
+
+        emit.return_value = False
+        self.useFixture(conf_fixture.ConfFixture())
+        self.useFixture(fixtures.RPCFixture('nova.test'))
+        api = self.useFixture(fixtures.OSAPIFixture()).api
+
+        resp = api.api_request('/')
+        report.assert_called_once_with(resp.headers['x-openstack-request-id'])
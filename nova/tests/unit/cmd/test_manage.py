@@ -24,6 +24,7 @@ import mock
 from oslo_db import exception as db_exc
 from oslo_serialization import jsonutils
 from oslo_utils.fixture import uuidsentinel
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 
 from nova.cmd import manage
@@ -350,7 +351,9 @@ Rows were archived, running purge...
             mock.call(test.MatchType(context.RequestContext), 20, before=None),
         ])
         mock_db_purge.assert_called_once_with(mock.ANY, None,
-                                              status_fn=mock.ANY)
+                                              status_fn=mock.ANY,
+                                              max_rows=None,
+                                              throttle_fn=mock.ANY)
 
     @mock.patch.object(db, 'archive_deleted_rows')
     def test_archive_deleted_rows_until_stopped_cells(self, mock_db_archive,
@@ -512,12 +515,127 @@ is set and run this command again.
         self.assertEqual(expected, output)
         self.assertEqual(3, result)
 
+    def test_archive_deleted_rows_parallel_invalid(self):
+        self.assertEqual(5, self.commands.archive_deleted_rows(
+            20, parallel=0))
+        self.assertEqual(5, self.commands.archive_deleted_rows(
+            20, batch_time=1.0))
+        self.assertEqual(5, self.commands.archive_deleted_rows(
+            20, parallel=2, batch_time=0))
+
+    @mock.patch.object(db, 'archive_deleted_rows_for_table')
+    @mock.patch.object(db, 'archive_deleted_rows_table_groups',
+                       return_value=[['consoles', 'instance_extra'],
+                                     ['instances']])
+    @mock.patch.object(objects.RequestSpec, 'destroy_bulk', return_value=1)
+    @mock.patch.object(objects.InstanceGroup, 'destroy_members_bulk',
+                       return_value=0)
+    @mock.patch.object(objects.InstanceMappingList, 'destroy_bulk',
+                       return_value=1)
+    @mock.patch.object(context, 'set_target_cell')
+    @mock.patch.object(objects.CellMappingList, 'get_all')
+    def test_archive_deleted_rows_parallel(
+            self, mock_get_all, mock_target, mock_mappings_destroy,
+            mock_members_destroy, mock_reqspec_destroy, mock_groups,
+            mock_archive_table):
+        mock_get_all.return_value = [
+            objects.CellMapping(uuid=uuidsentinel.cell1, name='cell1'),
+            objects.CellMapping(uuid=uuidsentinel.cell2, name='cell2')]
+
+        archived = []
+
+        def fake_archive_table(cctxt, table_name, max_rows, before=None):
+            # instances can only be archived once the other tables are done.
+            if table_name == 'instances':
+                self.assertEqual(2, sum(1 for archived_table in archived
+                                        if archived_table[0] == cctxt and
+                                        archived_table[1] != 'instances'))
+            if (cctxt, table_name) in archived:
+                return 0, []
+            archived.append((cctxt, table_name))
+            if table_name == 'instances':
+                return 1, [uuidsentinel.instance]
+            return 3, []
+        mock_archive_table.side_effect = fake_archive_table
+
+        result = self.commands.archive_deleted_rows(
+            20, verbose=True, all_cells=True, parallel=2)
+
+        self.assertEqual(1, result)
+        self.assertEqual(2, mock_groups.call_count)
+        self.assertEqual(12, mock_archive_table.call_count)
+        mock_archive_table.assert_has_calls([
+            mock.call(test.MatchType(context.RequestContext), 'instances',
+                      20, before=None)])
+        self.assertEqual(2, mock_mappings_destroy.call_count)
+        output = self.output.getvalue()
+        self.assertTrue(output.startswith('Archiving..'), output)
+        self.assertIn('.complete\n', output)
+        self.assertIn('cell1.consoles: archived 3 rows in ', output)
+        self.assertIn('cell2.instances: archived 1 rows in ', output)
+        expected = '''\
++------------------------------+-------------------------+
+| Table                        | Number of Rows Archived |
++------------------------------+-------------------------+
+| API_DB.instance_group_member | 0                       |
+| API_DB.instance_mappings     | 2                       |
+| API_DB.request_specs         | 2                       |
+| cell1.consoles               | 3                       |
+| cell1.instance_extra         | 3                       |
+| cell1.instances              | 1                       |
+| cell2.consoles               | 3                       |
+| cell2.instance_extra         | 3                       |
+| cell2.instances              | 1                       |
++------------------------------+-------------------------+
+'''
+        self.assertIn(expected, output)
+
+    @mock.patch.object(manage.timeutils.StopWatch, 'elapsed')
+    def test_run_in_batches(self, mock_elapsed):
+        mock_elapsed.side_effect = [4.0, 0.1, 0.1]
+        run_batch = mock.Mock(side_effect=[True, True, True, False])
+
+        manage._run_in_batches(run_batch, 50, 1.0)
+
+        # A batch taking 4 times the target shrinks to a quarter, quicker
+        # ones grow back by at most double, up to the maximum.
+        self.assertEqual([mock.call(50), mock.call(12), mock.call(24),
+                          mock.call(48)], run_batch.call_args_list)
+
+        run_batch = mock.Mock(side_effect=[True, False])
+        manage._run_in_batches(run_batch, 50, None)
+        self.assertEqual([mock.call(50), mock.call(50)],
+                         run_batch.call_args_list)
+
+    @mock.patch.object(manage.timeutils.StopWatch, 'elapsed')
+    @mock.patch.object(db, 'archive_deleted_rows_for_table')
+    @mock.patch.object(db, 'archive_deleted_rows_table_groups',
+                       return_value=[['consoles']])
+    @mock.patch.object(objects.CellMappingList, 'get_all')
+    def test_archive_deleted_rows_parallel_batch_time(
+            self, mock_get_all, mock_groups, mock_archive_table,
+            mock_elapsed):
+        # Batches taking 4 times the target shrink to a quarter, quicker
+        # ones grow back, at most up to max_rows rows.
+        mock_elapsed.side_effect = [4.0, 4.0, 0.1, 0.1, 0.1, 0.1]
+        mock_archive_table.side_effect = [
+            (100, []), (25, []), (6, []), (12, []), (24, []), (0, [])]
+
+        result = self.commands.archive_deleted_rows(
+            100, parallel=1, batch_time=1.0)
+
+        self.assertEqual(1, result)
+        self.assertEqual(
+            [100, 25, 6, 12, 24, 48],
+            [call[0][2] for call in mock_archive_table.call_args_list])
+
     @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
     def test_purge_all(self, mock_purge):
         mock_purge.return_value = 1
         ret = self.commands.purge(purge_all=True)
         self.assertEqual(0, ret)
-        mock_purge.assert_called_once_with(mock.ANY, None, status_fn=mock.ANY)
+        mock_purge.assert_called_once_with(mock.ANY, None, status_fn=mock.ANY,
+                                           max_rows=None, throttle_fn=mock.ANY)
 
     @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
     def test_purge_date(self, mock_purge):
@@ -526,7 +644,8 @@ is set and run this command again.
         self.assertEqual(0, ret)
         mock_purge.assert_called_once_with(mock.ANY,
                                            datetime.datetime(2015, 10, 21),
-                                           status_fn=mock.ANY)
+                                           status_fn=mock.ANY, max_rows=None,
+                                           throttle_fn=mock.ANY)
 
     @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
     def test_purge_date_fail(self, mock_purge):
@@ -540,6 +659,53 @@ is set and run this command again.
         self.assertEqual(1, ret)
         self.assertFalse(mock_purge.called)
 
+    @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
+    def test_purge_throttling_invalid(self, mock_purge):
+        for kwargs in ({'max_rows': 0},
+                       {'max_rows': 10, 'max_rate': 0},
+                       {'max_rows': 10, 'max_replication_lag': -1},
+                       {'max_rate': 100},
+                       {'max_replication_lag': 1}):
+            self.assertEqual(5, self.commands.purge(purge_all=True, **kwargs))
+        self.assertFalse(mock_purge.called)
+
+    @mock.patch.object(manage.time, 'sleep')
+    @mock.patch.object(manage.timeutils.StopWatch, 'elapsed',
+                       return_value=0.5)
+    @mock.patch('nova.db.sqlalchemy.api.replication_lag')
+    @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
+    def test_purge_throttled(self, mock_purge, mock_lag, mock_elapsed,
+                             mock_sleep):
+        mock_lag.side_effect = [None, float('inf'), 12.0, 3.0, 1.5]
+
+        def fake_purge(ctxt, before_date, status_fn=None, max_rows=None,
+                       throttle_fn=None):
+            throttle_fn(max_rows)
+            throttle_fn(max_rows)
+            return 3 * max_rows
+        mock_purge.side_effect = fake_purge
+
+        ret = self.commands.purge(purge_all=True, verbose=True, max_rows=100,
+                                  max_rate=50, max_replication_lag=2)
+
+        self.assertEqual(0, ret)
+        mock_purge.assert_called_once_with(
+            mock.ANY, None, status_fn=mock.ANY, max_rows=100,
+            throttle_fn=mock.ANY)
+        # Deleting 100 rows at 50 rows/s takes 2s, 0.5s of which were spent
+        # deleting them, then the second chunk waits for the lag to go down.
+        mock_sleep.assert_has_calls([
+            mock.call(1.5), mock.call(1.5), mock.call(1), mock.call(1),
+            mock.call(1)])
+        self.assertEqual(5, mock_sleep.call_count)
+        self.assertEqual(5, mock_lag.call_count)
+        output = self.output.getvalue()
+        self.assertIn('DB: Waiting for the replication to resume', output)
+        self.assertIn('DB: Waiting for the replication lag of 12.0s to go '
+                      'down', output)
+        self.assertIn('DB: Waiting for the replication lag of 3.0s to go '
+                      'down', output)
+
     @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
     def test_purge_nothing_deleted(self, mock_purge):
         mock_purge.return_value = 0
@@ -794,6 +960,111 @@ Running batches of 50 until complete
             self.assertEqual(1,
                              self.commands.online_data_migrations(max_count=5))
 
+    def _fake_batched_migration(self, name, remaining, runs):
+        def fake_migration(context, count):
+            runs.append((name, count))
+            found = remaining[0]
+            done = min(found, count)
+            remaining[0] -= done
+            return found, done
+        fake_migration.__name__ = name
+        return fake_migration
+
+    def test_online_migrations_parallel(self):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        runs = []
+        mig_1 = self._fake_batched_migration('mig_1', [120], runs)
+        mig_2 = self._fake_batched_migration('mig_2', [0], runs)
+        unmigratable = mock.MagicMock(__name__='unmigratable',
+                                      return_value=(3, 0))
+        command = self._fake_db_command((mig_1, mig_2, unmigratable))()
+
+        self.assertEqual(0, command.online_data_migrations(parallel=2))
+
+        # Migrations are not run again once they find nothing to migrate or
+        # migrate none of what they found.
+        self.assertEqual([('mig_1', 50)] * 4, [r for r in runs
+                                               if r[0] == 'mig_1'])
+        self.assertEqual([('mig_2', 50)], [r for r in runs
+                                           if r[0] == 'mig_2'])
+        unmigratable.assert_called_once_with(mock.ANY, 50)
+        output = sys.stdout.getvalue()
+        self.assertIn('mig_1: 210 rows matched, 120 migrated in', output)
+        self.assertIn('unmigratable: 3 rows matched, 0 migrated in', output)
+        self.assertIn('|    mig_1     |     210      |    120    |', output)
+        self.assertIn('|    mig_2     |      0       |     0     |', output)
+
+    @mock.patch.object(timeutils.StopWatch, 'elapsed', return_value=2.0)
+    def test_online_migrations_parallel_batch_time(self, mock_elapsed):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        runs = []
+        mig = self._fake_batched_migration('mig', [200], runs)
+        command = self._fake_db_command((mig,))()
+
+        self.assertEqual(0, command.online_data_migrations(
+            max_count=100, parallel=1, batch_time=1))
+        # Batches taking twice the batch time are halved.
+        self.assertEqual([100, 50, 25, 12, 6, 3, 1, 1, 1, 1, 1],
+                         [count for name, count in runs])
+
+    @mock.patch('nova.context.set_target_cell')
+    @mock.patch('nova.objects.CellMappingList.get_all')
+    def test_online_migrations_all_cells(self, mock_get_all, mock_target):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        cells = [objects.CellMapping(name='cell%i' % i, uuid=uuid)
+                 for i, uuid in enumerate((uuidsentinel.cell0,
+                                           uuidsentinel.cell1))]
+        mock_get_all.return_value = objects.CellMappingList(objects=cells)
+        per_cell = mock.MagicMock(__name__='per_cell', return_value=(2, 2))
+        per_cell.side_effect = [(2, 2), (0, 0), (1, 1), (0, 0)]
+        cells_wide = mock.MagicMock(__name__='cells_wide',
+                                    return_value=(0, 0))
+
+        class _CommandSub(manage.DbCommands):
+            online_migrations = (per_cell, cells_wide)
+            cells_wide_online_migrations = (cells_wide,)
+
+        self.assertEqual(
+            0, _CommandSub().online_data_migrations(all_cells=True))
+
+        self.assertEqual(4, per_cell.call_count)
+        cells_wide.assert_called_once_with(mock.ANY, 50)
+        # The cells wide migration is run against the untargeted context.
+        self.assertEqual([mock.call(mock.ANY, cells[0]),
+                          mock.call(mock.ANY, cells[1]),
+                          mock.call(mock.ANY, None)],
+                         mock_target.call_args_list)
+        output = sys.stdout.getvalue()
+        self.assertIn('cell0.per_cell: 2 rows matched, 2 migrated', output)
+        self.assertIn('cell1.per_cell: 1 rows matched, 1 migrated', output)
+        self.assertIn('|  per_cell  |      3       |     3     |', output)
+
+    def test_online_migrations_parallel_error(self):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        runs = []
+        good = self._fake_batched_migration('good', [10], runs)
+        # The migration fails until the other one completed.
+        bad = mock.MagicMock(__name__='bad', side_effect=[
+            test.TestingException, (4, 4), (0, 0)])
+        command = self._fake_db_command((bad, good))()
+
+        self.assertEqual(0, command.online_data_migrations(parallel=2))
+        self.assertEqual(3, bad.call_count)
+        self.assertIn('|    bad    |      4       |     4     |',
+                      sys.stdout.getvalue())
+
+        # Migrations which keep failing are reported.
+        bad.side_effect = test.TestingException
+        self.assertEqual(2, command.online_data_migrations(parallel=2))
+
+    def test_online_migrations_bad_parallel(self):
+        self.assertEqual(127,
+                         self.commands.online_data_migrations(parallel=0))
+        self.assertEqual(127,
+                         self.commands.online_data_migrations(batch_time=1))
+        self.assertEqual(127, self.commands.online_data_migrations(
+            parallel=1, batch_time=0))
+
 
 class ApiDbCommandsTestCase(test.NoDBTestCase):
     def setUp(self):
@@ -31,6 +31,7 @@ from oslo_utils import uuidutils
 from nova.compute import api as compute_api
 from nova.compute import flavors
 from nova.compute import instance_actions
+from nova.compute import instance_list
 from nova.compute import power_state
 from nova.compute import rpcapi as compute_rpcapi
 from nova.compute import task_states
@@ -6407,6 +6408,31 @@ class _ComputeAPIUnitTestMixIn(object):
             for i, instance in enumerate(build_req_instances + cell_instances):
                 self.assertEqual(instance, instances[i])
 
+    @mock.patch.object(objects.BuildRequestList, 'get_by_filters')
+    def test_get_all_keyset_marker_skips_build_requests(self,
+                                                        mock_buildreq_get):
+        cell_instances = self._list_of_instances(2)
+        marker = instance_list.KEYSET_MARKER_PREFIX + 'fake'
+
+        with mock.patch('nova.compute.instance_list.'
+                        'get_instance_objects_sorted') as mock_inst_get:
+            mock_inst_get.return_value = objects.InstanceList(
+                self.context, objects=cell_instances), list()
+
+            instances = self.compute_api.get_all(
+                self.context, search_opts={'foo': 'bar'},
+                limit=None, marker=marker, sort_keys=['baz'],
+                sort_dirs=['desc'])
+
+            # Keyset markers are only handed out for instances from cells,
+            # which are listed after all build requests.
+            mock_buildreq_get.assert_not_called()
+            fields = ['metadata', 'info_cache', 'security_groups']
+            mock_inst_get.assert_called_once_with(
+                self.context, {'foo': 'bar'}, None, marker,
+                fields, ['baz'], ['desc'], cell_down_support=False)
+            self.assertEqual(cell_instances, instances.objects)
+
     @mock.patch.object(objects.BuildRequestList, 'get_by_filters')
     @mock.patch.object(objects.CellMapping, 'get_by_uuid',
                        side_effect=exception.CellMappingNotFound(uuid='fake'))
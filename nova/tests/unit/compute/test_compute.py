@@ -5657,8 +5657,8 @@ class ComputeTestCase(BaseTestCase,
         instance.system_metadata = {}
         instance.save()
 
-        self.rt.tracked_migrations[instance.uuid] = (migration,
-                                                     instance.flavor)
+        self.rt.tracked_migrations[NODENAME][instance.uuid] = (
+            migration, instance.flavor)
         cn = self.rt.compute_nodes[NODENAME]
         cn.numa_topology = jsonutils.dumps(
             host_numa_topology.obj_to_primitive())
@@ -5720,7 +5720,7 @@ class ComputeTestCase(BaseTestCase,
         instance.save()
 
         self.rt.pci_tracker = mock.Mock()
-        self.rt.tracked_migrations[instance.uuid] = migration
+        self.rt.tracked_migrations[NODENAME][instance.uuid] = migration
 
         with test.nested(
             mock.patch.object(self.compute.network_api,
@@ -7138,7 +7138,7 @@ class ComputeTestCase(BaseTestCase,
                              columns_to_join)
             return instance_map[instance_uuid]
 
-        def fake_require_nw_info_update(cls, context, instance):
+        def fake_require_nw_info_update(cls, context, instance, ports=None):
             self.assertEqual(call_info['expected_instance']['uuid'],
                              instance['uuid'])
             if call_info['expected_instance']['task_state'] is None:
@@ -7272,6 +7272,64 @@ class ComputeTestCase(BaseTestCase,
         self._heal_instance_info_cache(_require_nw_info_update=True,
                                        _task_state_not_none=True)
 
+    def _get_instances_to_heal(self, count):
+        return [objects.Instance(uuid=getattr(uuids, 'heal_instance_%i' % x),
+                                 host=self.compute.host, task_state=None,
+                                 vm_state=vm_states.ACTIVE)
+                for x in range(count)]
+
+    @mock.patch('nova.network.neutron.API.list_ports',
+                new_callable=mock.NonCallableMock)
+    @mock.patch('nova.network.neutron.API.get_instance_nw_info')
+    @mock.patch('nova.network.neutron.API.prefetch_instances_nw_info')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_heal_instance_info_cache_batch(self, mock_get_by_host,
+                                            mock_prefetch, mock_get_nw_info,
+                                            mock_list_ports):
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_batch_size=2)
+        ctxt = context.get_admin_context()
+        instances = self._get_instances_to_heal(3)
+        mock_get_by_host.return_value = instances
+        prefetched = mock_prefetch.return_value
+        prefetched.get_ports.return_value = [
+            {'binding:host_id': self.compute.host,
+             'binding:vif_type': network_model.VIF_TYPE_OVS}]
+
+        self.compute._heal_instance_info_cache(ctxt)
+
+        mock_prefetch.assert_called_once_with(ctxt, instances[:2])
+        mock_get_nw_info.assert_has_calls([
+            mock.call(ctxt, instance, force_refresh=True,
+                      prefetched=prefetched)
+            for instance in instances[:2]])
+        self.assertEqual(2, mock_get_nw_info.call_count)
+        self.assertEqual([instances[2].uuid],
+                         self.compute._instance_uuids_to_heal)
+
+    @mock.patch('nova.network.neutron.API.list_ports',
+                return_value={'ports': []})
+    @mock.patch('nova.network.neutron.API.get_instance_nw_info')
+    @mock.patch('nova.network.neutron.API.prefetch_instances_nw_info',
+                side_effect=neutron_exceptions.ServiceUnavailable)
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_heal_instance_info_cache_batch_prefetch_fails(
+            self, mock_get_by_host, mock_prefetch, mock_get_nw_info,
+            mock_list_ports):
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_batch_size=2)
+        ctxt = context.get_admin_context()
+        instances = self._get_instances_to_heal(2)
+        mock_get_by_host.return_value = instances
+
+        self.compute._heal_instance_info_cache(ctxt)
+
+        # Each instance is refreshed individually instead.
+        self.assertEqual(2, mock_list_ports.call_count)
+        mock_get_nw_info.assert_has_calls([
+            mock.call(ctxt, instance, force_refresh=True, prefetched=None)
+            for instance in instances])
+
     @mock.patch('nova.objects.InstanceList.get_by_filters')
     @mock.patch('nova.compute.api.API.unrescue')
     def test_poll_rescued_instances(self, unrescue, get):
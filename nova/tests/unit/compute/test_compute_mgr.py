@@ -21,6 +21,7 @@ import time
 from cinderclient import exceptions as cinder_exception
 from cursive import exception as cursive_exception
 import ddt
+import eventlet
 from eventlet import event as eventlet_event
 from eventlet import timeout as eventlet_timeout
 from keystoneauth1 import exceptions as keystone_exception
@@ -387,6 +388,50 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
             else:
                 self.assertFalse(db_node.destroy.called)
 
+    @mock.patch.object(manager.ComputeManager,
+                       '_update_available_resource_for_node')
+    @mock.patch.object(fake_driver.FakeDriver, 'get_available_nodes')
+    @mock.patch.object(manager.ComputeManager, '_get_compute_nodes_in_db',
+                       return_value=[])
+    def test_update_available_resource_pool_size(self, get_db_nodes,
+                                                 get_avail_nodes,
+                                                 update_mock):
+        self.flags(update_resources_pool_size=3, group='compute')
+        avail_nodes = set(['node%s' % i for i in range(10)])
+        get_avail_nodes.return_value = avail_nodes
+        running = []
+        max_running = []
+
+        def fake_update(context, nodename, startup=False):
+            running.append(nodename)
+            max_running.append(len(running))
+            eventlet.sleep(0)
+            running.remove(nodename)
+
+        update_mock.side_effect = fake_update
+        self.compute.update_available_resource(self.context)
+
+        self.assertEqual(10, update_mock.call_count)
+        update_mock.assert_has_calls(
+            [mock.call(self.context, node, startup=False)
+             for node in avail_nodes], any_order=True)
+        self.assertEqual(3, max(max_running))
+
+    @mock.patch.object(manager.ComputeManager,
+                       '_update_available_resource_for_node',
+                       side_effect=exception.ReshapeFailed(error='oops'))
+    @mock.patch.object(fake_driver.FakeDriver, 'get_available_nodes',
+                       return_value=set(['node1']))
+    @mock.patch.object(manager.ComputeManager, '_get_compute_nodes_in_db',
+                       return_value=[])
+    def test_update_available_resource_pool_reraises(self, get_db_nodes,
+                                                     get_avail_nodes,
+                                                     update_mock):
+        self.flags(update_resources_pool_size=2, group='compute')
+        self.assertRaises(exception.ReshapeFailed,
+                          self.compute.update_available_resource,
+                          self.context, startup=True)
+
     @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
                 'delete_resource_provider')
     @mock.patch.object(manager.ComputeManager,
@@ -741,6 +786,104 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
         self.assertIsInstance(compute._build_semaphore,
                               compute_utils.UnlimitedSemaphore)
 
+    def test_max_concurrent_build_stages_semaphore_limited(self):
+        self.flags(max_concurrent_block_device_setups=3,
+                   max_concurrent_spawns=4, max_concurrent_image_fetches=2)
+        compute = manager.ComputeManager()
+        self.assertEqual(3, compute._block_device_setup_semaphore.balance)
+        self.assertEqual(4, compute._spawn_semaphore.balance)
+        self.assertEqual(2, compute._image_fetch_semaphore.balance)
+
+    def test_max_concurrent_build_stages_semaphore_unlimited(self):
+        compute = manager.ComputeManager()
+        self.assertIsInstance(compute._block_device_setup_semaphore,
+                              compute_utils.UnlimitedSemaphore)
+        self.assertIsInstance(compute._spawn_semaphore,
+                              compute_utils.UnlimitedSemaphore)
+        # Images are not fetched before spawning unless this is set.
+        self.assertIsNone(compute._image_fetch_semaphore)
+
+    @mock.patch.object(manager.LOG, 'debug')
+    def test_build_stage(self, mock_debug):
+        semaphore = eventlet.semaphore.Semaphore(1)
+        instance = objects.Instance(uuid=uuids.instance)
+        with self.compute._build_stage('spawn', semaphore, instance):
+            self.assertEqual(0, semaphore.balance)
+        self.assertEqual(1, semaphore.balance)
+        mock_debug.assert_called_once_with(
+            mock.ANY, {'wait': mock.ANY, 'stage': 'spawn', 'took': mock.ANY},
+            instance=instance)
+
+    def test_build_stage_releases_on_failure(self):
+        semaphore = eventlet.semaphore.Semaphore(1)
+        instance = objects.Instance(uuid=uuids.instance)
+
+        def _fail():
+            with self.compute._build_stage('spawn', semaphore, instance):
+                raise test.TestingException()
+
+        self.assertRaises(test.TestingException, _fail)
+        self.assertEqual(1, semaphore.balance)
+
+    @mock.patch.object(manager.LOG, 'debug')
+    def test_build_stage_logs_on_failure(self, mock_debug):
+        semaphore = eventlet.semaphore.Semaphore(1)
+        instance = objects.Instance(uuid=uuids.instance)
+
+        def _fail():
+            with self.compute._build_stage('spawn', semaphore, instance):
+                raise test.TestingException()
+
+        self.assertRaises(test.TestingException, _fail)
+        mock_debug.assert_called_once_with(
+            mock.ANY, {'wait': mock.ANY, 'stage': 'spawn', 'took': mock.ANY},
+            instance=instance)
+
+    def test_should_fetch_image_for_build(self):
+        instance = objects.Instance(uuid=uuids.instance, image_ref='',
+                                    trusted_certs=None)
+        # Disabled by default.
+        self.assertFalse(self.compute._should_fetch_image_for_build(instance))
+
+        self.compute._image_fetch_semaphore = eventlet.semaphore.Semaphore(1)
+        with mock.patch.object(self.compute.driver, 'spawn_uses_image_cache',
+                               return_value=True) as mock_uses_cache:
+            # Volume-backed instances have no image to fetch.
+            self.assertFalse(
+                self.compute._should_fetch_image_for_build(instance))
+
+            instance.image_ref = uuids.image
+            self.assertTrue(
+                self.compute._should_fetch_image_for_build(instance))
+
+            # Trusted images are verified by spawn while downloading them.
+            instance.trusted_certs = objects.TrustedCerts(ids=['cert'])
+            self.assertFalse(
+                self.compute._should_fetch_image_for_build(instance))
+
+            instance.trusted_certs = None
+            mock_uses_cache.return_value = False
+            self.assertFalse(
+                self.compute._should_fetch_image_for_build(instance))
+
+    @mock.patch.object(manager.LOG, 'warning')
+    def test_fetch_image_for_build(self, mock_warning):
+        instance = objects.Instance(uuid=uuids.instance,
+                                    image_ref=uuids.image)
+        with mock.patch.object(self.compute.driver,
+                               'cache_image') as mock_cache:
+            self.compute._fetch_image_for_build(self.context, instance)
+            mock_cache.assert_called_once_with(self.context, uuids.image)
+
+            # Failures are left for the driver to deal with while spawning.
+            mock_cache.side_effect = NotImplementedError()
+            self.compute._fetch_image_for_build(self.context, instance)
+            mock_warning.assert_not_called()
+
+            mock_cache.side_effect = test.TestingException()
+            self.compute._fetch_image_for_build(self.context, instance)
+            mock_warning.assert_called_once()
+
     @mock.patch('nova.objects.Instance.save')
     @mock.patch('nova.compute.manager.ComputeManager.'
                 '_snapshot_instance')
@@ -836,9 +979,9 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
             mock_destroy.assert_called_once_with(
                 self.context, {uuids.our_node_uuid: our_node})
             mock_inst_init.assert_has_calls(
-                [mock.call(self.context, inst_list[0]),
-                 mock.call(self.context, inst_list[1]),
-                 mock.call(self.context, inst_list[2])])
+                [mock.call(self.context, inst_list[0], vm_power_state=None),
+                 mock.call(self.context, inst_list[1], vm_power_state=None),
+                 mock.call(self.context, inst_list[2], vm_power_state=None)])
 
             mock_init_host.assert_called_once_with(host=our_host)
             mock_host_get.assert_called_once_with(self.context, our_host,
@@ -903,6 +1046,27 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
                 mock.call(self.compute.handle_events), mock.call(None)])
             mock_driver.cleanup_host.assert_called_once_with(host='fake-mini')
 
+    @mock.patch('nova.compute.utils.InstanceActionEventBuffer')
+    @mock.patch('nova.objects.InstanceList')
+    @mock.patch('nova.objects.MigrationList.get_by_filters')
+    def test_cleanup_host_flushes_instance_action_events(
+            self, mock_miglist_get, mock_instance_list, mock_buffer):
+        self.flags(instance_action_event_buffer_size=10, group='compute')
+        self.stub_out('nova.compute.utils.action_event_buffer', None)
+        mock_miglist_get.return_value = []
+        mock_instance_list.get_by_host.return_value = []
+
+        with mock.patch.object(self.compute, 'driver'):
+            self.compute.init_host()
+            mock_buffer.assert_called_once_with(10)
+            self.assertEqual(mock_buffer.return_value,
+                             compute_utils.action_event_buffer)
+
+            self.compute.cleanup_host()
+
+        self.assertIsNone(compute_utils.action_event_buffer)
+        mock_buffer.return_value.stop.assert_called_once_with()
+
     def test_cleanup_live_migrations_in_pool_with_record(self):
         fake_future = mock.MagicMock()
         fake_instance_uuid = uuids.instance
@@ -1042,11 +1206,96 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
         self.compute.init_host()
 
         mock_init_instance.assert_called_once_with(
-            self.context, active_instance)
+            self.context, active_instance, vm_power_state=None)
         mock_error_interrupted.assert_called_once_with(
             self.context, {active_instance.uuid, evacuating_instance.uuid},
             mock_get_nodes.return_value.keys())
 
+    @mock.patch.object(manager.ComputeManager, '_init_instance')
+    def test_init_instances_prefetches_power_states(self, mock_init_instance):
+        instances = [objects.Instance(uuid=uuids.instance1),
+                     objects.Instance(uuid=uuids.instance2)]
+        with mock.patch.object(
+                self.compute.driver, 'get_instance_power_states',
+                return_value={uuids.instance1: power_state.RUNNING}
+        ) as mock_states:
+            self.compute._init_instances(self.context, instances)
+        mock_states.assert_called_once_with(instances)
+        mock_init_instance.assert_has_calls([
+            mock.call(self.context, instances[0],
+                      vm_power_state=power_state.RUNNING),
+            mock.call(self.context, instances[1], vm_power_state=None)])
+
+    @mock.patch.object(manager.ComputeManager, '_init_instance')
+    def test_init_instances_pool_size(self, mock_init_instance):
+        self.flags(init_instances_pool_size=3, group='compute')
+        instances = [objects.Instance(uuid=getattr(uuids, 'inst%d' % i))
+                     for i in range(10)]
+        running = []
+        max_running = []
+
+        def fake_init_instance(context, instance, vm_power_state=None):
+            running.append(instance.uuid)
+            max_running.append(len(running))
+            eventlet.sleep(0)
+            running.remove(instance.uuid)
+
+        mock_init_instance.side_effect = fake_init_instance
+        self.compute._init_instances(self.context, instances)
+
+        self.assertEqual(10, mock_init_instance.call_count)
+        self.assertEqual(3, max(max_running))
+
+    @mock.patch.object(manager.ComputeManager, '_init_instance',
+                       side_effect=test.TestingException)
+    def test_init_instances_pool_reraises(self, mock_init_instance):
+        self.flags(init_instances_pool_size=2, group='compute')
+        instances = [objects.Instance(uuid=uuids.instance1)]
+        self.assertRaises(test.TestingException,
+                          self.compute._init_instances, self.context,
+                          instances)
+
+    def test_init_instance_uses_prefetched_power_state(self):
+        instance = fake_instance.fake_instance_obj(
+            self.context, uuid=uuids.instance, host=self.compute.host,
+            vm_state=vm_states.ACTIVE, task_state=None,
+            power_state=power_state.RUNNING)
+        instance.info_cache = objects.InstanceInfoCache(
+            network_info=network_model.NetworkInfo())
+        with test.nested(
+            mock.patch.object(self.compute, '_get_power_state',
+                              new_callable=mock.NonCallableMock),
+            mock.patch.object(self.compute.driver, 'plug_vifs'),
+            mock.patch.object(self.compute, '_resume_guests_state'),
+        ) as (mock_get_power_state, mock_plug, mock_resume):
+            self.compute._init_instance(self.context, instance,
+                                        vm_power_state=power_state.RUNNING)
+        mock_plug.assert_called_once_with(instance, mock.ANY)
+        mock_resume.assert_not_called()
+
+    def test_init_instance_prefetched_power_state_live_migrating(self):
+        # The power state is queried again after resetting an interrupted
+        # live migration as that may have changed it.
+        self.flags(resume_guests_state_on_host_boot=True)
+        instance = fake_instance.fake_instance_obj(
+            self.context, uuid=uuids.instance, host=self.compute.host,
+            vm_state=vm_states.ACTIVE, task_state=task_states.MIGRATING,
+            power_state=power_state.RUNNING)
+        instance.info_cache = objects.InstanceInfoCache(
+            network_info=network_model.NetworkInfo())
+        with test.nested(
+            mock.patch.object(self.compute, '_get_power_state',
+                              return_value=power_state.SHUTDOWN),
+            mock.patch.object(self.compute.driver, 'plug_vifs'),
+            mock.patch.object(self.compute, '_reset_live_migration'),
+            mock.patch.object(self.compute, '_resume_guests_state'),
+        ) as (mock_get_power_state, mock_plug, mock_reset, mock_resume):
+            self.compute._init_instance(self.context, instance,
+                                        vm_power_state=power_state.PAUSED)
+        mock_get_power_state.assert_called_once_with(instance)
+        mock_resume.assert_called_once_with(self.context, instance,
+                                            mock.ANY)
+
     @mock.patch.object(objects.ComputeNode, 'get_by_host_and_nodename')
     @mock.patch.object(fake_driver.FakeDriver, 'get_available_nodes')
     def test_get_nodes(self, mock_driver_get_nodes, mock_get_by_host_and_node):
@@ -2401,6 +2650,93 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
                                                           power_state.NOSTATE,
                                                           use_slave=True)
 
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_prefetches_power_states(self, mock_get):
+        instance = objects.Instance(uuid=uuids.instance)
+        mock_get.return_value = [instance]
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'get_num_instances',
+                              return_value=1),
+            mock.patch.object(self.compute.driver,
+                              'get_instance_power_states',
+                              return_value={
+                                  uuids.instance: power_state.RUNNING}),
+            mock.patch.object(self.compute,
+                              '_query_driver_power_state_and_sync'),
+        ) as (mock_num, mock_states, mock_query):
+            self.compute._sync_power_states(self.context)
+            self.compute._sync_power_pool.waitall()
+        mock_states.assert_called_once_with([instance])
+        mock_query.assert_called_once_with(
+            self.context, instance, power_state.RUNNING)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_prefetch_not_implemented(self, mock_get):
+        instance = objects.Instance(uuid=uuids.instance)
+        mock_get.return_value = [instance]
+        with test.nested(
+            mock.patch.object(self.compute.driver, 'get_num_instances',
+                              return_value=1),
+            mock.patch.object(self.compute.driver,
+                              'get_instance_power_states',
+                              side_effect=NotImplementedError),
+            mock.patch.object(self.compute,
+                              '_query_driver_power_state_and_sync'),
+        ) as (mock_num, mock_states, mock_query):
+            self.compute._sync_power_states(self.context)
+            self.compute._sync_power_pool.waitall()
+        mock_query.assert_called_once_with(self.context, instance, None)
+
+    @mock.patch('nova.compute.manager.ComputeManager.'
+                '_sync_instance_power_state')
+    def test_query_driver_power_state_and_sync_prefetched_in_sync(
+            self, mock_sync_power_state):
+        db_instance = self._get_sync_instance(power_state.RUNNING,
+                                              vm_states.ACTIVE)
+        with mock.patch.object(self.compute.driver,
+                               'get_info') as mock_get_info:
+            self.compute._query_driver_power_state_and_sync(
+                self.context, db_instance, power_state.RUNNING)
+        mock_get_info.assert_not_called()
+        mock_sync_power_state.assert_not_called()
+
+    @mock.patch('nova.compute.manager.ComputeManager.'
+                '_sync_instance_power_state')
+    def test_query_driver_power_state_and_sync_prefetched_mismatch(
+            self, mock_sync_power_state):
+        db_instance = self._get_sync_instance(power_state.RUNNING,
+                                              vm_states.ACTIVE)
+        with mock.patch.object(
+                self.compute.driver, 'get_info',
+                return_value=hardware.InstanceInfo(
+                    state=power_state.SHUTDOWN)) as mock_get_info:
+            self.compute._query_driver_power_state_and_sync(
+                self.context, db_instance, power_state.SHUTDOWN)
+        # The prefetched state is confirmed with the driver before acting.
+        mock_get_info.assert_called_once_with(db_instance)
+        mock_sync_power_state.assert_called_once_with(
+            self.context, db_instance, power_state.SHUTDOWN, use_slave=True)
+
+    def test_power_state_needs_sync(self):
+        for vm_state, vm_power_state, expected in (
+                (vm_states.ACTIVE, power_state.RUNNING, False),
+                (vm_states.ACTIVE, power_state.PAUSED, True),
+                (vm_states.STOPPED, power_state.SHUTDOWN, False),
+                (vm_states.STOPPED, power_state.RUNNING, True),
+                (vm_states.PAUSED, power_state.PAUSED, False),
+                (vm_states.PAUSED, power_state.SHUTDOWN, True),
+                (vm_states.SOFT_DELETED, power_state.SHUTDOWN, False),
+                (vm_states.SOFT_DELETED, power_state.RUNNING, True),
+                (vm_states.ERROR, power_state.RUNNING, False)):
+            db_instance = self._get_sync_instance(vm_power_state, vm_state)
+            self.assertEqual(
+                expected, self.compute._power_state_needs_sync(
+                    db_instance, vm_power_state), (vm_state, vm_power_state))
+        db_instance = self._get_sync_instance(power_state.RUNNING,
+                                              vm_states.ACTIVE)
+        self.assertTrue(self.compute._power_state_needs_sync(
+            db_instance, power_state.SHUTDOWN))
+
     def test_cleanup_running_deleted_instances_virt_driver_not_ready(self):
         """Tests the scenario that the driver raises VirtDriverNotReady
         when listing instances so the task returns early.
@@ -6055,6 +6391,37 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
             self.assertEqual({'one-image': 'cached',
                               'two-image': 'existing'}, r)
 
+    @mock.patch('nova.compute.manager.LOG')
+    def test_prefetch_image(self, mock_log):
+        with mock.patch.object(self.compute.driver, 'cache_image') as c:
+            c.return_value = True
+            self.compute.prefetch_image(self.context, 'an-image')
+            c.assert_called_once_with(self.context, 'an-image')
+        mock_log.info.assert_called_once_with(
+            'Took %(time)0.2f seconds to prefetch image %(image_id)s.',
+            {'time': mock.ANY, 'image_id': 'an-image'})
+
+    @mock.patch('nova.compute.manager.LOG')
+    def test_prefetch_image_existing(self, mock_log):
+        with mock.patch.object(self.compute.driver, 'cache_image') as c:
+            c.return_value = False
+            self.compute.prefetch_image(self.context, 'an-image')
+        mock_log.info.assert_not_called()
+        mock_log.warning.assert_not_called()
+
+    @mock.patch('nova.compute.manager.LOG')
+    def test_prefetch_image_unsupported(self, mock_log):
+        self.compute.prefetch_image(self.context, 'an-image')
+        mock_log.debug.assert_called_once()
+        mock_log.warning.assert_not_called()
+
+    @mock.patch('nova.compute.manager.LOG')
+    def test_prefetch_image_failed(self, mock_log):
+        with mock.patch.object(self.compute.driver, 'cache_image') as c:
+            c.side_effect = test.TestingException('foo')
+            self.compute.prefetch_image(self.context, 'an-image')
+        mock_log.warning.assert_called_once()
+
 
 class ComputeManagerBuildInstanceTestCase(test.NoDBTestCase):
     def setUp(self):
@@ -6387,6 +6754,64 @@ class ComputeManagerBuildInstanceTestCase(test.NoDBTestCase):
             mock.ANY, self.injected_files, self.admin_pass, mock.ANY,
             network_info=None, block_device_info=None, accel_info=accel_info)
 
+    @mock.patch.object(fake_driver.FakeDriver, 'spawn')
+    @mock.patch('nova.objects.Instance.save')
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'get_allocations_for_consumer')
+    @mock.patch.object(manager.ComputeManager, '_get_request_group_mapping',
+                       return_value=None)
+    @mock.patch.object(manager.ComputeManager, '_check_trusted_certs')
+    @mock.patch.object(manager.ComputeManager, '_check_device_tagging')
+    @mock.patch.object(compute_utils, 'notify_about_instance_create')
+    @mock.patch.object(manager.ComputeManager, '_notify_about_instance_usage')
+    def test_spawn_limited_by_spawn_semaphore(self, mock_ins_usage,
+            mock_ins_create, mock_dev_tag, mock_certs, mock_req_group_map,
+            mock_get_allocations, mock_ins_save, mock_spawn):
+        self.compute._spawn_semaphore = eventlet.semaphore.Semaphore(1)
+        self.compute._image_fetch_semaphore = eventlet.semaphore.Semaphore(1)
+
+        @contextlib.contextmanager
+        def fake_build_resources(compute_mgr, *args, **kwargs):
+            yield {
+                'block_device_info': None,
+                'network_info': None,
+                'accel_info': [],
+            }
+
+        self.instance.image_ref = uuids.image
+        self.instance.trusted_certs = None
+
+        def fake_cache_image(context, image_id):
+            # The image is fetched in its own stage before taking a spawn
+            # slot.
+            self.assertEqual(0, self.compute._image_fetch_semaphore.balance)
+            self.assertEqual(1, self.compute._spawn_semaphore.balance)
+            return True
+
+        def fake_spawn(*args, **kwargs):
+            self.assertEqual(0, self.compute._spawn_semaphore.balance)
+
+        self.stub_out('nova.compute.manager.ComputeManager._build_resources',
+                      fake_build_resources)
+        mock_spawn.side_effect = fake_spawn
+
+        with mock.patch.object(self.compute.driver, 'cache_image',
+                               side_effect=fake_cache_image) as mock_cache, \
+                mock.patch.object(self.compute.driver,
+                                  'spawn_uses_image_cache', return_value=True):
+            self.compute._build_and_run_instance(self.context, self.instance,
+                self.image, injected_files=self.injected_files,
+                admin_password=self.admin_pass,
+                requested_networks=self.requested_networks,
+                security_groups=self.security_groups,
+                block_device_mapping=self.block_device_mapping,
+                node=self.node, limits=self.limits,
+                filter_properties=self.filter_properties)
+
+        mock_cache.assert_called_once_with(self.context, uuids.image)
+        mock_spawn.assert_called_once()
+        self.assertEqual(1, self.compute._spawn_semaphore.balance)
+
     @mock.patch.object(objects.Instance, 'save')
     @mock.patch.object(nova.compute.manager.ComputeManager,
                        '_build_networks_for_instance')
@@ -7439,6 +7864,39 @@ class ComputeManagerBuildInstanceTestCase(test.NoDBTestCase):
         mock_prepspawn.assert_called_once_with(self.instance)
         mock_failedspawn.assert_called_once_with(self.instance)
 
+    @mock.patch.object(virt_driver.ComputeDriver, 'prepare_for_spawn')
+    @mock.patch.object(objects.Instance, 'save')
+    @mock.patch.object(manager.ComputeManager, '_build_networks_for_instance')
+    @mock.patch.object(manager.ComputeManager, '_prep_block_device')
+    @mock.patch.object(virt_driver.ComputeDriver,
+                       'prepare_networks_before_block_device_mapping')
+    def test_build_resources_limits_block_device_setup(
+            self, mock_prepnet, mock_prep, mock_build, mock_save,
+            mock_prepspawn):
+        self.compute._block_device_setup_semaphore = (
+            eventlet.semaphore.Semaphore(1))
+        mock_build.return_value = self.network_info
+
+        def _prep_block_device(*args, **kwargs):
+            self.assertEqual(
+                0, self.compute._block_device_setup_semaphore.balance)
+            return mock.sentinel.block_device_info
+
+        mock_prep.side_effect = _prep_block_device
+
+        with self.compute._build_resources(self.context, self.instance,
+                self.requested_networks, self.security_groups,
+                self.image, self.block_device_mapping,
+                self.resource_provider_mapping,
+                self.accel_uuids) as resources:
+            self.assertEqual(mock.sentinel.block_device_info,
+                             resources['block_device_info'])
+            self.assertEqual(
+                1, self.compute._block_device_setup_semaphore.balance)
+
+        mock_prep.assert_called_once_with(self.context, self.instance,
+                self.block_device_mapping)
+
     @mock.patch('nova.virt.block_device.attach_block_devices',
                 side_effect=exception.VolumeNotCreated('oops!'))
     def test_prep_block_device_maintain_original_error_message(self,
@@ -8576,8 +9034,8 @@ class ComputeManagerMigrationTestCase(test.NoDBTestCase,
                              mock_finish_revert,
                              mock_drop_move_claim):
 
-            self.compute.rt.tracked_migrations[self.instance['uuid']] = (
-                self.migration, None)
+            self.compute.rt.tracked_migrations[self.instance['node']][
+                self.instance['uuid']] = (self.migration, None)
             self.instance.migration_context = objects.MigrationContext()
             self.migration.source_compute = self.instance['host']
             self.migration.source_node = self.instance['node']
@@ -19,9 +19,11 @@
 import copy
 import datetime
 import string
+import sys
 
 import mock
 from oslo_serialization import jsonutils
+from oslo_utils import fixture as utils_fixture
 from oslo_utils.fixture import uuidsentinel as uuids
 from oslo_utils import uuidutils
 
@@ -874,6 +876,19 @@ class UsageInfoTestCase(test.TestCase):
         self.assertEqual(200, payload['write_bytes'])
         self.assertEqual(200, payload['writes'])
 
+    @mock.patch('nova.notifications.objects.instance.InstanceActionPayload')
+    def test_notify_about_instance_action_excluded(self, mock_payload):
+        self.flags(excluded_event_types=['instance.delete.*'],
+                   group='notifications')
+        instance = create_instance(self.context)
+
+        compute_utils.notify_about_instance_action(
+            self.context, instance, host='fake-compute', action='delete',
+            phase='start')
+
+        self.assertEqual(0, len(fake_notifier.VERSIONED_NOTIFICATIONS))
+        mock_payload.assert_not_called()
+
     def test_notify_about_instance_usage(self):
         instance = create_instance(self.context)
         # Set some system metadata
@@ -910,6 +925,25 @@ class UsageInfoTestCase(test.TestCase):
         self.assertEqual(payload['image_ref_url'], image_ref_url)
         self.compute.terminate_instance(self.context, instance, [])
 
+    @mock.patch('nova.notifications.info_from_instance')
+    def test_notify_about_instance_usage_excluded(self, mock_info):
+        self.flags(excluded_event_types=['compute.instance.create.*'],
+                   group='notifications')
+        compute_utils.notify_about_instance_usage(
+            rpc.get_notifier('compute'), self.context, mock.sentinel.instance,
+            'create.start')
+        self.assertEqual(0, len(fake_notifier.NOTIFICATIONS))
+        mock_info.assert_not_called()
+
+    @mock.patch('nova.notifications.info_from_instance')
+    def test_notify_about_instance_usage_notifier_disabled(self, mock_info):
+        notifier = mock.Mock()
+        notifier.is_enabled.return_value = False
+        compute_utils.notify_about_instance_usage(
+            notifier, self.context, mock.sentinel.instance, 'create.start')
+        mock_info.assert_not_called()
+        notifier.info.assert_not_called()
+
     def test_notify_about_aggregate_update_with_id(self):
         # Set aggregate payload
         aggregate_payload = {'aggregate_id': 1}
@@ -1112,6 +1146,85 @@ class ComputeUtilsTestCase(test.NoDBTestCase):
         self.assertRaises(test.TestingException,
                           self._test_event_reporter_graceful_exit, error)
 
+    @mock.patch('nova.objects.InstanceActionEvent.event_start')
+    @mock.patch('nova.objects.InstanceActionEvent.event_finish_with_failure')
+    def test_event_reporter_buffered(self, mock_event_finish,
+                                     mock_event_start):
+        buffer = mock.Mock(spec=compute_utils.InstanceActionEventBuffer)
+        self.stub_out('nova.compute.utils.action_event_buffer', buffer)
+        error = test.TestingException('uh oh')
+
+        def _fail():
+            with compute_utils.EventReporter(self.context, 'fake_event',
+                                             'fake.host', uuids.instance):
+                raise error
+
+        self.assertRaises(test.TestingException, _fail)
+        buffer.event_start.assert_called_once_with(
+            self.context, uuids.instance, 'fake_event', host='fake.host')
+        buffer.event_finish_with_failure.assert_called_once_with(
+            self.context, uuids.instance, 'fake_event', exc_val=error,
+            exc_tb=mock.ANY)
+        mock_event_start.assert_not_called()
+        mock_event_finish.assert_not_called()
+
+    @mock.patch('nova.objects.InstanceActionEvent.record_events')
+    def test_instance_action_event_buffer(self, mock_record):
+        self.useFixture(utils_fixture.TimeFixture())
+        buffer = compute_utils.InstanceActionEventBuffer(10)
+        buffer.event_start(self.context, uuids.instance, 'fake_event',
+                           host='fake.host')
+        try:
+            raise exception.NoValidHost(reason='some error')
+        except exception.NoValidHost as e:
+            buffer.event_finish_with_failure(
+                self.context, uuids.instance, 'fake_event', exc_val=e,
+                exc_tb=sys.exc_info()[2])
+        buffer.stop()
+
+        mock_record.assert_called_once_with(mock.ANY, mock.ANY)
+        events = mock_record.call_args[0][1]
+        self.assertEqual(['start', 'finish'],
+                         [event['event_type'] for event in events])
+        self.assertEqual(
+            objects.InstanceActionEvent.pack_action_event_start(
+                self.context, uuids.instance, 'fake_event',
+                host='fake.host'),
+            events[0]['values'])
+        finish = events[1]['values']
+        self.assertEqual('Error', finish['result'])
+        self.assertEqual('No valid host was found. some error',
+                         finish['details'])
+        self.assertIsInstance(finish['traceback'], str)
+        self.assertFalse(events[1]['use_last_action'])
+
+    @mock.patch('nova.objects.InstanceActionEvent.record_events')
+    def test_instance_action_event_buffer_bounded(self, mock_record):
+        buffer = compute_utils.InstanceActionEventBuffer(2)
+        # The writer only runs once the third event blocks on the full queue.
+        for i in range(3):
+            buffer.event_start(self.context, uuids.instance, 'event%d' % i)
+        buffer.stop()
+
+        self.assertEqual(2, mock_record.call_count)
+        batches = [[event['values']['event'] for event in call[0][1]]
+                   for call in mock_record.call_args_list]
+        self.assertEqual([['event0', 'event1'], ['event2']], batches)
+
+    @mock.patch.object(compute_utils.LOG, 'exception')
+    @mock.patch('nova.objects.InstanceActionEvent.record_events',
+                side_effect=[test.TestingException('uh oh'), 1])
+    def test_instance_action_event_buffer_write_fails(self, mock_record,
+                                                      mock_log):
+        buffer = compute_utils.InstanceActionEventBuffer(1)
+        buffer.event_start(self.context, uuids.instance, 'event0')
+        buffer.event_start(self.context, uuids.instance, 'event1')
+        buffer.stop()
+
+        self.assertEqual(2, mock_record.call_count)
+        mock_log.assert_called_once_with(
+            'Failed to record %d instance action events.', 1)
+
     @mock.patch('netifaces.interfaces')
     def test_get_machine_ips_value_error(self, mock_interfaces):
         # Tests that the utility method does not explode if netifaces raises
@@ -10,7 +10,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
+import datetime
+
+import iso8601
 import mock
+from oslo_serialization import jsonutils
 from oslo_utils.fixture import uuidsentinel as uuids
 
 from nova.compute import instance_list
@@ -61,6 +66,91 @@ class TestInstanceList(test.NoDBTestCase):
         self.assertEqual(['created_at', 'id', 'uuid'], ctx.sort_keys)
         self.assertEqual(['desc', 'desc', 'asc'], ctx.sort_dirs)
 
+    def test_keyset_marker(self):
+        created_at = datetime.datetime(2020, 1, 2, 3, 4, 5, 6)
+        inst = objects.Instance(
+            id=42, uuid=uuids.instance, display_name='foo',
+            created_at=created_at.replace(tzinfo=iso8601.UTC))
+        lister = instance_list.InstanceLister(None, None)
+
+        marker = instance_list.get_keyset_marker(inst, None, None)
+        self.assertTrue(instance_list.is_keyset_marker(marker))
+        self.assertEqual([created_at, 42, uuids.instance],
+                         lister.get_marker_values(self.context, marker))
+
+        marker = instance_list.get_keyset_marker(inst, ['display_name'],
+                                                 ['desc'])
+        lister = instance_list.InstanceLister(['display_name'], ['desc'])
+        self.assertEqual(['foo', uuids.instance],
+                         lister.get_marker_values(self.context, marker))
+
+        # Markers for a different sort order are refused
+        lister = instance_list.InstanceLister(['display_name'], ['asc'])
+        self.assertRaises(exception.MarkerNotFound,
+                          lister.get_marker_values, self.context, marker)
+        self.assertRaises(exception.MarkerNotFound,
+                          lister.get_marker_values, self.context,
+                          instance_list.KEYSET_MARKER_PREFIX + 'foo')
+
+        # Markers with values of the wrong type are refused
+        def _marker(values):
+            data = jsonutils.dump_as_bytes(
+                [['created_at', 'id', 'uuid'], ['desc', 'desc', 'asc'],
+                 values])
+            return (instance_list.KEYSET_MARKER_PREFIX +
+                    base64.urlsafe_b64encode(data).decode())
+
+        lister = instance_list.InstanceLister(None, None)
+        self.assertEqual([None, 42, uuids.instance],
+                         lister.get_marker_values(
+                             self.context,
+                             _marker([None, 42, uuids.instance])))
+        for values in ([None, '42', uuids.instance],
+                       [None, True, uuids.instance],
+                       [None, 42, ['foo']],
+                       [None, 42, {'foo': 'bar'}],
+                       [42, 42, uuids.instance],
+                       {'foo': 'bar', 'bar': 'baz', 'baz': 'foo'}):
+            self.assertRaises(exception.MarkerNotFound,
+                              lister.get_marker_values, self.context,
+                              _marker(values))
+
+        # Instance uuids are regular markers
+        self.assertFalse(instance_list.is_keyset_marker(uuids.instance))
+        self.assertIsNone(lister.get_marker_values(self.context,
+                                                   uuids.instance))
+
+    def test_keyset_marker_not_from_cell(self):
+        # Instances of build requests have no id
+        inst = objects.Instance(uuid=uuids.instance, display_name='foo',
+                                created_at=None)
+        self.assertIsNone(instance_list.get_keyset_marker(inst, None, None))
+
+    @mock.patch('nova.objects.InstanceMapping.get_by_instance_uuid')
+    @mock.patch('nova.db.api.instance_get_all_by_filters_sort')
+    @mock.patch('nova.objects.CellMappingList.get_all')
+    def test_get_instances_sorted_keyset_marker(self, mock_cells, mock_inst,
+                                                mock_im):
+        mock_cells.return_value = self.cells
+        mock_inst.return_value = []
+        inst = objects.Instance(id=1, uuid=uuids.instance,
+                                hostname='inst', created_at=None)
+        marker = instance_list.get_keyset_marker(inst, ['hostname'], ['asc'])
+
+        obj, insts = instance_list.get_instances_sorted(self.context, {},
+                                                        None, marker, [],
+                                                        ['hostname'], ['asc'])
+        self.assertEqual([], list(insts))
+
+        # Each cell seeks past the marker values without any lookup
+        mock_im.assert_not_called()
+        self.assertEqual(len(self.cells), mock_inst.call_count)
+        mock_inst.assert_called_with(
+            mock.ANY, {}, limit=None, marker=None,
+            marker_values=['inst', uuids.instance],
+            sort_keys=['hostname', 'uuid'], sort_dirs=['asc', 'asc'],
+            columns_to_join=[])
+
     @mock.patch('nova.db.api.instance_get_all_by_filters_sort')
     @mock.patch('nova.objects.CellMappingList.get_all')
     def test_get_instances_sorted(self, mock_cells, mock_inst):
@@ -435,3 +435,45 @@ class TestBaseClass(test.NoDBTestCase):
         self.assertEqual(sorted([cell.uuid for cell in cells
                                  if cell.uuid != uuids.cell1]),
                          gmbv_summary['called_in_cell'])
+
+    def test_keyset_marker(self):
+        class KeysetLister(TestLister):
+            def get_marker_values(self, ctx, marker):
+                return [marker[len('keyset-'):]]
+
+            def get_by_filters(self, ctx, filters, limit, marker, **kwargs):
+                self._method_called(ctx, 'marker_values',
+                                    (marker, kwargs.get('marker_values')))
+                return super(KeysetLister, self).get_by_filters(
+                    ctx, filters, limit, marker)
+
+        data = [{'id': 'foo-%i' % i} for i in range(0, 100)]
+        cells = [objects.CellMapping(uuid=getattr(uuids, 'cell%i' % i),
+                                     name='cell%i' % i)
+                 for i in range(0, 3)]
+
+        lister = KeysetLister(data, ['id'], ['asc'], cells=cells,
+                              batch_size=5)
+        ctx = context.RequestContext()
+        result = list(lister.get_records_sorted(ctx, {}, 20, 'keyset-foo-9'))
+        self.assertEqual(20, len(result))
+
+        # There is no marker record to look up
+        self.assertEqual(0, lister.call_summary('get_marker_record')['total'])
+        self.assertEqual(
+            0, lister.call_summary('get_marker_by_values')['total'])
+
+        # Every cell seeks past the values from the marker first, and past
+        # the values of the last record of a batch for the next batches.
+        summary = lister.call_summary('marker_values')
+        self.assertEqual(sorted(cell.uuid for cell in cells),
+                         summary['called_in_cell'])
+        for calls in summary['limit_by_cell']:
+            self.assertIn((None, ['foo-9']), calls)
+        batches = max(summary['limit_by_cell'], key=len)
+        self.assertGreater(len(batches), 1)
+        last_ids = ['foo-%i' % (i * 5 + 4) for i in range(0, 20)]
+        for marker, values in batches[1:]:
+            self.assertIsNone(marker)
+            self.assertEqual(1, len(values))
+            self.assertIn(values[0], last_ids)
@@ -13,6 +13,7 @@
 import copy
 import datetime
 
+import eventlet
 from keystoneauth1 import exceptions as ks_exc
 import mock
 import os_resource_classes as orc
@@ -1577,6 +1578,36 @@ class TestUpdateComputeNode(BaseTestCase):
         self.rt._update(mock.sentinel.ctx, new_compute)
         save_mock.assert_called_once_with()
 
+    @mock.patch('nova.compute.resource_tracker.ResourceTracker.'
+                '_sync_compute_service_disabled_trait', new=mock.Mock())
+    @mock.patch('nova.objects.ComputeNode.save')
+    def test_existing_compute_node_only_saves_changed_fields(self,
+                                                             save_mock):
+        self._setup_rt()
+
+        orig_compute = _COMPUTE_NODE_FIXTURES[0].obj_clone()
+        self.rt.compute_nodes[_NODENAME] = orig_compute
+        self.rt.old_resources[_NODENAME] = orig_compute
+
+        # Re-setting fields to their current value flags them as changed,
+        # like the periodic update does for the JSON blobs, but only the
+        # fields with a new value should be written.
+        new_compute = orig_compute.obj_clone()
+        new_compute.obj_reset_changes()
+        new_compute.numa_topology = orig_compute.numa_topology
+        new_compute.stats = copy.deepcopy(orig_compute.stats)
+        new_compute.pci_device_pools = (
+            orig_compute.pci_device_pools.obj_clone())
+        new_compute.vcpus_used = 2
+
+        def fake_save():
+            self.assertEqual({'vcpus_used': 2},
+                             new_compute.obj_get_changes())
+
+        save_mock.side_effect = fake_save
+        self.rt._update(mock.sentinel.ctx, new_compute)
+        save_mock.assert_called_once_with()
+
     @mock.patch('nova.compute.resource_tracker.ResourceTracker.'
                 '_sync_compute_service_disabled_trait')
     def test_existing_node_capabilities_as_traits(self, mock_sync_disabled):
@@ -2440,7 +2471,7 @@ class TestResize(BaseTestCase):
         self.assertIsInstance(claim, claims.MoveClaim)
         cn = self.rt.compute_nodes[_NODENAME]
         self.assertTrue(obj_base.obj_equal_prims(expected, cn))
-        self.assertEqual(1, len(self.rt.tracked_migrations))
+        self.assertEqual(1, len(self.rt.tracked_migrations[_NODENAME]))
 
         # Now abort the resize claim and check that the resources have been set
         # back to their original values.
@@ -2452,7 +2483,7 @@ class TestResize(BaseTestCase):
         self.assertEqual(1, cn.vcpus_used)
         self.assertEqual(1, cn.local_gb_used)
         self.assertEqual(128, cn.memory_mb_used)
-        self.assertEqual(0, len(self.rt.tracked_migrations))
+        self.assertEqual(0, len(self.rt.tracked_migrations[_NODENAME]))
 
     @mock.patch('nova.compute.resource_tracker.ResourceTracker.'
                 '_sync_compute_service_disabled_trait', new=mock.Mock())
@@ -2764,7 +2795,7 @@ class TestResize(BaseTestCase):
             dest_node=cn.hypervisor_hostname,
             migration_type='resize',
         )
-        self.rt.tracked_migrations = {instance.uuid: migration}
+        self.rt.tracked_migrations[_NODENAME] = {instance.uuid: migration}
 
         # not using mock.sentinel.ctx because _drop_move_claim calls elevated
         ctx = mock.MagicMock()
@@ -2918,9 +2949,9 @@ class TestResize(BaseTestCase):
                                  None, self.allocations)
         cn = self.rt.compute_nodes[_NODENAME]
         self.assertTrue(obj_base.obj_equal_prims(expected, cn))
-        self.assertEqual(2, len(self.rt.tracked_migrations),
+        self.assertEqual(2, len(self.rt.tracked_migrations[_NODENAME]),
                          "Expected 2 tracked migrations but got %s"
-                         % self.rt.tracked_migrations)
+                         % self.rt.tracked_migrations[_NODENAME])
 
 
 class TestRebuild(BaseTestCase):
@@ -3012,7 +3043,7 @@ class TestRebuild(BaseTestCase):
         self.assertEqual(_HOSTNAME, migration.dest_compute)
         self.assertEqual(_NODENAME, migration.dest_node)
         self.assertEqual("pre-migrating", migration.status)
-        self.assertEqual(1, len(self.rt.tracked_migrations))
+        self.assertEqual(1, len(self.rt.tracked_migrations[_NODENAME]))
         mig_save_mock.assert_called_once_with()
         inst_save_mock.assert_called_once_with()
 
@@ -3080,7 +3111,8 @@ class TestUpdateUsageFromMigration(test.NoDBTestCase):
             ctxt, instance, migration, migration.source_node)
         self.assertNotIn('Starting to track outgoing migration',
                          self.stdlog.logger.output)
-        self.assertNotIn(migration.instance_uuid, rt.tracked_migrations)
+        self.assertNotIn(migration.instance_uuid,
+                         rt.tracked_migrations[migration.source_node])
 
 
 class TestUpdateUsageFromMigrations(BaseTestCase):
@@ -3306,7 +3338,7 @@ class TestUpdateUsageFromInstance(BaseTestCase):
         # Stub out the is_bfv cache to make sure we remove the instance
         # from it after updating usage.
         self.rt.is_bfv[self.instance.uuid] = False
-        self.rt.tracked_instances = set([self.instance.uuid])
+        self.rt.tracked_instances[_NODENAME] = set([self.instance.uuid])
         self.rt._update_usage_from_instance(mock.sentinel.ctx, self.instance,
                                             _NODENAME)
         # The instance should have been removed from the is_bfv cache.
@@ -3334,7 +3366,7 @@ class TestUpdateUsageFromInstance(BaseTestCase):
     def test_deleted(self, mock_update_usage, mock_check_bfv):
         mock_check_bfv.return_value = False
         self.instance.vm_state = vm_states.DELETED
-        self.rt.tracked_instances = set([self.instance.uuid])
+        self.rt.tracked_instances[_NODENAME] = set([self.instance.uuid])
         self.rt._update_usage_from_instance(mock.sentinel.ctx,
                                             self.instance, _NODENAME, True)
 
@@ -3486,7 +3518,7 @@ class TestUpdateUsageFromInstance(BaseTestCase):
         given node do not have their allocations removed.
         """
         rc = self.rt.reportclient
-        self.rt.tracked_instances = set([uuids.known])
+        self.rt.tracked_instances[_NODENAME] = set([uuids.known])
         allocs = report.ProviderAllocInfo(
             allocations={
                 uuids.known: {
@@ -3937,6 +3969,115 @@ class ResourceTrackerTestCase(test.NoDBTestCase):
         self.assertRaises(AssertionError, _test_explict_unfair)
         self.assertRaises(AssertionError, _test_implicit_unfair)
 
+    @mock.patch('oslo_concurrency.lockutils.lock')
+    def test_node_lock_host_wide_by_default(self, mock_lock):
+        rt = resource_tracker.ResourceTracker(
+            _HOSTNAME, mock.sentinel.driver, mock.sentinel.reportclient)
+        self.assertIs(mock_lock.return_value, rt._node_lock(_NODENAME))
+        mock_lock.assert_called_once_with(
+            resource_tracker.COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+
+        # The host lock is already held by the caller of a node scoped
+        # operation so it must not be acquired again.
+        mock_lock.reset_mock()
+        with rt._host_lock():
+            pass
+        mock_lock.assert_not_called()
+
+    @mock.patch('oslo_concurrency.lockutils.lock')
+    def test_node_lock_per_node(self, mock_lock):
+        self.flags(resource_tracker_lock_per_node=True, group='compute')
+        rt = resource_tracker.ResourceTracker(
+            _HOSTNAME, mock.sentinel.driver, mock.sentinel.reportclient)
+        rt._node_lock(_NODENAME)
+        mock_lock.assert_called_once_with(
+            'compute_resources-%s' % _NODENAME, fair=True)
+
+        mock_lock.reset_mock()
+        with rt._host_lock():
+            mock_lock.assert_called_once_with(
+                resource_tracker.COMPUTE_RESOURCE_SEMAPHORE, fair=True)
+
+    def test_synchronized_node_uses_nodename(self):
+        self.flags(resource_tracker_lock_per_node=True, group='compute')
+        rt = resource_tracker.ResourceTracker(
+            _HOSTNAME, mock.sentinel.driver, mock.sentinel.reportclient)
+        ctxt = mock.Mock()
+        instance = mock.Mock()
+        with test.nested(
+            mock.patch.object(rt, '_node_lock'),
+            mock.patch.object(rt, '_update_usage_from_instance'),
+            mock.patch.object(rt, '_update'),
+            mock.patch.object(rt, '_drop_move_claim'),
+            mock.patch.object(rt, 'disabled', return_value=False),
+        ) as (mock_lock, _, _, _, _):
+            rt.tracked_instances['node1'].add(uuids.instance)
+            rt.compute_nodes['node1'] = mock.sentinel.cn
+            rt.update_usage(ctxt, {'uuid': uuids.instance}, 'node1')
+            mock_lock.assert_called_once_with('node1')
+
+            mock_lock.reset_mock()
+            rt.drop_move_claim_at_source(
+                ctxt, instance, mock.Mock(source_node='src'))
+            mock_lock.assert_called_once_with('src')
+
+            mock_lock.reset_mock()
+            rt.drop_move_claim_at_dest(
+                ctxt, instance, mock.Mock(dest_node='dest'))
+            mock_lock.assert_called_once_with('dest')
+
+    def test_synchronized_node_ignores_nodename_without_lock_per_node(self):
+        rt = resource_tracker.ResourceTracker(
+            _HOSTNAME, mock.sentinel.driver, mock.sentinel.reportclient)
+        migration = mock.Mock()
+        dest_node = mock.PropertyMock(return_value='dest')
+        type(migration).dest_node = dest_node
+        with test.nested(
+            mock.patch.object(rt, '_node_lock'),
+            mock.patch.object(rt, '_drop_move_claim'),
+        ) as (mock_lock, _):
+            rt.drop_move_claim_at_dest(mock.Mock(), mock.Mock(), migration)
+            mock_lock.assert_called_once_with(None)
+        # The node is only looked up by the method itself and not to pick
+        # the lock, as it may not be set on the migration.
+        dest_node.assert_called_once_with()
+
+    def test_concurrent_node_audits_keep_other_node_tracked_instances(self):
+        self.flags(resource_tracker_lock_per_node=True, group='compute')
+        rt = resource_tracker.ResourceTracker(
+            _HOSTNAME, mock.sentinel.driver, mock.sentinel.reportclient)
+        ctxt = context.get_admin_context()
+        instances = {}
+        for nodename in ('node1', 'node2'):
+            rt.compute_nodes[nodename] = objects.ComputeNode(
+                memory_mb=1024, local_gb=10, vcpus=4)
+            instances[nodename] = [
+                fake_instance.fake_instance_obj(
+                    ctxt, uuid=getattr(uuids, '%s-%d' % (nodename, i)),
+                    vm_state=vm_states.ACTIVE, task_state=None,
+                    node=nodename)
+                for i in range(3)]
+
+        def _update_usage(usage, nodename, sign=1):
+            # Let the audit of the other node run in between.
+            eventlet.sleep(0)
+
+        with test.nested(
+            mock.patch.object(rt, '_get_usage_dict', return_value={}),
+            mock.patch.object(rt, '_update_usage', side_effect=_update_usage),
+        ):
+            audits = [
+                nova_utils.spawn(rt._update_usage_from_instances,
+                                 ctxt, instances[nodename], nodename)
+                for nodename in ('node1', 'node2')]
+            for audit in audits:
+                audit.wait()
+
+        for nodename in ('node1', 'node2'):
+            self.assertEqual(
+                set(instance.uuid for instance in instances[nodename]),
+                rt.tracked_instances[nodename])
+
 
 class ProviderConfigTestCases(BaseTestCase):
     def setUp(self):
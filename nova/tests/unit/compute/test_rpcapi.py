@@ -975,6 +975,21 @@ class ComputeRpcAPITestCase(test.NoDBTestCase):
         self.assertRaises(exception.NovaException,
                           rpcapi.cache_images, ctxt, 'host', ['image'])
 
+    def test_prefetch_image(self):
+        self._test_compute_api('prefetch_image', 'cast',
+                               host='host', image_id='image', version='5.14')
+
+    def test_prefetch_image_pinned(self):
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        rpcapi = compute_rpcapi.ComputeAPI()
+        rpcapi.router.client = mock.Mock()
+        mock_client = mock.MagicMock()
+        rpcapi.router.client.return_value = mock_client
+        mock_client.can_send_version.return_value = False
+        rpcapi.prefetch_image(ctxt, 'host', 'image')
+        mock_client.can_send_version.assert_called_once_with('5.14')
+        mock_client.prepare.assert_not_called()
+
     def test_unshelve_instance_old_compute(self):
         ctxt = context.RequestContext('fake_user', 'fake_project')
         rpcapi = compute_rpcapi.ComputeAPI()
@@ -221,6 +221,28 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         self.assertIn('dict', updates)
         self.assertEqual({'foo': 'bar'}, updates['dict'])
 
+    def test_object_action_compressed_reply(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'dict': fields.DictOfStringsField()}
+
+            def touch_dict(self):
+                self.dict['foo'] = 'bar'
+                return 'test'
+
+        obj_base.NovaObjectRegistry.register(TestObject)
+
+        obj = TestObject()
+        obj.dict = {}
+        obj.obj_reset_changes()
+        reply = self.conductor.object_action(
+            self.context, obj, 'touch_dict', tuple(), {},
+            compress_threshold=1)
+        serializer = obj_base.NovaObjectSerializer()
+        self.assertIn(serializer.COMPRESSED_KEY, reply)
+        updates, result = serializer.deserialize_entity(self.context, reply)
+        self.assertEqual({'foo': 'bar'}, updates['dict'])
+        self.assertEqual('test', result)
+
     def test_object_class_action_versions(self):
         @obj_base.NovaObjectRegistry.register
         class TestObject(obj_base.NovaObject):
@@ -317,6 +339,147 @@ class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
         self.conductor_manager = self.conductor_service.manager
         self.conductor = conductor_rpcapi.ConductorAPI()
 
+    def _test_object_action(self, delta=False, threshold=0):
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField(),
+                      'bar': fields.StringField()}
+
+            def obj_delta_fields(self, objmethod):
+                return self.obj_what_changed()
+
+            def touch(self):
+                self.bar = ','.join(sorted(name for name in self.fields
+                                           if name in self))
+                return 'test'
+
+        obj_base.NovaObjectRegistry.register(TestObject)
+
+        self.flags(rpc_object_delta=delta, rpc_compress_threshold=threshold)
+        obj = TestObject(foo=1, bar='x' * 100)
+        obj.obj_reset_changes()
+        obj.foo = 2
+        client = self.conductor.serializer
+        server = self.conductor_manager.serializer
+        with test.nested(
+            mock.patch.object(client, 'compress_entity',
+                              wraps=client.compress_entity),
+            mock.patch.object(server, 'compress_entity',
+                              wraps=server.compress_entity),
+        ) as (client_compress, server_compress):
+            updates, result = self.conductor.object_action(
+                self.context, obj, 'touch', [], {})
+        self.assertEqual('test', result)
+        self.assertEqual(client_compress.called, server_compress.called)
+        return updates, client_compress.called
+
+    def test_object_action(self):
+        updates, compressed = self._test_object_action()
+        self.assertEqual('bar,foo', updates['bar'])
+        self.assertFalse(compressed)
+
+    def test_object_action_delta(self):
+        updates, compressed = self._test_object_action(delta=True)
+        # Only the changed field was sent to conductor
+        self.assertEqual('foo', updates['bar'])
+        self.assertFalse(compressed)
+
+    def test_object_action_compressed(self):
+        updates, compressed = self._test_object_action(threshold=1)
+        self.assertEqual('bar,foo', updates['bar'])
+        self.assertTrue(compressed)
+
+    def test_object_action_delta_compressed(self):
+        updates, compressed = self._test_object_action(delta=True,
+                                                       threshold=1)
+        self.assertEqual('foo', updates['bar'])
+        self.assertTrue(compressed)
+
+    def test_object_action_delta_instance_save(self):
+        self.flags(rpc_object_delta=True, rpc_compress_threshold=1)
+        self.flags(notify_on_state_change='vm_and_task_state',
+                   notification_format='both', group='notifications')
+        ctxt = context.get_admin_context()
+        flavor = objects.Flavor.get_by_name(ctxt, 'm1.small')
+        instance = objects.Instance(
+            ctxt, project_id=self.project_id, user_id=self.user_id,
+            host='foo', flavor=flavor, old_flavor=None, new_flavor=None,
+            metadata={'key': 'value'})
+        instance.create()
+        instance = objects.Instance.get_by_uuid(
+            ctxt, instance.uuid, expected_attrs=['metadata', 'flavor',
+                                                 'info_cache', 'tags',
+                                                 'system_metadata'])
+        # NOTE: Only this copy of the instance goes through conductor.
+        instance.indirection_api = self.conductor
+        server = self.conductor_manager.serializer
+        with test.nested(
+            mock.patch.object(self.conductor.serializer, 'compress_entity',
+                              wraps=self.conductor.serializer.
+                              compress_entity),
+            mock.patch.object(server, 'compress_entity',
+                              wraps=server.compress_entity),
+            mock.patch.object(objects.Instance, 'obj_load_attr'),
+        ) as (mock_compress, mock_server_compress, mock_load):
+            instance.host = 'bar'
+            instance.task_state = task_states.SPAWNING
+            instance.save()
+        # The fields read by save() and its notifications were sent so that
+        # conductor did not have to lazy-load anything.
+        delta = mock_compress.call_args[0][1]
+        self.assertEqual(
+            {'uuid', 'host', 'vm_state', 'task_state', 'power_state', 'node',
+             'display_name', 'locked', 'progress', 'launched_at',
+             'terminated_at', 'updated_at', 'flavor', 'info_cache',
+             'metadata', 'system_metadata', 'tags'},
+            set(delta['nova_object.data']))
+        mock_load.assert_not_called()
+        # Only the fields which were sent were diffed in the reply, not all
+        # of the columns loaded from the database by save().
+        updates, result = mock_server_compress.call_args[0][1]
+        self.assertLessEqual(set(updates) - {'obj_what_changed'},
+                             set(delta['nova_object.data']))
+        self.assertEqual('bar', instance.host)
+        self.assertEqual({'key': 'value'}, instance.metadata)
+        self.assertEqual(set(), instance.obj_what_changed())
+        instance = objects.Instance.get_by_uuid(ctxt, instance.uuid)
+        self.assertEqual('bar', instance.host)
+
+    def test_object_action_delta_loaded_fields(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField(),
+                      'bar': fields.StringField(),
+                      'baz': fields.StringField()}
+
+            def obj_delta_fields(self, objmethod):
+                return self.obj_what_changed()
+
+            def load(self):
+                self.bar = 'loaded'
+                self.obj_reset_changes()
+                self.baz = 'changed'
+
+        obj_base.NovaObjectRegistry.register(TestObject)
+
+        self.flags(rpc_object_delta=True)
+        obj = TestObject(foo=1, bar='x')
+        obj.obj_reset_changes()
+        obj.foo = 2
+        updates, result = self.conductor.object_action(
+            self.context, obj, 'load', [], {})
+        # The field loaded without being changed is not sent back since it
+        # was not part of the delta, the changed one is.
+        self.assertNotIn('bar', updates)
+        self.assertEqual('changed', updates['baz'])
+
+    def test_object_action_pinned(self):
+        self.flags(conductor='3.0', group='upgrade_levels')
+        self.conductor = conductor_rpcapi.ConductorAPI()
+        updates, compressed = self._test_object_action(delta=True,
+                                                       threshold=1)
+        # The whole object is sent uncompressed to an older conductor
+        self.assertEqual('bar,foo', updates['bar'])
+        self.assertFalse(compressed)
+
 
 class ConductorAPITestCase(_BaseTestCase, test.TestCase):
     """Conductor API Tests."""
@@ -2390,6 +2553,96 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
                 else:
                     self.assertEqual(0, len(actions))
 
+    @mock.patch('nova.compute.rpcapi.ComputeAPI.prefetch_image')
+    def test_schedule_and_build_instances_prefetch_image(self, mock_prefetch):
+        self.flags(image_prefetch_hosts=2, group='conductor')
+        self._do_schedule_and_build_instances_test(self.params)
+        mock_prefetch.assert_called_once_with(
+            test.MatchType(context.RequestContext), 'host1',
+            self.params['request_specs'][0].image.id)
+
+    @mock.patch('nova.compute.rpcapi.ComputeAPI.prefetch_image')
+    def test_schedule_and_build_instances_prefetch_disabled(self,
+                                                            mock_prefetch):
+        self._do_schedule_and_build_instances_test(self.params)
+        mock_prefetch.assert_not_called()
+
+    @mock.patch('nova.compute.rpcapi.ComputeAPI.prefetch_image')
+    @mock.patch('nova.objects.HostMapping.get_by_host')
+    def test_prefetch_image(self, mock_get_hm, mock_prefetch):
+        self.flags(image_prefetch_hosts=2, group='conductor')
+        cell = self.cell_mappings['cell1']
+        host_mapping = objects.HostMapping(cell_mapping=cell)
+        mock_get_hm.return_value = host_mapping
+        host_mapping_cache = {'host1': host_mapping}
+        host_lists = [
+            [fake_selection1, fake_selection2, fake_selection3],
+            [fake_selection1, fake_selection3]]
+        build_request = self.params['build_requests'][0]
+        request_spec = self.params['request_specs'][0]
+
+        self.conductor._prefetch_image(self.ctxt, build_request, request_spec,
+                                       host_lists, host_mapping_cache)
+
+        # host1 was cached and host2 is looked up once even though the
+        # selected host and first alternate of each instance is prefetched.
+        mock_get_hm.assert_has_calls([
+            mock.call(self.ctxt, 'host2'), mock.call(self.ctxt, 'host3')])
+        self.assertEqual(2, mock_get_hm.call_count)
+        self.assertEqual({'host1', 'host2', 'host3'}, set(host_mapping_cache))
+        mock_prefetch.assert_has_calls([
+            mock.call(mock.ANY, 'host1', request_spec.image.id),
+            mock.call(mock.ANY, 'host2', request_spec.image.id),
+            mock.call(mock.ANY, 'host3', request_spec.image.id)])
+        self.assertEqual(3, mock_prefetch.call_count)
+
+    @mock.patch('nova.compute.rpcapi.ComputeAPI.prefetch_image')
+    @mock.patch('nova.objects.HostMapping.get_by_host')
+    def test_prefetch_image_host_failures_ignored(self, mock_get_hm,
+                                                  mock_prefetch):
+        self.flags(image_prefetch_hosts=3, group='conductor')
+        cell = self.cell_mappings['cell1']
+        mock_get_hm.side_effect = [
+            exc.HostMappingNotFound(name='host1'),
+            objects.HostMapping(cell_mapping=cell),
+            objects.HostMapping(cell_mapping=cell)]
+        mock_prefetch.side_effect = [messaging.MessagingTimeout, None]
+        host_mapping_cache = {}
+
+        self.conductor._prefetch_image(
+            self.ctxt, self.params['build_requests'][0],
+            self.params['request_specs'][0], fake_host_lists_alt,
+            host_mapping_cache)
+
+        self.assertEqual(3, mock_get_hm.call_count)
+        self.assertEqual(2, mock_prefetch.call_count)
+        self.assertEqual({'host2', 'host3'}, set(host_mapping_cache))
+
+    @mock.patch('nova.compute.rpcapi.ComputeAPI.prefetch_image')
+    def test_prefetch_image_skipped(self, mock_prefetch):
+        self.flags(image_prefetch_hosts=1, group='conductor')
+        build_request = self.params['build_requests'][0]
+        request_spec = self.params['request_specs'][0]
+        host_mapping_cache = {}
+
+        request_spec.is_bfv = True
+        self.conductor._prefetch_image(self.ctxt, build_request, request_spec,
+                                       fake_host_lists1, host_mapping_cache)
+
+        request_spec.is_bfv = False
+        build_request.instance.trusted_certs = objects.TrustedCerts(
+            ids=['0b5d2c72-12cc-4ba6-a8d7-3ff5cc1d8cb8'])
+        self.conductor._prefetch_image(self.ctxt, build_request, request_spec,
+                                       fake_host_lists1, host_mapping_cache)
+
+        build_request.instance.trusted_certs = None
+        request_spec.image = objects.ImageMeta()
+        self.conductor._prefetch_image(self.ctxt, build_request, request_spec,
+                                       fake_host_lists1, host_mapping_cache)
+
+        mock_prefetch.assert_not_called()
+        self.assertEqual({}, host_mapping_cache)
+
     @mock.patch('nova.compute.rpcapi.ComputeAPI.build_and_run_instance')
     @mock.patch('nova.scheduler.rpcapi.SchedulerAPI.select_destinations')
     @mock.patch('nova.objects.HostMapping.get_by_host')
@@ -2501,6 +2754,20 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
         self.assertEqual(2, build_and_run_instance.call_count)
         self.assertEqual(2, len(instance_cells))
 
+    def test_schedule_and_build_instances_batched(self):
+        self.flags(build_batch_size=2, group='conductor')
+        self.test_schedule_and_build_instances()
+
+    def test_schedule_and_build_multiple_instances_batched(self):
+        # The four instances, one of which is deleted, are written in a
+        # full batch of two followed by a partial batch of one.
+        self.flags(build_batch_size=2, group='conductor')
+        self.test_schedule_and_build_multiple_instances()
+
+    def test_schedule_and_build_multiple_cells_batched(self):
+        self.flags(build_batch_size=10, group='conductor')
+        self.test_schedule_and_build_multiple_cells()
+
     @mock.patch('nova.compute.utils.notify_about_compute_task_error')
     @mock.patch('nova.scheduler.rpcapi.SchedulerAPI.select_destinations')
     def test_schedule_and_build_scheduler_failure(self, select_destinations,
@@ -2563,6 +2830,45 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
             expect_targeted_context=True, expected_source='nova-conductor',
             expected_host='host1')
 
+    @mock.patch('nova.objects.TagList.destroy')
+    @mock.patch('nova.compute.utils.notify_about_instance_action')
+    @mock.patch('nova.compute.utils.notify_about_instance_usage')
+    @mock.patch('nova.compute.rpcapi.ComputeAPI.build_and_run_instance')
+    @mock.patch('nova.scheduler.rpcapi.SchedulerAPI.select_destinations')
+    @mock.patch('nova.objects.BuildRequestList.destroy_bulk',
+                return_value=[])
+    @mock.patch('nova.conductor.manager.ComputeTaskManager._bury_in_cell0')
+    def test_schedule_and_build_batched_delete_during_scheduling(
+            self, bury, br_destroy_bulk, select_destinations, build_and_run,
+            legacy_notify, notify, taglist_destroy):
+        self.flags(build_batch_size=10, group='conductor')
+        self.start_service('compute', host='host1')
+        select_destinations.return_value = [[fake_selection1]]
+        instance_uuid = self.params['build_requests'][0].instance_uuid
+
+        self.conductor.schedule_and_build_instances(**self.params)
+
+        self.assertFalse(build_and_run.called)
+        self.assertFalse(bury.called)
+        br_destroy_bulk.assert_called_once_with(
+            test.MatchType(context.RequestContext), [instance_uuid])
+        taglist_destroy.assert_called_once_with(
+            test.MatchType(context.RequestContext), instance_uuid)
+        with context.target_cell(self.ctxt,
+                                 self.cell_mappings['cell1']) as cctxt:
+            self.assertRaises(exc.InstanceNotFound,
+                              objects.Instance.get_by_uuid, cctxt,
+                              instance_uuid)
+            bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
+                cctxt, instance_uuid)
+            self.assertEqual(0, len(bdms))
+
+        test_utils.assert_instance_delete_notification_by_uuid(
+            legacy_notify, notify, instance_uuid,
+            self.conductor.notifier, test.MatchType(context.RequestContext),
+            expect_targeted_context=True, expected_source='nova-conductor',
+            expected_host='host1')
+
     @mock.patch('nova.compute.utils.notify_about_instance_action')
     @mock.patch('nova.objects.Instance.destroy')
     @mock.patch('nova.compute.utils.notify_about_instance_usage')
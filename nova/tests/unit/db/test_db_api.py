@@ -18,10 +18,12 @@
 
 """Unit tests for the DB API."""
 
+import collections
 import copy
 import datetime
 
 from dateutil import parser as dateutil_parser
+import eventlet
 import iso8601
 import mock
 import netaddr
@@ -37,12 +39,14 @@ from oslo_utils.fixture import uuidsentinel
 from oslo_utils import timeutils
 from oslo_utils import uuidutils
 from sqlalchemy import Column
+from sqlalchemy import create_engine
 from sqlalchemy.dialects import sqlite
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import inspect
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
+from sqlalchemy import pool
 from sqlalchemy.orm import query
 from sqlalchemy.orm import session as sqla_session
 from sqlalchemy import sql
@@ -60,6 +64,7 @@ from nova.db.sqlalchemy import models
 from nova.db.sqlalchemy import types as col_types
 from nova.db.sqlalchemy import utils as db_utils
 from nova import exception
+from nova import objects
 from nova.objects import fields
 from nova import test
 from nova.tests import fixtures as nova_fixtures
@@ -274,6 +279,373 @@ class DecoratorTestCase(test.TestCase):
         mock_clone.assert_called_once_with(mode=enginefacade._READER)
         mock_using.assert_called_once_with(ctxt)
 
+    @mock.patch.object(sqlalchemy_api, '_use_replica', return_value=True)
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def test_select_db_reader_mode_replica_safe_select_async(
+            self, mock_clone, mock_using, mock_use_replica):
+
+        @db.select_db_reader_mode
+        @db.replica_safe
+        def func(self, context, value, use_slave=False):
+            pass
+
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._ASYNC_READER)
+        ctxt = context.get_admin_context()
+        func(self, ctxt, 'some_value')
+
+        mock_use_replica.assert_called_once_with(
+            ctxt, sqlalchemy_api.get_context_manager(ctxt), None)
+        mock_clone.assert_called_once_with(mode=enginefacade._ASYNC_READER)
+        mock_using.assert_called_once_with(ctxt)
+
+    @mock.patch.object(sqlalchemy_api, '_use_replica', return_value=False)
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def test_select_db_reader_mode_replica_safe_select_sync(
+            self, mock_clone, mock_using, mock_use_replica):
+
+        @db.select_db_reader_mode
+        @db.replica_safe
+        def func(self, context, value, use_slave=False):
+            pass
+
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._READER)
+        ctxt = context.get_admin_context()
+        func(self, ctxt, 'some_value')
+
+        mock_use_replica.assert_called_once()
+        mock_clone.assert_called_once_with(mode=enginefacade._READER)
+        mock_using.assert_called_once_with(ctxt)
+
+    @mock.patch.object(sqlalchemy_api, '_use_replica', return_value=True)
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def test_pick_context_manager_reader_allow_async_replica_safe(
+            self, mock_clone, mock_using, mock_use_replica):
+
+        @sqlalchemy_api.pick_context_manager_reader_allow_async
+        @sqlalchemy_api.replica_safe
+        def func(context):
+            pass
+
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._ASYNC_READER)
+        ctxt = context.get_admin_context()
+        func(ctxt)
+
+        mock_use_replica.assert_called_once_with(
+            ctxt, sqlalchemy_api.get_context_manager(ctxt), None)
+        mock_clone.assert_called_once_with(mode=enginefacade._ASYNC_READER)
+        mock_using.assert_called_once_with(ctxt)
+
+    @mock.patch.object(sqlalchemy_api, '_use_replica', return_value=True)
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def test_pick_context_manager_reader_allow_async_replica_safe_on_request(
+            self, mock_clone, mock_using, mock_use_replica):
+
+        @sqlalchemy_api.pick_context_manager_reader_allow_async
+        @sqlalchemy_api.replica_safe_on_request
+        def func(context):
+            pass
+
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._READER)
+        ctxt = context.get_admin_context()
+        func(ctxt)
+        mock_use_replica.assert_not_called()
+        mock_clone.assert_has_calls([mock.call(mode=enginefacade._READER),
+                                     mock.call(allow_async=True)])
+
+        mock_clone.reset_mock()
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._ASYNC_READER)
+        ctxt.allow_replica_reads = True
+        func(ctxt)
+        mock_use_replica.assert_called_once_with(
+            ctxt, sqlalchemy_api.get_context_manager(ctxt), None)
+        mock_clone.assert_called_once_with(mode=enginefacade._ASYNC_READER)
+
+    @mock.patch.object(sqlalchemy_api, '_use_replica')
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def test_pick_context_manager_reader_allow_async_not_replica_safe(
+            self, mock_clone, mock_using, mock_use_replica):
+
+        @sqlalchemy_api.pick_context_manager_reader_allow_async
+        def func(context):
+            pass
+
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._READER)
+        ctxt = context.get_admin_context()
+        func(ctxt)
+
+        mock_use_replica.assert_not_called()
+        mock_clone.assert_has_calls([mock.call(mode=enginefacade._READER),
+                                     mock.call(allow_async=True)])
+
+    @mock.patch.object(sqlalchemy_api, '_use_replica', return_value=True)
+    @mock.patch.object(enginefacade._TransactionContextManager, 'using')
+    @mock.patch.object(enginefacade._TransactionContextManager, '_clone')
+    def test_pick_api_context_manager_reader_replica_safe(
+            self, mock_clone, mock_using, mock_use_replica):
+        self.flags(replica_max_lag=1.5, group='api_database')
+
+        @sqlalchemy_api.pick_api_context_manager_reader
+        @sqlalchemy_api.replica_safe
+        def func(context):
+            pass
+
+        mock_clone.return_value = enginefacade._TransactionContextManager(
+            mode=enginefacade._ASYNC_READER)
+        ctxt = context.get_admin_context()
+        func(ctxt)
+
+        mock_use_replica.assert_called_once_with(
+            ctxt, sqlalchemy_api.api_context_manager, 1.5)
+        mock_clone.assert_called_once_with(mode=enginefacade._ASYNC_READER)
+        mock_using.assert_called_once_with(ctxt)
+
+
+class ReplicaRoutingTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(ReplicaRoutingTestCase, self).setUp()
+        self.stub_out('nova.db.sqlalchemy.api._REQUEST_WRITES', {})
+        self.stub_out('nova.db.sqlalchemy.api._REPLICA_LAGS', {})
+        self.ctxt_mgr = mock.Mock()
+        self.ctxt_mgr.writer.get_engine.return_value = mock.sentinel.engine
+        self.ctxt_mgr.reader.get_engine.return_value = (
+            mock.sentinel.slave_engine)
+        self.context = context.RequestContext('fake-user', 'fake-project')
+
+    @mock.patch.object(sqlalchemy_api, '_replica_lag', return_value=0.5)
+    @mock.patch('time.monotonic', return_value=100)
+    def test_use_replica(self, mock_monotonic, mock_lag):
+        self.assertFalse(sqlalchemy_api._use_replica(
+            self.context, self.ctxt_mgr, None))
+        self.assertTrue(sqlalchemy_api._use_replica(
+            self.context, self.ctxt_mgr, 1))
+        self.assertFalse(sqlalchemy_api._use_replica(
+            self.context, self.ctxt_mgr, 0.25))
+        mock_lag.return_value = None
+        self.assertFalse(sqlalchemy_api._use_replica(
+            self.context, self.ctxt_mgr, 1))
+
+    @mock.patch.object(sqlalchemy_api, '_replica_lag', return_value=0.5)
+    @mock.patch('time.monotonic', return_value=100)
+    def test_use_replica_read_your_writes(self, mock_monotonic, mock_lag):
+        sqlalchemy_api._REQUEST_WRITES[self.context.request_id] = 99.75
+        self.assertFalse(sqlalchemy_api._use_replica(
+            self.context, self.ctxt_mgr, 1))
+        # Other requests still read from the slave database.
+        self.assertTrue(sqlalchemy_api._use_replica(
+            context.RequestContext('fake-user', 'fake-project'),
+            self.ctxt_mgr, 1))
+        # Once it has caught up with the write, so does the request.
+        mock_monotonic.return_value = 100.5
+        self.assertTrue(sqlalchemy_api._use_replica(
+            self.context, self.ctxt_mgr, 1))
+
+    @mock.patch.object(sqlalchemy_api, '_replication_lag', return_value=2.0)
+    @mock.patch('time.monotonic', return_value=100)
+    def test_replica_lag(self, mock_monotonic, mock_replication_lag):
+        self.assertEqual(2.0, sqlalchemy_api._replica_lag(self.ctxt_mgr))
+        mock_monotonic.return_value = 100.5
+        mock_replication_lag.return_value = 3.0
+        # The cached lag is used, aged by the time since it was measured.
+        self.assertEqual(2.5, sqlalchemy_api._replica_lag(self.ctxt_mgr))
+        mock_replication_lag.assert_called_once_with(
+            mock.sentinel.engine, mock.sentinel.slave_engine)
+        mock_monotonic.return_value = 101.5
+        self.assertEqual(3.0, sqlalchemy_api._replica_lag(self.ctxt_mgr))
+        self.assertEqual(2, mock_replication_lag.call_count)
+
+    @mock.patch.object(sqlalchemy_api, '_replication_lag')
+    def test_replica_lag_unknown(self, mock_replication_lag):
+        mock_replication_lag.return_value = None
+        self.assertEqual(0, int(sqlalchemy_api._replica_lag(self.ctxt_mgr)))
+
+        self.ctxt_mgr.reader.get_engine.return_value = mock.sentinel.engine
+        self.assertIsNone(sqlalchemy_api._replica_lag(self.ctxt_mgr))
+
+    @mock.patch.object(sqlalchemy_api, '_replication_lag',
+                       side_effect=db_exc.DBError)
+    def test_replica_lag_error(self, mock_replication_lag):
+        self.assertEqual(float('inf'),
+                         sqlalchemy_api._replica_lag(self.ctxt_mgr))
+
+    def test_replication_lag_mysql(self):
+        slave_engine = mock.Mock()
+        slave_engine.dialect.name = 'mysql'
+        first = slave_engine.execute.return_value.first
+
+        first.return_value = {'Seconds_Behind_Master': 3}
+        self.assertEqual(3.0, sqlalchemy_api._replication_lag(
+            mock.sentinel.engine, slave_engine))
+        slave_engine.execute.assert_called_once_with('SHOW SLAVE STATUS')
+
+        # The replication threads have stopped.
+        first.return_value = {'Seconds_Behind_Master': None}
+        self.assertEqual(float('inf'), sqlalchemy_api._replication_lag(
+            mock.sentinel.engine, slave_engine))
+
+        # The database is not a slave.
+        first.return_value = None
+        self.assertIsNone(sqlalchemy_api._replication_lag(
+            mock.sentinel.engine, slave_engine))
+
+    def test_track_request_writes(self):
+        engine = create_engine('sqlite://')
+        sqlalchemy_api._track_request_writes(engine)
+        table = Table('t', MetaData(), Column('id', Integer))
+        table.create(engine)
+
+        # Nothing is tracked unless replica-safe reads are enabled.
+        engine.execute(table.insert().values(id=1))
+        self.assertEqual({}, sqlalchemy_api._REQUEST_WRITES)
+
+        self.flags(replica_max_lag=1, group='database')
+        with mock.patch('time.monotonic', return_value=100):
+            engine.execute(table.select())
+            self.assertEqual({}, sqlalchemy_api._REQUEST_WRITES)
+            engine.execute(table.insert().values(id=1))
+        self.assertEqual({self.context.request_id: 100},
+                         sqlalchemy_api._REQUEST_WRITES)
+
+        other_context = context.RequestContext('fake-user', 'fake-project')
+        with mock.patch('time.monotonic', return_value=101.5):
+            engine.execute(table.update().values(id=2))
+        # The older write was forgotten as slave databases have it by now.
+        self.assertEqual({other_context.request_id: 101.5},
+                         sqlalchemy_api._REQUEST_WRITES)
+
+
+class QueryStatsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(QueryStatsTestCase, self).setUp()
+        self.stub_out('nova.db.sqlalchemy.api._QUERY_STATS', {})
+        # NOTE: A single connection is shared with greenthreads.
+        self.engine = create_engine('sqlite://', poolclass=pool.StaticPool)
+        sqlalchemy_api._instrument_queries(self.engine)
+        self.table = Table('t', MetaData(), Column('id', Integer))
+        self.table.create(self.engine)
+        self.context = context.RequestContext('fake-user', 'fake-project')
+
+    def test_disabled(self):
+        self.engine.execute(self.table.insert().values(id=1))
+        self.assertEqual({}, sqlalchemy_api._QUERY_STATS)
+        self.assertIsNone(
+            sqlalchemy_api.report_query_stats(self.context.request_id))
+
+    @mock.patch.object(sqlalchemy_api, 'LOG')
+    def test_report_query_stats(self, mock_log):
+        self.flags(query_stats=True, query_stats_repeat_threshold=2,
+                   group='database')
+        self.engine.execute(self.table.insert().values(id=1))
+        self.engine.execute(self.table.insert().values(id=2))
+        for i in range(3):
+            self.engine.execute(self.table.select())
+
+        stats = sqlalchemy_api.report_query_stats(self.context.request_id)
+        self.assertEqual(5, stats.queries)
+        self.assertEqual(2, stats.rows)
+        self.assertEqual(3, stats.statements.most_common(1)[0][1])
+        mock_log.info.assert_called_once_with(mock.ANY, {
+            'request_id': self.context.request_id, 'queries': 5,
+            'rows': 2, 'time': stats.time})
+        # Only the select was repeated more than the threshold.
+        mock_log.warning.assert_called_once_with(mock.ANY, {
+            'request_id': self.context.request_id, 'count': 3,
+            'statement': mock.ANY})
+        self.assertIn('SELECT', mock_log.warning.call_args[0][1]['statement'])
+        self.assertEqual({}, sqlalchemy_api._QUERY_STATS)
+        self.assertIsNone(
+            sqlalchemy_api.report_query_stats(self.context.request_id))
+
+    @mock.patch.object(sqlalchemy_api, 'report_query_stats')
+    def test_reported_when_greenthread_exits(self, mock_report):
+        self.flags(query_stats=True, group='database')
+
+        def run():
+            self.context.update_store()
+            self.engine.execute(self.table.select())
+
+        eventlet.spawn(run).wait()
+        mock_report.assert_called_once_with(self.context.request_id)
+
+    @mock.patch.object(sqlalchemy_api, '_report_thread_query_stats')
+    def test_linked_once_per_greenthread(self, mock_report_thread):
+        self.flags(query_stats=True, group='database')
+
+        def run():
+            for i in range(3):
+                ctxt = context.RequestContext('fake-user', 'fake-project')
+                self.engine.execute(self.table.select())
+                sqlalchemy_api.report_query_stats(ctxt.request_id)
+            current = eventlet.greenthread.getcurrent()
+            return current._nova_query_stats_request_ids
+
+        # Reported requests are not remembered for the greenthread.
+        thread_request_ids = eventlet.spawn(run).wait()
+        self.assertEqual(set(), thread_request_ids)
+        mock_report_thread.assert_called_once_with(thread_request_ids)
+        self.assertEqual({}, sqlalchemy_api._QUERY_STATS)
+
+    @mock.patch.object(sqlalchemy_api, '_QUERY_STATS_MAX_REQUESTS', 1)
+    @mock.patch.object(sqlalchemy_api, 'report_query_stats',
+                       wraps=sqlalchemy_api.report_query_stats)
+    def test_oldest_request_reported(self, mock_report):
+        self.flags(query_stats=True, group='database')
+        self.engine.execute(self.table.select())
+        other_context = context.RequestContext('fake-user', 'fake-project')
+        self.engine.execute(self.table.select())
+
+        mock_report.assert_called_once_with(self.context.request_id)
+        self.assertEqual([other_context.request_id],
+                         list(sqlalchemy_api._QUERY_STATS))
+
+
+class ReplicaSafeReadersTestCase(test.TestCase):
+
+    @mock.patch.object(sqlalchemy_api, '_use_replica', return_value=True)
+    def test_replica_safe_readers(self, mock_use_replica):
+        # Replica-safe readers only use readers allowing asynchronous reads.
+        ctxt = context.get_admin_context()
+        instance = db.instance_create(ctxt, {})
+        action = db.action_start(ctxt, {'instance_uuid': instance['uuid'],
+                                        'request_id': ctxt.request_id})
+        db.compute_node_create(ctxt, {
+            'vcpus': 1, 'memory_mb': 1, 'local_gb': 1, 'vcpus_used': 0,
+            'memory_mb_used': 0, 'local_gb_used': 0, 'hypervisor_type': 'x',
+            'hypervisor_version': 1, 'cpu_info': '', 'uuid': uuidsentinel.cn,
+            'hypervisor_hostname': 'node', 'host': 'host'})
+
+        ctxt.allow_replica_reads = True
+        self.assertEqual(instance['uuid'], db.instance_get_by_uuid(
+            ctxt, instance['uuid'])['uuid'])
+        self.assertEqual(1, len(db.instance_get_all_by_filters_sort(
+            ctxt, {}, sort_keys=['created_at'], sort_dirs=['desc'])))
+        self.assertEqual([], db.actions_get(ctxt, instance['uuid'],
+                                            marker=ctxt.request_id))
+        self.assertEqual([], db.action_events_get(ctxt, action['id']))
+        self.assertEqual(1, len(db.compute_node_get_all(ctxt)))
+        self.assertEqual(1, len(db.compute_node_get_all_by_pagination(ctxt)))
+        self.assertEqual(instance['uuid'], objects.Instance.get_by_uuid(
+            ctxt, instance['uuid']).uuid)
+        self.assertEqual(1, len(objects.InstanceList.get_by_filters(
+            ctxt, {})))
+        self.assertEqual(1, len(objects.ComputeNodeList.get_all_by_uuids(
+            ctxt, [uuidsentinel.cn])))
+        self.assertEqual([], objects.CellMappingList.get_by_project_id(
+            ctxt, 'fake-project').objects)
+        self.assertNotEqual(0, mock_use_replica.call_count)
+
 
 def _get_fake_aggr_values():
     return {'name': 'fake_aggregate'}
@@ -508,6 +880,64 @@ class UnsupportedDbRegexpTestCase(DbTestCase):
                     marker = insts[-1]['uuid']
                     self.assertEqual(correct[-1]['uuid'], marker)
 
+    def test_instance_get_all_by_filters_sort_keys_paginate_values(self,
+            mock_get_regexp):
+        '''Verifies paginating with marker values matches markers.'''
+        for name in ('test1', 'test2', 'test1', 'test3', 'test2', 'test3'):
+            self.create_instance_with_args(display_name=name,
+                                           vm_state=vm_states.ACTIVE)
+
+        for sort_keys, sort_dirs in (
+                (['created_at', 'id', 'uuid'], ['desc', 'desc', 'asc']),
+                (['display_name', 'uuid'], ['asc', 'asc']),
+                (['display_name', 'uuid'], ['desc', 'asc']),
+                (['updated_at', 'uuid'], ['desc', 'desc'])):
+            correct_order = db.instance_get_all_by_filters_sort(
+                self.context, {}, sort_keys=sort_keys, sort_dirs=sort_dirs)
+            self.assertEqual(6, len(correct_order))
+            for limit in range(1, 4):
+                marker_values = None
+                for i in range(0, 7, limit):
+                    correct = correct_order[i:i + limit]
+                    insts = db.instance_get_all_by_filters_sort(
+                        self.context, {}, limit=limit,
+                        sort_keys=sort_keys, sort_dirs=sort_dirs,
+                        marker_values=marker_values)
+                    self.assertEqual([inst['uuid'] for inst in correct],
+                                     [inst['uuid'] for inst in insts])
+                    if insts:
+                        marker_values = [insts[-1][key] for key in sort_keys]
+
+        # NULL values are handled like with a marker instance
+        marker = self.create_instance_with_args(display_name=None)
+        sort_keys = ['display_name', 'uuid']
+        expected = db.instance_get_all_by_filters_sort(
+            self.context, {}, sort_keys=sort_keys, marker=marker['uuid'])
+        insts = db.instance_get_all_by_filters_sort(
+            self.context, {}, sort_keys=sort_keys,
+            marker_values=[None, marker['uuid']])
+        self.assertEqual([inst['uuid'] for inst in expected],
+                         [inst['uuid'] for inst in insts])
+
+    def test_instance_get_all_by_filters_sort_values_row_compare(self,
+            mock_get_regexp):
+        '''Verifies keys with the same direction are compared together.'''
+        created_at = timeutils.utcnow()
+        seek = sqlalchemy_api._keyset_filter(
+            models.Instance, ['created_at', 'id', 'uuid'],
+            ['desc', 'desc', 'asc'], [created_at, 1, uuidsentinel.instance])
+        self.assertEqual(
+            '(instances.created_at, instances.id) < (:param_1, :param_2) OR '
+            '(instances.created_at, instances.id) = (:param_3, :param_4) AND '
+            'instances.uuid > :uuid_1', str(seek))
+        # NULL values and booleans are left to paginate_query()
+        self.assertIsNone(sqlalchemy_api._keyset_filter(
+            models.Instance, ['display_name', 'uuid'], ['asc', 'asc'],
+            [None, uuidsentinel.instance]))
+        self.assertIsNone(sqlalchemy_api._keyset_filter(
+            models.Instance, ['locked', 'uuid'], ['asc', 'asc'],
+            [False, uuidsentinel.instance]))
+
     def test_instance_get_deleted_by_filters_sort_keys_paginate(self,
             mock_get_regexp):
         '''Verifies sort order with pagination for deleted instances.'''
@@ -896,9 +1326,9 @@ class SqlAlchemyDbApiTestCase(DbTestCase):
             ctxt, begin=now)
         self.assertEqual(4, len(result))
         # verify that all default columns are joined
-        meta = utils.metadata_to_dict(result[0]['metadata'])
+        meta = result[0]['metadata']
         self.assertEqual(sample_data['metadata'], meta)
-        sys_meta = utils.metadata_to_dict(result[0]['system_metadata'])
+        sys_meta = result[0]['system_metadata']
         self.assertEqual(sample_data['system_metadata'], sys_meta)
         self.assertIn('info_cache', result[0])
 
@@ -906,7 +1336,7 @@ class SqlAlchemyDbApiTestCase(DbTestCase):
             ctxt, begin=now3, columns_to_join=['info_cache'])
         self.assertEqual(2, len(result))
         # verify that only info_cache is loaded
-        meta = utils.metadata_to_dict(result[0]['metadata'])
+        meta = result[0]['metadata']
         self.assertEqual({}, meta)
         self.assertIn('info_cache', result[0])
 
@@ -919,9 +1349,9 @@ class SqlAlchemyDbApiTestCase(DbTestCase):
             columns_to_join=['system_metadata'])
         self.assertEqual(2, len(result))
         # verify that only system_metadata is loaded
-        meta = utils.metadata_to_dict(result[0]['metadata'])
+        meta = result[0]['metadata']
         self.assertEqual({}, meta)
-        sys_meta = utils.metadata_to_dict(result[0]['system_metadata'])
+        sys_meta = result[0]['system_metadata']
         self.assertEqual(sample_data['system_metadata'], sys_meta)
         self.assertNotIn('info_cache', result[0])
 
@@ -930,9 +1360,9 @@ class SqlAlchemyDbApiTestCase(DbTestCase):
             columns_to_join=['metadata', 'info_cache'])
         self.assertEqual(2, len(result))
         # verify that only metadata and info_cache are loaded
-        meta = utils.metadata_to_dict(result[0]['metadata'])
+        meta = result[0]['metadata']
         self.assertEqual(sample_data['metadata'], meta)
-        sys_meta = utils.metadata_to_dict(result[0]['system_metadata'])
+        sys_meta = result[0]['system_metadata']
         self.assertEqual({}, sys_meta)
         self.assertIn('info_cache', result[0])
         self.assertEqual(network_info, result[0]['info_cache']['network_info'])
@@ -1686,9 +2116,9 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def test_instance_get_all_with_meta(self):
         self.create_instance_with_args()
         for inst in db.instance_get_all(self.ctxt):
-            meta = utils.metadata_to_dict(inst['metadata'])
+            meta = inst['metadata']
             self.assertEqual(meta, self.sample_data['metadata'])
-            sys_meta = utils.metadata_to_dict(inst['system_metadata'])
+            sys_meta = inst['system_metadata']
             self.assertEqual(sys_meta, self.sample_data['system_metadata'])
 
     def test_instance_get_with_meta(self):
@@ -1785,9 +2215,9 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def test_instance_get_all_by_filters_with_meta(self):
         self.create_instance_with_args()
         for inst in db.instance_get_all_by_filters(self.ctxt, {}):
-            meta = utils.metadata_to_dict(inst['metadata'])
+            meta = inst['metadata']
             self.assertEqual(meta, self.sample_data['metadata'])
-            sys_meta = utils.metadata_to_dict(inst['system_metadata'])
+            sys_meta = inst['system_metadata']
             self.assertEqual(sys_meta, self.sample_data['system_metadata'])
 
     def test_instance_get_all_by_filters_without_meta(self):
@@ -1828,39 +2258,74 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
 
     def test_instance_metadata_get_multi(self):
         uuids = [self.create_instance_with_args()['uuid'] for i in range(3)]
+        db.instance_metadata_delete(self.ctxt, uuids[0], 'mkey1')
+        meta = collections.defaultdict(dict)
+        sys_meta = collections.defaultdict(dict)
 
         @sqlalchemy_api.pick_context_manager_reader
         def test(context):
-            return sqlalchemy_api._instance_metadata_get_multi(
-                context, uuids)
+            sqlalchemy_api._instance_metadata_get_multi(
+                context, uuids[:2], ['metadata', 'system_metadata'], meta,
+                sys_meta)
 
-        meta = test(self.ctxt)
-        for row in meta:
-            self.assertIn(row['instance_uuid'], uuids)
+        test(self.ctxt)
 
-    @mock.patch.object(query.Query, 'filter')
-    def test_instance_metadata_get_multi_no_uuids(self, mock_query_filter):
-        with sqlalchemy_api.main_context_manager.reader.using(self.ctxt):
-            sqlalchemy_api._instance_metadata_get_multi(self.ctxt, [])
-        self.assertFalse(mock_query_filter.called)
+        self.assertEqual({uuids[0]: {'mkey2': 'mval2'},
+                          uuids[1]: self.sample_data['metadata']}, meta)
+        self.assertEqual({uuid: self.sample_data['system_metadata']
+                          for uuid in uuids[:2]}, sys_meta)
 
-    def test_instance_system_system_metadata_get_multi(self):
-        uuids = [self.create_instance_with_args()['uuid'] for i in range(3)]
+    def test_instance_metadata_get_multi_system_metadata_only(self):
+        uuid = self.create_instance_with_args()['uuid']
+        meta = collections.defaultdict(dict)
+        sys_meta = collections.defaultdict(dict)
 
         @sqlalchemy_api.pick_context_manager_reader
         def test(context):
-            return sqlalchemy_api._instance_system_metadata_get_multi(
-                context, uuids)
+            sqlalchemy_api._instance_metadata_get_multi(
+                context, [uuid], ['system_metadata'], meta, sys_meta)
 
-        sys_meta = test(self.ctxt)
-        for row in sys_meta:
-            self.assertIn(row['instance_uuid'], uuids)
+        test(self.ctxt)
 
-    @mock.patch.object(query.Query, 'filter')
-    def test_instance_system_metadata_get_multi_no_uuids(self,
-                                               mock_query_filter):
-        sqlalchemy_api._instance_system_metadata_get_multi(self.ctxt, [])
-        self.assertFalse(mock_query_filter.called)
+        self.assertEqual({}, meta)
+        self.assertEqual({uuid: self.sample_data['system_metadata']},
+                         sys_meta)
+
+    def test_instance_metadata_get_multi_no_uuids(self):
+        ctxt = mock.Mock()
+        sqlalchemy_api._instance_metadata_get_multi(
+            ctxt, [], ['metadata', 'system_metadata'], {}, {})
+        self.assertFalse(ctxt.session.execute.called)
+
+    @mock.patch.object(sqlalchemy_api, '_FILL_METADATA_BATCH_SIZE', 2)
+    def test_instances_fill_metadata_batches(self):
+        instances = [self.create_instance_with_args() for i in range(3)]
+        uuids = [inst['uuid'] for inst in instances]
+        db.instance_fault_create(self.ctxt, {
+            'instance_uuid': uuids[2], 'code': 404, 'message': 'msg',
+            'details': 'detail', 'host': 'host'})
+
+        with test.nested(
+            mock.patch.object(sqlalchemy_api, '_instance_metadata_get_multi',
+                wraps=sqlalchemy_api._instance_metadata_get_multi),
+            mock.patch.object(sqlalchemy_api,
+                'instance_fault_get_by_instance_uuids',
+                wraps=sqlalchemy_api.instance_fault_get_by_instance_uuids),
+        ) as (mock_meta, mock_faults):
+            filled = sqlalchemy_api.pick_context_manager_reader(
+                sqlalchemy_api._instances_fill_metadata)(
+                    self.ctxt, instances,
+                    ['metadata', 'system_metadata', 'fault'])
+
+        self.assertEqual([uuids[:2], uuids[2:]],
+                         [c[0][1] for c in mock_meta.call_args_list])
+        self.assertEqual(2, mock_faults.call_count)
+        for inst in filled:
+            self.assertEqual(self.sample_data['metadata'], inst['metadata'])
+            self.assertEqual(self.sample_data['system_metadata'],
+                             inst['system_metadata'])
+        self.assertIsNone(filled[0]['fault'])
+        self.assertEqual(404, filled[2]['fault']['code'])
 
     def test_instance_get_all_by_filters_regex(self):
         i1 = self.create_instance_with_args(display_name='test1')
@@ -1870,6 +2335,123 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                                 {'display_name': 't.*st.'})
         self._assertEqualListsOfInstances(result, [i1, i2])
 
+    def test_instance_get_all_by_filters_regex_literal(self):
+        i1 = self.create_instance_with_args(display_name='test')
+        i2 = self.create_instance_with_args(display_name='test1')
+        i3 = self.create_instance_with_args(display_name='a-test')
+        self.create_instance_with_args(display_name='diff')
+        for regex, expected in (('^test$', [i1]),
+                                ('^test', [i1, i2]),
+                                ('test', [i1, i2, i3]),
+                                ('test$', [i1, i3]),
+                                ('^te.t1', [i2])):
+            result = db.instance_get_all_by_filters(
+                self.ctxt, {'display_name': regex})
+            self._assertEqualListsOfInstances(expected, result)
+
+    def _literal_regex_instance_filter(self, regex):
+        with sqlalchemy_api.main_context_manager.reader.using(self.ctxt):
+            query = self.ctxt.session.query(models.Instance)
+            return str(sqlalchemy_api._literal_regex_instance_filter(
+                query, 'display_name', regex))
+
+    def test_literal_regex_instance_filter(self):
+        unfiltered = self._literal_regex_instance_filter('')
+        self.assertNotIn('WHERE', unfiltered)
+        for regex in ('t.*st', '^te[s]t', '^', 'te\\.st', 'test'):
+            self.assertEqual(unfiltered,
+                             self._literal_regex_instance_filter(regex))
+
+        self.assertIn('WHERE instances.display_name = ',
+                      self._literal_regex_instance_filter('^test$'))
+        self.assertIn('WHERE (instances.display_name LIKE ',
+                      self._literal_regex_instance_filter('^test'))
+
+        # Unanchored literals are only narrowed down with name trigrams.
+        self.flags(instance_name_trigrams='search')
+        self.assertIn('instance_name_trigrams.trigram IN ',
+                      self._literal_regex_instance_filter('test'))
+        self.assertEqual(unfiltered,
+                         self._literal_regex_instance_filter('te'))
+
+    def _get_instance_name_trigrams(self, instance_uuid):
+        @sqlalchemy_api.pick_context_manager_reader
+        def get(context):
+            return {row.trigram for row in context.session.query(
+                models.InstanceNameTrigram).filter_by(
+                    instance_uuid=instance_uuid)}
+        return get(self.ctxt)
+
+    def test_instance_name_trigrams_disabled(self):
+        instance = self.create_instance_with_args(display_name='test')
+        db.instance_update(self.ctxt, instance['uuid'],
+                           {'display_name': 'other'})
+        self.assertEqual(set(), self._get_instance_name_trigrams(
+            instance['uuid']))
+
+    def test_instance_name_trigrams_maintained(self):
+        self.flags(instance_name_trigrams='maintain')
+        instance = self.create_instance_with_args(display_name='TeSt')
+        self.assertEqual({'tes', 'est'},
+                         self._get_instance_name_trigrams(instance['uuid']))
+        db.instance_update(self.ctxt, instance['uuid'], {'host': 'host2'})
+        self.assertEqual({'tes', 'est'},
+                         self._get_instance_name_trigrams(instance['uuid']))
+        db.instance_update(self.ctxt, instance['uuid'],
+                           {'display_name': 'vm'})
+        self.assertEqual({''},
+                         self._get_instance_name_trigrams(instance['uuid']))
+
+    def test_instance_name_trigrams_hard_delete(self):
+        self.flags(instance_name_trigrams='maintain')
+        instance = self.create_instance_with_args(display_name='test')
+        other = self.create_instance_with_args(display_name='test')
+        db.instance_destroy(self.ctxt, instance['uuid'], hard_delete=True)
+        # The trigrams of the hard deleted instance, which is never
+        # archived, are deleted along with it.
+        self.assertEqual(set(), self._get_instance_name_trigrams(
+            instance['uuid']))
+        self.assertEqual({'tes', 'est'},
+                         self._get_instance_name_trigrams(other['uuid']))
+
+    def test_instance_get_all_by_filters_regex_trigrams(self):
+        self.flags(instance_name_trigrams='maintain')
+        names = ['test', 'a-test-1', 'tset', 'te', None, 'other', 'ates']
+        instances = {name: self.create_instance_with_args(display_name=name)
+                     for name in names}
+        for regex in ('test', 'tes', 'st-', 'te', 'e', 'TEST', 'x'):
+            self.flags(instance_name_trigrams='maintain')
+            expected = db.instance_get_all_by_filters(
+                self.ctxt, {'display_name': regex})
+            self.flags(instance_name_trigrams='search')
+            result = db.instance_get_all_by_filters(
+                self.ctxt, {'display_name': regex})
+            self._assertEqualListsOfInstances(expected, result)
+        self._assertEqualListsOfInstances(
+            [instances['test'], instances['a-test-1']],
+            db.instance_get_all_by_filters(self.ctxt,
+                                           {'display_name': 'test'}))
+
+    def test_instance_name_trigrams_populate(self):
+        i1 = self.create_instance_with_args(display_name='test')
+        i2 = self.create_instance_with_args(display_name='vm')
+        i3 = self.create_instance_with_args(display_name='other')
+        db.instance_destroy(self.ctxt, i3['uuid'])
+        populate = sqlalchemy_api.instance_name_trigrams_populate
+        self.assertEqual((0, 0), populate(self.ctxt, 10))
+
+        self.flags(instance_name_trigrams='maintain')
+        i4 = self.create_instance_with_args(display_name='new')
+        self.assertEqual((2, 2), populate(self.ctxt, 2))
+        self.assertEqual((1, 1), populate(self.ctxt, 2))
+        self.assertEqual((0, 0), populate(self.ctxt, 2))
+        self.assertEqual({'tes', 'est'},
+                         self._get_instance_name_trigrams(i1['uuid']))
+        self.assertEqual({''}, self._get_instance_name_trigrams(i2['uuid']))
+        self.assertEqual({'oth', 'the', 'her'},
+                         self._get_instance_name_trigrams(i3['uuid']))
+        self.assertEqual({'new'}, self._get_instance_name_trigrams(i4['uuid']))
+
     def test_instance_get_all_by_filters_changes_since(self):
         i1 = self.create_instance_with_args(updated_at=
                                             '2013-12-05T15:03:25.000000')
@@ -2112,7 +2694,7 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         instance = self.create_instance_with_args()
         result = db.instance_get_all_by_host_and_node(self.ctxt, 'h1', 'n1')
         self.assertEqual(result[0]['uuid'], instance['uuid'])
-        self.assertEqual(result[0]['system_metadata'], [])
+        self.assertEqual(result[0]['system_metadata'], {})
 
     def test_instance_get_all_by_host_and_node(self):
         instance = self.create_instance_with_args(
@@ -2121,7 +2703,7 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
             self.ctxt, 'h1', 'n1',
             columns_to_join=['system_metadata', 'extra'])
         self.assertEqual(instance['uuid'], result[0]['uuid'])
-        self.assertEqual('bar', result[0]['system_metadata'][0]['value'])
+        self.assertEqual({'foo': 'bar'}, result[0]['system_metadata'])
         self.assertEqual(instance['uuid'], result[0]['extra']['instance_uuid'])
 
     @mock.patch('nova.db.sqlalchemy.api._instances_fill_metadata')
@@ -3338,6 +3920,19 @@ class InstanceActionTestCase(test.TestCase, ModelsObjectComparatorMixin):
 
         self._assertActionSaved(action, uuid)
 
+    def test_instance_action_start_bulk(self):
+        """Create an action for several instances."""
+        uuids = [uuidsentinel.uuid1, uuidsentinel.uuid2]
+        values_list = [self._create_action_values(uuid) for uuid in uuids]
+
+        db.action_start_bulk(self.ctxt, copy.deepcopy(values_list))
+
+        ignored_keys = self.IGNORED_FIELDS + ['finish_time']
+        for uuid, action_values in zip(uuids, values_list):
+            actions = db.actions_get(self.ctxt, uuid)
+            self.assertEqual(1, len(actions))
+            self._assertEqualObjects(action_values, actions[0], ignored_keys)
+
     def test_instance_action_finish(self):
         """Create an instance action."""
         uuid = uuidsentinel.uuid1
@@ -3632,6 +4227,60 @@ class InstanceActionTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                              self.ctxt.request_id)
         self.assertEqual('Error', action['message'])
 
+    def test_action_events_record(self):
+        """Start and finish events of several instances in one batch."""
+        uuid1 = uuidsentinel.uuid1
+        uuid2 = uuidsentinel.uuid2
+        action1 = db.action_start(self.ctxt,
+                                  self._create_action_values(uuid1))
+        action2 = db.action_start(self.ctxt,
+                                  self._create_action_values(uuid2))
+
+        finish_values = {
+            'finish_time': timeutils.utcnow() + datetime.timedelta(seconds=5),
+            'result': 'Error'
+        }
+        events = [
+            {'event_type': 'start', 'use_last_action': False,
+             'values': self._create_event_values(uuid1)},
+            {'event_type': 'start', 'use_last_action': False,
+             'values': self._create_event_values(uuid2)},
+            # There is no action for this instance so it is skipped.
+            {'event_type': 'start', 'use_last_action': False,
+             'values': self._create_event_values(uuidsentinel.uuid3)},
+            {'event_type': 'finish', 'use_last_action': False,
+             'values': self._create_event_values(uuid1,
+                                                 extra=finish_values)},
+        ]
+        self.assertEqual(3, db.action_events_record(self.ctxt, events))
+
+        events1 = db.action_events_get(self.ctxt, action1['id'])
+        self.assertEqual(1, len(events1))
+        self.assertEqual('Error', events1[0]['result'])
+        self.assertIsNotNone(events1[0]['finish_time'])
+        events2 = db.action_events_get(self.ctxt, action2['id'])
+        self.assertEqual(1, len(events2))
+        self.assertIsNone(events2[0]['finish_time'])
+        action1 = db.action_get_by_request_id(self.ctxt, uuid1,
+                                              self.ctxt.request_id)
+        self.assertEqual('Error', action1['message'])
+
+    def test_action_events_record_use_last_action(self):
+        """Record an event against the last action of the instance."""
+        uuid = uuidsentinel.uuid1
+        action = db.action_start(self.ctxt, self._create_action_values(uuid))
+
+        event_values = self._create_event_values(
+            uuid, extra={'request_id': 'req-unknown'})
+        events = [{'event_type': 'start', 'use_last_action': True,
+                   'values': event_values}]
+        self.assertEqual(1, db.action_events_record(self.ctxt, events))
+        self.assertEqual(1, len(db.action_events_get(self.ctxt,
+                                                     action['id'])))
+
+        events[0]['use_last_action'] = False
+        self.assertEqual(0, db.action_events_record(self.ctxt, events))
+
     def test_instance_action_and_event_start_string_time(self):
         """Create an instance action and event with a string start_time."""
         uuid = uuidsentinel.uuid1
@@ -4401,6 +5050,40 @@ class BlockDeviceMappingTestCase(test.TestCase):
                          'expected 2 bdms without device_name, found %d' %
                          len(without_device_name))
 
+    def test_block_device_mapping_update_or_create_bulk(self):
+        instance2 = db.instance_create(self.ctxt, {})
+        bdm = self._create_bdm({'device_name': '/dev/vda'})
+        values_list = [
+            # Updates the existing bdm
+            {'instance_uuid': self.instance['uuid'],
+             'device_name': '/dev/vda',
+             'source_type': 'volume',
+             'destination_type': 'camelot'},
+            {'instance_uuid': self.instance['uuid'],
+             'device_name': None,
+             'source_type': 'blank',
+             'destination_type': 'local'},
+            {'instance_uuid': instance2['uuid'],
+             'device_name': 'fake_name',
+             'source_type': 'volume',
+             'destination_type': 'volume'},
+        ]
+
+        result = db.block_device_mapping_update_or_create_bulk(
+            self.ctxt, values_list, legacy=False)
+
+        self.assertEqual(3, len(result))
+        self.assertEqual(bdm['id'], result[0]['id'])
+        self.assertEqual('camelot', result[0]['destination_type'])
+        for bdm_ref, values in zip(result, values_list):
+            self.assertTrue(uuidutils.is_uuid_like(bdm_ref['uuid']))
+            self.assertEqual(values['instance_uuid'], bdm_ref['instance_uuid'])
+            self.assertEqual(values['device_name'], bdm_ref['device_name'])
+        bdms = db.block_device_mapping_get_all_by_instance_uuids(
+            self.ctxt, [self.instance['uuid'], instance2['uuid']])
+        self.assertEqual(sorted(b['id'] for b in result),
+                         sorted(b['id'] for b in bdms))
+
     def test_block_device_mapping_update_or_create_with_uuid(self):
         # Test that we are able to change device_name when calling
         # block_device_mapping_update_or_create with a uuid.
@@ -5230,6 +5913,26 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         new_stats = jsonutils.loads(node['stats'])
         self.assertEqual(self.stats, new_stats)
 
+    def test_compute_node_get_all_columns(self):
+        nodes = db.compute_node_get_all(self.ctxt, columns=['id', 'host'])
+        self.assertEqual([{'id': self.item['id'], 'host': self.item['host']}],
+                         nodes)
+
+    def test_compute_node_get_all_by_ids(self):
+        node = db.compute_node_create(
+            self.ctxt, dict(self.compute_node_dict, hypervisor_hostname='foo',
+                            uuid=uuidutils.generate_uuid()))
+        db.compute_node_create(
+            self.ctxt, dict(self.compute_node_dict, hypervisor_hostname='bar',
+                            uuid=uuidutils.generate_uuid()))
+        nodes = db.compute_node_get_all_by_ids(
+            self.ctxt, [self.item['id'], node['id']],
+            columns=['id', 'hypervisor_hostname'])
+        self.assertEqual(
+            [{'id': self.item['id'],
+              'hypervisor_hostname': self.item['hypervisor_hostname']},
+             {'id': node['id'], 'hypervisor_hostname': 'foo'}], nodes)
+
     def test_compute_node_get_all_mapped_less_than(self):
         cn = dict(self.compute_node_dict,
                   hostname='foo',
@@ -5917,9 +6620,12 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
             # with no shadow table and it's OK, so skip.
             # 318 adds one more: 'resource_provider_aggregates'.
             # NOTE(PaulMurray): migration 333 adds 'console_auth_tokens'
+            # NOTE: migration 419 adds 'instance_name_trigrams', which is
+            # cleaned up when instances are archived.
             if table_name in ['tags', 'resource_providers', 'allocations',
                               'inventories', 'resource_provider_aggregates',
-                              'console_auth_tokens']:
+                              'console_auth_tokens',
+                              'instance_name_trigrams']:
                 continue
 
             if table_name.startswith("shadow_"):
@@ -6230,6 +6936,24 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
             'shadow_migrations'
         )
 
+    def test_archive_deleted_rows_instance_name_trigrams(self):
+        trigrams = models.InstanceNameTrigram.__table__
+        for instance_uuid, deleted in ((uuidsentinel.deleted, 1),
+                                       (uuidsentinel.active, 0)):
+            self.conn.execute(self.instances.insert().values(
+                uuid=instance_uuid, deleted=deleted,
+                deleted_at=timeutils.utcnow() if deleted else None))
+            self.conn.execute(trigrams.insert().values(
+                instance_uuid=instance_uuid, trigram='tes'))
+        num = sqlalchemy_api._archive_deleted_rows_for_table(self.metadata,
+                                                             "instances",
+                                                             max_rows=None,
+                                                             before=None)
+        self.assertEqual((1, [uuidsentinel.deleted]), num)
+        rows = self.conn.execute(
+            sql.select([trigrams.c.instance_uuid])).fetchall()
+        self.assertEqual([(uuidsentinel.active,)], rows)
+
     def test_archive_deleted_rows_2_tables(self):
         # Add 6 rows to each table
         for uuidstr in self.uuidstrs:
@@ -6300,6 +7024,105 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
             'shadow_instance_id_mappings'
         )
 
+    def test_archive_deleted_rows_table_groups(self):
+        groups = db.archive_deleted_rows_table_groups()
+        positions = {}
+        for position, tablenames in enumerate(groups):
+            self.assertEqual(sorted(tablenames), tablenames)
+            for tablename in tablenames:
+                positions[tablename] = position
+        self.assertNotIn('migrate_version', positions)
+        self.assertNotIn('instance_name_trigrams', positions)
+        self.assertFalse(any(name.startswith('shadow_')
+                             for name in positions))
+        # Referencing tables come before the tables they reference.
+        self.assertLess(positions['instance_actions_events'],
+                        positions['instance_actions'])
+        self.assertLess(positions['instance_actions'],
+                        positions['instances'])
+        self.assertLess(positions['instance_extra'], positions['instances'])
+        self.assertLess(positions['block_device_mapping'],
+                        positions['instances'])
+
+    def test_archive_deleted_rows_for_table(self):
+        ctxt = context.get_admin_context()
+        for uuidstr in self.uuidstrs:
+            self.conn.execute(self.instances.insert().values(uuid=uuidstr))
+            self.conn.execute(self.instance_actions.insert().values(
+                instance_uuid=uuidstr))
+        self.conn.execute(self.instances.update().where(
+            self.instances.c.uuid.in_(self.uuidstrs[:4])).values(
+                deleted=1, deleted_at=timeutils.utcnow()))
+
+        # The actions of the deleted instances are archived first.
+        rows, deleted_instance_uuids = db.archive_deleted_rows_for_table(
+            ctxt, 'instance_actions', 10)
+        self.assertEqual(4, rows)
+        self.assertEqual([], deleted_instance_uuids)
+        qsia = sql.select([self.shadow_instance_actions])
+        self.assertEqual(4, len(self.conn.execute(qsia).fetchall()))
+
+        rows, deleted_instance_uuids = db.archive_deleted_rows_for_table(
+            ctxt, 'instances', 3)
+        self.assertEqual(3, rows)
+        self.assertEqual(3, len(deleted_instance_uuids))
+        self.assertTrue(set(deleted_instance_uuids) <
+                        set(self.uuidstrs[:4]))
+
+        rows, deleted_instance_uuids = db.archive_deleted_rows_for_table(
+            ctxt, 'instances', 3)
+        self.assertEqual(1, rows)
+        self.assertEqual(1, len(deleted_instance_uuids))
+        rows, deleted_instance_uuids = db.archive_deleted_rows_for_table(
+            ctxt, 'instances', 3)
+        self.assertEqual(0, rows)
+        self._assert_shadow_tables_empty_except(
+            'shadow_instances', 'shadow_instance_actions')
+
+    def test_purge_shadow_tables_in_chunks(self):
+        for uuidstr in self.uuidstrs:
+            self.conn.execute(self.shadow_instances.insert().values(
+                uuid=uuidstr, deleted_at=timeutils.utcnow()))
+            self.conn.execute(self.shadow_instance_actions.insert().values(
+                instance_uuid=uuidstr))
+
+        lines = []
+        throttled = []
+        deleted = sqlalchemy_api.purge_shadow_tables(
+            context.get_admin_context(), None, status_fn=lines.append,
+            max_rows=4, throttle_fn=throttled.append)
+
+        self.assertEqual(12, deleted)
+        self._assert_shadow_tables_empty_except()
+        # The purge was only throttled between chunks of the same table.
+        self.assertEqual([4, 4], throttled)
+        for table in ('shadow_instances', 'shadow_instance_actions'):
+            self.assertIn('Deleted 4 rows from %s so far' % table, lines)
+            self.assertIn('Deleted 6 rows from %s so far' % table, lines)
+            self.assertIn('Deleted 6 rows from %s based on timestamp column '
+                          '(n/a)' % table, lines)
+
+    def test_purge_shadow_tables_in_chunks_before(self):
+        past = timeutils.utcnow() - datetime.timedelta(days=1)
+        for i, uuidstr in enumerate(self.uuidstrs):
+            self.conn.execute(self.shadow_instances.insert().values(
+                uuid=uuidstr,
+                deleted_at=past if i % 2 else timeutils.utcnow()))
+
+        deleted = sqlalchemy_api.purge_shadow_tables(
+            context.get_admin_context(),
+            timeutils.utcnow() - datetime.timedelta(hours=1), max_rows=1)
+
+        self.assertEqual(3, deleted)
+        rows = self.conn.execute(
+            sql.select([self.shadow_instances.c.uuid])).fetchall()
+        self.assertEqual(sorted(self.uuidstrs[::2]),
+                         sorted(row[0] for row in rows))
+
+    def test_replication_lag_without_slave(self):
+        self.assertIsNone(
+            sqlalchemy_api.replication_lag(context.get_admin_context()))
+
 
 class PciDeviceDBApiTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
@@ -6637,6 +7460,38 @@ class TestDBInstanceTags(test.TestCase):
         expected = [(uuid, tag3), (uuid, tag4), (uuid, tag2)]
         self.assertEqual(set(expected), set(tags))
 
+    def test_instance_tag_set_bulk(self):
+        uuid1 = self._create_instance()
+        uuid2 = self._create_instance()
+        uuid3 = self._create_instance()
+        db.instance_tag_set(self.context, uuid1, [u'old'])
+        db.instance_tag_set(self.context, uuid3, [u'other'])
+
+        tag_refs = db.instance_tag_set_bulk(self.context, [uuid1, uuid2],
+                                            [u'tag1', u'tag2'])
+
+        expected = set([(uuid1, u'tag1'), (uuid1, u'tag2'),
+                        (uuid2, u'tag1'), (uuid2, u'tag2')])
+        self.assertEqual(expected, set(self._get_tags_from_resp(tag_refs)))
+        for uuid in (uuid1, uuid2):
+            tag_refs = db.instance_tag_get_by_instance_uuid(self.context,
+                                                            uuid)
+            self.assertEqual(set([(uuid, u'tag1'), (uuid, u'tag2')]),
+                             set(self._get_tags_from_resp(tag_refs)))
+        # The tags of other instances are left alone
+        tag_refs = db.instance_tag_get_by_instance_uuid(self.context, uuid3)
+        self.assertEqual([(uuid3, u'other')],
+                         self._get_tags_from_resp(tag_refs))
+
+    def test_instance_tag_set_bulk_empty(self):
+        uuid = self._create_instance()
+        db.instance_tag_set(self.context, uuid, [u'old'])
+
+        self.assertEqual([], db.instance_tag_set_bulk(self.context, [uuid],
+                                                      []))
+        self.assertEqual([], db.instance_tag_get_by_instance_uuid(
+            self.context, uuid))
+
     @mock.patch('nova.db.sqlalchemy.models.Tag.__table__.insert',
                 return_value=models.Tag.__table__.insert())
     def test_instance_tag_set_empty_add(self, mock_insert):
@@ -6771,6 +7626,15 @@ class TestDBInstanceTags(test.TestCase):
         self.assertRaises(exception.InstanceNotFound, db.instance_tag_set,
                           self.context, 'fake_uuid', ['tag1', 'tag2'])
 
+    def test_instance_tag_set_bulk_to_non_existing_instance(self):
+        uuid = self._create_instance()
+        self.assertRaises(exception.InstanceNotFound,
+                          db.instance_tag_set_bulk, self.context,
+                          [uuid, 'fake_uuid'], ['tag1'])
+        # Nothing was tagged
+        self.assertEqual([], db.instance_tag_get_by_instance_uuid(
+            self.context, uuid))
+
     def test_instance_tag_get_from_non_existing_instance(self):
         self._create_instance()
         self.assertRaises(exception.InstanceNotFound,
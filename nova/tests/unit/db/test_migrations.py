@@ -1058,6 +1058,29 @@ class NovaMigrationsCheckers(test_migrations.ModelsMigrationsSync,
         self.assertColumnExists(engine, 'instance_extra', 'resources')
         self.assertColumnExists(engine, 'shadow_instance_extra', 'resources')
 
+    def _check_418(self, engine, data):
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_created_at_id_idx',
+                                ['created_at', 'id'])
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_display_name_uuid_idx',
+                                ['display_name', 'uuid'])
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_updated_at_uuid_idx',
+                                ['updated_at', 'uuid'])
+
+    def _check_419(self, engine, data):
+        for column in ('id', 'created_at', 'updated_at', 'instance_uuid',
+                       'trigram'):
+            self.assertColumnExists(engine, 'instance_name_trigrams', column)
+        self.assertTableNotExists(engine, 'shadow_instance_name_trigrams')
+        self.assertIndexMembers(engine, 'instance_name_trigrams',
+                                'instance_name_trigrams_trigram_instance_'
+                                'uuid_idx', ['trigram', 'instance_uuid'])
+        self.assertIndexMembers(engine, 'instance_name_trigrams',
+                                'instance_name_trigrams_instance_uuid_idx',
+                                ['instance_uuid'])
+
 
 class TestNovaMigrationsSQLite(NovaMigrationsCheckers,
                                test_fixtures.OpportunisticDBTestMixin,
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 from oslo_config import cfg
 from oslo_utils.fixture import uuidsentinel as uuids
 
@@ -525,6 +526,53 @@ class NetworkInfoTests(test.NoDBTestCase):
                  fake_network_cache_model.new_fixed_ip(
                         {'address': '10.10.0.3'})] * 4, ninfo.fixed_ips())
 
+    def test_hydrate_json(self):
+        vif = fake_network_cache_model.new_vif()
+        vif['network']['subnets'][0]['ips'][0].add_floating_ip(
+            model.IP(address='192.168.1.1', type='floating'))
+        ninfo = model.NetworkInfo([vif, fake_network_cache_model.new_vif(
+            {'address': 'bb:bb:bb:bb:bb:bb'})])
+        with mock.patch.object(model.VIF, '__init__') as mock_init:
+            hydrated = model.NetworkInfo.hydrate(ninfo.json())
+        mock_init.assert_not_called()
+        self.assertEqual(ninfo, hydrated)
+        self.assertEqual(ninfo.json(), hydrated.json())
+        fixed_ip = hydrated[0]['network']['subnets'][0]['ips'][0]
+        self.assertIsInstance(fixed_ip, model.FixedIP)
+        self.assertIsInstance(fixed_ip['floating_ips'][0], model.IP)
+        self.assertEqual(['192.168.1.1'], [
+            ip['address'] for ip in hydrated.floating_ips()])
+
+    def test_hydrate_json_sets_defaults(self):
+        ninfo = model.NetworkInfo.hydrate([dict(
+            model.VIF(network=model.Network(subnets=[model.Subnet(
+                cidr='10.0.0.0/24', ips=[model.FixedIP(
+                    address='10.0.0.2')])])), details=None)])
+        ninfo[0]['network']['subnets'][0]['version'] = None
+        ninfo[0]['network']['subnets'][0]['ips'][0].update(
+            type=None, version=None, floating_ips=None)
+        hydrated = model.NetworkInfo.hydrate(ninfo.json())
+        self.assertEqual({}, hydrated[0]['details'])
+        subnet = hydrated[0]['network']['subnets'][0]
+        self.assertEqual(4, subnet['version'])
+        self.assertEqual('fixed', subnet['ips'][0]['type'])
+        self.assertEqual(4, subnet['ips'][0]['version'])
+        self.assertEqual([], subnet['ips'][0]['floating_ips'])
+
+    def test_hydrate_compressed_json(self):
+        ninfo = model.NetworkInfo([fake_network_cache_model.new_vif()])
+        compressed = model.compress_json(ninfo.json())
+        self.assertTrue(compressed.startswith(model.COMPRESSED_PREFIX))
+        self.assertLess(len(compressed), len(ninfo.json()))
+        self.assertEqual(ninfo.json(), model.decompress_json(compressed))
+        self.assertEqual(ninfo.json(), model.decompress_json(ninfo.json()))
+        self.assertEqual(ninfo, model.NetworkInfo.hydrate(compressed))
+
+    def test_models_are_slotted(self):
+        for model_cls in (model.IP, model.FixedIP, model.Route, model.Subnet,
+                          model.Network, model.VIF):
+            self.assertFalse(hasattr(model_cls(), '__dict__'))
+
     def _setup_injected_network_scenario(self, should_inject=True,
                                         use_ipv4=True, use_ipv6=False,
                                         gateway=True, dns=True,
@@ -3430,6 +3430,184 @@ class TestAPI(TestAPIBase):
         self.assertEqual(subnet_data1[0]['gateway_ip'],
                          subnets[0]['meta']['dhcp_server'])
 
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_prefetch_instances_nw_info(self, mock_get_client):
+        mocked_client = mock.create_autospec(client.Client)
+        mock_get_client.return_value = mocked_client
+        dhcp_port = dict(self.dhcp_port_data1[0], network_id=uuids.my_netid1)
+        ports = [dict(self.port_data2[0], device_id=uuids.instance1),
+                 dict(self.port_data2[1], device_id=uuids.instance2)]
+        mocked_client.list_ports.side_effect = [
+            {'ports': ports}, {'ports': [dhcp_port]}]
+        mocked_client.list_networks.return_value = {'networks': self.nets2}
+        mocked_client.list_subnets.return_value = {
+            'subnets': self.subnet_data1 + self.subnet_data2}
+        mocked_client.list_floatingips.return_value = {
+            'floatingips': self.float_data2}
+        instances = [objects.Instance(uuid=uuids.instance1,
+                                      project_id=self.tenant_id),
+                     objects.Instance(uuid=uuids.instance2,
+                                      project_id=self.tenant_id)]
+
+        prefetched = self.api.prefetch_instances_nw_info(
+            self.context, instances)
+
+        mock_get_client.assert_called_once_with(self.context, admin=True)
+        mocked_client.list_ports.assert_has_calls([
+            mock.call(device_id=[uuids.instance1, uuids.instance2]),
+            mock.call(network_id=test.MatchType(list),
+                      device_owner='network:dhcp')])
+        self.assertEqual(
+            {uuids.my_netid1, uuids.my_netid2},
+            set(mocked_client.list_networks.call_args[1]['id']))
+        self.assertEqual(
+            {'my_subid1', 'my_subid2'},
+            set(mocked_client.list_subnets.call_args[1]['id']))
+        self.assertEqual(
+            {uuids.portid_1, uuids.portid_2},
+            set(mocked_client.list_floatingips.call_args[1]['port_id']))
+
+        self.assertEqual([ports[0]], prefetched.get_ports(instances[0]))
+        self.assertEqual([ports[1]], prefetched.get_ports(instances[1]))
+        self.assertEqual([self.nets2[1], self.nets2[0]],
+                         prefetched.get_networks(
+                             [uuids.my_netid2, uuids.my_netid1,
+                              uuids.my_netid2, uuids.unknown]))
+        self.assertEqual(self.subnet_data1,
+                         prefetched.get_subnets(ports[0]))
+        self.assertEqual([dhcp_port],
+                         prefetched.dhcp_ports[uuids.my_netid1])
+        self.assertEqual([self.float_data2[1]],
+                         prefetched.get_floating_ips('10.0.2.2',
+                                                     uuids.portid_2))
+        self.assertEqual([], prefetched.get_floating_ips('10.0.2.3',
+                                                         uuids.portid_2))
+
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_prefetch_instances_nw_info_no_ports(self, mock_get_client):
+        mocked_client = mock.create_autospec(client.Client)
+        mock_get_client.return_value = mocked_client
+        mocked_client.list_ports.return_value = {'ports': []}
+        instance = objects.Instance(uuid=uuids.instance,
+                                    project_id=self.tenant_id)
+
+        prefetched = self.api.prefetch_instances_nw_info(
+            self.context, [instance])
+
+        # Nothing else is listed as an empty list of IDs would match all the
+        # resources.
+        mocked_client.list_ports.assert_called_once_with(
+            device_id=[uuids.instance])
+        mocked_client.list_networks.assert_not_called()
+        mocked_client.list_subnets.assert_not_called()
+        mocked_client.list_floatingips.assert_not_called()
+        self.assertEqual([], prefetched.get_ports(instance))
+
+    @mock.patch.object(neutronapi.API, '_has_multi_provider_extension',
+                       return_value=False)
+    @mock.patch.object(neutronapi.API, '_get_ordered_port_list')
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_build_network_info_model_prefetched(
+            self, mock_get_client, mock_ordered_ports, mock_multi_provider):
+        mocked_client = mock.create_autospec(client.Client)
+        mock_get_client.return_value = mocked_client
+        instance = objects.Instance(
+            uuid=self.instance2['uuid'], project_id=self.tenant_id,
+            info_cache=objects.InstanceInfoCache(
+                network_info=model.NetworkInfo()))
+        network = dict(self.nets1[0], **{
+            'provider:physical_network': 'physnet1',
+            'provider:network_type': 'vlan'})
+        subnet = dict(self.subnet_data1[0], enable_dhcp=True)
+        dhcp_port = dict(self.dhcp_port_data1[0], network_id=uuids.my_netid1)
+        prefetched = neutronapi.PrefetchedNetworkInfo(
+            self.port_data1, [network], [subnet], [dhcp_port],
+            self.float_data1)
+        mocked_client.list_ports.return_value = {
+            'ports': copy.deepcopy(self.port_data1)}
+        mock_ordered_ports.return_value = [uuids.portid_1]
+
+        nw_info = self.api._build_network_info_model(
+            self.context, instance, force_refresh=True,
+            prefetched=prefetched)
+
+        # Only the ports were listed again, the other neutron resources were
+        # taken from the prefetched ones.
+        mocked_client.list_ports.assert_called_once_with(
+            tenant_id=self.tenant_id, device_id=instance.uuid)
+        mocked_client.list_networks.assert_not_called()
+        mocked_client.list_subnets.assert_not_called()
+        mocked_client.list_floatingips.assert_not_called()
+        mocked_client.show_network.assert_not_called()
+        mock_ordered_ports.assert_called_once_with(
+            self.context, instance, self.port_data1)
+
+        self.assertEqual(1, len(nw_info))
+        vif = nw_info[0]
+        self.assertEqual(uuids.portid_1, vif['id'])
+        self.assertEqual('my_netname1', vif['network']['label'])
+        self.assertEqual('physnet1',
+                         vif['network']['meta']['physical_network'])
+        self.assertFalse(vif['network']['meta']['tunneled'])
+        subnets = vif['network']['subnets']
+        self.assertEqual(1, len(subnets))
+        self.assertEqual('10.0.1.9', subnets[0]['meta']['dhcp_server'])
+        self.assertEqual([self.port_address],
+                         [ip['address'] for ip in subnets[0]['ips']])
+        self.assertEqual(['172.0.1.2'],
+                         [ip['address'] for ip in vif.floating_ips()])
+
+    @mock.patch.object(neutronapi.API, '_build_vif_model')
+    @mock.patch.object(neutronapi.API, '_get_available_networks')
+    @mock.patch.object(neutronapi.API, '_get_ordered_port_list')
+    @mock.patch.object(neutronapi, 'get_client')
+    def test_build_network_info_model_prefetched_ports_changed(
+            self, mock_get_client, mock_ordered_ports, mock_get_networks,
+            mock_build_vif):
+        mocked_client = mock.create_autospec(client.Client)
+        mock_get_client.return_value = mocked_client
+        instance = objects.Instance(
+            uuid=self.instance2['uuid'], project_id=self.tenant_id,
+            info_cache=objects.InstanceInfoCache(
+                network_info=model.NetworkInfo()))
+        prefetched = neutronapi.PrefetchedNetworkInfo(
+            self.port_data1, self.nets1, self.subnet_data1, [],
+            self.float_data1)
+        # The fixed IP of the port changed after the ports were prefetched.
+        port = dict(self.port_data1[0], fixed_ips=[
+            {'ip_address': '10.0.1.3', 'subnet_id': 'my_subid1'}])
+        mocked_client.list_ports.return_value = {'ports': [port]}
+        mock_ordered_ports.return_value = [uuids.portid_1]
+
+        nw_info = self.api._build_network_info_model(
+            self.context, instance, force_refresh=True,
+            prefetched=prefetched)
+
+        # The prefetched resources were not used for the changed port.
+        mock_ordered_ports.assert_called_once_with(
+            self.context, instance, [port])
+        mock_get_networks.assert_called_once_with(
+            self.context, self.tenant_id, [uuids.my_netid1], mocked_client)
+        mock_build_vif.assert_called_once_with(
+            self.context, mocked_client, port, mock_get_networks.return_value,
+            set(), prefetched=None)
+        self.assertEqual([mock_build_vif.return_value], nw_info)
+
+    def test_prefetched_network_info_matches_ports(self):
+        instance = objects.Instance(uuid=self.instance2['uuid'],
+                                    project_id=self.tenant_id)
+        prefetched = neutronapi.PrefetchedNetworkInfo(
+            self.port_data1, [], [], [], [])
+
+        self.assertTrue(prefetched.matches_ports(
+            instance, copy.deepcopy(self.port_data1)))
+        self.assertFalse(prefetched.matches_ports(instance, []))
+        self.assertFalse(prefetched.matches_ports(
+            instance, [dict(self.port_data1[0], network_id=uuids.other)]))
+        self.assertFalse(prefetched.matches_ports(
+            instance, self.port_data1 + [dict(self.port_data1[0],
+                                              id=uuids.portid_2)]))
+
     @mock.patch.object(neutronapi, 'get_client', return_value=mock.Mock())
     def test_get_physnet_tunneled_info_multi_segment(self, mock_get_client):
         test_net = {'network': {'segments':
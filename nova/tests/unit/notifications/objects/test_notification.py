@@ -189,6 +189,15 @@ class TestNotificationBase(test.NoDBTestCase):
             expected_payload=self.expected_payload)
         self.assertFalse(mock_legacy.called)
 
+    @mock.patch('nova.rpc.NOTIFIER')
+    def test_emit_excluded_event_type(self, mock_notifier):
+        self.flags(excluded_event_types=['test_object.update.*'],
+                   group='notifications')
+        mock_context = mock.Mock()
+        self.notification.emit(mock_context)
+
+        mock_notifier.prepare.assert_not_called()
+
     @mock.patch('nova.rpc.NOTIFIER')
     def test_emit_with_host_and_binary_as_publisher(self, mock_notifier):
         noti = self.TestNotification(
@@ -491,6 +491,37 @@ class _TestBlockDeviceMappingListObject(object):
             self.context, [uuids.instance])
         self.assertEqual(0, len(bdm_list))
 
+    @mock.patch.object(db, 'block_device_mapping_update_or_create_bulk')
+    def test_update_or_create_bulk(self, update_or_create_bulk):
+        fakes = [self.fake_bdm(123),
+                 self.fake_bdm(456, instance_uuid=uuids.instance2)]
+        update_or_create_bulk.return_value = fakes
+        values = [{'source_type': 'volume', 'volume_id': 'fake-vol-id',
+                   'destination_type': 'volume',
+                   'instance_uuid': uuids.instance},
+                  {'source_type': 'blank', 'destination_type': 'local',
+                   'instance_uuid': uuids.instance2}]
+        bdms = [objects.BlockDeviceMapping(**v) for v in values]
+
+        bdm_list = objects.BlockDeviceMappingList.update_or_create_bulk(
+            self.context, bdms)
+
+        update_or_create_bulk.assert_called_once_with(
+            self.context, values, legacy=False)
+        self.assertEqual([123, 456], [bdm.id for bdm in bdm_list])
+        self.assertEqual([uuids.instance, uuids.instance2],
+                         [bdm.instance_uuid for bdm in bdm_list])
+
+    @mock.patch.object(db, 'block_device_mapping_update_or_create_bulk')
+    def test_update_or_create_bulk_already_created(self,
+                                                   update_or_create_bulk):
+        bdms = [objects.BlockDeviceMapping(id=1, source_type='blank',
+                                           destination_type='local')]
+        self.assertRaises(exception.ObjectActionError,
+                          objects.BlockDeviceMappingList.update_or_create_bulk,
+                          self.context, bdms)
+        update_or_create_bulk.assert_not_called()
+
     @mock.patch.object(db, 'block_device_mapping_get_all_by_instance')
     def test_get_by_instance_uuid(self, get_all_by_inst):
         fakes = [self.fake_bdm(123), self.fake_bdm(456)]
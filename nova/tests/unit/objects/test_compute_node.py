@@ -425,7 +425,7 @@ class _TestComputeNodeObject(object):
         self.compare_obj(computes[0], fake_compute_node,
                          subs=self.subs(),
                          comparators=self.comparators())
-        mock_get_all.assert_called_once_with(self.context)
+        mock_get_all.assert_called_once_with(self.context, columns=None)
 
     @mock.patch.object(db, 'compute_node_search_by_hypervisor')
     def test_get_by_hypervisor(self, mock_search):
@@ -723,10 +723,86 @@ class _TestComputeNodeObject(object):
         self.assertEqual(3, len(nodes))
         self.assertEqual([0, 1, 1], sorted([x.mapped for x in nodes]))
 
+    def test_get_all_expected_attrs(self):
+        for hostname in ('node1', 'node2'):
+            compute = fake_compute_with_resources.obj_clone()
+            compute._context = self.context
+            compute.hypervisor_hostname = hostname
+            compute.create()
+
+        with mock.patch.object(db, 'compute_node_get_all_by_ids',
+                               wraps=db.compute_node_get_all_by_ids) as get:
+            nodes = compute_node.ComputeNodeList.get_all(
+                self.context, expected_attrs=['cpu_info'])
+            self.assertEqual(2, len(nodes))
+            for node in nodes:
+                self.assertEqual('fake-info', node.cpu_info)
+                self.assertNotIn('numa_topology', node)
+            get.assert_not_called()
+
+            # Lazy-loading an attribute loads it for the whole list.
+            self.assertEqual(fake_numa_topology_db_format,
+                             nodes[0].numa_topology)
+            self.assertEqual(fake_numa_topology_db_format,
+                             nodes[1].numa_topology)
+            get.assert_called_once_with(
+                self.context, sorted(node.id for node in nodes),
+                columns=['id', 'numa_topology'])
+            self.assertEqual(list(fake_supported_instances[0]),
+                             nodes[0].supported_hv_specs[0].to_list())
+            self.assertEqual(2, get.call_count)
+            self.assertEqual(set(), nodes[0].obj_what_changed())
+
+    def test_get_all_by_uuids_expected_attrs(self):
+        compute = fake_compute_with_resources.obj_clone()
+        compute._context = self.context
+        compute.create()
+        nodes = compute_node.ComputeNodeList.get_all_by_uuids(
+            self.context, [compute.uuid], expected_attrs=['numa_topology'])
+        self.assertEqual(1, len(nodes))
+        self.assertEqual(compute.hypervisor_hostname,
+                         nodes[0].hypervisor_hostname)
+        self.assertEqual(fake_numa_topology_db_format,
+                         nodes[0].numa_topology)
+        self.assertNotIn('cpu_info', nodes[0])
+        self.assertNotIn('supported_hv_specs', nodes[0])
+
 
 class TestComputeNodeObject(test_objects._LocalTest,
                             _TestComputeNodeObject):
-    pass
+
+    def test_from_db_object_decodes_lazily(self):
+        compute = compute_node.ComputeNode._from_db_object(
+            self.context, objects.ComputeNode(), fake_compute_node)
+        self.assertEqual({'stats', 'supported_hv_specs', 'pci_device_pools'},
+                         set(compute._db_blobs))
+        self.assertIn('stats', compute)
+        self.assertEqual(fake_stats, compute.stats)
+        self.assertNotIn('stats', compute._db_blobs)
+        self.assertEqual(set(), compute.obj_what_changed())
+
+        primitive = compute.obj_to_primitive()['nova_object.data']
+        self.assertEqual(fake_stats, primitive['stats'])
+        self.assertIn('supported_hv_specs', primitive)
+        self.assertIn('pci_device_pools', primitive)
+        self.assertEqual({}, compute._db_blobs)
+
+    def test_from_db_object_lazy_field_set_before_decoding(self):
+        compute = compute_node.ComputeNode._from_db_object(
+            self.context, objects.ComputeNode(), fake_compute_node)
+        compute.stats = {'num_bar': '1'}
+        primitive = compute.obj_to_primitive()['nova_object.data']
+        self.assertEqual({'num_bar': '1'}, primitive['stats'])
+        self.assertIn('stats', compute.obj_what_changed())
+
+    def test_from_db_object_empty_blobs(self):
+        db_compute = dict(fake_compute_node, stats=None,
+                          supported_instances='', pci_stats=None)
+        compute = compute_node.ComputeNode._from_db_object(
+            self.context, objects.ComputeNode(), db_compute)
+        self.assertNotIn('stats', compute)
+        self.assertNotIn('supported_hv_specs', compute)
+        self.assertIsNone(compute.pci_device_pools)
 
 
 class TestRemoteComputeNodeObject(test_objects._RemoteTest,
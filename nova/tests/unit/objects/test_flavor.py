@@ -368,6 +368,119 @@ class TestFlavor(test_objects._LocalTest, _TestFlavor):
         self.assertIn('name', flavor_primitive)
         self.assertNotIn('description', flavor_primitive)
 
+    def _enable_flavor_cache(self):
+        self.flags(flavor_cache_time=60, group='api')
+        cache = flavor_obj._FlavorCache()
+        self.stub_out('nova.objects.flavor._FLAVOR_CACHE', cache)
+        return cache
+
+    def test_cached_lookups(self):
+        cache = self._enable_flavor_cache()
+        db_flavor = self._create_api_flavor(self.context)
+
+        with mock.patch.object(
+                flavor_obj, '_flavor_get_all_for_cache_from_db',
+                wraps=flavor_obj._flavor_get_all_for_cache_from_db
+        ) as mock_load, mock.patch.object(
+                flavor_obj.Flavor, '_flavor_get_query_from_db',
+                wraps=flavor_obj.Flavor._flavor_get_query_from_db
+        ) as mock_query:
+            for flavor in (
+                    objects.Flavor.get_by_id(self.context, db_flavor['id']),
+                    objects.Flavor.get_by_flavor_id(self.context, 'm1.foo'),
+                    objects.Flavor.get_by_name(self.context, 'm1.foo')):
+                self._compare(self, db_flavor, flavor)
+            mock_load.assert_called_once_with(self.context)
+            self.assertFalse(mock_query.called)
+
+            # Returned flavors do not share their extra specs with the cache.
+            flavor.extra_specs['foo'] = 'baz'
+            self.assertEqual({'foo': 'bar'}, objects.Flavor.get_by_id(
+                self.context, db_flavor['id']).extra_specs)
+
+            # Flavors created by other processes are looked up in the
+            # database until the cache is checked again.
+            self._create_api_flavor(self.context, altid='m1.bar')
+            self.assertEqual('m1.bar', objects.Flavor.get_by_flavor_id(
+                self.context, 'm1.bar').name)
+            self.assertTrue(mock_query.called)
+            mock_query.reset_mock()
+            cache.checked_at -= 60
+            objects.Flavor.get_by_flavor_id(self.context, 'm1.bar')
+            self.assertEqual(2, mock_load.call_count)
+            self.assertFalse(mock_query.called)
+
+            # The flavors are not reloaded if they did not change.
+            cache.checked_at -= 60
+            objects.Flavor.get_by_flavor_id(self.context, 'm1.bar')
+            self.assertEqual(2, mock_load.call_count)
+
+        self.assertRaises(exception.FlavorNotFound,
+                          objects.Flavor.get_by_flavor_id, self.context,
+                          'm1.baz')
+
+    @mock.patch('nova.objects.Flavor._send_notification')
+    def test_cache_invalidated_by_writes(self, mock_notify):
+        self._enable_flavor_cache()
+        db_flavor = self._create_api_flavor(self.context)
+        flavor = objects.Flavor.get_by_id(self.context, db_flavor['id'])
+        flavor.extra_specs['marty'] = 'mcfly'
+        flavor.description = 'outatime'
+        flavor.save()
+
+        flavor = objects.Flavor.get_by_id(self.context, db_flavor['id'])
+        self.assertEqual({'foo': 'bar', 'marty': 'mcfly'}, flavor.extra_specs)
+        self.assertEqual('outatime', flavor.description)
+
+        flavor.destroy()
+        self.assertRaises(exception.FlavorNotFound,
+                          objects.Flavor.get_by_id, self.context,
+                          db_flavor['id'])
+
+    def test_cache_reloaded_after_same_second_update(self):
+        cache = self._enable_flavor_cache()
+        db_flavor = self._create_api_flavor(self.context)
+        self.assertIsNone(objects.Flavor.get_by_id(
+            self.context, db_flavor['id']).description)
+
+        # Another process updates the flavor within the same second as its
+        # last update, so the version of the flavors does not change.
+        @db_api.api_context_manager.writer
+        def _update_description(context):
+            context.session.query(api_models.Flavors).filter_by(
+                id=db_flavor['id']).update(
+                    {'description': 'outatime',
+                     'updated_at': db_flavor['updated_at']})
+
+        _update_description(self.context)
+        cache.checked_at -= 60
+        self.assertIsNone(objects.Flavor.get_by_id(
+            self.context, db_flavor['id']).description)
+
+        # The flavors are reloaded anyway once they were cached for long
+        # enough.
+        cache.loaded_at -= 60 * flavor_obj._FLAVOR_CACHE_RELOAD_PERIODS
+        cache.checked_at -= 60
+        self.assertEqual('outatime', objects.Flavor.get_by_id(
+            self.context, db_flavor['id']).description)
+
+    @mock.patch('nova.objects.Flavor._send_notification')
+    def test_cached_flavor_access(self, mock_notify):
+        self._enable_flavor_cache()
+        dict_flavor = dict(fake_flavor, is_public=False)
+        del dict_flavor['id']
+        flavor = flavor_obj.Flavor(self.context.elevated(), **dict_flavor)
+        flavor.create()
+        ctxt = nova_context.RequestContext('fake-user', 'fake-project')
+
+        self.assertRaises(exception.FlavorNotFound,
+                          objects.Flavor.get_by_id, ctxt, flavor.id)
+        flavor.add_access('fake-project')
+        self.assertEqual(flavor.id, objects.Flavor.get_by_id(
+            ctxt, flavor.id).id)
+        self.assertEqual({'fake-project': {flavor.id}},
+                         flavor_obj._FLAVOR_CACHE.flavor_ids_by_project)
+
 
 class TestFlavorRemote(test_objects._RemoteTest, _TestFlavor):
     pass
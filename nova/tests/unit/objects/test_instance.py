@@ -1249,6 +1249,24 @@ class _TestInstanceObject(object):
                              expected_attrs=['info_cache'])
         self.assertIs(info_cache, inst.info_cache)
 
+    def test_from_db_object_skips_coercion_of_db_values(self):
+        inst = objects.Instance(context=self.context)
+        db_inst = fake_instance.fake_db_instance(hostname='foo')
+        hostname_field = objects.Instance.fields['hostname']
+        created_at_field = objects.Instance.fields['created_at']
+        with test.nested(
+            mock.patch.object(hostname_field, 'coerce'),
+            mock.patch.object(created_at_field, 'coerce',
+                              wraps=created_at_field.coerce),
+        ) as (mock_hostname, mock_created_at):
+            inst._from_db_object(self.context, inst, db_inst)
+        mock_hostname.assert_not_called()
+        self.assertEqual('foo', inst.hostname)
+        # Values the database returns in another form are still coerced
+        mock_created_at.assert_called_once_with(
+            inst, 'created_at', db_inst['created_at'])
+        self.assertIsNotNone(inst.created_at.tzinfo)
+
     def test_from_db_object_info_cache_not_set(self):
         inst = instance.Instance(context=self.context,
                                  info_cache=None)
@@ -1580,6 +1598,25 @@ class _TestInstanceObject(object):
         inst1 = inst1.obj_clone()
         self.assertEqual(len(inst1.obj_what_changed()), 0)
 
+    def test_obj_delta_fields(self):
+        inst = objects.Instance(uuid=uuids.instance, host='foo',
+                                vm_state=vm_states.ACTIVE,
+                                flavor=objects.Flavor(), old_flavor=None,
+                                new_flavor=None)
+        inst.obj_reset_changes()
+        self.assertIsNone(inst.obj_delta_fields('refresh'))
+        self.assertEqual(instance._SAVE_DELTA_FIELDS,
+                         inst.obj_delta_fields('save'))
+        inst.display_description = 'bar'
+        self.assertEqual(
+            instance._SAVE_DELTA_FIELDS | {'display_description'},
+            inst.obj_delta_fields('save'))
+        inst.new_flavor = objects.Flavor()
+        self.assertEqual(
+            instance._SAVE_DELTA_FIELDS | {'display_description',
+                                           'old_flavor', 'new_flavor'},
+            inst.obj_delta_fields('save'))
+
     def test_obj_make_compatible(self):
         inst_obj = objects.Instance(
             # trusted_certs were added in 2.4
@@ -1897,6 +1934,88 @@ class _TestInstanceListObject(object):
         mock_fault_get.assert_called_once_with(self.context,
             [x['uuid'] for x in fake_insts])
 
+    def _get_list_for_bulk_load(self, count):
+        fakes = [self.fake_instance(i) for i in range(count)]
+        with mock.patch.object(db, 'instance_get_all_by_filters',
+                               return_value=fakes):
+            return objects.InstanceList.get_by_filters(
+                self.context, {}, expected_attrs=[])
+
+    def test_lazy_load_in_bulk(self):
+        inst_list = self._get_list_for_bulk_load(3)
+        instance_uuids = [inst.uuid for inst in inst_list]
+        loaded = objects.InstanceList(objects=[
+            objects.Instance(uuid=uuid, tags=objects.TagList(
+                objects=[objects.Tag(resource_id=uuid, tag=uuid)]))
+            for uuid in instance_uuids])
+        loaded.obj_reset_changes(recursive=True)
+
+        with mock.patch.object(objects.InstanceList, 'get_by_filters',
+                               return_value=loaded) as mock_get:
+            self.assertEqual(instance_uuids[1], inst_list[1].tags[0].tag)
+            for inst in inst_list:
+                self.assertEqual(inst.uuid, inst.tags[0].tag)
+                self.assertEqual(set(), inst.obj_what_changed())
+        mock_get.assert_called_once_with(
+            inst_list[1]._context, {'uuid': instance_uuids},
+            expected_attrs=['tags'])
+
+    def test_lazy_load_in_bulk_flavor(self):
+        inst_list = self._get_list_for_bulk_load(2)
+        flavor = objects.Flavor(name='m1.small')
+        loaded = objects.InstanceList(objects=[
+            objects.Instance(uuid=inst.uuid, flavor=flavor, old_flavor=None,
+                             new_flavor=None)
+            for inst in inst_list])
+
+        with mock.patch.object(objects.InstanceList, 'get_by_filters',
+                               return_value=loaded) as mock_get:
+            self.assertIsNone(inst_list[0].old_flavor)
+            for inst in inst_list:
+                self.assertEqual('m1.small', inst.flavor.name)
+                self.assertIsNone(inst.new_flavor)
+        mock_get.assert_called_once_with(
+            inst_list[0]._context, {'uuid': [inst.uuid for inst in inst_list]},
+            expected_attrs=['flavor'])
+
+    @mock.patch.object(objects.TagList, 'get_by_resource_id')
+    def test_lazy_load_in_bulk_skips_deleted_tags(self, mock_get_tags):
+        inst_list = self._get_list_for_bulk_load(3)
+        inst_list[0].deleted = True
+        inst_list[0].obj_reset_changes()
+        loaded = objects.InstanceList(objects=[
+            objects.Instance(uuid=inst.uuid, tags=objects.TagList())
+            for inst in inst_list[1:]])
+
+        with mock.patch.object(objects.InstanceList, 'get_by_filters',
+                               return_value=loaded) as mock_get:
+            self.assertEqual(0, len(inst_list[0].tags))
+            self.assertEqual(0, len(inst_list[1].tags))
+        mock_get.assert_called_once_with(
+            inst_list[1]._context,
+            {'uuid': [inst.uuid for inst in inst_list[1:]]},
+            expected_attrs=['tags'])
+        mock_get_tags.assert_not_called()
+
+    @mock.patch.object(objects.EC2Ids, 'get_by_instance',
+                       return_value=objects.EC2Ids())
+    @mock.patch.object(objects.InstanceFault, 'get_latest_for_instance',
+                       return_value=None)
+    def test_lazy_load_not_in_bulk(self, mock_get_fault, mock_get_ec2):
+        inst_list = self._get_list_for_bulk_load(1)
+        other_list = self._get_list_for_bulk_load(2)
+        with mock.patch.object(objects.InstanceList,
+                               'get_by_filters') as mock_get:
+            # A single instance does not need a bulk load
+            self.assertIsNone(inst_list[0].fault)
+            # Nor do attributes without a bulk loader
+            other_list[0].ec2_ids
+        mock_get.assert_not_called()
+        mock_get_fault.assert_called_once_with(inst_list[0]._context,
+                                               inst_list[0].uuid)
+        mock_get_ec2.assert_called_once_with(other_list[0]._context,
+                                             other_list[0])
+
     @mock.patch.object(db, 'instance_fault_get_by_instance_uuids')
     def test_fill_faults(self, mock_fault_get):
         inst1 = objects.Instance(uuid=uuids.db_fault_1)
@@ -115,6 +115,18 @@ class _TestInstanceActionObject(object):
                                            expected_packed_values)
         self.assertIsNone(action)
 
+    @mock.patch.object(db, 'action_start_bulk')
+    def test_action_start_bulk(self, mock_start_bulk):
+        test_class = instance_action.InstanceAction
+        expected_packed_values = [
+            test_class.pack_action_start(self.context, uuid, 'fake-action')
+            for uuid in (uuids.instance1, uuids.instance2)]
+        result = instance_action.InstanceAction.action_start_bulk(
+            self.context, [uuids.instance1, uuids.instance2], 'fake-action')
+        mock_start_bulk.assert_called_once_with(self.context,
+                                                expected_packed_values)
+        self.assertIsNone(result)
+
     @mock.patch.object(db, 'action_finish')
     def test_action_finish(self, mock_finish):
         self.useFixture(utils_fixture.TimeFixture(NOW))
@@ -245,6 +257,16 @@ class _TestInstanceActionEventObject(object):
                                            expected_packed_values)
         self.assertIsNone(event)
 
+    @mock.patch.object(db, 'action_events_record', return_value=1)
+    def test_record_events(self, mock_record):
+        events = [{'event_type': 'start', 'use_last_action': False,
+                   'values': {'event': 'fake-event',
+                              'instance_uuid': 'fake-uuid',
+                              'request_id': 'fake-request'}}]
+        self.assertEqual(1, instance_action.InstanceActionEvent.record_events(
+            self.context, events))
+        mock_record.assert_called_once_with(self.context, events)
+
     @mock.patch.object(db, 'action_event_finish')
     def test_event_finish(self, mock_finish):
         self.useFixture(utils_fixture.TimeFixture(NOW))
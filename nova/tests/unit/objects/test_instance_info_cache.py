@@ -47,6 +47,55 @@ class _TestInstanceInfoCacheObject(object):
         self.assertEqual(nwinfo, obj.network_info)
         mock_get.assert_called_once_with(self.context, uuids.info_instance)
 
+    @mock.patch.object(db, 'instance_info_cache_get')
+    def test_get_by_instance_uuid_hydrates_lazily(self, mock_get):
+        nwinfo = network_model.NetworkInfo.hydrate([{'address': 'foo'}])
+        mock_get.return_value = dict(fake_info_cache,
+                                     network_info=nwinfo.json())
+        with mock.patch.object(network_model.NetworkInfo, 'hydrate',
+                               wraps=network_model.NetworkInfo.hydrate
+                               ) as mock_hydrate:
+            obj = instance_info_cache.InstanceInfoCache.get_by_instance_uuid(
+                self.context, uuids.info_instance)
+            self.assertIn('network_info', obj)
+            primitive = obj.obj_to_primitive()
+            mock_hydrate.assert_not_called()
+            self.assertEqual(nwinfo.json(),
+                             primitive['nova_object.data']['network_info'])
+            self.assertEqual(nwinfo, obj.network_info)
+            self.assertEqual(nwinfo, obj.network_info)
+            mock_hydrate.assert_called_once_with(nwinfo.json())
+        self.assertEqual(set(), obj.obj_what_changed())
+
+    def test_obj_from_primitive_hydrates_lazily(self):
+        nwinfo = network_model.NetworkInfo.hydrate([{'address': 'foo'}])
+        obj = instance_info_cache.InstanceInfoCache(
+            instance_uuid=uuids.info_instance, network_info=nwinfo)
+        obj.obj_reset_changes(['instance_uuid'])
+        with mock.patch.object(network_model.NetworkInfo, 'hydrate',
+                               wraps=network_model.NetworkInfo.hydrate
+                               ) as mock_hydrate:
+            obj2 = instance_info_cache.InstanceInfoCache.obj_from_primitive(
+                obj.obj_to_primitive())
+            self.assertEqual({'network_info'}, obj2.obj_what_changed())
+            self.assertEqual(obj.obj_to_primitive(), obj2.obj_to_primitive())
+            mock_hydrate.assert_not_called()
+            self.assertEqual(nwinfo, obj2.network_info)
+        self.assertEqual({'network_info'}, obj2.obj_what_changed())
+
+    @mock.patch.object(db, 'instance_info_cache_get')
+    def test_get_by_instance_uuid_compressed(self, mock_get):
+        nwinfo = network_model.NetworkInfo.hydrate([{'address': 'foo'}])
+        mock_get.return_value = dict(
+            fake_info_cache,
+            network_info=network_model.compress_json(nwinfo.json()))
+        obj = instance_info_cache.InstanceInfoCache.get_by_instance_uuid(
+            self.context, uuids.info_instance)
+        # Only plain JSON is sent over RPC
+        self.assertEqual(nwinfo.json(), obj.obj_to_primitive()[
+            'nova_object.data']['network_info'])
+        self.assertEqual(nwinfo, obj.network_info)
+
     @mock.patch.object(db, 'instance_info_cache_get', return_value=None)
     def test_get_by_instance_uuid_no_entries(self, mock_get):
         self.assertRaises(
@@ -82,6 +131,21 @@ class _TestInstanceInfoCacheObject(object):
         self.assertEqual(timeutils.normalize_time(fake_updated_at),
                          timeutils.normalize_time(obj.updated_at))
 
+    @mock.patch.object(db, 'instance_info_cache_update')
+    def test_save_compressed(self, mock_update):
+        self.flags(compress_network_info_cache=True)
+        nwinfo = network_model.NetworkInfo.hydrate([{'address': 'foo'}])
+        compressed = network_model.compress_json(nwinfo.json())
+        mock_update.return_value = dict(fake_info_cache,
+                                        network_info=compressed)
+        obj = instance_info_cache.InstanceInfoCache(context=self.context)
+        obj.instance_uuid = uuids.info_instance
+        obj.network_info = nwinfo
+        obj.save()
+        mock_update.assert_called_once_with(self.context, uuids.info_instance,
+                                            {'network_info': compressed})
+        self.assertEqual(nwinfo, obj.network_info)
+
     @mock.patch.object(db, 'instance_info_cache_get',
                        return_value=fake_info_cache)
     def test_refresh(self, mock_get):
@@ -94,7 +158,25 @@ class _TestInstanceInfoCacheObject(object):
 
 class TestInstanceInfoCacheObject(test_objects._LocalTest,
                                   _TestInstanceInfoCacheObject):
-    pass
+    @mock.patch.object(db, 'instance_info_cache_update')
+    def test_save_not_hydrated(self, mock_update):
+        # NOTE: Remotely, conductor looks at the saved object to send back
+        # what changed.
+        nwinfo = network_model.NetworkInfo.hydrate([{'address': 'foo'}])
+        mock_update.return_value = dict(fake_info_cache,
+                                        network_info=nwinfo.json())
+        obj = instance_info_cache.InstanceInfoCache.obj_from_primitive(
+            instance_info_cache.InstanceInfoCache(
+                instance_uuid=uuids.info_instance,
+                network_info=nwinfo).obj_to_primitive())
+        obj._context = self.context
+        with mock.patch.object(network_model.NetworkInfo, 'hydrate',
+                               wraps=network_model.NetworkInfo.hydrate
+                               ) as mock_hydrate:
+            obj.save()
+            mock_hydrate.assert_not_called()
+        mock_update.assert_called_once_with(self.context, uuids.info_instance,
+                                            {'network_info': nwinfo.json()})
 
 
 class TestInstanceInfoCacheObjectRemote(test_objects._RemoteTest,
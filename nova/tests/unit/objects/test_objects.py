@@ -969,6 +969,171 @@ class TestObjectSerializer(_BaseTestCase):
         thing2 = ser.deserialize_entity(self.context, thing)
         self.assertIsInstance(thing2['foo'], base.NovaObject)
 
+    def test_codec_to_primitive_matches_generic(self):
+        obj = MyObj(foo=1, bar='bar', readonly=2,
+                    created_at=timeutils.utcnow(),
+                    rel_object=MyOwnedObject(baz=3),
+                    rel_objects=[MyOwnedObject(baz=4)])
+        obj.obj_reset_changes(['foo', 'bar'])
+        obj.rel_object.obj_reset_changes()
+        self.assertIsNotNone(MyObj._obj_get_codec())
+        expected = ovo_base.VersionedObject.obj_to_primitive(obj)
+        with mock.patch.object(MyObj, '_obj_get_codec', return_value=None):
+            generic = obj.obj_to_primitive()
+        self.assertEqual(expected, generic)
+        primitive = obj.obj_to_primitive()
+        self.assertEqual(sorted(expected.pop('nova_object.changes')),
+                         sorted(primitive.pop('nova_object.changes')))
+        self.assertEqual(expected, primitive)
+
+    def test_codec_from_primitive(self):
+        obj = MyObj(foo=1, bar='bar', readonly=2,
+                    created_at=timeutils.utcnow().replace(microsecond=0),
+                    rel_object=MyOwnedObject(baz=3))
+        obj.obj_reset_changes(['foo'])
+        obj2 = MyObj.obj_from_primitive(obj.obj_to_primitive(),
+                                        context=self.context)
+        self.assertIsInstance(obj2, MyObj)
+        self.assertEqual(self.context, obj2._context)
+        for name in ('foo', 'bar', 'readonly', 'created_at'):
+            self.assertEqual(getattr(obj, name), getattr(obj2, name))
+        self.assertEqual(3, obj2.rel_object.baz)
+        self.assertNotIn('missing', obj2)
+        self.assertEqual(obj.obj_what_changed(), obj2.obj_what_changed())
+
+    def test_codec_from_primitive_other_version_coerced(self):
+        primitive = MyObj(foo=1).obj_to_primitive()
+        primitive['nova_object.data']['foo'] = '2'
+        # A primitive of our own version holds values we already coerced
+        self.assertEqual('2', MyObj.obj_from_primitive(primitive).foo)
+        primitive['nova_object.version'] = '1.5'
+        self.assertEqual(2, MyObj.obj_from_primitive(primitive).foo)
+
+    def test_codec_not_inherited(self):
+        @base.NovaObjectRegistry.register_if(False)
+        class MySubObj(MyObj):
+            fields = {'new_field': fields.StringField()}
+
+        self.assertIsNotNone(MyObj._obj_get_codec())
+        self.assertIsNone(MySubObj._obj_get_codec())
+        obj = MySubObj(foo=1, new_field='new')
+        primitive = obj.obj_to_primitive()
+        self.assertEqual('new', primitive['nova_object.data']['new_field'])
+
+    def _get_obj_for_backport(self):
+        obj = MyObj(foo=1, bar='bar', rel_object=MyOwnedObject(baz=3),
+                    rel_objects=[MyOwnedObject(baz=4)])
+        obj.obj_reset_changes(['foo'])
+        return obj
+
+    def test_codec_make_compatible_matches_generic(self):
+        manifest = {'MyObj': '1.1', 'MyOwnedObject': '1.0'}
+        obj = self._get_obj_for_backport()
+        with mock.patch.object(base.NovaObject, '_obj_get_codec',
+                               return_value=None):
+            expected = obj.obj_to_primitive(target_version='1.1',
+                                            version_manifest=manifest)
+        primitive = obj.obj_to_primitive(target_version='1.1',
+                                         version_manifest=manifest)
+        self.assertEqual('1.1', primitive['nova_object.version'])
+        self.assertEqual('oldbar', primitive['nova_object.data']['bar'])
+        self.assertEqual(sorted(expected.pop('nova_object.changes')),
+                         sorted(primitive.pop('nova_object.changes')))
+        self.assertEqual(expected, primitive)
+
+        del manifest['MyOwnedObject']
+        primitive = obj.obj_to_primitive(target_version='1.1',
+                                         version_manifest=manifest)
+        self.assertEqual(3, primitive['nova_object.data']['rel_object'][
+            'nova_object.data']['baz'])
+        # Without a manifest there is no rule to backport sub-objects by
+        self.assertRaises(ovo_exc.ObjectActionError, obj.obj_to_primitive,
+                          target_version='1.1')
+        self.assertRaises(ovo_exc.InvalidTargetVersion, obj.obj_to_primitive,
+                          target_version='1.7')
+
+    def test_codec_make_compatible_plan_cached(self):
+        manifest = {'MyObj': '1.1', 'MyOwnedObject': '1.0'}
+        obj = self._get_obj_for_backport()
+        MyObj._obj_get_codec().compat_plans.clear()
+        with mock.patch.object(base, '_subobject_compat_version',
+                               wraps=base._subobject_compat_version) as m:
+            for i in range(3):
+                obj.obj_to_primitive(target_version='1.1',
+                                     version_manifest=manifest)
+            # Once for each of rel_object and rel_objects
+            self.assertEqual(2, m.call_count)
+            obj.obj_to_primitive(target_version='1.2',
+                                 version_manifest=manifest)
+            self.assertEqual(4, m.call_count)
+
+    def test_codec_make_compatible_relationships_of_object(self):
+        obj = self._get_obj_for_backport()
+        obj.obj_relationships = {'rel_object': [('1.0', '1.0')],
+                                 'rel_objects': [('1.2', '1.0')]}
+        primitive = obj.obj_to_primitive(target_version='1.1')
+        self.assertIn('rel_object', primitive['nova_object.data'])
+        self.assertNotIn('rel_objects', primitive['nova_object.data'])
+
+    @mock.patch('oslo_versionedobjects.base.obj_tree_get_versions',
+                return_value={'MyObj': '1.6', 'MyOwnedObject': '1.0'})
+    def test_obj_tree_get_versions_cached(self, mock_get_versions):
+        base._VERSION_MANIFESTS.clear()
+        versions = base.obj_tree_get_versions('MyObj')
+        self.assertEqual(mock_get_versions.return_value, versions)
+        versions['MyObj'] = '1.0'
+        self.assertEqual(mock_get_versions.return_value,
+                         base.obj_tree_get_versions('MyObj'))
+        mock_get_versions.assert_called_once_with('MyObj')
+
+        @base.NovaObjectRegistry.register
+        class MyNewObj(base.NovaObject):
+            VERSION = '1.0'
+
+        base.obj_tree_get_versions('MyObj')
+        self.assertEqual(2, mock_get_versions.call_count)
+
+    def test_compress_entity(self):
+        ser = base.NovaObjectSerializer()
+        obj = MyObj(foo=1, bar='x' * 100)
+        compressed = ser.compress_entity(self.context, [{'key': obj}], 10)
+        self.assertEqual([ser.COMPRESSED_KEY], list(compressed))
+        thing = ser.deserialize_entity(self.context, compressed)
+        self.assertIsInstance(thing[0]['key'], MyObj)
+        self.assertEqual(1, thing[0]['key'].foo)
+        self.assertEqual('x' * 100, thing[0]['key'].bar)
+        self.assertEqual(self.context, thing[0]['key']._context)
+
+    def test_compress_entity_multibyte(self):
+        ser = base.NovaObjectSerializer()
+        obj = MyObj(foo=1, bar='\u00e9' * 100)
+        compressed = ser.compress_entity(self.context, obj, 150)
+        self.assertEqual([ser.COMPRESSED_KEY], list(compressed))
+        thing = ser.deserialize_entity(self.context, compressed)
+        self.assertEqual('\u00e9' * 100, thing.bar)
+
+    def test_compress_entity_below_threshold(self):
+        ser = base.NovaObjectSerializer()
+        obj = MyObj(foo=1)
+        primitive = ser.compress_entity(self.context, obj, 4096)
+        self.assertEqual(ser.serialize_entity(self.context, obj), primitive)
+
+    def test_obj_to_delta_primitive(self):
+        ser = base.NovaObjectSerializer()
+        obj = MyObj(foo=1, bar='bar')
+        obj.obj_reset_changes()
+        obj.foo = 2
+        self.assertIsNone(obj.obj_to_delta_primitive('save'))
+        with mock.patch.object(obj, 'obj_delta_fields',
+                               return_value={'foo', 'missing'}):
+            primitive = obj.obj_to_delta_primitive('save')
+        self.assertEqual({'foo': 2}, primitive['nova_object.data'])
+        self.assertEqual(['foo'], primitive['nova_object.changes'])
+        obj2 = ser.deserialize_entity(self.context, primitive)
+        self.assertEqual(2, obj2.foo)
+        self.assertNotIn('bar', obj2)
+        self.assertEqual({'foo'}, obj2.obj_what_changed())
+
 
 class TestArgsSerializer(test.NoDBTestCase):
     def setUp(self):
@@ -1049,13 +1214,13 @@ object_data = {
     'BandwidthUsage': '1.2-c6e4c779c7f40f2407e3d70022e3cd1c',
     'BandwidthUsageList': '1.2-5fe7475ada6fe62413cbfcc06ec70746',
     'BlockDeviceMapping': '1.20-45a6ad666ddf14bbbedece2293af77e2',
-    'BlockDeviceMappingList': '1.17-1e568eecb91d06d4112db9fd656de235',
+    'BlockDeviceMappingList': '1.18-f84cd4db9e89f1c919868021c3489853',
     'BuildRequest': '1.3-077dee42bed93f8a5b62be77657b7152',
     'BuildRequestList': '1.0-cd95608eccb89fbc702c8b52f38ec738',
     'CellMapping': '1.1-5d652928000a5bc369d79d5bde7e497d',
     'CellMappingList': '1.1-496ef79bb2ab41041fff8bcb57996352',
     'ComputeNode': '1.19-af6bd29a6c3b225da436a0d8487096f2',
-    'ComputeNodeList': '1.17-52f3b0962b1c86b98590144463ebb192',
+    'ComputeNodeList': '1.18-a31681ed0fd35258fb500616ec66111f',
     'ConsoleAuthToken': '1.1-8da320fb065080eb4d3c2e5c59f8bf52',
     'CpuDiagnostics': '1.0-d256f2e442d1b837735fd17dfe8e3d47',
     'Destination': '1.4-3b440d29459e2c98987ad5b25ad1cb2c',
@@ -1076,8 +1241,8 @@ object_data = {
     'ImageMeta': '1.8-642d1b2eb3e880a367f37d72dd76162d',
     'ImageMetaProps': '1.27-f3f17d5e35146a0dbb56420ffc4f3990',
     'Instance': '2.7-d187aec68cad2e4d8b8a03a68e4739ce',
-    'InstanceAction': '1.2-9a5abc87fdd3af46f45731960651efb5',
-    'InstanceActionEvent': '1.4-5b1f361bd81989f8bb2c20bb7e8a4cb4',
+    'InstanceAction': '1.3-59d3773f5df7ab74319e90b4d733f531',
+    'InstanceActionEvent': '1.5-46903c455cea28f94ef7343c3931c3d0',
     'InstanceActionEventList': '1.1-13d92fb953030cdbfee56481756e02be',
     'InstanceActionList': '1.1-a2b2fb6006b47c27076d3a1d48baa759',
     'InstanceDeviceMetadata': '1.0-74d78dd36aa32d26d2769a1b57caf186',
@@ -1138,7 +1303,7 @@ object_data = {
     'Service': '1.22-8a740459ab9bf258a19c8fcb875c2d9a',
     'ServiceList': '1.19-5325bce13eebcbf22edc9678285270cc',
     'Tag': '1.1-8b8d7d5b48887651a0e01241672e2963',
-    'TagList': '1.1-55231bdb671ecf7641d6a2e9109b5d8e',
+    'TagList': '1.2-4a6da38b6b02f0ad9d406cce95459952',
     'TaskLog': '1.0-78b0534366f29aa3eebb01860fbe18fe',
     'TaskLogList': '1.0-cc8cce1af8a283b9d28b55fcd682e777',
     'TrustedCerts': '1.0-dcf528851e0f868c77ee47e90563cda7',
@@ -1315,6 +1480,24 @@ class TestObjEqualPrims(_BaseTestCase):
                         "Objects that only differ in an ignored field "
                         "should be equal")
 
+    def test_object_diff_fields(self):
+        obj1 = MyObj(foo=1, bar='goodbye', rel_object=MyOwnedObject(baz=1))
+        obj1.obj_reset_changes()
+        obj2 = MyObj(foo=2, bar='goodbye', rel_object=MyOwnedObject(baz=1))
+        self.assertEqual(set(['foo']), base.obj_diff_fields(obj1, obj2))
+        self.assertEqual(set(), base.obj_diff_fields(obj1, obj2, ['foo']))
+
+    def test_object_diff_fields_unset(self):
+        obj1 = MyObj(foo=1, bar='goodbye')
+        obj2 = MyObj(foo=1)
+        self.assertEqual(set(['bar']), base.obj_diff_fields(obj1, obj2))
+        self.assertEqual(set(['bar']), base.obj_diff_fields(obj2, obj1))
+
+    def test_object_diff_fields_nested(self):
+        obj1 = MyObj(foo=1, rel_object=MyOwnedObject(baz=1))
+        obj2 = MyObj(foo=1, rel_object=MyOwnedObject(baz=2))
+        self.assertEqual(set(['rel_object']), base.obj_diff_fields(obj1, obj2))
+
 
 class TestObjMethodOverrides(test.NoDBTestCase):
     def test_obj_reset_changes(self):
@@ -169,7 +169,7 @@ class _TestPciDeviceObject(object):
         self.pci_device.update_device(changes)
         self.assertEqual(self.pci_device.vendor_id, 'v2')
         self.assertEqual(self.pci_device.obj_what_changed(),
-                         set(['vendor_id', 'product_id', 'parent_addr']))
+                         set(['vendor_id', 'product_id']))
 
     def test_update_device_same_value(self):
         self.pci_device = pci_device.PciDevice.create(None, dev_dict)
@@ -178,8 +178,16 @@ class _TestPciDeviceObject(object):
         self.pci_device.update_device(changes)
         self.assertEqual(self.pci_device.product_id, 'p')
         self.assertEqual(self.pci_device.vendor_id, 'v2')
+        # Fields updated with their current value are not flagged as changed
+        # so that they are not needlessly written back to the database.
         self.assertEqual(self.pci_device.obj_what_changed(),
-                         set(['vendor_id', 'product_id', 'parent_addr']))
+                         set(['vendor_id']))
+
+    def test_update_device_no_changes(self):
+        self.pci_device = pci_device.PciDevice.create(None, dev_dict)
+        self.pci_device.obj_reset_changes()
+        self.pci_device.update_device(copy.deepcopy(dev_dict))
+        self.assertEqual(set(), self.pci_device.obj_what_changed())
 
     @mock.patch.object(db, 'pci_device_get_by_addr')
     def test_get_by_dev_addr(self, mock_get):
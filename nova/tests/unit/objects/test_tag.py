@@ -101,6 +101,16 @@ class _TestTagList(object):
                                         RESOURCE_ID, [TAG_NAME1, TAG_NAME2])
         self._compare_tag_list(fake_tag_list, tag_list_obj)
 
+    @mock.patch('nova.db.api.instance_tag_set_bulk')
+    def test_create_bulk(self, tag_set_bulk):
+        tag_set_bulk.return_value = fake_tag_list
+        tag_list_obj = tag.TagList.create_bulk(
+            self.context, [RESOURCE_ID], [TAG_NAME1, TAG_NAME2])
+
+        tag_set_bulk.assert_called_once_with(
+            self.context, [RESOURCE_ID], [TAG_NAME1, TAG_NAME2])
+        self._compare_tag_list(fake_tag_list, tag_list_obj)
+
     @mock.patch('nova.db.api.instance_tag_delete_all')
     def test_destroy(self, tag_delete_all):
         tag.TagList.destroy(self.context, RESOURCE_ID)
@@ -34,6 +34,7 @@ from nova import objects
 from nova.objects import base as obj_base
 from nova.pci import stats as pci_stats
 from nova.scheduler import filters
+from nova.scheduler.filters import numa_topology_filter
 from nova.scheduler import host_manager
 from nova import test
 from nova.tests import fixtures
@@ -76,6 +77,21 @@ class HostManagerTestCase(test.NoDBTestCase):
         filters = self.host_manager._load_filters()
         self.assertEqual(filters, ['FakeFilterClass1'])
 
+    def test_choose_compute_node_attrs(self):
+        # The PCI weigher is enabled by default.
+        self.assertEqual(
+            ['cpu_info', 'stats', 'supported_hv_specs', 'pci_device_pools'],
+            self.host_manager.compute_node_attrs)
+        self.host_manager.weighers = []
+        self.assertEqual(['cpu_info', 'stats', 'supported_hv_specs'],
+                         self.host_manager._choose_compute_node_attrs())
+        self.host_manager.enabled_filters.append(
+            numa_topology_filter.NUMATopologyFilter())
+        self.assertEqual(
+            ['cpu_info', 'stats', 'supported_hv_specs', 'numa_topology',
+             'pci_device_pools'],
+            self.host_manager._choose_compute_node_attrs())
+
     def test_refresh_cells_caches(self):
         ctxt = nova_context.RequestContext('fake', 'fake')
         # Loading the non-cell0 mapping from the base test class.
@@ -1084,7 +1100,9 @@ class HostManagerTestCase(test.NoDBTestCase):
         # targeted one if we honored the only-cell destination requirement,
         # and only looked up services and compute nodes in one
         mock_target.assert_called_once_with(context, cells[1])
-        mock_cn.assert_called_once_with(mock.sentinel.cctxt)
+        mock_cn.assert_called_once_with(
+            mock.sentinel.cctxt,
+            expected_attrs=self.host_manager.compute_node_attrs)
         mock_sl.assert_called_once_with(mock.sentinel.cctxt, 'nova-compute',
                                         include_disabled=True)
 
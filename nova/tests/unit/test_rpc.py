@@ -15,6 +15,7 @@
 import mock
 import oslo_messaging as messaging
 from oslo_messaging.rpc import dispatcher
+from oslo_messaging.rpc import server as rpc_server
 from oslo_serialization import jsonutils
 
 import nova.conf
@@ -104,6 +105,19 @@ class TestRPC(test.NoDBTestCase):
             {'topics': ['versioned_notifications']}]
         self._test_init('versioned', expected_driver_topic_kwargs)
 
+    def test_init_send_queue(self):
+        self.flags(send_queue_size=5, send_queue_overflow_policy='drop',
+                   group='notifications')
+        with mock.patch.object(rpc, '_NOTIFICATION_QUEUE', new=None):
+            self._test_init('versioned', [
+                {'driver': 'noop'},
+                {'topics': ['versioned_notifications']}])
+            self.assertIsInstance(rpc._NOTIFICATION_QUEUE,
+                                  rpc.NotificationQueue)
+            self.assertEqual(5, rpc._NOTIFICATION_QUEUE._queue.maxsize)
+            self.assertEqual('drop',
+                             rpc._NOTIFICATION_QUEUE._overflow_policy)
+
     def test_init_versioned_with_custom_topics(self):
         expected_driver_topic_kwargs = [
             {'driver': 'noop'},
@@ -156,6 +170,31 @@ class TestRPC(test.NoDBTestCase):
         self.assertIsNone(rpc.LEGACY_NOTIFIER)
         self.assertIsNone(rpc.NOTIFIER)
 
+    @mock.patch.object(rpc, 'TRANSPORT')
+    @mock.patch.object(rpc, 'NOTIFICATION_TRANSPORT')
+    @mock.patch.object(rpc, 'LEGACY_NOTIFIER')
+    @mock.patch.object(rpc, 'NOTIFIER')
+    def test_cleanup_flushes_notifications(self, mock_NOTIFIER,
+            mock_LEGACY_NOTIFIER, mock_NOTIFICATION_TRANSPORT,
+            mock_TRANSPORT):
+        queue = mock.Mock(spec=rpc.NotificationQueue)
+        with mock.patch.object(rpc, '_NOTIFICATION_QUEUE', new=queue):
+            rpc.cleanup()
+            self.assertIsNone(rpc._NOTIFICATION_QUEUE)
+        queue.flush.assert_called_once_with()
+
+    def test_is_event_type_enabled(self):
+        self.assertTrue(rpc.is_event_type_enabled('instance.update'))
+        self.flags(excluded_event_types=['instance.update',
+                                         'compute.instance.*.start'],
+                   group='notifications')
+        self.assertFalse(rpc.is_event_type_enabled('instance.update'))
+        self.assertFalse(
+            rpc.is_event_type_enabled('compute.instance.create.start'))
+        self.assertTrue(
+            rpc.is_event_type_enabled('compute.instance.create.end'))
+        self.assertTrue(rpc.is_event_type_enabled('compute.instance.update'))
+
     @mock.patch.object(messaging, 'set_transport_defaults')
     def test_set_defaults(self, mock_set):
         control_exchange = mock.Mock()
@@ -232,21 +271,24 @@ class TestRPC(test.NoDBTestCase):
     @mock.patch.object(rpc, 'TRANSPORT')
     @mock.patch.object(rpc, 'profiler', None)
     @mock.patch.object(rpc, 'RequestContextSerializer')
-    @mock.patch.object(messaging, 'get_rpc_server')
-    def test_get_server(self, mock_get, mock_ser, mock_TRANSPORT):
+    @mock.patch.object(rpc, 'RPCDispatcher')
+    @mock.patch.object(rpc_server, 'RPCServer')
+    def test_get_server(self, mock_server, mock_disp, mock_ser,
+                        mock_TRANSPORT):
         ser = mock.Mock()
         tgt = mock.Mock()
         ends = mock.Mock()
         mock_ser.return_value = ser
-        mock_get.return_value = 'server'
+        mock_server.return_value = 'server'
 
         server = rpc.get_server(tgt, ends, serializer='foo')
 
         mock_ser.assert_called_once_with('foo')
         access_policy = dispatcher.DefaultRPCAccessPolicy
-        mock_get.assert_called_once_with(mock_TRANSPORT, tgt, ends,
-                                         executor='eventlet', serializer=ser,
-                                         access_policy=access_policy)
+        mock_disp.assert_called_once_with(ends, ser, access_policy)
+        mock_server.assert_called_once_with(mock_TRANSPORT, tgt,
+                                            mock_disp.return_value,
+                                            executor='eventlet')
         self.assertEqual('server', server)
 
     @mock.patch.object(rpc, 'TRANSPORT')
@@ -273,24 +315,41 @@ class TestRPC(test.NoDBTestCase):
     @mock.patch.object(rpc, 'profiler', mock.Mock())
     @mock.patch.object(rpc, 'profiler', mock.Mock())
     @mock.patch.object(rpc, 'ProfilerRequestContextSerializer')
-    @mock.patch.object(messaging, 'get_rpc_server')
-    def test_get_server_profiler_enabled(self, mock_get, mock_ser,
-            mock_TRANSPORT):
+    @mock.patch.object(rpc, 'RPCDispatcher')
+    @mock.patch.object(rpc_server, 'RPCServer')
+    def test_get_server_profiler_enabled(self, mock_server, mock_disp,
+            mock_ser, mock_TRANSPORT):
         ser = mock.Mock()
         tgt = mock.Mock()
         ends = mock.Mock()
         mock_ser.return_value = ser
-        mock_get.return_value = 'server'
+        mock_server.return_value = 'server'
 
         server = rpc.get_server(tgt, ends, serializer='foo')
 
         mock_ser.assert_called_once_with('foo')
         access_policy = dispatcher.DefaultRPCAccessPolicy
-        mock_get.assert_called_once_with(mock_TRANSPORT, tgt, ends,
-                                         executor='eventlet', serializer=ser,
-                                         access_policy=access_policy)
+        mock_disp.assert_called_once_with(ends, ser, access_policy)
+        mock_server.assert_called_once_with(mock_TRANSPORT, tgt,
+                                            mock_disp.return_value,
+                                            executor='eventlet')
         self.assertEqual('server', server)
 
+    @mock.patch('nova.db.api.report_query_stats')
+    def test_dispatcher_reports_query_stats(self, mock_report):
+        endpoint = mock.Mock(target=messaging.Target(version='1.0'))
+        endpoint.method.side_effect = test.TestingException
+        rpc_dispatcher = rpc.RPCDispatcher(
+            [endpoint], rpc.RequestContextSerializer(None),
+            dispatcher.DefaultRPCAccessPolicy)
+        ctxt = context.RequestContext('fake-user', 'fake-project')
+        incoming = mock.Mock(ctxt=ctxt.to_dict(), client_timeout=None,
+                             message={'method': 'method', 'args': {}})
+
+        self.assertRaises(test.TestingException, rpc_dispatcher.dispatch,
+                          incoming)
+        mock_report.assert_called_once_with(ctxt.request_id)
+
     @mock.patch.object(rpc, 'LEGACY_NOTIFIER')
     def test_get_notifier(self, mock_LEGACY_NOTIFIER):
         mock_prep = mock.Mock()
@@ -326,6 +385,31 @@ class TestRPC(test.NoDBTestCase):
         mock_prep.assert_called_once_with(publisher_id='service.foo')
         self.assertEqual('notifier', notifier)
 
+    @mock.patch.object(rpc, 'NOTIFIER')
+    @mock.patch.object(rpc, 'LEGACY_NOTIFIER')
+    def test_get_notifiers_queued(self, mock_LEGACY_NOTIFIER, mock_NOTIFIER):
+        queue = mock.Mock(spec=rpc.NotificationQueue)
+        with mock.patch.object(rpc, '_NOTIFICATION_QUEUE', new=queue):
+            legacy_notifier = rpc.get_notifier('service', host='bar')
+            notifier = rpc.get_versioned_notifier('service.foo')
+
+        self.assertIsInstance(legacy_notifier.notifier, rpc.QueuedNotifier)
+        self.assertEqual(mock_LEGACY_NOTIFIER.prepare.return_value,
+                         legacy_notifier.notifier.notifier)
+        self.assertIsInstance(notifier, rpc.QueuedNotifier)
+        self.assertEqual(mock_NOTIFIER.prepare.return_value,
+                         notifier.notifier)
+
+        notifier.info(mock.sentinel.ctxt, event_type='instance.update',
+                      payload=mock.sentinel.payload)
+        mock_NOTIFIER.prepare.return_value.info.assert_not_called()
+        queue.put.assert_called_once_with(mock.ANY)
+        # Sending the queued notification calls the wrapped notifier.
+        queue.put.call_args[0][0]()
+        mock_NOTIFIER.prepare.return_value.info.assert_called_once_with(
+            mock.sentinel.ctxt, event_type='instance.update',
+            payload=mock.sentinel.payload)
+
     @mock.patch.object(rpc, 'get_allowed_exmods')
     @mock.patch.object(messaging, 'get_rpc_transport')
     def test_create_transport(self, mock_transport, mock_exmods):
@@ -338,6 +422,62 @@ class TestRPC(test.NoDBTestCase):
                                                allowed_remote_exmods=exmods)
 
 
+class TestLegacyValidatingNotifier(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestLegacyValidatingNotifier, self).setUp()
+        self.wrapped = mock.Mock()
+        self.notifier = rpc.LegacyValidatingNotifier(self.wrapped)
+
+    def test_is_enabled(self):
+        self.assertEqual(self.wrapped.is_enabled.return_value,
+                         self.notifier.is_enabled())
+
+    def test_excluded_event_type_not_sent(self):
+        self.flags(excluded_event_types=['compute.instance.update'],
+                   group='notifications')
+        self.notifier.info(mock.sentinel.ctxt, 'compute.instance.update', {})
+        self.notifier.info(mock.sentinel.ctxt, 'compute.instance.exists', {})
+        self.wrapped.info.assert_called_once_with(
+            mock.sentinel.ctxt, 'compute.instance.exists', {})
+
+
+class TestNotificationQueue(test.NoDBTestCase):
+
+    def test_send(self):
+        queue = rpc.NotificationQueue(10, 'block')
+        sent = []
+        queue.put(lambda: sent.append(1))
+        queue.put(mock.Mock(side_effect=test.TestingException))
+        queue.put(lambda: sent.append(2))
+        # Nothing is sent until the sender greenthread gets to run.
+        self.assertEqual([], sent)
+        queue.flush()
+        self.assertEqual([1, 2], sent)
+
+    def test_flush_nothing_queued(self):
+        rpc.NotificationQueue(10, 'block').flush()
+
+    @mock.patch.object(rpc.LOG, 'warning')
+    def test_overflow_drop(self, mock_warning):
+        queue = rpc.NotificationQueue(1, 'drop')
+        sent = []
+        queue.put(lambda: sent.append(1))
+        queue.put(lambda: sent.append(2))
+        mock_warning.assert_called_once_with(mock.ANY, 1)
+        queue.flush()
+        self.assertEqual([1], sent)
+
+    def test_overflow_block(self):
+        queue = rpc.NotificationQueue(1, 'block')
+        sent = []
+        queue.put(lambda: sent.append(1))
+        # The second put waits for the sender to make room in the queue.
+        queue.put(lambda: sent.append(2))
+        queue.flush()
+        self.assertEqual([1, 2], sent)
+
+
 class TestJsonPayloadSerializer(test.NoDBTestCase):
     def test_serialize_entity(self):
         serializer = rpc.JsonPayloadSerializer()
@@ -74,6 +74,15 @@ class ServiceManagerTestCase(test.NoDBTestCase):
                                'nova.tests.unit.test_service.FakeManager')
         self.assertEqual('service', serv.test_method())
 
+    @mock.patch('nova.db.api.report_query_stats')
+    def test_periodic_tasks_report_query_stats(self, mock_report):
+        mgr = FakeManager()
+        ctxt = mock.Mock()
+        with mock.patch.object(mgr, 'run_periodic_tasks',
+                               side_effect=test.TestingException):
+            self.assertRaises(test.TestingException, mgr.periodic_tasks, ctxt)
+        mock_report.assert_called_once_with(ctxt.request_id)
+
     def test_service_with_min_down_time(self):
         # TODO(hanlind): This really tests code in the servicegroup api.
         self.flags(service_down_time=10, report_interval=10)
@@ -639,6 +639,28 @@ class IronicDriverTestCase(test.NoDBTestCase):
         expected = [n.instance_id for n in nodes]
         self.assertEqual(sorted(expected), sorted(uuids))
 
+    def test_get_instance_power_states(self):
+        nodes = [
+            ironic_utils.get_test_node(instance_id=uuids.instance1,
+                                       power_state=ironic_states.POWER_ON),
+            ironic_utils.get_test_node(instance_id=uuids.instance2,
+                                       power_state=ironic_states.POWER_OFF),
+            ironic_utils.get_test_node(instance_id=uuids.other,
+                                       power_state=ironic_states.POWER_ON),
+        ]
+        self.mock_conn.nodes.return_value = iter(nodes)
+        instances = [fake_instance.fake_instance_obj(self.ctx, uuid=uuid)
+                     for uuid in (uuids.instance1, uuids.instance2,
+                                  uuids.instance3)]
+
+        states = self.driver.get_instance_power_states(instances)
+
+        self.mock_conn.nodes.assert_called_once_with(
+            associated=True, fields=['instance_uuid', 'power_state'])
+        self.assertEqual({uuids.instance1: nova_states.RUNNING,
+                          uuids.instance2: nova_states.SHUTDOWN,
+                          uuids.instance3: nova_states.NOSTATE}, states)
+
     # NOTE(dustinc) This test ensures we use instance_uuid not instance_id in
     # 'fields' when calling ironic.
     @mock.patch.object(objects.Instance, 'get_by_uuid')
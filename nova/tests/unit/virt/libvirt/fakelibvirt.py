@@ -173,6 +173,9 @@ VIR_DOMAIN_BLOCK_COMMIT_RELATIVE = 4
 VIR_CONNECT_LIST_DOMAINS_ACTIVE = 1
 VIR_CONNECT_LIST_DOMAINS_INACTIVE = 2
 
+# virConnectGetAllDomainStats stats
+VIR_DOMAIN_STATS_STATE = 1
+
 # virConnectListAllNodeDevices flags
 VIR_CONNECT_LIST_NODE_DEVICES_CAP_PCI_DEV = 2
 VIR_CONNECT_LIST_NODE_DEVICES_CAP_NET = 16
@@ -1536,6 +1539,16 @@ class Connection(object):
                     vms.append(vm)
         return vms
 
+    def getAllDomainStats(self, stats=0, flags=0):
+        records = []
+        for vm in self._vms.values():
+            record = {}
+            if stats & VIR_DOMAIN_STATS_STATE:
+                record['state.state'] = vm._state
+                record['state.reason'] = 0
+            records.append((vm, record))
+        return records
+
     def _emit_lifecycle(self, dom, event, detail):
         if VIR_DOMAIN_EVENT_ID_LIFECYCLE not in self._event_callbacks:
             return
@@ -8821,6 +8821,19 @@ class LibvirtConnTestCase(test.NoDBTestCase,
         self.assertEqual(uuids[3], vm4.UUIDString())
         mock_list.assert_called_with(only_guests=True, only_running=False)
 
+    @mock.patch.object(host.Host, 'get_guest_power_states')
+    def test_get_instance_power_states(self, mock_states):
+        mock_states.return_value = {
+            uuids.instance1: power_state.RUNNING,
+            uuids.other: power_state.RUNNING,
+        }
+        instances = [objects.Instance(uuid=uuids.instance1),
+                     objects.Instance(uuid=uuids.instance2)]
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual({uuids.instance1: power_state.RUNNING,
+                          uuids.instance2: power_state.NOSTATE},
+                         drvr.get_instance_power_states(instances))
+
     @mock.patch('nova.virt.libvirt.host.Host.get_online_cpus',
                 return_value=set([0, 1, 2, 3]))
     def test_get_pcpu_available(self, get_online_cpus):
@@ -25989,13 +26002,23 @@ class LibvirtDriverTestCase(test.NoDBTestCase, TraitsComparisonMixin):
 </cpu>
 '''], 1)
 
+    def test_spawn_uses_image_cache(self):
+        self.flags(images_type='qcow2', group='libvirt')
+        self.assertTrue(self.drvr.spawn_uses_image_cache())
+        # Images are cloned rather than fetched into the cache.
+        self.flags(images_type='rbd', group='libvirt')
+        self.assertFalse(self.drvr.spawn_uses_image_cache())
+
+    @mock.patch('nova.utils.synchronized',
+                side_effect=lambda *a, **kw: lambda f: f)
     @mock.patch('oslo_utils.fileutils.ensure_tree')
     @mock.patch('os.path.isdir')
     @mock.patch('os.path.exists')
     @mock.patch('os.utime')
     @mock.patch('nova.virt.images.fetch_to_raw')
     def test_cache_image_uncached(self, mock_fetch, mock_utime, mock_exists,
-                                  mock_isdir, mock_et, first_time=False):
+                                  mock_isdir, mock_et, mock_sync,
+                                  first_time=False):
         # NOTE(artom): This is not actually a path on the system, since we
         # are fully mocked out and are just testing string formatting in this
         # test.
@@ -26010,7 +26033,11 @@ class LibvirtDriverTestCase(test.NoDBTestCase, TraitsComparisonMixin):
         mock_fetch.assert_called_once_with(self.context, 'an-image',
                                            expected_fn)
         mock_utime.assert_not_called()
-        mock_exists.assert_called_once_with(expected_fn)
+        # The existence of the image is checked again once the lock is held
+        mock_exists.assert_has_calls([mock.call(expected_fn)] * 2)
+        mock_sync.assert_called_once_with(
+            imagecache.get_cache_fname('an-image'), external=True,
+            lock_path='/nova/instances/locks')
         mock_isdir.assert_called_once_with('/nova/instances/cache')
         if first_time:
             mock_et.assert_called_once_with('/nova/instances/cache')
@@ -26047,6 +26074,24 @@ class LibvirtDriverTestCase(test.NoDBTestCase, TraitsComparisonMixin):
         mock_et.assert_not_called()
         mock_isdir.assert_not_called()
 
+    @mock.patch('nova.utils.synchronized',
+                side_effect=lambda *a, **kw: lambda f: f)
+    @mock.patch('oslo_utils.fileutils.ensure_tree')
+    @mock.patch('os.path.isdir', return_value=True)
+    @mock.patch('os.path.exists', side_effect=[False, True])
+    @mock.patch('nova.privsep.path.utime')
+    @mock.patch('nova.virt.images.fetch_to_raw')
+    def test_cache_image_fetched_concurrently(self, mock_fetch, mock_utime,
+                                              mock_exists, mock_isdir,
+                                              mock_et, mock_sync):
+        # Another request finished fetching the image while we waited for
+        # the lock, so there is nothing left to do.
+        self.assertFalse(self.drvr.cache_image(self.context, 'an-image'))
+        mock_fetch.assert_not_called()
+        mock_utime.assert_not_called()
+        self.assertEqual(2, mock_exists.call_count)
+        mock_sync.assert_called_once()
+
     @mock.patch('nova.virt.images.qemu_img_info',
                 return_value=mock.Mock(file_format="fake_fmt"))
     @mock.patch('oslo_concurrency.processutils.execute')
@@ -24,6 +24,7 @@ from oslo_utils.fixture import uuidsentinel as uuids
 from oslo_utils import uuidutils
 import testtools
 
+from nova.compute import power_state
 from nova.compute import vm_states
 from nova import exception
 from nova import objects
@@ -515,6 +516,24 @@ class HostTestCase(test.NoDBTestCase):
 
         fake_lookup.assert_called_once_with(uuid)
 
+    @mock.patch.object(fakelibvirt.Connection, "getAllDomainStats")
+    def test_get_guest_power_states(self, mock_stats):
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        vm2 = FakeVirtDomain(name="instance00000002")
+        mock_stats.return_value = [
+            (vm1, {'state.state': fakelibvirt.VIR_DOMAIN_RUNNING,
+                   'state.reason': 1}),
+            (vm2, {'state.state': fakelibvirt.VIR_DOMAIN_SHUTOFF,
+                   'state.reason': 1}),
+        ]
+
+        states = self.host.get_guest_power_states()
+
+        mock_stats.assert_called_once_with(
+            fakelibvirt.VIR_DOMAIN_STATS_STATE)
+        self.assertEqual({vm1.UUIDString(): power_state.RUNNING,
+                          vm2.UUIDString(): power_state.SHUTDOWN}, states)
+
     @mock.patch.object(fakelibvirt.Connection, "listAllDomains")
     def test_list_instance_domains(self, mock_list_all):
         vm0 = FakeVirtDomain(id=0, name="Domain-0")  # Xen dom-0
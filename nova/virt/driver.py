@@ -247,6 +247,22 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_instance_power_states(self, instances):
+        """Get the current power state of several instances at once.
+
+        Drivers able to query the hypervisor for the state of all their
+        instances in a single call should implement this so that the
+        _sync_power_states periodic task does not have to call get_info()
+        for every instance of the host.
+
+        :param instances: list of nova.objects.instance.Instance objects
+        :returns: dict, keyed by instance UUID, of nova.compute.power_state
+                  values for every given instance. Instances unknown to the
+                  hypervisor are reported as power_state.NOSTATE.
+        :raises: NotImplementedError if the driver cannot do this in bulk
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
@@ -1529,6 +1545,18 @@ class ComputeDriver(object):
         """
         raise NotImplementedError()
 
+    def spawn_uses_image_cache(self):
+        """Return whether spawn() fetches images into the local cache.
+
+        Used by the compute manager to decide whether the image of an
+        instance being built can be downloaded with cache_image() before
+        spawning it, rather than by spawn() itself.
+
+        :returns: True if spawn() downloads images into the same cache as
+                  cache_image(), False otherwise.
+        """
+        return False
+
     def get_volume_connector(self, instance):
         """Get connector information for the instance for attaching to volumes.
 
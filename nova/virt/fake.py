@@ -1045,6 +1045,9 @@ class FakeDriverWithCaching(FakeDriver):
         super(FakeDriverWithCaching, self).__init__(*a, **k)
         self.cached_images = set()
 
+    def spawn_uses_image_cache(self):
+        return True
+
     def cache_image(self, context, image_id):
         if image_id in self.cached_images:
             return False
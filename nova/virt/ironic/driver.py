@@ -1039,6 +1039,24 @@ class IronicDriver(virt_driver.ComputeDriver):
 
         return hardware.InstanceInfo(state=map_power_state(node.power_state))
 
+    def get_instance_power_states(self, instances):
+        """Get the current power state of several instances at once.
+
+        All the nodes associated with an instance are retrieved from ironic
+        with a single (paginated) node list request.
+
+        :param instances: list of instance objects.
+        :returns: dict of power states keyed by instance UUID.
+        :raises: VirtDriverNotReady
+        """
+        nodes = self._get_node_list(return_generator=True, associated=True,
+                                    fields=['instance_uuid', 'power_state'])
+        states = {node.instance_id: map_power_state(node.power_state)
+                  for node in nodes}
+        nostate = map_power_state(ironic_states.NOSTATE)
+        return {instance.uuid: states.get(instance.uuid, nostate)
+                for instance in instances}
+
     def _get_network_metadata(self, node, network_info):
         """Gets a more complete representation of the instance network info.
 
@@ -6469,6 +6469,11 @@ class LibvirtDriver(driver.ComputeDriver):
         # workaround, see libvirt/compat.py
         return guest.get_info(self._host)
 
+    def get_instance_power_states(self, instances):
+        states = self._host.get_guest_power_states()
+        return {instance.uuid: states.get(instance.uuid, power_state.NOSTATE)
+                for instance in instances}
+
     def _create_domain_setup_lxc(self, context, instance, image_meta,
                                  block_device_info):
         inst_path = libvirt_utils.get_instance_path(instance)
@@ -10184,11 +10189,17 @@ class LibvirtDriver(driver.ComputeDriver):
         except Exception:
             pass
 
+    def spawn_uses_image_cache(self):
+        # NOTE: Backends which can clone images, such as rbd, only fall back
+        # to the local image cache if cloning fails.
+        return not self.image_backend.backend(
+            CONF.libvirt.images_type).SUPPORTS_CLONE
+
     def cache_image(self, context, image_id):
         cache_dir = os.path.join(CONF.instances_path,
                                  CONF.image_cache.subdirectory_name)
-        path = os.path.join(cache_dir,
-                            imagecache.get_cache_fname(image_id))
+        filename = imagecache.get_cache_fname(image_id)
+        path = os.path.join(cache_dir, filename)
         if os.path.exists(path):
             LOG.info('Image %(image_id)s already cached; updating timestamp',
                      {'image_id': image_id})
@@ -10206,18 +10217,23 @@ class LibvirtDriver(driver.ComputeDriver):
             # sure the cache directory is created
             if not os.path.isdir(cache_dir):
                 fileutils.ensure_tree(cache_dir)
-            LOG.info('Caching image %(image_id)s by request',
-                     {'image_id': image_id})
-            # NOTE(danms): The imagebackend code, as called via spawn() where
-            # images are normally cached, uses a lock on the root disk it is
-            # creating at the time, but relies on the
-            # compute_utils.disk_ops_semaphore for cache fetch mutual
-            # exclusion, which is grabbed in images.fetch() (which is called
-            # by images.fetch_to_raw() below). So, by calling fetch_to_raw(),
-            # we are sharing the same locking for the cache fetch as the
-            # rest of the code currently called only from spawn().
-            images.fetch_to_raw(context, image_id, path)
-            return True
+
+            # NOTE: Hold the same lock as the imagebackend code, as called via
+            # spawn(), holds while it fetches the image into the cache. This
+            # way an image prefetched while an instance using it is spawning,
+            # or prefetched twice at the same time, is only downloaded once.
+            @utils.synchronized(filename, external=True,
+                                lock_path=os.path.join(CONF.instances_path,
+                                                       'locks'))
+            def _fetch_image():
+                if os.path.exists(path):
+                    return False
+                LOG.info('Caching image %(image_id)s by request',
+                         {'image_id': image_id})
+                images.fetch_to_raw(context, image_id, path)
+                return True
+
+            return _fetch_image()
 
     def _get_disk_size_reserved_for_image_cache(self):
         """Return the amount of DISK_GB resource need to be reserved for the
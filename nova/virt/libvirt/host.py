@@ -668,6 +668,26 @@ class Host(object):
 
         return doms
 
+    def get_guest_power_states(self):
+        """Get the power state of every domain defined on the host.
+
+        This uses a single virConnectGetAllDomainStats call instead of
+        looking up each domain and retrieving its info separately.
+
+        :returns: dict of nova.compute.power_state values keyed by domain
+                  UUID
+        """
+        # NOTE: As with listAllDomains(), the domains returned here are not
+        # wrapped by tpool.Proxy, but UUIDString() does not call into the
+        # libvirt daemon.
+        stats = self.get_connection().getAllDomainStats(
+            libvirt.VIR_DOMAIN_STATS_STATE)
+        return {
+            dom.UUIDString(): libvirt_guest.LIBVIRT_POWER_STATE[
+                record['state.state']]
+            for dom, record in stats
+        }
+
     def get_online_cpus(self):
         """Get the set of CPUs that are online on the host
 
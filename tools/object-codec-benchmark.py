@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Microbenchmark for NovaObject primitive conversion.
+
+Runs an InstanceList through serialization, backporting with a version
+manifest, deserialization and Instance._from_db_object(), with and without
+the per-class codecs that are compiled when objects are registered, and
+prints the best time for each.
+
+Run it from the top of a nova tree, for example::
+
+    PYTHONPATH=. python tools/object-codec-benchmark.py --instances 1000
+"""
+
+import argparse
+import timeit
+from unittest import mock
+
+from nova import context as nova_context
+from nova import objects
+from nova.objects import base
+from nova.tests.unit import fake_instance
+
+
+def build_db_instances(count):
+    flavor = objects.Flavor(id=1, name='m1.small', memory_mb=512, vcpus=1,
+                            root_gb=1, ephemeral_gb=0, flavorid='1',
+                            swap=0, rxtx_factor=1.0, vcpu_weight=1,
+                            disabled=False, is_public=True, extra_specs={},
+                            projects=[])
+    return [fake_instance.fake_db_instance(
+                id=i, instance_type=flavor, hostname='server-%d' % i,
+                display_name='server-%d' % i, vm_state='active',
+                power_state=1, memory_mb=512, vcpus=1, launch_index=0,
+                node='node-%d' % (i % 10))
+            for i in range(count)]
+
+
+def run(db_instances, repeat):
+    ctxt = nova_context.get_admin_context()
+    serializer = base.NovaObjectSerializer()
+    expected_attrs = ['flavor']
+
+    def from_db():
+        return base.obj_make_list(ctxt, objects.InstanceList(ctxt),
+                                  objects.Instance, db_instances,
+                                  expected_attrs=expected_attrs)
+
+    instances = from_db()
+    primitive = serializer.serialize_entity(ctxt, instances)
+    manifest = base.obj_tree_get_versions('InstanceList')
+
+    results = {}
+    for name, fn in (
+            ('serialize', lambda: serializer.serialize_entity(ctxt,
+                                                              instances)),
+            ('backport', lambda: instances.obj_to_primitive(
+                target_version=instances.VERSION,
+                version_manifest=manifest)),
+            ('deserialize', lambda: serializer.deserialize_entity(
+                ctxt, primitive)),
+            ('_from_db_object', from_db)):
+        results[name] = min(timeit.repeat(fn, number=1, repeat=repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--instances', type=int, default=1000,
+                        help='Number of instances in the list')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of times to time each step')
+    args = parser.parse_args()
+
+    objects.register_all()
+    db_instances = build_db_instances(args.instances)
+
+    with mock.patch.object(base.NovaObject, '_obj_get_codec',
+                           return_value=None):
+        generic = run(db_instances, args.repeat)
+    compiled = run(db_instances, args.repeat)
+
+    print('%-16s %12s %12s %8s' % ('step', 'generic (s)', 'codec (s)',
+                                   'speedup'))
+    for name in generic:
+        print('%-16s %12.4f %12.4f %7.2fx' % (
+            name, generic[name], compiled[name],
+            generic[name] / compiled[name]))
+
+
+if __name__ == '__main__':
+    main()